@@ -1,5 +1,21 @@
 import sqlite3
 import os
+import re
+
+# Mirrors server/user_db_layout.py: user_{id}.db lives in user_dbs/<id % 256 as 2 hex digits>/,
+# or directly in user_dbs/ for databases not yet moved by server/tools/shard_user_dbs.py
+USER_DB_FILENAME_RE = re.compile(r'^user_(\d+)\.db$')
+
+
+def resolve_user_db_path(user_dbs_dir, db_name):
+    """Returns the path of a user DB file, checking the sharded layout before the flat one."""
+    match = USER_DB_FILENAME_RE.match(db_name)
+    if match:
+        sharded = os.path.join(user_dbs_dir, f"{int(match.group(1)) % 256:02x}", db_name)
+        if os.path.exists(sharded):
+            return sharded
+    return os.path.join(user_dbs_dir, db_name)
+
 
 class BaseRepository:
     _connections = {}
@@ -19,8 +35,8 @@ class BaseRepository:
                     # Admin DB (for regular users) is in server/
                     db_path = os.path.join(project_root, 'server', db_name)
                 else:
-                    # Assume it's a user-specific Anki DB in server/user_dbs/
-                    db_path = os.path.join(project_root, 'server', 'user_dbs', db_name)
+                    # Assume it's a user-specific Anki DB in server/user_dbs/ (sharded or flat)
+                    db_path = resolve_user_db_path(os.path.join(project_root, 'server', 'user_dbs'), db_name)
 
                 # Ensure the directory exists for sysadmin.db if it's being created
                 if db_name == 'sysadmin.db':
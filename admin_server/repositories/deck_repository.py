@@ -6,14 +6,22 @@ from base_repository import BaseRepository
 class DeckRepository(BaseRepository):
 
     def get_decks_by_user_id(self, user_id):
-        """Retrieves all decks for a specific user (by user_id) by parsing the JSON in their Anki DB.
-        
+        """Retrieves all decks for a specific user (by user_id) from their Anki DB.
+
+        Reads the server's deck registry table (schema v3+, see server/user_db_decks.py); older
+        DBs without it fall back to parsing the col.decks JSON, which the registry replaces.
         Returns a list of dictionaries, each with 'id' and 'name'.
         Returns an empty list if the DB, table, or column is not found, or if parsing fails.
         """
         # Construct filename using user_id
         db_filename = f"user_{user_id}.db" 
-        
+
+        try:
+            rows = self._execute_query(db_filename, "SELECT id, name FROM decks ORDER BY name")
+            return [{"id": row['id'], "name": row['name']} for row in rows]
+        except sqlite3.OperationalError:
+            pass  # No registry yet: use the JSON below
+
         # Query the 'decks' JSON blob from the 'col' table
         query = "SELECT decks FROM col WHERE id = 1 LIMIT 1" 
         
@@ -12,10 +12,12 @@ export const setDeck = async (deckId) => {
   return response.data;
 };
 
-// Get the next card for review in the current deck
-export const getNextCard = async () => {
-  const response = await axiosInstance.get('/review');
-  return response.data;
+// Get the next card for review in the current deck, or interleaved across
+// several decks when `decks` is 'all' or an array of deck ids (no deck switch needed)
+export const getNextCard = async (decks = null) => {
+  const params = decks ? { decks: Array.isArray(decks) ? decks.join(',') : decks } : {};
+  const response = await axiosInstance.get('/review', { params });
+  return response.data; // In multi-deck mode the card also carries deckId and deckName
 };
 
 // Answer a review card
@@ -61,4 +63,23 @@ export const getDeckCards = async (deckId, page = 1, perPage = 10) => {
 export const deleteCard = async (cardId) => {
   const response = await axiosInstance.delete(`/cards/${cardId}`);
   return response.data;
-}; 
\ No newline at end of file
+};
+
+// Apply one operation (move, suspend, unsuspend, reset, delete, retag) to many cards at once
+// selection: { cardIds?, deckId?, query? }; options: { targetDeckId } or { addTags, removeTags }
+export const bulkCards = async (selection, operation, options = {}) => {
+  const response = await axiosInstance.post('/cards/bulk', { selection, operation, ...options });
+  return response.data; // Expected: { operation, matched, changed, notesDeleted? }
+};
+
+// Incremental sync: rows changed since the USN returned by the previous pull (-1 = everything)
+export const syncPull = async (since = -1) => {
+  const response = await axiosInstance.get('/sync', { params: { since } });
+  return response.data; // Expected: { usn, since, notes, cards, revlog, graves, col }
+};
+
+// Push local changes in the same { columns, rows } form returned by syncPull
+export const syncPush = async (changes) => {
+  const response = await axiosInstance.post('/sync', changes);
+  return response.data; // Expected: { notes: { applied, skipped }, cards: ..., revlog: ..., graves: ... }
+};
@@ -330,9 +330,11 @@ def load_users(admin_db: Path) -> Dict[int, Dict]:
 
 
 def find_user_db_by_id(user_dbs_dir: Path, user_id: int) -> Optional[Path]:
-    p = user_dbs_dir / f"user_{user_id}.db"
-    if p.exists():
-        return p
+    # Sharded layout first (user_dbs/<id % 256 as 2 hex digits>/user_<id>.db), then the flat one
+    for p in (user_dbs_dir / f"{user_id % 256:02x}" / f"user_{user_id}.db",
+              user_dbs_dir / f"user_{user_id}.db"):
+        if p.exists():
+            return p
     # Also try .anki2 by username — not used here, ID-based is canonical
     return None
 
@@ -1068,7 +1070,7 @@ def main():
         cached_admin    = fetch_dir / "admin.db"
         cached_user_dbs = fetch_dir / "user_dbs"
         already_cached  = (cached_admin.exists() and cached_user_dbs.is_dir()
-                           and any(cached_user_dbs.glob("*.db")))
+                           and any(cached_user_dbs.rglob("*.db")))
         if not already_cached or args.refresh:
             result = fetch_from_s3(bucket, args.profile, args.region,
                                    args.latest, args.week, args.day,
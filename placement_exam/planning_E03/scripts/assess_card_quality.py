@@ -305,8 +305,12 @@ def load_users(admin_db: Path) -> Dict[int, Dict]:
 
 
 def find_user_db(user_dbs_dir: Path, user_id: int) -> Optional[Path]:
-    p = user_dbs_dir / f"user_{user_id}.db"
-    return p if p.exists() else None
+    # Sharded layout first (user_dbs/<id % 256 as 2 hex digits>/user_<id>.db), then the flat one
+    for p in (user_dbs_dir / f"{user_id % 256:02x}" / f"user_{user_id}.db",
+              user_dbs_dir / f"user_{user_id}.db"):
+        if p.exists():
+            return p
+    return None
 
 
 def load_account_map(csv_path: Optional[Path]) -> Dict[str, str]:
@@ -436,7 +440,17 @@ def load_roster(csv_path: Path) -> List[Dict]:
 
 
 def get_deck_id(conn: sqlite3.Connection, deck_name: str) -> Optional[int]:
-    """Parse col.decks JSON and return the deck id for the given name."""
+    """Return the deck id for the given name.
+
+    Reads the server's deck registry table (schema v3+); older DBs without it
+    fall back to parsing the col.decks JSON, which the registry replaces.
+    """
+    try:
+        row = conn.execute("SELECT id FROM decks WHERE name = ?", (deck_name,)).fetchone()
+        return int(row[0]) if row else None
+    except sqlite3.OperationalError:
+        pass  # No registry yet: use the JSON below
+
     row = conn.execute("SELECT decks FROM col LIMIT 1").fetchone()
     if not row:
         return None
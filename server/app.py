@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, session, send_file
+from flask import Flask, request, jsonify, session, send_file, make_response
 from flask_cors import CORS
 from flask_session import Session # Import the Session extension
 import sqlite3
@@ -9,27 +9,39 @@ import time
 import json
 import zipfile
 import hashlib # For Anki checksum
+import socket
 import shutil # For file operations (copying)
 import tempfile # For creating temporary directories
 import logging # Import logging module
 import traceback # Keep for explicit exception logging if needed
 import datetime # Import datetime
 from functools import wraps
-import boto3
-from botocore.exceptions import ClientError
+import user_db_layout
+import user_db_migrations
+import user_db_sync
+import user_db_decks
+import user_db_revlog_archive
+import due_queue_cache
+import user_warmup
+# boto3 is imported inside _send_reset_email: it is by far the heaviest import and only
+# the password reset email needs it, so keeping it off the module path speeds up worker boot.
 
 # Add near the top of server/app.py
 from dotenv import load_dotenv
-import os
-
-# Load environment variables from .env file
-load_dotenv()
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+# Load environment variables from the .env next to app.py (an explicit path skips
+# python-dotenv's search up the call stack and directory tree)
+load_dotenv(os.path.join(basedir, '.env'))
+
 # --- Configuration ---
 PORT = 8000 # Port Gunicorn will listen on internally
-ADMIN_DB_PATH = os.path.join(basedir, 'admin.db')
+# Directory holding admin.db, user_dbs/ and flask_session/. Defaults to the directory of
+# app.py; the benchmark harness (benchmarks/) points it at generated fixtures instead.
+DATA_DIR = os.path.abspath(os.getenv('DATA_DIR', basedir))
+ADMIN_DB_PATH = os.path.join(DATA_DIR, 'admin.db')
+USER_DBS_DIR = os.path.join(DATA_DIR, 'user_dbs') # Sharded per-user DBs, see user_db_layout.py
 # ... other paths ...
 SECRET_KEY = os.getenv('SECRET_KEY') # Load from environment
 # Ensure SECRET_KEY is loaded, otherwise raise an error or use a default only for non-production
@@ -54,8 +66,28 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 # --- Configuration ---
 FLASHCARD_DB_PATH = 'flashcards.db' # We will create user-specific DBs later, this is a placeholder
 EXPORT_DIR = os.path.join(basedir, 'exports') # Path relative to app.py
+VERBAL_TENSES_DATA_PATH = os.path.join(basedir, 'data', 'verbal_tenses.json') # Sample deck content
 DAILY_NEW_LIMIT = 20 # Maximum number of new cards to introduce per day per user
 DAY_ROLLOVER_UTC = 5 * 3600  # 05:00 UTC = 02:00 BRT — day boundary for scheduling
+DELETE_DECK_CHUNK_SIZE = 500 # Cards deleted per transaction by delete_deck
+DELETE_DECK_CHUNK_PAUSE_S = 0.01 # Gap between chunks so requests waiting on the DB lock get a turn
+# Also delete the revlog rows of deleted cards. Off by default: grading and activity reports
+# count reviews straight from revlog, so purging would rewrite a student's study history.
+PURGE_ORPHAN_REVLOG = os.getenv('PURGE_ORPHAN_REVLOG', '0') == '1'
+BULK_MAX_CARD_IDS = 10000 # Max explicit cardIds accepted by POST /cards/bulk
+BULK_OPERATIONS = ('move', 'suspend', 'unsuspend', 'reset', 'delete', 'retag')
+# Users whose current-deck due queues each worker keeps in memory for /review
+# (see due_queue_cache.py). 0 disables the cache and /review queries SQLite every time.
+DUE_QUEUE_CACHE_USERS = int(os.getenv('DUE_QUEUE_CACHE_USERS', '0'))
+# Threads per worker that warm a user's DB and caches right after /login (see user_warmup.py).
+# 0 disables the warm-up.
+LOGIN_WARMUP_THREADS = int(os.getenv('LOGIN_WARMUP_THREADS', '1'))
+LOGIN_WARMUP_REPORT_EVERY = 100 # Log the warm-up payoff stats every N resolved warm-ups
+# Multi-container deployments route each user to one container/worker by hashing this cookie
+# in nginx (docs/AFFINITY_ROUTING.md). INSTANCE_ID names the container in X-Served-By.
+ROUTE_COOKIE = 'sa_route'
+ROUTE_COOKIE_MAX_AGE = 30 * 86400 # Outlives logout so the next login reaches the same worker
+INSTANCE_ID = os.getenv('INSTANCE_ID') or socket.gethostname()
 
 # --- App Initialization ---
 app = Flask(__name__)
@@ -65,10 +97,8 @@ CORS(app, supports_credentials=True, origins=["http://localhost:5173", "https://
 
 # --- Configure Flask-Session ---
 # Choose a directory for session files (must be writable by the Gunicorn user)
-# Ensure this directory exists or is created
-SESSION_FILE_DIR = os.path.join(basedir, 'flask_session') 
-if not os.path.exists(SESSION_FILE_DIR):
-    os.makedirs(SESSION_FILE_DIR) # Create the directory if it doesn't exist
+# Flask-Session's filesystem backend creates the directory itself when it is missing
+SESSION_FILE_DIR = os.path.join(DATA_DIR, 'flask_session')
 
 app.config['SESSION_TYPE'] = 'filesystem' # Use filesystem-based sessions
 app.config['SESSION_FILE_DIR'] = SESSION_FILE_DIR
@@ -92,14 +122,31 @@ logging.basicConfig(level=logging.INFO,
 app.logger.info(f"Base directory detected: {basedir}")
 
 # --- Helper Functions ---
+_user_db_path_cache = {} # user_id -> resolved DB path (per worker process)
+_due_queue_cache = due_queue_cache.DueQueueCache(DUE_QUEUE_CACHE_USERS) if DUE_QUEUE_CACHE_USERS > 0 else None
+_login_warmups = user_warmup.WarmupTracker(LOGIN_WARMUP_THREADS) if LOGIN_WARMUP_THREADS > 0 else None
+
 def get_user_db_path(user_id):
-    """Returns the path to the user's specific flashcard database."""
-    # Ensure the base directory exists, relative to app.py
-    db_dir = os.path.join(basedir, 'user_dbs') # Path relative to app.py
-    if not os.path.exists(db_dir):
-        os.makedirs(db_dir)
-        app.logger.info(f"Created user DB directory: {db_dir}") # Use logger
-    return os.path.join(db_dir, f'user_{user_id}.db')
+    """Returns the path to the user's specific flashcard database.
+
+    Paths are resolved once per process (sharded user_dbs/ab/user_{id}.db first, then the
+    legacy flat user_dbs/user_{id}.db) and cached, so the hot path does no filesystem calls.
+    Run tools/shard_user_dbs.py with the server stopped, or restart workers afterwards.
+    The first resolution of an existing DB also applies pending schema migrations; a path
+    whose migration failed is not cached, so the next request retries it.
+    """
+    path = _user_db_path_cache.get(user_id)
+    if path is None:
+        path = user_db_layout.resolve_user_db_path(USER_DBS_DIR, user_id, create_dirs=True)
+        if os.path.exists(path):
+            try:
+                user_db_migrations.ensure_migrated(path, app.logger)
+            except sqlite3.Error as e:
+                # Don't cache the path: the next request retries the migration (e.g. after a lock clears)
+                app.logger.error(f"Schema migration failed for {path}: {e}")
+                return path
+        _user_db_path_cache[user_id] = path
+    return path
 
 def sha1_checksum(data):
     """Calculates the SHA1 checksum for Anki note syncing."""
@@ -349,6 +396,8 @@ def init_anki_db(db_path, user_name="Default User"):
     )
 
     conn.commit()
+    # Bring the new DB to the latest schema version (indexes added after the base schema)
+    user_db_migrations.migrate(conn)
     conn.close()
     app.logger.info(f"Initialized Anki DB schema in '{db_path}'") # Use logger
 
@@ -396,6 +445,8 @@ def login():
             session['username'] = user['username']
 
             app.logger.info(f"User logged in: {email} (ID: {user['user_id']})")
+            if _login_warmups is not None:
+                _login_warmups.schedule(user['user_id'], _warmUserState)
 
             return jsonify({
                 "message": "Login successful",
@@ -427,719 +478,22 @@ def logout():
 
 # --- Flashcard Generation ---
 
+_verbal_tenses_cache = None
+
+def _load_verbal_tenses():
+    """Reads the verbal tenses table from VERBAL_TENSES_DATA_PATH (once per process)."""
+    global _verbal_tenses_cache
+    if _verbal_tenses_cache is None:
+        with open(VERBAL_TENSES_DATA_PATH, encoding='utf-8') as f:
+            _verbal_tenses_cache = json.load(f)
+    return _verbal_tenses_cache
+
 def generate_ai_flashcards():
     """Generates a list of flashcards about verbal tenses in English, with each example
     sentence as its own flashcard including Portuguese translations."""
-    # Define the structure of verbal tenses
-    tenses = [
-        # Simple Present
-        {
-            "name": "Simple Present: I work",
-            "usage": "Usage: For habits, routines, facts, and general truths.",
-            "usage_pt": "Uso: Para hábitos, rotinas, fatos e verdades gerais.",
-            "examples": [
-                {
-                    "en": "She plays tennis every weekend.",
-                    "pt": "Ela joga tênis todos os fins de semana."
-                },
-                {
-                    "en": "The sun rises in the east.", 
-                    "pt": "O sol nasce no leste."
-                },
-                {
-                    "en": "They live in New York.",
-                    "pt": "Eles moram em Nova York."
-                }
-            ]
-        },
-        {
-            "name": "Simple Present: Negatives",
-            "usage": "Form: Subject + do/does + not + verb",
-            "usage_pt": "Forma: Sujeito + do/does + not + verbo",
-            "examples": [
-                {
-                    "en": "I do not (don't) speak French.",
-                    "pt": "Eu não falo francês."
-                },
-                {
-                    "en": "He does not (doesn't) own a car.",
-                    "pt": "Ele não possui um carro."
-                },
-                {
-                    "en": "They do not (don't) like coffee.",
-                    "pt": "Eles não gostam de café."
-                }
-            ]
-        },
-        {
-            "name": "Simple Present: Questions",
-            "usage": "Form: Do/Does + subject + verb?",
-            "usage_pt": "Forma: Do/Does + sujeito + verbo?",
-            "examples": [
-                {
-                    "en": "Do you enjoy swimming?",
-                    "pt": "Você gosta de nadar?"
-                },
-                {
-                    "en": "Does she work here?",
-                    "pt": "Ela trabalha aqui?"
-                },
-                {
-                    "en": "Do they understand the rules?",
-                    "pt": "Eles entendem as regras?"
-                }
-            ]
-        },
-        
-        # Present Continuous/Progressive
-        {
-            "name": "Present Continuous: I am working",
-            "usage": "Usage: For actions happening now or around now, and temporary situations.",
-            "usage_pt": "Uso: Para ações acontecendo agora ou por volta de agora, e situações temporárias.",
-            "examples": [
-                {
-                    "en": "She is studying for her exam.",
-                    "pt": "Ela está estudando para o exame dela."
-                },
-                {
-                    "en": "They are building a new house this year.",
-                    "pt": "Eles estão construindo uma casa nova este ano."
-                },
-                {
-                    "en": "I am learning to play the guitar.",
-                    "pt": "Eu estou aprendendo a tocar guitarra."
-                }
-            ]
-        },
-        {
-            "name": "Present Continuous: Negatives",
-            "usage": "Form: Subject + am/is/are + not + verb-ing",
-            "usage_pt": "Forma: Sujeito + am/is/are + not + verbo-ing",
-            "examples": [
-                {
-                    "en": "He is not (isn't) sleeping right now.",
-                    "pt": "Ele não está dormindo agora."
-                },
-                {
-                    "en": "We are not (aren't) having dinner yet.",
-                    "pt": "Nós não estamos jantando ainda."
-                },
-                {
-                    "en": "I am not waiting any longer.",
-                    "pt": "Eu não estou esperando mais."
-                }
-            ]
-        },
-        {
-            "name": "Present Continuous: Questions",
-            "usage": "Form: Am/Is/Are + subject + verb-ing?",
-            "usage_pt": "Forma: Am/Is/Are + sujeito + verbo-ing?",
-            "examples": [
-                {
-                    "en": "Are you listening to me?",
-                    "pt": "Você está me ouvindo?"
-                },
-                {
-                    "en": "Is it raining outside?",
-                    "pt": "Está chovendo lá fora?"
-                },
-                {
-                    "en": "Are they coming to the party?",
-                    "pt": "Eles estão vindo para a festa?"
-                }
-            ]
-        },
-        
-        # Present Perfect
-        {
-            "name": "Present Perfect: I have worked",
-            "usage": "Usage: For past actions with present results, experiences, and unfinished time periods.",
-            "usage_pt": "Uso: Para ações passadas com resultados presentes, experiências e períodos de tempo inacabados.",
-            "examples": [
-                {
-                    "en": "I have visited Paris twice.",
-                    "pt": "Eu já visitei Paris duas vezes."
-                },
-                {
-                    "en": "She has lived here for five years.",
-                    "pt": "Ela tem morado aqui por cinco anos."
-                },
-                {
-                    "en": "They have already finished their homework.",
-                    "pt": "Eles já terminaram a lição de casa."
-                }
-            ]
-        },
-        {
-            "name": "Present Perfect: Negatives",
-            "usage": "Form: Subject + have/has + not + past participle",
-            "usage_pt": "Forma: Sujeito + have/has + not + particípio passado",
-            "examples": [
-                {
-                    "en": "I have not (haven't) seen that movie.",
-                    "pt": "Eu não vi esse filme."
-                },
-                {
-                    "en": "She has not (hasn't) called me back.",
-                    "pt": "Ela não me ligou de volta."
-                },
-                {
-                    "en": "We have not (haven't) been to that restaurant.",
-                    "pt": "Nós não fomos àquele restaurante."
-                }
-            ]
-        },
-        {
-            "name": "Present Perfect: Questions",
-            "usage": "Form: Have/Has + subject + past participle?",
-            "usage_pt": "Forma: Have/Has + sujeito + particípio passado?",
-            "examples": [
-                {
-                    "en": "Have you ever climbed a mountain?",
-                    "pt": "Você já escalou uma montanha?"
-                },
-                {
-                    "en": "Has he sent the email?",
-                    "pt": "Ele enviou o email?"
-                },
-                {
-                    "en": "Have they arrived yet?",
-                    "pt": "Eles já chegaram?"
-                }
-            ]
-        },
-        
-        # Present Perfect Continuous
-        {
-            "name": "Present Perfect Continuous: I have been working",
-            "usage": "Usage: For ongoing actions that started in the past and continue to the present, often emphasizing duration.",
-            "usage_pt": "Uso: Para ações contínuas que começaram no passado e continuam até o presente, frequentemente enfatizando a duração.",
-            "examples": [
-                {
-                    "en": "I have been waiting for an hour.",
-                    "pt": "Eu estou esperando há uma hora."
-                },
-                {
-                    "en": "She has been teaching since 2010.",
-                    "pt": "Ela está ensinando desde 2010."
-                },
-                {
-                    "en": "They have been traveling all month.",
-                    "pt": "Eles estão viajando o mês todo."
-                }
-            ]
-        },
-        {
-            "name": "Present Perfect Continuous: Negatives",
-            "usage": "Form: Subject + have/has + not + been + verb-ing",
-            "usage_pt": "Forma: Sujeito + have/has + not + been + verbo-ing",
-            "examples": [
-                {
-                    "en": "I have not (haven't) been feeling well.",
-                    "pt": "Eu não tenho me sentido bem."
-                },
-                {
-                    "en": "He has not (hasn't) been working lately.",
-                    "pt": "Ele não tem trabalhado ultimamente."
-                },
-                {
-                    "en": "They have not (haven't) been studying enough.",
-                    "pt": "Eles não têm estudado o suficiente."
-                }
-            ]
-        },
-        {
-            "name": "Present Perfect Continuous: Questions",
-            "usage": "Form: Have/Has + subject + been + verb-ing?",
-            "usage_pt": "Forma: Have/Has + sujeito + been + verbo-ing?",
-            "examples": [
-                {
-                    "en": "Have you been exercising regularly?",
-                    "pt": "Você tem se exercitado regularmente?"
-                },
-                {
-                    "en": "Has she been living alone?",
-                    "pt": "Ela tem morado sozinha?"
-                },
-                {
-                    "en": "Have they been practicing for the concert?",
-                    "pt": "Eles têm praticado para o concerto?"
-                }
-            ]
-        },
-        
-        # Simple Past
-        {
-            "name": "Simple Past: I worked",
-            "usage": "Usage: For completed actions in the past.",
-            "usage_pt": "Uso: Para ações completas no passado.",
-            "examples": [
-                {
-                    "en": "She visited her grandmother last week.",
-                    "pt": "Ela visitou a avó dela na semana passada."
-                },
-                {
-                    "en": "They bought a new car yesterday.",
-                    "pt": "Eles compraram um carro novo ontem."
-                },
-                {
-                    "en": "I watched a movie last night.",
-                    "pt": "Eu assisti um filme ontem à noite."
-                }
-            ]
-        },
-        {
-            "name": "Simple Past: Negatives",
-            "usage": "Form: Subject + did + not + verb",
-            "usage_pt": "Forma: Sujeito + did + not + verbo",
-            "examples": [
-                {
-                    "en": "I did not (didn't) go to the party.",
-                    "pt": "Eu não fui à festa."
-                },
-                {
-                    "en": "She did not (didn't) like the book.",
-                    "pt": "Ela não gostou do livro."
-                },
-                {
-                    "en": "They did not (didn't) finish their work.",
-                    "pt": "Eles não terminaram o trabalho deles."
-                }
-            ]
-        },
-        {
-            "name": "Simple Past: Questions",
-            "usage": "Form: Did + subject + verb?",
-            "usage_pt": "Forma: Did + sujeito + verbo?",
-            "examples": [
-                {
-                    "en": "Did you call him?",
-                    "pt": "Você ligou para ele?"
-                },
-                {
-                    "en": "Did she arrive on time?",
-                    "pt": "Ela chegou na hora?"
-                },
-                {
-                    "en": "Did they win the game?",
-                    "pt": "Eles ganharam o jogo?"
-                }
-            ]
-        },
-        
-        # Past Continuous/Progressive
-        {
-            "name": "Past Continuous: I was working",
-            "usage": "Usage: For actions in progress at a specific time in the past, often interrupted by another action.",
-            "usage_pt": "Uso: Para ações em progresso em um momento específico no passado, frequentemente interrompidas por outra ação.",
-            "examples": [
-                {
-                    "en": "I was reading when the phone rang.",
-                    "pt": "Eu estava lendo quando o telefone tocou."
-                },
-                {
-                    "en": "They were having dinner at 8 PM.",
-                    "pt": "Eles estavam jantando às 8 da noite."
-                },
-                {
-                    "en": "She was sleeping when I came home.",
-                    "pt": "Ela estava dormindo quando eu cheguei em casa."
-                }
-            ]
-        },
-        {
-            "name": "Past Continuous: Negatives",
-            "usage": "Form: Subject + was/were + not + verb-ing",
-            "usage_pt": "Forma: Sujeito + was/were + not + verbo-ing",
-            "examples": [
-                {
-                    "en": "I was not (wasn't) listening carefully.",
-                    "pt": "Eu não estava ouvindo com atenção."
-                },
-                {
-                    "en": "They were not (weren't) expecting visitors.",
-                    "pt": "Eles não estavam esperando visitantes."
-                },
-                {
-                    "en": "She was not (wasn't) driving fast.",
-                    "pt": "Ela não estava dirigindo rápido."
-                }
-            ]
-        },
-        {
-            "name": "Past Continuous: Questions",
-            "usage": "Form: Was/Were + subject + verb-ing?",
-            "usage_pt": "Forma: Was/Were + sujeito + verbo-ing?",
-            "examples": [
-                {
-                    "en": "Were you waiting for me?",
-                    "pt": "Você estava esperando por mim?"
-                },
-                {
-                    "en": "Was he telling the truth?",
-                    "pt": "Ele estava dizendo a verdade?"
-                },
-                {
-                    "en": "Were they working late?",
-                    "pt": "Eles estavam trabalhando até tarde?"
-                }
-            ]
-        },
-        
-        # Past Perfect
-        {
-            "name": "Past Perfect: I had worked",
-            "usage": "Usage: For actions completed before another past action or time.",
-            "usage_pt": "Uso: Para ações completadas antes de outra ação passada ou tempo.",
-            "examples": [
-                {
-                    "en": "I had finished dinner before she called.",
-                    "pt": "Eu tinha terminado o jantar antes de ela ligar."
-                },
-                {
-                    "en": "They had left before I arrived.",
-                    "pt": "Eles tinham saído antes de eu chegar."
-                },
-                {
-                    "en": "She had studied Spanish before moving to Madrid.",
-                    "pt": "Ela tinha estudado espanhol antes de se mudar para Madri."
-                }
-            ]
-        },
-        {
-            "name": "Past Perfect: Negatives",
-            "usage": "Form: Subject + had + not + past participle",
-            "usage_pt": "Forma: Sujeito + had + not + particípio passado",
-            "examples": [
-                {
-                    "en": "I had not (hadn't) seen the movie before.",
-                    "pt": "Eu não tinha visto o filme antes."
-                },
-                {
-                    "en": "She had not (hadn't) completed her work.",
-                    "pt": "Ela não tinha completado o trabalho dela."
-                },
-                {
-                    "en": "They had not (hadn't) heard the news.",
-                    "pt": "Eles não tinham ouvido as notícias."
-                }
-            ]
-        },
-        {
-            "name": "Past Perfect: Questions",
-            "usage": "Form: Had + subject + past participle?",
-            "usage_pt": "Forma: Had + sujeito + particípio passado?",
-            "examples": [
-                {
-                    "en": "Had you met him before?",
-                    "pt": "Você tinha conhecido ele antes?"
-                },
-                {
-                    "en": "Had she ever visited London?",
-                    "pt": "Ela já tinha visitado Londres?"
-                },
-                {
-                    "en": "Had they received my message?",
-                    "pt": "Eles tinham recebido minha mensagem?"
-                }
-            ]
-        },
-        
-        # Past Perfect Continuous
-        {
-            "name": "Past Perfect Continuous: I had been working",
-            "usage": "Usage: For ongoing actions that started before and continued up to another time in the past, emphasizing duration.",
-            "usage_pt": "Uso: Para ações contínuas que começaram antes e continuaram até outro momento no passado, enfatizando a duração.",
-            "examples": [
-                {
-                    "en": "I had been studying for three hours when she called.",
-                    "pt": "Eu estava estudando há três horas quando ela ligou."
-                },
-                {
-                    "en": "They had been living there for years before they moved.",
-                    "pt": "Eles estavam morando lá por anos antes de se mudarem."
-                },
-                {
-                    "en": "She had been working all day before she went home.",
-                    "pt": "Ela estava trabalhando o dia todo antes de ir para casa."
-                }
-            ]
-        },
-        {
-            "name": "Past Perfect Continuous: Negatives",
-            "usage": "Form: Subject + had + not + been + verb-ing",
-            "usage_pt": "Forma: Sujeito + had + not + been + verbo-ing",
-            "examples": [
-                {
-                    "en": "I had not (hadn't) been sleeping well before the exam.",
-                    "pt": "Eu não estava dormindo bem antes do exame."
-                },
-                {
-                    "en": "She had not (hadn't) been feeling well.",
-                    "pt": "Ela não estava se sentindo bem."
-                },
-                {
-                    "en": "They had not (hadn't) been paying attention.",
-                    "pt": "Eles não estavam prestando atenção."
-                }
-            ]
-        },
-        {
-            "name": "Past Perfect Continuous: Questions",
-            "usage": "Form: Had + subject + been + verb-ing?",
-            "usage_pt": "Forma: Had + sujeito + been + verbo-ing?",
-            "examples": [
-                {
-                    "en": "Had you been waiting long?",
-                    "pt": "Você estava esperando há muito tempo?"
-                },
-                {
-                    "en": "Had she been working there before?",
-                    "pt": "Ela estava trabalhando lá antes?"
-                },
-                {
-                    "en": "Had they been expecting this outcome?",
-                    "pt": "Eles estavam esperando este resultado?"
-                }
-            ]
-        },
-        
-        # Simple Future
-        {
-            "name": "Simple Future: I will work",
-            "usage": "Usage: For predictions, promises, offers, and decisions made at the moment of speaking.",
-            "usage_pt": "Uso: Para previsões, promessas, ofertas e decisões tomadas no momento da fala.",
-            "examples": [
-                {
-                    "en": "I will help you tomorrow.",
-                    "pt": "Eu vou te ajudar amanhã."
-                },
-                {
-                    "en": "She will probably arrive late.",
-                    "pt": "Ela provavelmente vai chegar atrasada."
-                },
-                {
-                    "en": "They will be here soon.",
-                    "pt": "Eles estarão aqui em breve."
-                }
-            ]
-        },
-        {
-            "name": "Simple Future: Negatives",
-            "usage": "Form: Subject + will + not + verb",
-            "usage_pt": "Forma: Sujeito + will + not + verbo",
-            "examples": [
-                {
-                    "en": "I will not (won't) be available tomorrow.",
-                    "pt": "Eu não estarei disponível amanhã."
-                },
-                {
-                    "en": "She will not (won't) agree to these terms.",
-                    "pt": "Ela não vai concordar com estes termos."
-                },
-                {
-                    "en": "They will not (won't) finish on time.",
-                    "pt": "Eles não vão terminar a tempo."
-                }
-            ]
-        },
-        {
-            "name": "Simple Future: Questions",
-            "usage": "Form: Will + subject + verb?",
-            "usage_pt": "Forma: Will + sujeito + verbo?",
-            "examples": [
-                {
-                    "en": "Will you attend the meeting?",
-                    "pt": "Você vai participar da reunião?"
-                },
-                {
-                    "en": "Will she join us for dinner?",
-                    "pt": "Ela vai se juntar a nós para o jantar?"
-                },
-                {
-                    "en": "Will they accept our offer?",
-                    "pt": "Eles vão aceitar nossa oferta?"
-                }
-            ]
-        },
-        
-        # Future Continuous/Progressive
-        {
-            "name": "Future Continuous: I will be working",
-            "usage": "Usage: For actions that will be in progress at a specific time in the future.",
-            "usage_pt": "Uso: Para ações que estarão em andamento em um momento específico no futuro.",
-            "examples": [
-                {
-                    "en": "This time tomorrow, I will be flying to Paris.",
-                    "pt": "Amanhã a esta hora, eu estarei voando para Paris."
-                },
-                {
-                    "en": "She will be studying when you call.",
-                    "pt": "Ela estará estudando quando você ligar."
-                },
-                {
-                    "en": "They will be waiting for us when we arrive.",
-                    "pt": "Eles estarão esperando por nós quando chegarmos."
-                }
-            ]
-        },
-        {
-            "name": "Future Continuous: Negatives",
-            "usage": "Form: Subject + will + not + be + verb-ing",
-            "usage_pt": "Forma: Sujeito + will + not + be + verbo-ing",
-            "examples": [
-                {
-                    "en": "I will not (won't) be working this weekend.",
-                    "pt": "Eu não estarei trabalhando neste fim de semana."
-                },
-                {
-                    "en": "She will not (won't) be attending the conference.",
-                    "pt": "Ela não estará participando da conferência."
-                },
-                {
-                    "en": "They will not (won't) be staying with us.",
-                    "pt": "Eles não estarão ficando conosco."
-                }
-            ]
-        },
-        {
-            "name": "Future Continuous: Questions",
-            "usage": "Form: Will + subject + be + verb-ing?",
-            "usage_pt": "Forma: Will + sujeito + be + verbo-ing?",
-            "examples": [
-                {
-                    "en": "Will you be using the car tomorrow?",
-                    "pt": "Você estará usando o carro amanhã?"
-                },
-                {
-                    "en": "Will she be coming to the party?",
-                    "pt": "Ela estará vindo para a festa?"
-                },
-                {
-                    "en": "Will they be joining us for lunch?",
-                    "pt": "Eles estarão se juntando a nós para o almoço?"
-                }
-            ]
-        },
-        
-        # Future Perfect
-        {
-            "name": "Future Perfect: I will have worked",
-            "usage": "Usage: For actions that will be completed before a specific time in the future.",
-            "usage_pt": "Uso: Para ações que serão concluídas antes de um momento específico no futuro.",
-            "examples": [
-                {
-                    "en": "By next month, I will have finished my degree.",
-                    "pt": "Até o próximo mês, eu terei terminado meu curso."
-                },
-                {
-                    "en": "She will have completed the project by Friday.",
-                    "pt": "Ela terá completado o projeto até sexta-feira."
-                },
-                {
-                    "en": "They will have moved into their new house by Christmas.",
-                    "pt": "Eles terão se mudado para a nova casa até o Natal."
-                }
-            ]
-        },
-        {
-            "name": "Future Perfect: Negatives",
-            "usage": "Form: Subject + will + not + have + past participle",
-            "usage_pt": "Forma: Sujeito + will + not + have + particípio passado",
-            "examples": [
-                {
-                    "en": "I will not (won't) have read the book by then.",
-                    "pt": "Eu não terei lido o livro até lá."
-                },
-                {
-                    "en": "She will not (won't) have arrived by that time.",
-                    "pt": "Ela não terá chegado até aquela hora."
-                },
-                {
-                    "en": "They will not (won't) have made a decision before the deadline.",
-                    "pt": "Eles não terão tomado uma decisão antes do prazo."
-                }
-            ]
-        },
-        {
-            "name": "Future Perfect: Questions",
-            "usage": "Form: Will + subject + have + past participle?",
-            "usage_pt": "Forma: Will + sujeito + have + particípio passado?",
-            "examples": [
-                {
-                    "en": "Will you have finished by tomorrow?",
-                    "pt": "Você terá terminado até amanhã?"
-                },
-                {
-                    "en": "Will she have prepared everything?",
-                    "pt": "Ela terá preparado tudo?"
-                },
-                {
-                    "en": "Will they have solved the problem by then?",
-                    "pt": "Eles terão resolvido o problema até lá?"
-                }
-            ]
-        },
-        
-        # Future Perfect Continuous
-        {
-            "name": "Future Perfect Continuous: I will have been working",
-            "usage": "Usage: For ongoing actions that will continue up to a specific time in the future, emphasizing duration.",
-            "usage_pt": "Uso: Para ações contínuas que continuarão até um momento específico no futuro, enfatizando a duração.",
-            "examples": [
-                {
-                    "en": "By next week, I will have been working here for five years.",
-                    "pt": "Até a próxima semana, eu estarei trabalhando aqui há cinco anos."
-                },
-                {
-                    "en": "She will have been studying for six hours by the time she finishes.",
-                    "pt": "Ela estará estudando por seis horas quando terminar."
-                },
-                {
-                    "en": "They will have been traveling for two days when they arrive.",
-                    "pt": "Eles estarão viajando por dois dias quando chegarem."
-                }
-            ]
-        },
-        {
-            "name": "Future Perfect Continuous: Negatives",
-            "usage": "Form: Subject + will + not + have + been + verb-ing",
-            "usage_pt": "Forma: Sujeito + will + not + have + been + verbo-ing",
-            "examples": [
-                {
-                    "en": "I will not (won't) have been waiting for more than an hour.",
-                    "pt": "Eu não estarei esperando por mais de uma hora."
-                },
-                {
-                    "en": "She will not (won't) have been teaching for very long.",
-                    "pt": "Ela não estará ensinando por muito tempo."
-                },
-                {
-                    "en": "They will not (won't) have been living there for much time.",
-                    "pt": "Eles não estarão morando lá por muito tempo."
-                }
-            ]
-        },
-        {
-            "name": "Future Perfect Continuous: Questions",
-            "usage": "Form: Will + subject + have + been + verb-ing?",
-            "usage_pt": "Forma: Will + sujeito + have + been + verbo-ing?",
-            "examples": [
-                {
-                    "en": "Will you have been working all day?",
-                    "pt": "Você estará trabalhando o dia todo?"
-                },
-                {
-                    "en": "Will she have been practicing enough?",
-                    "pt": "Ela estará praticando o suficiente?"
-                },
-                {
-                    "en": "Will they have been searching for long?",
-                    "pt": "Eles estarão procurando por muito tempo?"
-                }
-            ]
-        }
-    ]
+    # The tense/example table lives in data/verbal_tenses.json so importing app.py
+    # doesn't have to build it; it is only read when a new user gets the sample deck.
+    tenses = _load_verbal_tenses()
     
     # Create cards based on the new structure
     cards = []
@@ -1226,20 +580,19 @@ def _getDbConnection(userDbPath):
         raise  # Re-raise the exception to be handled by the caller
 
 def _getCollectionConfig(cursor):
-    """Fetches essential configuration from the col table."""
+    """Fetches essential configuration from the col table and the deck registry."""
     try:
-        cursor.execute("SELECT crt, conf, decks FROM col LIMIT 1")
+        cursor.execute("SELECT crt, mod FROM col LIMIT 1")
         colData = cursor.fetchone()
         if not colData:
             raise ValueError("Collection configuration could not be read")
 
-        confDict = json.loads(colData['conf'])
-        decksDict = json.loads(colData['decks'])
-        currentDeckId = confDict.get('curDeck', 1)
-        deckName = decksDict.get(str(currentDeckId), {}).get('name', 'Default')
+        currentDeckId = user_db_decks.current_deck_id(cursor)
+        deckName = user_db_decks.get_deck_name(cursor, currentDeckId, 'Default')
 
         return {
             "collectionCreationTime": colData['crt'],
+            "collectionMod": colData['mod'],
             "currentDeckId": currentDeckId,
             "deckName": deckName
         }
@@ -1319,6 +672,182 @@ def _fetchNewCard(cursor, currentDeckId):
         app.logger.error(f"Error fetching new card: {e}")
         return None
 
+def _bumpCollectionMod(cursor):
+    """Sets col.mod to now inside the caller's write transaction. Returns (oldMod, newMod) so
+    cached due queues can tell whether they saw every change before this one."""
+    oldMod = cursor.execute("SELECT mod FROM col").fetchone()[0]
+    newMod = int(time.time() * 1000)
+    cursor.execute("UPDATE col SET mod = ?", (newMod,))
+    return oldMod, newMod
+
+def _loadDueQueues(cursor, userId, config, dayCutoff):
+    """Returns the user's in-memory queues for the current deck, building them on a miss or after any change."""
+    deckId, mod = config['currentDeckId'], config['collectionMod']
+    queues = _due_queue_cache.get(userId, deckId, mod, dayCutoff)
+    if queues is None:
+        newSeen = _countNewCardsReviewedToday(cursor, dayCutoff, config['collectionCreationTime'])
+        queues = due_queue_cache.DueQueues.build(cursor, deckId, mod, dayCutoff, newSeen)
+        _due_queue_cache.put(userId, queues)
+        app.logger.info(f"User {userId}: built due queues for deck {deckId} ({len(queues)} cards)")
+    return queues
+
+def _warmUserState(userId):
+    """Does the cold work of a user's first /review ahead of time (scheduled by /login):
+    path resolution and migrations, col config, and the due queues or the review queries'
+    pages in the OS cache."""
+    if not os.path.exists(user_db_layout.resolve_user_db_path(USER_DBS_DIR, userId)):
+        return
+    conn = _getDbConnection(get_user_db_path(userId))
+    try:
+        cursor = conn.cursor()
+        config = _getCollectionConfig(cursor)
+        now, dayCutoff = _calculateDayCutoff(config['collectionCreationTime'])
+        if _due_queue_cache is not None:
+            _loadDueQueues(cursor, userId, config, dayCutoff)
+        else:
+            _countNewCardsReviewedToday(cursor, dayCutoff, config['collectionCreationTime'])
+            _fetchLearningCard(cursor, config['currentDeckId'], now)
+            _fetchReviewCard(cursor, config['currentDeckId'], dayCutoff)
+            _fetchNewCard(cursor, config['currentDeckId'])
+    finally:
+        conn.close()
+
+def _claimLoginWarmup(userId):
+    """Counts whether the login warm-up was ready for this /review, waiting briefly if it is running."""
+    outcome = _login_warmups.claim(userId)
+    if outcome is None:
+        return
+    app.logger.info(f"User {userId}: login warm-up {outcome}")
+    if _login_warmups.resolved() % LOGIN_WARMUP_REPORT_EVERY == 0:
+        app.logger.info(f"Login warm-ups (worker {os.getpid()}): {_login_warmups.stats()}")
+
+def _fetchQueuedCard(cursor, queues, now, dayCutoff):
+    """Fetches the next card picked by the in-memory queues by primary key.
+    Raises LookupError if the card no longer matches the queues."""
+    picked = queues.next_card(now, dayCutoff, queues.new_seen_today < DAILY_NEW_LIMIT)
+    if picked is None:
+        return None
+    cursor.execute("""
+        SELECT c.id, c.nid, c.did, c.queue, n.flds, c.due, c.ivl
+        FROM cards c JOIN notes n ON c.nid = n.id
+        WHERE c.id = ?
+    """, (picked[0],))
+    cardData = cursor.fetchone()
+    expectedQueues = {due_queue_cache.LEARN: (1, 3), due_queue_cache.REVIEW: (2,), due_queue_cache.NEW: (0,)}
+    if not cardData or cardData['did'] != queues.deck_id or cardData['queue'] not in expectedQueues[picked[1]]:
+        raise LookupError(f"Due queues out of date for card {picked[0]}")
+    return cardData
+
+def _parseStudyDecks(decksParam, decksDict):
+    """Deck ids selected by /review?decks=all or ?decks=2,5 (unknown ids are ignored)."""
+    if decksParam.strip().lower() == 'all':
+        return [int(deckId) for deckId in decksDict]
+    deckIds = []
+    for part in decksParam.split(','):
+        part = part.strip()
+        if part.isdigit() and part in decksDict and int(part) not in deckIds:
+            deckIds.append(int(part))
+    return deckIds
+
+def _getDeckAllowances(cursor, deckIds, decksDict, dconfDict, dayCutoff, collectionCreationTime):
+    """Remaining new and review cards each deck may show today, from its dconf new.perDay and
+    rev.perDay. Today's counts come from one grouped revlog query and follow
+    _countNewCardsReviewedToday (type 0 = new/learning, types 1-2 = review answers).
+    Returns ({deckId: (newLeft, revLeft)}, newSeenToday across all decks).
+    """
+    normalizedCrt = collectionCreationTime - ((collectionCreationTime - DAY_ROLLOVER_UTC) % 86400)
+    startOfDayTimestampMs = (normalizedCrt + dayCutoff * 86400) * 1000
+    cursor.execute("""
+        SELECT c.did, r.type, COUNT(*)
+        FROM revlog r JOIN cards c ON c.id = r.cid
+        WHERE r.type IN (0, 1, 2) AND r.id >= ?
+        GROUP BY c.did, r.type
+    """, (startOfDayTimestampMs,))
+    newSeen, revSeen = {}, {}
+    for deckId, logType, count in cursor.fetchall():
+        seen = newSeen if logType == 0 else revSeen
+        seen[deckId] = seen.get(deckId, 0) + count
+
+    allowances = {}
+    for deckId in deckIds:
+        confId = str(decksDict.get(str(deckId), {}).get('conf', 1))
+        deckConf = dconfDict.get(confId, {})
+        newPerDay = deckConf.get('new', {}).get('perDay', DAILY_NEW_LIMIT)
+        revPerDay = deckConf.get('rev', {}).get('perDay', 100)
+        allowances[deckId] = (max(newPerDay - newSeen.get(deckId, 0), 0),
+                              max(revPerDay - revSeen.get(deckId, 0), 0))
+    return allowances, sum(newSeen.values())
+
+def _fetchNextCardAcrossDecks(cursor, learnDeckIds, reviewDeckIds, newDeckIds, now, dayCutoff):
+    """Fetches the next card from several decks in one query: due learning cards first, then
+    due review cards (oldest due first, whatever the deck), then a random new card. Each
+    branch only looks at the decks given for it, so decks out of allowance drop out.
+    """
+    branches, params = [], []
+    if learnDeckIds:
+        branches.append(f"""
+            SELECT * FROM (SELECT 0 AS priority, c.id, c.nid, c.did, c.queue, n.flds, c.due, c.ivl
+                           FROM cards c JOIN notes n ON c.nid = n.id
+                           WHERE c.did IN ({','.join('?' * len(learnDeckIds))}) AND c.queue IN (1, 3) AND c.due <= ?
+                           ORDER BY c.due LIMIT 1)""")
+        params += [*learnDeckIds, now]
+    if reviewDeckIds:
+        branches.append(f"""
+            SELECT * FROM (SELECT 1 AS priority, c.id, c.nid, c.did, c.queue, n.flds, c.due, c.ivl
+                           FROM cards c JOIN notes n ON c.nid = n.id
+                           WHERE c.did IN ({','.join('?' * len(reviewDeckIds))}) AND c.queue = 2 AND c.due <= ?
+                           ORDER BY c.due LIMIT 1)""")
+        params += [*reviewDeckIds, dayCutoff]
+    if newDeckIds:
+        branches.append(f"""
+            SELECT * FROM (SELECT 2 AS priority, c.id, c.nid, c.did, c.queue, n.flds, c.due, c.ivl
+                           FROM cards c JOIN notes n ON c.nid = n.id
+                           WHERE c.did IN ({','.join('?' * len(newDeckIds))}) AND c.queue = 0
+                           ORDER BY RANDOM() LIMIT 1)""")
+        params += newDeckIds
+    if not branches:
+        return None
+    try:
+        cursor.execute(" UNION ALL ".join(branches) + " ORDER BY priority LIMIT 1", params)
+        return cursor.fetchone()
+    except sqlite3.Error as e:
+        app.logger.error(f"Error fetching card across decks: {e}")
+        return None
+
+def _reviewAcrossDecks(cursor, userId, decksParam, collectionCreationTime):
+    """GET /review?decks=...: next card interleaved across the selected decks, honoring each
+    deck's dconf limits plus the per-user DAILY_NEW_LIMIT. Returns a (response, status) tuple.
+    """
+    decksDict = user_db_decks.load_decks(cursor)
+    deckIds = _parseStudyDecks(decksParam, decksDict)
+    if not deckIds:
+        return jsonify({"error": "No valid decks selected"}), 400
+    dconfDict = user_db_decks.load_deck_configs(cursor, {decksDict[str(deckId)]['conf'] for deckId in deckIds})
+
+    now, dayCutoff = _calculateDayCutoff(collectionCreationTime)
+    allowances, newSeenToday = _getDeckAllowances(cursor, deckIds, decksDict, dconfDict,
+                                                  dayCutoff, collectionCreationTime)
+    reviewDeckIds = [deckId for deckId in deckIds if allowances[deckId][1] > 0]
+    newDeckIds = [deckId for deckId in deckIds if allowances[deckId][0] > 0]
+    if newSeenToday >= DAILY_NEW_LIMIT:
+        newDeckIds = []
+
+    app.logger.info(f"User {userId}, Decks {deckIds}: Day Cutoff={dayCutoff}, Now={now}, "
+                    f"New Seen={newSeenToday}/{DAILY_NEW_LIMIT}, review decks {reviewDeckIds}, new decks {newDeckIds}")
+
+    nextCardData = _fetchNextCardAcrossDecks(cursor, deckIds, reviewDeckIds, newDeckIds, now, dayCutoff)
+    if not nextCardData:
+        session.pop('currentCardId', None)
+        session.pop('currentNoteId', None)
+        return jsonify({"message": "No cards due in the selected decks right now."}), 200
+
+    responsePayload = _formatCardResponse(nextCardData)
+    if not responsePayload:
+        return jsonify({"error": "Failed to process card data."}), 500
+    responsePayload["deckId"] = nextCardData['did']
+    responsePayload["deckName"] = decksDict.get(str(nextCardData['did']), {}).get('name', 'Unknown')
+    return jsonify(responsePayload), 200
+
 def _formatCardResponse(cardData):
     """Formats the card data for the JSON response and updates session."""
     if not cardData:
@@ -1357,6 +886,70 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# --- Upstream affinity ---
+
+def _routeKey(userId):
+    """Stable, opaque per-user value for nginx to hash (doesn't reveal the user id)."""
+    return hashlib.sha256(f"{SECRET_KEY}:route:{userId}".encode('utf-8')).hexdigest()[:16]
+
+@app.after_request
+def _setAffinityHeaders(response):
+    """Reports which container/worker served the request and keeps the route cookie in step
+    with the session: set after login and replaced on a user switch. It is kept after logout,
+    so the next /login from the browser reaches (and warms) the user's own worker."""
+    response.headers['X-Served-By'] = f"{INSTANCE_ID}:{os.getpid()}"
+    userId = session.get('user_id')
+    if userId is None:
+        return response
+    routeKey = _routeKey(userId)
+    response.headers['X-Route-Key'] = routeKey  # for API clients that send it back as a header
+    if request.cookies.get(ROUTE_COOKIE) != routeKey:
+        response.set_cookie(ROUTE_COOKIE, routeKey, max_age=ROUTE_COOKIE_MAX_AGE, httponly=True,
+                            samesite='Lax', secure=app.config['SESSION_COOKIE_SECURE'])
+    return response
+
+# --- Conditional GET ---
+
+def _collectionEtag(userId, userDbPath):
+    """Validator for the user's collection: every server write bumps col.mod, and MAX(revlog.id)
+    also catches reviews written by tools that don't. Returns None if the DB can't be read."""
+    if not os.path.exists(userDbPath):
+        return None
+    try:
+        conn = sqlite3.connect(userDbPath)
+        try:
+            colMod, revlogMax = conn.execute(
+                "SELECT (SELECT mod FROM col LIMIT 1), (SELECT MAX(id) FROM revlog)").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        app.logger.warning(f"Could not compute ETag for user {userId}: {e}")
+        return None
+    return f"{userId}-{colMod}-{revlogMax or 0}"
+
+def conditional_get(f):
+    """Answers 304 Not Modified, without running the route, when the client's If-None-Match
+    still matches the collection; otherwise tags 200 responses with an ETag.
+    Goes below @login_required on read-only routes whose output depends only on the user DB.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user_id = session['user_id']
+        etag = _collectionEtag(user_id, get_user_db_path(user_id))
+        if etag is None:
+            return f(*args, **kwargs)
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        # Browsers may keep the body but must revalidate before reusing it
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
+
 # --- Password Change ---
 
 @app.route('/change-password', methods=['POST'])
@@ -1423,6 +1016,7 @@ def _send_reset_email(recipient_email: str, recipient_name: str, token: str):
       to reset your password. Link expires in 1 hour.</em></p>
     </body></html>
     """
+    import boto3
     ses = boto3.client('ses', region_name=SES_AWS_REGION)
     ses.send_email(
         Source=SES_SENDER_EMAIL,
@@ -1544,8 +1138,14 @@ def reset_password():
 @app.route('/review', methods=['GET'])
 @login_required
 def get_next_card():
-    """Fetches the next card due for review using prioritized queues and daily limits."""
+    """Fetches the next card due for review using prioritized queues and daily limits.
+
+    By default only the current deck (conf.curDeck) is used. ?decks=all or ?decks=2,5
+    interleaves the selected decks instead, without changing the current deck.
+    """
     userId = session['user_id']
+    if _login_warmups is not None:
+        _claimLoginWarmup(userId)
     userDbPath = get_user_db_path(userId)
     
     if not os.path.exists(userDbPath):
@@ -1567,29 +1167,50 @@ def get_next_card():
             # Error logged in helper, return error response
             return jsonify({"error": str(e)}), 500
 
+        # Study-all mode: several decks, each with its own dconf limits
+        decksParam = request.args.get('decks')
+        if decksParam:
+            return _reviewAcrossDecks(cursor, userId, decksParam, collectionCreationTime)
+
         now, dayCutoff = _calculateDayCutoff(collectionCreationTime)
-        
-        # Count new cards reviewed today
-        newCardsSeenToday = _countNewCardsReviewedToday(cursor, dayCutoff, collectionCreationTime)
-        
+
+        # Count new cards reviewed today (the in-memory queues keep their own count)
+        queues = _loadDueQueues(cursor, userId, config, dayCutoff) if _due_queue_cache is not None else None
+        if queues is not None:
+            newCardsSeenToday = queues.new_seen_today
+        else:
+            newCardsSeenToday = _countNewCardsReviewedToday(cursor, dayCutoff, collectionCreationTime)
+
         app.logger.info(f"User {userId}, Deck {currentDeckId}: Day Cutoff={dayCutoff}, Now={now}, New Seen={newCardsSeenToday}/{DAILY_NEW_LIMIT}")
 
         nextCardData = None
 
+        # 0. In-memory queues: same priorities as 1-3 below, without scanning the deck
+        if queues is not None:
+            try:
+                nextCardData = _fetchQueuedCard(cursor, queues, now, dayCutoff)
+                if nextCardData:
+                    app.logger.info(f"User {userId}: found card {nextCardData['id']} (queue={nextCardData['queue']}) in cached due queues")
+            except LookupError as e:
+                app.logger.warning(f"User {userId}: {e}; falling back to SQL queues")
+                _due_queue_cache.invalidate(userId)
+                queues = None
+
         # 1. Check for Learning Cards
-        nextCardData = _fetchLearningCard(cursor, currentDeckId, now)
-        if nextCardData:
-            app.logger.info(f"User {userId}: found learning card {nextCardData['id']}")
+        if queues is None:
+            nextCardData = _fetchLearningCard(cursor, currentDeckId, now)
+            if nextCardData:
+                app.logger.info(f"User {userId}: found learning card {nextCardData['id']}")
 
         # 2. Check for Due Review Cards
-        if not nextCardData:
+        if queues is None and not nextCardData:
             nextCardData = _fetchReviewCard(cursor, currentDeckId, dayCutoff)
             if nextCardData:
                 # Log details if a review card (Young or Mature) is fetched
                 app.logger.info(f"User {userId}: found review card {nextCardData['id']} (queue={nextCardData['queue']}). Card Due: {nextCardData['due']}, Card Interval: {nextCardData['ivl']} days. Current Day Cutoff: {dayCutoff}")
 
         # 3. Check for New Cards (respecting limit)
-        if not nextCardData:
+        if queues is None and not nextCardData:
             if newCardsSeenToday < DAILY_NEW_LIMIT:
                 nextCardData = _fetchNewCard(cursor, currentDeckId)
                 if nextCardData:
@@ -1709,27 +1330,12 @@ def answer_card():
         coll_conf = json.loads(col_data['conf'])
         collectionCreationTime = col_data['crt'] # <-- Store crt
         
-        # Get deck-specific configuration 
+        # Get deck-specific configuration (the deck's option group, one registry row)
         deck_id = card['did']
-        # No need to fetch decks/dconf again if we already have col_data
-        # cursor.execute("SELECT decks, dconf FROM col LIMIT 1")
-        # col_data_deck = cursor.fetchone() # This is redundant
-        # decks_dict = json.loads(col_data_deck['decks'])
-        # dconf_dict = json.loads(col_data_deck['dconf'])
-
-        # Fetch decks and dconf from col table (assuming they exist as TEXT columns)
-        cursor.execute("SELECT decks, dconf FROM col LIMIT 1")
-        deck_config_data = cursor.fetchone()
-        if not deck_config_data:
-             app.logger.error("Decks or Dconf configuration not found in col table")
+        deck_conf = user_db_decks.get_deck_options(cursor, deck_id)
+        if not deck_conf:
+             app.logger.error(f"Deck options not found for deck {deck_id}")
              return jsonify({"error": "Database configuration error"}), 500
-
-        decks_dict = json.loads(deck_config_data['decks'])
-        dconf_dict = json.loads(deck_config_data['dconf'])
-        
-        # Get the deck's configuration id
-        deck_conf_id = decks_dict[str(deck_id)].get('conf', 1)  # Default to 1 if not found
-        deck_conf = dconf_dict[str(deck_conf_id)]
         
         # Get the configuration settings for the current card state
         if current_type == 0:  # 0 = new
@@ -1912,10 +1518,18 @@ def answer_card():
         app.logger.info(f"User {user_id} ({username}) reviewed card {current_card_id} (\"{front_text}\") ease={ease}: {old_state} → {new_state}")
 
         # Update collection modification time
-        cursor.execute("UPDATE col SET mod = ?", (int(time.time() * 1000),))
+        oldCollectionMod, newCollectionMod = _bumpCollectionMod(cursor)
 
         # Commit the changes
         conn.commit()
+
+        # Move the card within the cached due queues instead of rebuilding them
+        if _due_queue_cache is not None:
+            def _requeueAnsweredCard(queues):
+                queues.update_card(current_card_id, deck_id, new_queue, new_due)
+                if review_log_type == 0:
+                    queues.new_seen_today += 1
+            _due_queue_cache.apply(user_id, oldCollectionMod, newCollectionMod, _requeueAnsweredCard)
         
         # Clear the current card from the session
         session.pop('currentCardId', None)
@@ -1960,6 +1574,18 @@ def export_deck():
         shutil.copy2(user_db_path, anki2_path) # copy2 preserves metadata
         app.logger.info(f"Copied user DB to {anki2_path}") # Use logger
 
+        # Our sync triggers, deck registry and revlog archive are not part of Anki's schema;
+        # keep them out of the package, regenerating the col.decks/dconf/conf JSON Anki reads
+        # and putting archived reviews back into revlog instead
+        export_conn = sqlite3.connect(anki2_path)
+        user_db_sync.drop_usn_triggers(export_conn)
+        user_db_decks.materialize_col_json(export_conn)
+        user_db_decks.drop_tables(export_conn)
+        user_db_revlog_archive.restore_revlog(export_conn)
+        user_db_revlog_archive.drop_tables(export_conn)
+        export_conn.commit()
+        export_conn.close()
+
         # 2. Create the media file (required by Anki, even if empty)
         media_path = os.path.join(temp_dir, 'media')
         with open(media_path, 'w') as f:
@@ -2052,15 +1678,14 @@ def add_new_card():
         cursor = conn.cursor()
 
         # Get current model ID and current deck ID
-        cursor.execute("SELECT models, conf FROM col LIMIT 1")
+        cursor.execute("SELECT models FROM col LIMIT 1")
         col_data = cursor.fetchone()
-        if not col_data or not col_data['models'] or not col_data['conf']:
+        if not col_data or not col_data['models']:
             return jsonify({"error": "Collection configuration not found or invalid"}), 500
 
         models = json.loads(col_data['models'])
-        conf_dict = json.loads(col_data['conf'])
         model_id = next(iter(models), None)
-        current_deck_id = conf_dict.get('curDeck', 1) # Get current deck ID
+        current_deck_id = user_db_decks.current_deck_id(cursor) # Get current deck ID
 
         if not model_id:
              return jsonify({"error": "Default note model not found in collection"}), 500
@@ -2098,12 +1723,7 @@ def add_new_card():
             0, 2500, 0, 0, 0, 0, 0, 0, "" # ivl, factor, reps, lapses, left, odue, odid, flags, data
         ))
         # Get deck name for enhanced logging
-        cursor.execute("SELECT decks FROM col LIMIT 1")
-        decks_data = cursor.fetchone()
-        deck_name = "Unknown"
-        if decks_data and decks_data['decks']:
-            decks_dict = json.loads(decks_data['decks'])
-            deck_name = decks_dict.get(str(current_deck_id), {}).get('name', 'Unknown')
+        deck_name = user_db_decks.get_deck_name(cursor, current_deck_id, 'Unknown')
 
         # Get username for logging
         username = session.get('username', 'Unknown')
@@ -2115,9 +1735,13 @@ def add_new_card():
         app.logger.info(f"User {user_id} ({username}) created card {card_id} in deck {current_deck_id} ({deck_name}): \"{front_truncated}\"")
 
         # --- Update Collection Mod Time --- #
-        cursor.execute("UPDATE col SET mod = ?", (int(time.time() * 1000),))
+        old_mod, new_mod = _bumpCollectionMod(cursor)
         conn.commit()
 
+        if _due_queue_cache is not None:
+            _due_queue_cache.apply(user_id, old_mod, new_mod,
+                                   lambda queues: queues.update_card(card_id, current_deck_id, 0, note_id))
+
         return jsonify({"message": "Card added successfully", "note_id": note_id, "card_id": card_id}), 201
 
     except sqlite3.Error as e:
@@ -2136,6 +1760,7 @@ def add_new_card():
 
 @app.route('/decks', methods=['GET'])
 @login_required
+@conditional_get
 def get_decks():
     """Fetches the list of decks for the current user."""
     user_id = session['user_id']
@@ -2145,16 +1770,8 @@ def get_decks():
         conn = sqlite3.connect(user_db_path)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
-        cursor.execute("SELECT decks FROM col LIMIT 1")
-        col_data = cursor.fetchone()
-        if not col_data or not col_data['decks']:
-            return jsonify({"error": "Collection data not found or invalid"}), 500
-
-        decks_dict = json.loads(col_data['decks'])
-        # Convert dictionary to list of objects expected by frontend
-        decks_list = [{"id": k, "name": v["name"]} for k, v in decks_dict.items()]
-        # Sort by name for consistency
-        decks_list.sort(key=lambda x: x["name"])
+        # Deck registry rows, sorted by name for consistency (ids as strings, as before)
+        decks_list = [{"id": str(deck_id), "name": name} for deck_id, name in user_db_decks.list_decks(cursor)]
 
         return jsonify(decks_list), 200
 
@@ -2184,39 +1801,19 @@ def create_deck():
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
-        # Fetch current decks and dconf
-        cursor.execute("SELECT decks, dconf FROM col LIMIT 1")
-        col_data = cursor.fetchone()
-        if not col_data:
-            return jsonify({"error": "Collection data not found"}), 500
-
-        decks_dict = json.loads(col_data['decks'])
-        dconf_dict = json.loads(col_data['dconf'])
-
         # Generate new deck ID (using epoch ms)
         new_deck_id = str(int(time.time() * 1000))
 
-        # Check for duplicate name (case-insensitive)
-        if any(d['name'].lower() == deck_name.lower() for d in decks_dict.values()):
+        # Check for duplicate name (case-insensitive, indexed)
+        if user_db_decks.name_taken(cursor, deck_name):
             return jsonify({"error": "A deck with this name already exists"}), 409
 
-        # Create new deck entry - using dconf ID '1' for simplicity for now
-        new_deck = {
-            "id": new_deck_id,
-            "name": deck_name,
-            "mod": int(time.time()),
-            "usn": -1,
-            "lrnToday": [0, 0], "revToday": [0, 0], "newToday": [0, 0],
-            "timeToday": [0, 0], "conf": 1, # Use default dconf '1'
-            "desc": "", "dyn": 0, "collapsed": False,
-            "extendNew": 10, "extendRev": 50
-        }
-        decks_dict[new_deck_id] = new_deck
+        # Create the deck row - using dconf ID 1 for simplicity for now
+        user_db_decks.add_deck(cursor, new_deck_id, deck_name, conf=1)
 
         # Update col table
         current_mod_time = int(time.time() * 1000)
-        cursor.execute("UPDATE col SET decks = ?, mod = ?",
-                       (json.dumps(decks_dict), current_mod_time))
+        cursor.execute("UPDATE col SET mod = ?", (current_mod_time,))
         conn.commit()
 
         app.logger.info(f"Created new deck '{deck_name}' (ID: {new_deck_id}) for user {user_id}") # Use logger
@@ -2248,26 +1845,16 @@ def set_current_deck():
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
 
-        # Fetch current config and decks to validate deck_id
-        cursor.execute("SELECT conf, decks FROM col LIMIT 1")
-        col_data = cursor.fetchone()
-        if not col_data:
-            return jsonify({"error": "Collection data not found"}), 500
-
-        conf_dict = json.loads(col_data['conf'])
-        decks_dict = json.loads(col_data['decks'])
-
         # Validate deck ID exists
-        if str(deck_id) not in decks_dict:
+        if not str(deck_id).isdigit() or not user_db_decks.deck_exists(cursor, int(deck_id)):
             return jsonify({"error": "Invalid deck ID"}), 404
 
-        # Update current deck ID in conf
-        conf_dict['curDeck'] = int(deck_id) # Store as integer
+        # Update current deck ID (stored as integer)
+        user_db_decks.set_conf_value(cursor, 'curDeck', int(deck_id))
 
         # Update col table
         current_mod_time = int(time.time() * 1000)
-        cursor.execute("UPDATE col SET conf = ?, mod = ?",
-                       (json.dumps(conf_dict), current_mod_time))
+        cursor.execute("UPDATE col SET mod = ?", (current_mod_time,))
         conn.commit()
 
         app.logger.info(f"Set current deck to {deck_id} for user {user_id}") # Use logger
@@ -2283,6 +1870,7 @@ def set_current_deck():
 
 @app.route('/decks/<int:deckId>/stats', methods=['GET'])
 @login_required
+@conditional_get
 def get_deck_stats(deckId):
     """Calculates and returns CURRENT card status counts for a specific deck."""
     user_id = session['user_id']
@@ -2302,12 +1890,7 @@ def get_deck_stats(deckId):
         cursor = conn.cursor()
 
         # Verify deck exists (as before)
-        cursor.execute("SELECT decks FROM col LIMIT 1")
-        col_data = cursor.fetchone()
-        if not col_data or not col_data['decks']:
-             return jsonify({"error": "Collection data not found."}), 500
-        decks_dict = json.loads(col_data['decks'])
-        if str(deckId) not in decks_dict:
+        if not user_db_decks.deck_exists(cursor, deckId):
              return jsonify({"error": "Deck not found or access denied."}), 404
 
         # Query cards for the specific deck - id no longer needed for filtering New
@@ -2362,6 +1945,7 @@ def get_deck_stats(deckId):
 
 @app.route('/cards/<cardId>', methods=['GET'])
 @login_required
+@conditional_get
 def get_card(cardId):
     user_id = session['user_id']
     db_path = get_user_db_path(user_id)
@@ -2513,7 +2097,7 @@ def delete_card(cardId):
 
         # First, get card details for enhanced logging (BEFORE deletion)
         cursor.execute("""
-            SELECT c.nid, c.did, c.type, c.queue, c.ivl, n.flds
+            SELECT c.id, c.nid, c.did, c.type, c.queue, c.ivl, n.flds
             FROM cards c
             JOIN notes n ON c.nid = n.id
             WHERE c.id = ?
@@ -2532,12 +2116,7 @@ def delete_card(cardId):
         fields = card_data['flds']
 
         # Get deck name
-        cursor.execute("SELECT decks FROM col LIMIT 1")
-        decks_data = cursor.fetchone()
-        deck_name = "Unknown"
-        if decks_data and decks_data['decks']:
-            decks_dict = json.loads(decks_data['decks'])
-            deck_name = decks_dict.get(str(deck_id), {}).get('name', 'Unknown')
+        deck_name = user_db_decks.get_deck_name(cursor, deck_id, 'Unknown')
 
         # Get card front text
         field_list = fields.split('\x1f')
@@ -2552,8 +2131,9 @@ def delete_card(cardId):
         # Begin transaction
         conn.execute("BEGIN")
 
-        # Delete the card
+        # Delete the card (graves let syncing clients drop it too)
         cursor.execute("DELETE FROM cards WHERE id = ?", (cardId,))
+        cursor.execute("INSERT INTO graves (usn, oid, type) VALUES (-1, ?, 0)", (cardId,))
 
         # Check if there are any other cards associated with this note
         cursor.execute("SELECT COUNT(*) FROM cards WHERE nid = ?", (note_id,))
@@ -2562,13 +2142,17 @@ def delete_card(cardId):
         # If no other cards use this note, delete the note too
         if other_cards_count == 0:
             cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+            cursor.execute("INSERT INTO graves (usn, oid, type) VALUES (-1, ?, 1)", (note_id,))
 
         # Update collection modification time
-        cursor.execute("UPDATE col SET mod = ?", (int(time.time() * 1000),))
+        old_mod, new_mod = _bumpCollectionMod(cursor)
 
         # Commit the transaction
         conn.commit()
 
+        if _due_queue_cache is not None:
+            _due_queue_cache.apply(user_id, old_mod, new_mod, lambda queues: queues.remove(card_data['id']))
+
         # Enhanced logging AFTER successful commit
         app.logger.info(f"User {user_id} ({username}) deleted card {cardId} from deck {deck_id} ({deck_name}): \"{front_text}\" [state: {card_state}]")
         return jsonify({"success": True, "message": "Card deleted successfully"})
@@ -2582,6 +2166,227 @@ def delete_card(cardId):
         if 'conn' in locals():
             conn.close()
 
+def _deleteCardsIn(cursor, tempTable):
+    """Deletes the cards listed in tempTable (columns id, nid) and the notes left without cards,
+    writing graves rows (type 0/1) like Anki does. Runs inside the caller's transaction.
+    Returns the number of notes deleted.
+    """
+    cursor.execute(f"INSERT INTO graves (usn, oid, type) SELECT -1, id, 0 FROM {tempTable}")
+    if PURGE_ORPHAN_REVLOG:
+        cursor.execute(f"DELETE FROM revlog WHERE cid IN (SELECT id FROM {tempTable})")
+    cursor.execute(f"DELETE FROM cards WHERE id IN (SELECT id FROM {tempTable})")
+
+    # Notes whose last card was just deleted
+    orphanNotes = f"""
+        SELECT DISTINCT d.nid FROM {tempTable} d
+        WHERE NOT EXISTS (SELECT 1 FROM cards c WHERE c.nid = d.nid)
+    """
+    cursor.execute(f"INSERT INTO graves (usn, oid, type) SELECT -1, nid, 1 FROM ({orphanNotes})")
+    cursor.execute(f"DELETE FROM notes WHERE id IN ({orphanNotes})")
+    return cursor.rowcount
+
+def _selectBulkCards(cursor, selection):
+    """Fills the temp table bulk_cards (id, nid) with the cards matched by a /cards/bulk selection.
+    cardIds, deckId and query (a substring of the note's fields) can be combined; every given
+    filter must match. Returns the number of cards selected.
+    """
+    conditions, params = [], []
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_cards (id INTEGER PRIMARY KEY, nid INTEGER NOT NULL)")
+    cursor.execute("DELETE FROM bulk_cards")
+
+    if 'cardIds' in selection:
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_ids (id INTEGER PRIMARY KEY)")
+        cursor.execute("DELETE FROM bulk_ids")
+        cursor.executemany("INSERT OR IGNORE INTO bulk_ids (id) VALUES (?)",
+                           [(cardId,) for cardId in selection['cardIds']])
+        conditions.append("c.id IN (SELECT id FROM bulk_ids)")
+    if 'deckId' in selection:
+        conditions.append("c.did = ?")
+        params.append(selection['deckId'])
+    if selection.get('query'):
+        escaped = selection['query'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append("n.flds LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+
+    cursor.execute(f"""
+        INSERT INTO bulk_cards (id, nid)
+        SELECT c.id, c.nid FROM cards c JOIN notes n ON n.id = c.nid
+        WHERE {' AND '.join(conditions)}
+    """, params)
+    return cursor.rowcount
+
+def _retagBulkNotes(cursor, addTags, removeTags, now):
+    """Adds/removes tags on the notes of the cards in bulk_cards. Returns the notes changed."""
+    removeLower = {tag.lower() for tag in removeTags}
+    updates = []
+    cursor.execute("SELECT id, tags FROM notes WHERE id IN (SELECT nid FROM bulk_cards)")
+    for noteId, tags in cursor.fetchall():
+        current = tags.split()
+        newTags = [tag for tag in current if tag.lower() not in removeLower]
+        present = {tag.lower() for tag in newTags}
+        for tag in addTags:
+            if tag.lower() not in present:
+                newTags.append(tag)
+                present.add(tag.lower())
+        if newTags != current:
+            updates.append((' '.join(newTags), now, noteId))
+    cursor.executemany("UPDATE notes SET tags = ?, mod = ?, usn = -1 WHERE id = ?", updates)
+    return len(updates)
+
+def _applyBulkOperation(cursor, operation, data, now):
+    """Applies a /cards/bulk operation to the cards in bulk_cards with set-based statements.
+    Returns the summary fields for the response.
+    """
+    inSelection = "id IN (SELECT id FROM bulk_cards)"
+    if operation == 'move':
+        cursor.execute(f"UPDATE cards SET did = ?, mod = ?, usn = -1 WHERE {inSelection} AND did != ?",
+                       (data['targetDeckId'], now, data['targetDeckId']))
+    elif operation == 'suspend':
+        cursor.execute(f"UPDATE cards SET queue = -1, mod = ?, usn = -1 WHERE {inSelection} AND queue != -1",
+                       (now,))
+    elif operation == 'unsuspend':
+        # Back to the queue matching the card type (relearning cards live in the learning queue)
+        cursor.execute(f"""
+            UPDATE cards SET queue = CASE WHEN type = 3 THEN 1 ELSE type END, mod = ?, usn = -1
+            WHERE {inSelection} AND queue = -1
+        """, (now,))
+    elif operation == 'reset':
+        # Same state add_card gives a new card; the revlog history is kept
+        cursor.execute(f"""
+            UPDATE cards SET type = 0, queue = 0, due = nid, ivl = 0, factor = 2500, reps = 0,
+                             lapses = 0, left = 0, odue = 0, odid = 0, mod = ?, usn = -1
+            WHERE {inSelection}
+        """, (now,))
+    elif operation == 'delete':
+        cursor.execute("SELECT COUNT(*) FROM bulk_cards")
+        cardsDeleted = cursor.fetchone()[0]
+        return {"changed": cardsDeleted, "notesDeleted": _deleteCardsIn(cursor, 'bulk_cards')}
+    elif operation == 'retag':
+        return {"changed": _retagBulkNotes(cursor, data.get('addTags', []), data.get('removeTags', []), now)}
+    return {"changed": cursor.rowcount}
+
+def _isInt(value):
+    """JSON integer check: bool is an int subclass, but true/false are not ids."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _parseBulkTags(value):
+    """Normalizes addTags/removeTags: a list of strings, each may hold several space separated tags."""
+    if not isinstance(value, list) or not all(isinstance(tag, str) for tag in value):
+        return None
+    return [tag for item in value for tag in item.split()]
+
+@app.route('/cards/bulk', methods=['POST'])
+@login_required
+def bulk_cards():
+    """Apply one operation to a selection of cards in a single transaction.
+
+    Body: {"selection": {"cardIds": [...], "deckId": 1, "query": "text"},
+           "operation": "move" | "suspend" | "unsuspend" | "reset" | "delete" | "retag",
+           "targetDeckId": 2 (move), "addTags"/"removeTags": [...] (retag)}
+    """
+    user_id = session['user_id']
+    db_path = get_user_db_path(user_id)
+
+    data = request.get_json(silent=True) or {}
+    selection = data.get('selection')
+    operation = data.get('operation')
+
+    if operation not in BULK_OPERATIONS:
+        return jsonify({"error": f"operation must be one of: {', '.join(BULK_OPERATIONS)}"}), 400
+    if not isinstance(selection, dict):
+        return jsonify({"error": "selection must contain cardIds, deckId or query"}), 400
+    if 'cardIds' in selection:
+        cardIds = selection['cardIds']
+        if not isinstance(cardIds, list) or not all(_isInt(cardId) for cardId in cardIds):
+            return jsonify({"error": "cardIds must be a list of integers"}), 400
+        if len(cardIds) > BULK_MAX_CARD_IDS:
+            return jsonify({"error": f"At most {BULK_MAX_CARD_IDS} cardIds per request"}), 400
+    if 'deckId' in selection and not _isInt(selection['deckId']):
+        return jsonify({"error": "deckId must be an integer"}), 400
+    if 'query' in selection and not isinstance(selection['query'], str):
+        return jsonify({"error": "query must be a string"}), 400
+    # An empty query adds no filter; without another one the selection would be every card
+    if not ('cardIds' in selection or 'deckId' in selection or selection.get('query')):
+        return jsonify({"error": "selection must contain cardIds, deckId or query"}), 400
+    if operation == 'move' and not _isInt(data.get('targetDeckId')):
+        return jsonify({"error": "targetDeckId is required for move"}), 400
+    if operation == 'retag':
+        addTags = _parseBulkTags(data.get('addTags', []))
+        removeTags = _parseBulkTags(data.get('removeTags', []))
+        if addTags is None or removeTags is None or not (addTags or removeTags):
+            return jsonify({"error": "retag needs addTags and/or removeTags as lists of strings"}), 400
+        data = {**data, 'addTags': addTags, 'removeTags': removeTags}
+
+    if not os.path.exists(db_path):
+        app.logger.error(f"Database not found for user {user_id}")
+        return jsonify({"error": "User database not found"}), 404
+
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+
+        if operation == 'move':
+            if not user_db_decks.deck_exists(cursor, data['targetDeckId']):
+                conn.rollback()
+                return jsonify({"error": "Target deck not found"}), 404
+
+        matched = _selectBulkCards(cursor, selection)
+        summary = _applyBulkOperation(cursor, operation, data, int(time.time()))
+        if summary['changed']:
+            cursor.execute("UPDATE col SET mod = ?", (int(time.time() * 1000),))
+        conn.commit()
+
+        username = session.get('username', 'Unknown')
+        app.logger.info(f"User {user_id} ({username}) bulk {operation}: {matched} cards matched, {summary['changed']} changed")
+        return jsonify({"operation": operation, "matched": matched, **summary}), 200
+
+    except sqlite3.Error as e:
+        app.logger.exception(f"Database error in bulk {operation} for user {user_id}: {e}")
+        if conn: conn.rollback()
+        return jsonify({"error": "Database error during bulk operation"}), 500
+    except Exception as e:
+        app.logger.exception(f"Error in bulk {operation} for user {user_id}: {e}")
+        if conn: conn.rollback()
+        return jsonify({"error": "Bulk operation failed"}), 500
+    finally:
+        if conn:
+            conn.close()
+
+def _deleteDeckCards(conn, deckId, chunkSize=None):
+    """Deletes every card of a deck plus the notes left without cards, chunkSize cards per
+    transaction, so a huge deck never holds the user's DB write lock for long.
+
+    Each chunk is set-based: the chunk's card ids go into a temp table and _deleteCardsIn
+    handles cards, graves and orphaned notes with a few INSERT/DELETE ... SELECT statements
+    instead of a query per note. Returns (cardsDeleted, notesDeleted).
+    """
+    chunkSize = chunkSize or DELETE_DECK_CHUNK_SIZE
+    cursor = conn.cursor()
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS deleted_cards (id INTEGER PRIMARY KEY, nid INTEGER NOT NULL)")
+    cardsDeleted = notesDeleted = 0
+    while True:
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("DELETE FROM deleted_cards")
+            cursor.execute("INSERT INTO deleted_cards (id, nid) SELECT id, nid FROM cards WHERE did = ? LIMIT ?",
+                           (deckId, chunkSize))
+            chunkCards = cursor.rowcount
+            if chunkCards == 0:
+                conn.commit()
+                break
+
+            notesDeleted += _deleteCardsIn(cursor, 'deleted_cards')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        cardsDeleted += chunkCards
+        time.sleep(DELETE_DECK_CHUNK_PAUSE_S)
+    cursor.execute("DROP TABLE IF EXISTS temp.deleted_cards")
+    return cardsDeleted, notesDeleted
+
 @app.route('/decks/<int:deckId>', methods=['DELETE'])
 @login_required
 def delete_deck(deckId):
@@ -2599,59 +2404,24 @@ def delete_deck(deckId):
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # First check if the deck exists in the col table's decks JSON
-        cursor.execute("SELECT decks FROM col LIMIT 1")
-        col_data = cursor.fetchone()
-        
-        if not col_data or not col_data['decks']:
-            conn.close()
-            app.logger.warning(f"Collection data not found or invalid")
-            return jsonify({"error": "Collection data not found"}), 500
-            
-        decks_dict = json.loads(col_data['decks'])
-        deck_id_str = str(deckId)
-        
-        if deck_id_str not in decks_dict:
+        # First check if the deck exists in the deck registry
+        deck_name = user_db_decks.get_deck_name(cursor, deckId)
+        if deck_name is None:
             conn.close()
             app.logger.warning(f"Attempt to delete non-existent deck {deckId}")
             return jsonify({"error": "Deck not found"}), 404
-        
-        deck_name = decks_dict[deck_id_str]['name']
         app.logger.info(f"Deleting deck '{deck_name}' (ID: {deckId}) for user {user_id}")
         
-        # Start a transaction
-        cursor.execute("BEGIN TRANSACTION")
-        
-        # Count cards in the deck
-        cursor.execute("SELECT COUNT(*) FROM cards WHERE did = ?", (deckId,))
-        card_count = cursor.fetchone()[0]
-        
-        # Get the IDs of notes associated with this deck's cards
-        cursor.execute("SELECT DISTINCT nid FROM cards WHERE did = ?", (deckId,))
-        note_ids = [row[0] for row in cursor.fetchall()]
-        
-        # Delete cards in this deck
-        cursor.execute("DELETE FROM cards WHERE did = ?", (deckId,))
-        app.logger.debug(f"Deleted {card_count} cards from deck {deckId}")
-        
-        # For each note, check if it has any remaining cards
-        # If not, delete the note
-        for note_id in note_ids:
-            cursor.execute("SELECT COUNT(*) FROM cards WHERE nid = ?", (note_id,))
-            remaining_cards = cursor.fetchone()[0]
-            if remaining_cards == 0:
-                cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-                app.logger.debug(f"Deleted orphaned note {note_id}")
-        
-        # Remove the deck from the decks JSON
-        del decks_dict[deck_id_str]
-        
-        # Update the col table with the modified decks JSON
+        # Delete cards and orphaned notes in chunks, each in its own short transaction
+        card_count, note_count = _deleteDeckCards(conn, deckId)
+        app.logger.debug(f"Deleted {card_count} cards and {note_count} orphaned notes from deck {deckId}")
+
+        # Remove the deck itself (one registry row)
+        cursor.execute("BEGIN IMMEDIATE")
+        user_db_decks.delete_deck(cursor, deckId)
         current_time_ms = int(time.time() * 1000)
-        cursor.execute("UPDATE col SET decks = ?, mod = ?", 
-                     (json.dumps(decks_dict), current_time_ms))
-        
-        # Commit the transaction
+        cursor.execute("UPDATE col SET mod = ?", (current_time_ms,))
+        cursor.execute("INSERT INTO graves (usn, oid, type) VALUES (-1, ?, 2)", (deckId,))
         conn.commit()
 
         # Enhanced logging with username
@@ -2696,39 +2466,24 @@ def rename_deck(deckId):
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # First get the decks from the col table
-        cursor.execute("SELECT decks FROM col LIMIT 1")
-        col_data = cursor.fetchone()
-        
-        if not col_data or not col_data['decks']:
-            app.logger.warning("Collection data not found or invalid")
-            return jsonify({"error": "Collection data not found"}), 500
-            
-        decks_dict = json.loads(col_data['decks'])
-        deck_id_str = str(deckId)
-        
         # Check if the deck exists
-        if deck_id_str not in decks_dict:
+        old_deck_name = user_db_decks.get_deck_name(cursor, deckId)
+        if old_deck_name is None:
             app.logger.warning(f"Attempt to rename non-existent deck {deckId}")
             return jsonify({"error": "Deck not found"}), 404
         
-        old_deck_name = decks_dict[deck_id_str]['name']
-        
         # Check if another deck with the same name already exists
         # Case insensitive comparison
-        for did, deck in decks_dict.items():
-            if did != deck_id_str and deck['name'].lower() == new_deck_name.lower():
-                app.logger.warning(f"Attempt to rename deck to existing name: {new_deck_name}")
-                return jsonify({"error": "A deck with this name already exists"}), 409
+        if user_db_decks.name_taken(cursor, new_deck_name, exclude_id=deckId):
+            app.logger.warning(f"Attempt to rename deck to existing name: {new_deck_name}")
+            return jsonify({"error": "A deck with this name already exists"}), 409
         
-        # Update the deck name
-        decks_dict[deck_id_str]['name'] = new_deck_name
-        decks_dict[deck_id_str]['mod'] = int(time.time())  # Update modification time
+        # Update the deck name (and its modification time)
+        user_db_decks.rename_deck(cursor, deckId, new_deck_name)
         
         # Update the collection
         current_time_ms = int(time.time() * 1000)
-        cursor.execute("UPDATE col SET decks = ?, mod = ?", 
-                      (json.dumps(decks_dict), current_time_ms))
+        cursor.execute("UPDATE col SET mod = ?", (current_time_ms,))
         conn.commit()
         
         app.logger.info(f"Renamed deck from '{old_deck_name}' to '{new_deck_name}'")
@@ -2754,6 +2509,7 @@ def rename_deck(deckId):
 
 @app.route('/decks/<deckId>/cards', methods=['GET'])
 @login_required
+@conditional_get
 def get_deck_cards(deckId):
     user_id = session['user_id']
     db_path = get_user_db_path(user_id)
@@ -2775,19 +2531,11 @@ def get_deck_cards(deckId):
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
-        # First, check if the deck exists by querying the col table's decks JSON field
-        cursor.execute("SELECT decks FROM col LIMIT 1")
-        col_data = cursor.fetchone()
-        if not col_data or not col_data['decks']:
-            app.logger.warning("Collection data not found or invalid")
-            return jsonify({"error": "Collection data not found"}), 500
-            
-        decks_dict = json.loads(col_data['decks'])
-        if str(deckId) not in decks_dict:
+        # First, check if the deck exists in the deck registry
+        deck_name = user_db_decks.get_deck_name(cursor, deckId)
+        if deck_name is None:
             app.logger.warning(f"Deck {deckId} not found")
             return jsonify({"error": "Deck not found"}), 404
-            
-        deck_name = decks_dict[str(deckId)]['name']
         
         # Get total number of cards in the deck
         cursor.execute("""
@@ -2841,6 +2589,69 @@ def get_deck_cards(deckId):
         if 'conn' in locals():
             conn.close()
 
+# --- Incremental Sync ---
+
+@app.route('/sync', methods=['GET'])
+@login_required
+def sync_pull():
+    """Returns the notes, cards, revlog rows and graves changed since the client's last sync.
+
+    Query: since (USN from the previous response; -1 or omitted for a full sync).
+    """
+    user_id = session['user_id']
+    db_path = get_user_db_path(user_id)
+    since = request.args.get('since', -1, type=int)
+
+    if not os.path.exists(db_path):
+        app.logger.error(f"Database not found for user {user_id}")
+        return jsonify({"error": "User database not found"}), 404
+
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        changes = user_db_sync.pull_changes(conn, since)
+        app.logger.debug(f"User {user_id} sync pull since {since}: usn {changes['usn']}, "
+                         f"{len(changes['cards']['rows'])} cards, {len(changes['notes']['rows'])} notes")
+        return jsonify(changes), 200
+    except sqlite3.Error as e:
+        app.logger.exception(f"Database error in sync pull for user {user_id}: {e}")
+        return jsonify({"error": "Database error during sync"}), 500
+    finally:
+        if conn:
+            conn.close()
+
+@app.route('/sync', methods=['POST'])
+@login_required
+def sync_push():
+    """Applies client-side changes (same compact form as GET /sync) in one transaction."""
+    user_id = session['user_id']
+    db_path = get_user_db_path(user_id)
+
+    if not os.path.exists(db_path):
+        app.logger.error(f"Database not found for user {user_id}")
+        return jsonify({"error": "User database not found"}), 404
+
+    conn = None
+    try:
+        conn = sqlite3.connect(db_path)
+        summary = user_db_sync.apply_changes(conn, request.get_json(silent=True))
+        username = session.get('username', 'Unknown')
+        app.logger.info(f"User {user_id} ({username}) sync push: " +
+                        ", ".join(f"{table} {counts['applied']}/{counts['applied'] + counts['skipped']}"
+                                  for table, counts in summary.items()))
+        return jsonify(summary), 200
+    except user_db_sync.SyncError as e:
+        return jsonify({"error": str(e)}), 400
+    except sqlite3.IntegrityError as e:
+        app.logger.warning(f"Rejected sync push for user {user_id}: {e}")
+        return jsonify({"error": f"Invalid change: {e}"}), 400
+    except sqlite3.Error as e:
+        app.logger.exception(f"Database error in sync push for user {user_id}: {e}")
+        return jsonify({"error": "Database error during sync"}), 500
+    finally:
+        if conn:
+            conn.close()
+
 # --- Server Start ---
 if __name__ == '__main__':
     # Initialize databases if they don't exist
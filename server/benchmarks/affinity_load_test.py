@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+affinity_load_test.py — Throughput vs. container count under user-affinity routing.
+
+For each container count in --containers (e.g. 1,2,3) this boots that many
+"containers" locally. Each one is --pinned-workers single-worker gunicorn
+processes on their own ports, the same layout as gunicorn_pinned.sh, with their
+own INSTANCE_ID. The same study sessions as run_benchmark.py are then replayed
+through a client-side router that does what client/nginx.affinity.conf does:
+  - ketama-style consistent hashing of the sa_route cookie over all worker
+    ports; requests without the cookie (login) go to a random port;
+  - a port that refuses connections is skipped for --fail-timeout seconds and
+    its students fall through to the next port on the ring; only GETs are
+    retried, as with nginx's proxy_next_upstream without non_idempotent.
+
+Reported per container count: throughput, p50/p95 and affinity, i.e. the share
+of logged-in requests served by the worker process that served most of that
+student's session (X-Served-By). With --kill-after S, one worker of the last
+container is killed S seconds into each run to exercise failover.
+
+All containers share one scratch copy of the fixtures, as the compose
+containers share ./server. On one machine throughput stops scaling once the
+cores are busy. For a real deployment, run run_benchmark.py --url against the
+nginx of docker-compose.affinity.yml with 1, 2, ... app containers.
+
+Usage (from server/):
+    python benchmarks/generate_fixtures.py --users 300
+    python benchmarks/affinity_load_test.py --containers 1,2,3 --students 300 --concurrency 60
+"""
+
+import argparse
+import bisect
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from run_benchmark import (DEFAULT_FIXTURES, DEFAULT_RESULTS_DIR, SERVER_DIR, Recorder, _git_commit,
+                           build_report, run_student)
+
+ROUTER_URL = 'http://affinity-router'
+ROUTE_COOKIE = 'sa_route'
+RING_POINTS = 160  # nginx's ketama points per server (weight 1)
+
+
+class HashRing:
+    """Consistent hash ring over backend base URLs."""
+
+    def __init__(self, backends, points=RING_POINTS):
+        self._ring = sorted((zlib.crc32(f"{backend}-{i}".encode()), backend)
+                            for backend in backends for i in range(points))
+        self._hashes = [h for h, _ in self._ring]
+
+    def lookup(self, key, skip=()):
+        """First backend clockwise from the key's hash that is not in skip, or None."""
+        start = bisect.bisect(self._hashes, zlib.crc32(key.encode()))
+        for offset in range(len(self._ring)):
+            backend = self._ring[(start + offset) % len(self._ring)][1]
+            if backend not in skip:
+                return backend
+        return None
+
+
+class Router:
+    """Shared routing state: the ring and the backends currently marked down."""
+
+    def __init__(self, backends, fail_timeout):
+        self.backends = backends
+        self.ring = HashRing(backends)
+        self.fail_timeout = fail_timeout
+        self._down = {}  # backend -> time it may be tried again
+        self._lock = threading.Lock()
+        self.failovers = 0
+
+    def down(self):
+        now = time.time()
+        with self._lock:
+            return {backend for backend, until in self._down.items() if until > now}
+
+    def mark_down(self, backend):
+        with self._lock:
+            self._down[backend] = time.time() + self.fail_timeout
+            self.failovers += 1
+
+    def pick(self, key, rng, skip=()):
+        skip = set(skip) | self.down()
+        if key:
+            return self.ring.lookup(key, skip)
+        candidates = [backend for backend in self.backends if backend not in skip]
+        return rng.choice(candidates) if candidates else None
+
+
+class AffinitySession(requests.Session):
+    """requests.Session that sends ROUTER_URL requests to the backend the router picks."""
+
+    def __init__(self, router, rng):
+        super().__init__()
+        self.router = router
+        self.rng = rng
+        self.served_by = Counter()  # X-Served-By of requests made with a route cookie
+
+    def request(self, method, url, *args, **kwargs):
+        path = url[len(ROUTER_URL):]
+        key = self.cookies.get(ROUTE_COOKIE)
+        tried = []
+        while True:
+            backend = self.router.pick(key, self.rng, skip=tried)
+            if backend is None:
+                raise requests.ConnectionError('no backend available')
+            try:
+                response = super().request(method, backend + path, *args, **kwargs)
+            except requests.ConnectionError:
+                self.router.mark_down(backend)
+                tried.append(backend)
+                if method != 'GET' or len(tried) >= 2:
+                    raise
+                continue
+            if key and 'X-Served-By' in response.headers:
+                self.served_by[response.headers['X-Served-By']] += 1
+            return response
+
+
+def _start_container(index, data_dir, base_port, workers, log_path):
+    """Starts one container's pinned workers. Returns (processes, backend URLs)."""
+    env = dict(os.environ, DATA_DIR=data_dir, INSTANCE_ID=f'container{index}',
+               SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark-secret-key'))
+    log = open(log_path, 'a')
+    procs, backends = [], []
+    for worker in range(workers):
+        port = base_port + worker
+        procs.append(subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', '1', 'app:app'],
+            cwd=SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT))
+        backends.append(f'http://127.0.0.1:{port}')
+    return procs, backends
+
+
+def _wait_ready(procs, backends, log_path):
+    deadline = time.time() + 30
+    for proc, backend in zip(procs, backends):
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"gunicorn exited early (see {log_path})")
+            try:
+                if requests.get(backend + '/', timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if time.time() >= deadline:
+                raise RuntimeError(f"gunicorn did not become ready within 30s (see {log_path})")
+            time.sleep(0.2)
+
+
+def run_containers(containers, args, fixtures_meta):
+    log_path = os.path.join(args.results_dir, 'affinity_gunicorn.log')
+    scratch = tempfile.mkdtemp(prefix='sa_affinity_')
+    data_dir = os.path.join(scratch, 'data')
+    shutil.copytree(os.path.abspath(args.fixtures), data_dir)
+    procs, backends, last_container = [], [], []
+    try:
+        for index in range(containers):
+            container_procs, container_backends = _start_container(
+                index, data_dir, args.port + index * args.pinned_workers, args.pinned_workers, log_path)
+            procs.extend(container_procs)
+            backends.extend(container_backends)
+            last_container = container_procs
+        _wait_ready(procs, backends, log_path)
+        print(f"{containers} container(s), {len(backends)} pinned workers: "
+              f"{args.students} students, concurrency {args.concurrency}")
+
+        router = Router(backends, args.fail_timeout)
+        recorder = Recorder()
+        rng = random.Random(args.seed)
+        sessions = []
+        jobs = []
+        for i in range(args.students):
+            student_rng = random.Random(rng.random())
+            http = AffinitySession(router, student_rng)
+            sessions.append(http)
+            jobs.append((fixtures_meta['email_format'].format(i % fixtures_meta['users']), student_rng, http))
+
+        killer = None
+        if args.kill_after:
+            killer = threading.Timer(args.kill_after, last_container[0].kill)
+            killer.start()
+        recorder.started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_student, ROUTER_URL, email, fixtures_meta['password'], args, recorder,
+                                   student_rng, http)
+                       for email, student_rng, http in jobs]
+            for future in futures:
+                future.result()
+        recorder.finished = time.perf_counter()
+        if killer:
+            killer.cancel()
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    args.url = ROUTER_URL
+    report = build_report(recorder, args, fixtures_meta)
+    pinned = sum(max(http.served_by.values()) for http in sessions if http.served_by)
+    routed = sum(sum(http.served_by.values()) for http in sessions)
+    workers_per_student = [len(http.served_by) for http in sessions if http.served_by]
+    report['meta'].update({'containers': containers, 'pinned_workers': len(backends)})
+    report['affinity'] = {
+        'pinned_share': round(pinned / routed, 4) if routed else None,
+        'students_on_one_worker': sum(1 for n in workers_per_student if n == 1),
+        'students': len(workers_per_student),
+        'failovers': router.failovers,
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput vs. container count with user-affinity routing.')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='Fixture DATA_DIR from generate_fixtures.py')
+    parser.add_argument('--containers', default='1,2,3', help='Container counts to run (default: 1,2,3)')
+    parser.add_argument('--pinned-workers', type=int, default=3,
+                        help='Single-worker gunicorn processes per container (default: 3)')
+    parser.add_argument('--port', type=int, default=8800, help='First backend port (default: 8800)')
+    parser.add_argument('--students', type=int, default=300, help='Study sessions per run (default: 300)')
+    parser.add_argument('--concurrency', type=int, default=60, help='Concurrent students (default: 60)')
+    parser.add_argument('--reviews', type=int, default=20, help='Review/answer iterations per session (default: 20)')
+    parser.add_argument('--think-ms', type=int, default=0, help='Max random think time before each answer')
+    parser.add_argument('--add-card-rate', type=float, default=0.3, help='Share of sessions that add a card')
+    parser.add_argument('--deck-switch-rate', type=float, default=0.2, help='Share of sessions that switch deck')
+    parser.add_argument('--fail-timeout', type=float, default=10.0,
+                        help='Seconds a refused backend is skipped, as nginx fail_timeout (default: 10)')
+    parser.add_argument('--kill-after', type=float, default=0,
+                        help='Kill one worker of the last container this many seconds into each run')
+    parser.add_argument('--seed', type=int, default=1234, help='Random seed (default: 1234)')
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR, help='Where the JSON report is written')
+    parser.add_argument('--output', help='Report path (default: results/affinity_<commit>_<timestamp>.json)')
+    args = parser.parse_args()
+
+    meta_path = os.path.join(os.path.abspath(args.fixtures), 'fixtures.json')
+    if not os.path.exists(meta_path):
+        print(f"No fixtures at {args.fixtures}. Run benchmarks/generate_fixtures.py first.")
+        sys.exit(1)
+    with open(meta_path) as f:
+        fixtures_meta = json.load(f)
+    os.makedirs(args.results_dir, exist_ok=True)
+
+    runs = [run_containers(int(count), args, fixtures_meta) for count in args.containers.split(',')]
+
+    print(f"\n{'containers':>10}{'workers':>9}{'req/s':>9}{'scale':>7}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'errors':>8}{'affinity':>10}{'failovers':>11}")
+    print('-' * 82)
+    base_rps = runs[0]['overall']['throughput_rps'] or 1
+    for report in runs:
+        overall, affinity = report['overall'], report['affinity']
+        pinned = f"{affinity['pinned_share']:.1%}" if affinity['pinned_share'] is not None else '-'
+        print(f"{report['meta']['containers']:>10}{report['meta']['pinned_workers']:>9}"
+              f"{overall['throughput_rps']:>9.1f}{overall['throughput_rps'] / base_rps:>6.2f}x"
+              f"{overall['p50_ms']:>9.1f}{overall['p95_ms']:>9.1f}{overall['errors']:>8}{pinned:>10}"
+              f"{affinity['failovers']:>11}")
+
+    output = args.output or os.path.join(
+        args.results_dir, f"affinity_{_git_commit() or 'nogit'}_{int(time.time())}.json")
+    with open(output, 'w') as f:
+        json.dump({'runs': runs}, f, indent=2)
+    print(f"✓ Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+delete_deck_benchmark.py — Compare deck deletion strategies on a large generated deck.
+
+Builds a user DB (via app.init_anki_db) with one deck of --cards cards, then times:
+    legacy   the old delete_deck body: DELETE cards, then COUNT(*) + DELETE per note,
+             all in one transaction
+    chunked  app._deleteDeckCards: set-based statements, --chunk-size cards per transaction
+
+Each strategy runs on its own copy of the DB, and both must leave the same cards/notes.
+While a strategy runs, a second connection keeps making tiny writes (like a review being
+answered in another tab); its worst-case wait shows how long the user was locked out.
+
+Usage (from server/):
+    python benchmarks/delete_deck_benchmark.py
+    python benchmarks/delete_deck_benchmark.py --cards 50000 --chunk-size 1000 --output delete_deck.json
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SERVER_DIR)
+os.environ.setdefault('SECRET_KEY', 'delete-deck-benchmark')
+
+DECK_ID = 2
+
+
+def _build_db(db_path, card_count):
+    import app as server_app
+
+    server_app.init_anki_db(db_path, user_name='Delete Benchmark')
+    conn = sqlite3.connect(db_path)
+    base_id = int(time.time() * 1000)
+    notes = [(base_id + i, f"guid{i}", 1, 0, -1, '', f"front {i}\x1fback {i}", f"front {i}", 0, 0, '')
+             for i in range(card_count)]
+    conn.executemany("INSERT INTO notes (id, guid, mid, mod, usn, tags, flds, sfld, csum, flags, data) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", notes)
+    cards = [(base_id + i, base_id + i, DECK_ID, 0, 0, -1, 0, 0, i, 0, 2500, 0, 0, 0, 0, 0, 0, '')
+             for i in range(card_count)]
+    conn.executemany("INSERT INTO cards (id, nid, did, ord, mod, usn, type, queue, due, ivl, factor, "
+                     "reps, lapses, left, odue, odid, flags, data) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", cards)
+    conn.commit()
+    conn.close()
+
+
+def _legacy_delete(conn, deck_id):
+    """The pre-chunking delete_deck: one statement per note inside one transaction."""
+    import app as server_app
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT nid FROM cards WHERE did = ?", (deck_id,))
+    note_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("DELETE FROM cards WHERE did = ?", (deck_id,))
+    for note_id in note_ids:
+        cursor.execute("SELECT COUNT(*) FROM cards WHERE nid = ?", (note_id,))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+            server_app.app.logger.debug(f"Deleted orphaned note {note_id}")
+    conn.commit()
+
+
+def _remaining(db_path):
+    conn = sqlite3.connect(db_path)
+    counts = (conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0],
+              conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0])
+    conn.close()
+    return counts
+
+
+def _concurrent_writer(db_path, stop, waits):
+    """Small write transactions on another connection; records each one's latency (ms)."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("UPDATE col SET mod = mod + 1")
+        conn.execute("COMMIT")
+        waits.append((time.perf_counter() - started) * 1000)
+        time.sleep(0.002)
+    conn.close()
+
+
+def _run(template, work_dir, name, fn):
+    db_path = os.path.join(work_dir, f"{name}.db")
+    shutil.copyfile(template, db_path)
+    conn = sqlite3.connect(db_path)
+    stop, waits = threading.Event(), []
+    writer = threading.Thread(target=_concurrent_writer, args=(db_path, stop, waits))
+    writer.start()
+    started = time.perf_counter()
+    fn(conn)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    stop.set()
+    writer.join()
+    conn.close()
+    return {'total_ms': round(elapsed_ms, 1), 'max_writer_wait_ms': round(max(waits), 1)}, _remaining(db_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark legacy vs chunked deck deletion.')
+    parser.add_argument('--cards', type=int, default=10000, help='Cards (one note each) in the deck')
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help='Cards per transaction for the chunked strategy (default: app setting)')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    import app as server_app
+
+    work_dir = tempfile.mkdtemp(prefix='delete_deck_bench_')
+    try:
+        template = os.path.join(work_dir, 'template.db')
+        _build_db(template, args.cards)
+
+        legacy, legacy_left = _run(template, work_dir, 'legacy',
+                                   lambda conn: _legacy_delete(conn, DECK_ID))
+        chunked, chunked_left = _run(template, work_dir, 'chunked',
+                                     lambda conn: server_app._deleteDeckCards(conn, DECK_ID, args.chunk_size))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if legacy_left != chunked_left:
+        sys.exit(f"Strategies disagree: legacy left {legacy_left}, chunked left {chunked_left}")
+
+    result = {
+        'cards': args.cards,
+        'chunk_size': args.chunk_size or server_app.DELETE_DECK_CHUNK_SIZE,
+        'legacy': legacy,
+        'chunked': chunked,
+    }
+    print(f"{args.cards} cards, {result['chunk_size']} cards/transaction")
+    for name in ('legacy', 'chunked'):
+        print(f"  {name:8} total {result[name]['total_ms']:8.1f}ms   "
+              f"max concurrent write wait {result[name]['max_writer_wait_ms']:8.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
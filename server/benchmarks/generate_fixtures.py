@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+generate_fixtures.py — Build a local DATA_DIR (admin.db + user_dbs/) for the benchmark harness.
+
+Every simulated student gets an account in admin.db and an Anki collection in
+user_dbs/ created with the same code the server uses (init_anki_db +
+add_initial_flashcards). A configurable slice of each collection is given past
+review history so the review, stats and card-list queries run against realistic
+data instead of brand-new decks.
+
+Usage (from server/):
+    python benchmarks/generate_fixtures.py --users 300
+    python benchmarks/generate_fixtures.py --users 500 --history-days 60 --out /tmp/sa_bench
+
+All accounts share the password in BENCH_PASSWORD; emails are bench<N>@bench.local.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_OUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+BENCH_PASSWORD = 'benchpass123'
+BENCH_EMAIL_FMT = 'bench{}@bench.local'
+VERBAL_TENSES_DECK_ID = 2
+BASIC_MODEL_ID = '1700000000001'
+
+
+def _import_app(data_dir):
+    """Import server/app.py with DATA_DIR pointing at the fixture directory."""
+    os.environ['DATA_DIR'] = data_dir
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret-key')
+    sys.path.insert(0, SERVER_DIR)
+    import app as server_app
+    return server_app
+
+
+def _add_history(db_path, rng, history_days):
+    """Move part of the sample deck into learning/review state with matching revlog rows."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    crt = cursor.execute("SELECT crt FROM col").fetchone()[0]
+    now = int(time.time())
+
+    # Pretend the collection was created history_days ago so review due days line up.
+    crt -= history_days * 86400
+    cursor.execute("UPDATE col SET crt = ?", (crt,))
+    today = (now - crt) // 86400
+
+    card_ids = [row[0] for row in cursor.execute("SELECT id FROM cards WHERE did = ?", (VERBAL_TENSES_DECK_ID,))]
+    rng.shuffle(card_ids)
+    studied = card_ids[:int(len(card_ids) * 0.6)]
+
+    revlog_id = (crt + 3600) * 1000
+    for card_id in studied:
+        reviews = rng.randint(1, 6)
+        ivl = 0
+        for _ in range(reviews):
+            revlog_id += rng.randint(60_000, 4 * 3600_000)
+            last_ivl, ivl = ivl, max(1, ivl * 2 + 1)
+            cursor.execute("""
+                INSERT INTO revlog (id, cid, usn, ease, ivl, lastIvl, factor, time, type)
+                VALUES (?, ?, -1, ?, ?, ?, 2500, ?, ?)
+            """, (revlog_id, card_id, rng.choice([2, 3, 3, 4]), ivl, last_ivl,
+                  rng.randint(2_000, 20_000), 0 if last_ivl == 0 else 1))
+        if rng.random() < 0.2:
+            # Still in learning, due some minutes from now or already due
+            cursor.execute("UPDATE cards SET type=1, queue=1, due=?, ivl=0, left=1, reps=? WHERE id=?",
+                           (now + rng.randint(-600, 600), reviews, card_id))
+        else:
+            due_day = today + rng.randint(-3, ivl)
+            cursor.execute("UPDATE cards SET type=2, queue=2, due=?, ivl=?, reps=? WHERE id=?",
+                           (due_day, ivl, reviews, card_id))
+
+    conn.commit()
+    conn.close()
+
+
+def generate(out_dir, users, history_days, seed, force):
+    if os.path.exists(out_dir):
+        if not force:
+            print(f"Fixture directory already exists: {out_dir} (use --force to rebuild)")
+            return 1
+        shutil.rmtree(out_dir)
+    os.makedirs(os.path.join(out_dir, 'user_dbs'))
+
+    server_app = _import_app(out_dir)
+    import user_db_decks  # importable once _import_app has put server/ on sys.path
+    import bcrypt
+
+    rng = random.Random(seed)
+    server_app.init_admin_db()
+    # One hash for everybody: login still pays the real bcrypt cost, generation stays fast.
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+    admin = sqlite3.connect(server_app.ADMIN_DB_PATH)
+    started = time.time()
+    for i in range(users):
+        cursor = admin.execute(
+            "INSERT INTO users (username, name, password_hash, email) VALUES (?, ?, ?, ?)",
+            (f'bench{i}', f'Bench Student {i}', password_hash, BENCH_EMAIL_FMT.format(i))
+        )
+        user_id = cursor.lastrowid
+        db_path = server_app.get_user_db_path(user_id)
+        server_app.init_anki_db(db_path, user_name=f'Bench Student {i}')
+        server_app.add_initial_flashcards(db_path, BASIC_MODEL_ID, deck_id=VERBAL_TENSES_DECK_ID)
+
+        conn = sqlite3.connect(db_path)
+        user_db_decks.set_conf_value(conn, 'curDeck', VERBAL_TENSES_DECK_ID)
+        conn.commit()
+        conn.close()
+
+        if history_days > 0:
+            _add_history(db_path, rng, history_days)
+
+        if (i + 1) % 50 == 0:
+            print(f"  {i + 1}/{users} users created")
+    admin.commit()
+    admin.close()
+
+    manifest = {
+        'users': users,
+        'history_days': history_days,
+        'seed': seed,
+        'password': BENCH_PASSWORD,
+        'email_format': BENCH_EMAIL_FMT,
+        'created_at': int(time.time()),
+    }
+    with open(os.path.join(out_dir, 'fixtures.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"✓ Generated {users} users in {out_dir} ({time.time() - started:.1f}s)")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate benchmark fixtures (admin.db + user_dbs/).')
+    parser.add_argument('--out', default=DEFAULT_OUT, help=f'Output DATA_DIR (default: {DEFAULT_OUT})')
+    parser.add_argument('--users', type=int, default=300, help='Number of student accounts (default: 300)')
+    parser.add_argument('--history-days', type=int, default=30,
+                        help='Days of simulated review history per student, 0 for none (default: 30)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--force', action='store_true', help='Delete and rebuild an existing fixture directory')
+    args = parser.parse_args()
+    sys.exit(generate(os.path.abspath(args.out), args.users, args.history_days, args.seed, args.force))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+run_benchmark.py — Repeatable HTTP benchmark for the gunicorn deployment of server/app.py.
+
+Boots `gunicorn app:app` (same command as the Dockerfile) against a scratch copy of the
+fixtures produced by generate_fixtures.py, then drives realistic study sessions from
+hundreds of simulated students:
+
+    login → list decks → review/answer loop → (sometimes) add_card → deck stats
+          → deck card list → logout
+
+Per-route latency percentiles (p50/p95/p99) and throughput are written as JSON so runs
+can be compared across commits.
+
+Usage (from server/):
+    python benchmarks/generate_fixtures.py --users 300
+    python benchmarks/run_benchmark.py --students 300 --concurrency 50
+    python benchmarks/run_benchmark.py --compare benchmarks/results/baseline.json
+    python benchmarks/run_benchmark.py --compare old.json --against new.json   # no run, just diff
+
+Use --url to benchmark an already running server (e.g. the docker-compose stack) instead
+of booting a local gunicorn.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = os.path.join(BENCH_DIR, 'fixtures')
+DEFAULT_RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+STUDY_DECK_ID = 2
+
+
+class Recorder:
+    """Thread-safe collection of (route, status, latency) samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)   # route -> [latency_ms, ...]
+        self.errors = defaultdict(int)     # route -> count of non-2xx / exceptions
+        self.started = None
+        self.finished = None
+
+    def request(self, http, method, route, url, **kwargs):
+        """Issue a request, record its latency under `route`, return the response (or None)."""
+        start = time.perf_counter()
+        try:
+            response = http.request(method, url, timeout=30, **kwargs)
+        except requests.RequestException:
+            response = None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.samples[route].append(elapsed_ms)
+            if response is None or response.status_code >= 400:
+                self.errors[route] += 1
+        return response
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_student(base_url, email, password, args, recorder, rng, http=None):
+    """One study session for one student (on a fresh requests.Session unless `http` is given)."""
+    http = http or requests.Session()
+    r = recorder.request(http, 'POST', 'POST /login', f'{base_url}/login',
+                         json={'email': email, 'password': password})
+    if r is None or r.status_code != 200:
+        return
+
+    recorder.request(http, 'GET', 'GET /decks', f'{base_url}/decks')
+    if rng.random() < args.deck_switch_rate:
+        recorder.request(http, 'PUT', 'PUT /decks/current', f'{base_url}/decks/current',
+                         json={'deckId': STUDY_DECK_ID})
+
+    for _ in range(args.reviews):
+        r = recorder.request(http, 'GET', 'GET /review', f'{base_url}/review')
+        if r is None or r.status_code != 200 or 'cardId' not in r.json():
+            break
+        if args.think_ms:
+            time.sleep(rng.uniform(0, args.think_ms) / 1000.0)
+        recorder.request(http, 'POST', 'POST /answer', f'{base_url}/answer',
+                         json={'ease': rng.choice([1, 2, 3, 3, 3, 4]), 'timeTaken': rng.randint(1500, 15000)})
+
+    if rng.random() < args.add_card_rate:
+        recorder.request(http, 'POST', 'POST /add_card', f'{base_url}/add_card',
+                         json={'front': f'bench front {rng.random():.6f}', 'back': 'bench back'})
+
+    recorder.request(http, 'GET', 'GET /decks/<id>/stats', f'{base_url}/decks/{STUDY_DECK_ID}/stats')
+    recorder.request(http, 'GET', 'GET /decks/<id>/cards',
+                     f'{base_url}/decks/{STUDY_DECK_ID}/cards?page=1&perPage=10')
+    recorder.request(http, 'POST', 'POST /logout', f'{base_url}/logout')
+
+
+def build_report(recorder, args, fixtures_meta):
+    duration = recorder.finished - recorder.started
+    routes = {}
+    all_latencies = []
+    for route, latencies in sorted(recorder.samples.items()):
+        latencies.sort()
+        all_latencies.extend(latencies)
+        routes[route] = {
+            'count': len(latencies),
+            'errors': recorder.errors.get(route, 0),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'max_ms': round(latencies[-1], 2),
+            'throughput_rps': round(len(latencies) / duration, 2) if duration else 0.0,
+        }
+    all_latencies.sort()
+
+    return {
+        'meta': {
+            'git_commit': _git_commit(),
+            'timestamp': int(time.time()),
+            'target': args.url or 'local-gunicorn',
+            'gunicorn_workers': None if args.url else args.workers,
+            'students': args.students,
+            'concurrency': args.concurrency,
+            'reviews_per_session': args.reviews,
+            'fixture_users': fixtures_meta.get('users'),
+            'duration_s': round(duration, 2),
+        },
+        'overall': {
+            'requests': len(all_latencies),
+            'errors': sum(recorder.errors.values()),
+            'p50_ms': round(percentile(all_latencies, 50), 2),
+            'p95_ms': round(percentile(all_latencies, 95), 2),
+            'p99_ms': round(percentile(all_latencies, 99), 2),
+            'throughput_rps': round(len(all_latencies) / duration, 2) if duration else 0.0,
+        },
+        'routes': routes,
+    }
+
+
+def compare_reports(baseline, current, max_regression_pct):
+    """Print a per-route diff; return True if no route's p95 regressed beyond the threshold."""
+    ok = True
+    print(f"\n{'route':<26}{'p95 base':>10}{'p95 now':>10}{'Δ%':>8}{'rps base':>10}{'rps now':>10}")
+    print('-' * 74)
+    for route in sorted(set(baseline['routes']) | set(current['routes'])):
+        base = baseline['routes'].get(route)
+        now = current['routes'].get(route)
+        if not base or not now:
+            print(f"{route:<26}{'(only in ' + ('current' if now else 'baseline') + ')':>48}")
+            continue
+        delta = ((now['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100) if base['p95_ms'] else 0.0
+        flag = ''
+        if delta > max_regression_pct:
+            flag = '  ← regression'
+            ok = False
+        print(f"{route:<26}{base['p95_ms']:>10.1f}{now['p95_ms']:>10.1f}{delta:>+8.1f}"
+              f"{base['throughput_rps']:>10.1f}{now['throughput_rps']:>10.1f}{flag}")
+    print(f"\nbaseline {baseline['meta'].get('git_commit')}  →  current {current['meta'].get('git_commit')}")
+    return ok
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _start_gunicorn(data_dir, port, workers, log_path):
+    env = dict(os.environ, DATA_DIR=data_dir, SECRET_KEY=os.environ.get('SECRET_KEY', 'benchmark-secret-key'))
+    log = open(log_path, 'w')
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers), 'app:app'],
+        cwd=SERVER_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited early (see {log_path})")
+        try:
+            if requests.get(base_url + '/', timeout=1).status_code == 200:
+                return proc, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"gunicorn did not become ready within 30s (see {log_path})")
+
+
+def run(args):
+    fixtures_dir = os.path.abspath(args.fixtures)
+    meta_path = os.path.join(fixtures_dir, 'fixtures.json')
+    if not os.path.exists(meta_path):
+        print(f"No fixtures at {fixtures_dir}. Run benchmarks/generate_fixtures.py first.")
+        return None
+    with open(meta_path) as f:
+        fixtures_meta = json.load(f)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    proc = None
+    scratch = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            # Answers and new cards mutate the collections; run against a copy so every run
+            # starts from identical data.
+            scratch = tempfile.mkdtemp(prefix='sa_bench_')
+            data_dir = os.path.join(scratch, 'data')
+            shutil.copytree(fixtures_dir, data_dir)
+            proc, base_url = _start_gunicorn(data_dir, args.port, args.workers,
+                                             os.path.join(args.results_dir, 'gunicorn.log'))
+        print(f"Benchmarking {base_url}: {args.students} students, concurrency {args.concurrency}")
+
+        recorder = Recorder()
+        rng = random.Random(args.seed)
+        jobs = [(fixtures_meta['email_format'].format(i % fixtures_meta['users']), random.Random(rng.random()))
+                for i in range(args.students)]
+
+        recorder.started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(run_student, base_url, email, fixtures_meta['password'], args, recorder, student_rng)
+                       for email, student_rng in jobs]
+            for future in futures:
+                future.result()
+        recorder.finished = time.perf_counter()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    return build_report(recorder, args, fixtures_meta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP benchmark for the gunicorn server.')
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES, help='Fixture DATA_DIR from generate_fixtures.py')
+    parser.add_argument('--url', help='Benchmark an already running server instead of booting gunicorn')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the local gunicorn (default: 8765)')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers (default: 3, as in the Dockerfile)')
+    parser.add_argument('--students', type=int, default=300, help='Study sessions to simulate (default: 300)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Concurrent students (default: 50)')
+    parser.add_argument('--reviews', type=int, default=20, help='Review/answer iterations per session (default: 20)')
+    parser.add_argument('--think-ms', type=int, default=0, help='Max random think time before each answer')
+    parser.add_argument('--add-card-rate', type=float, default=0.3, help='Share of sessions that add a card')
+    parser.add_argument('--deck-switch-rate', type=float, default=0.2, help='Share of sessions that switch deck')
+    parser.add_argument('--seed', type=int, default=1234, help='Random seed (default: 1234)')
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR, help='Where JSON reports are written')
+    parser.add_argument('--output', help='Report path (default: results/bench_<commit>_<timestamp>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare against a previous JSON report')
+    parser.add_argument('--against', metavar='CURRENT', help='With --compare: diff two reports without running')
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help='p95 regression (%%) that makes --compare exit non-zero (default: 20)')
+    args = parser.parse_args()
+
+    if args.against:
+        if not args.compare:
+            parser.error('--against requires --compare')
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        with open(args.against) as f:
+            current = json.load(f)
+        sys.exit(0 if compare_reports(baseline, current, args.max_regression) else 1)
+
+    report = run(args)
+    if report is None:
+        sys.exit(1)
+
+    output = args.output or os.path.join(
+        args.results_dir, f"bench_{report['meta']['git_commit'] or 'nogit'}_{report['meta']['timestamp']}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    overall = report['overall']
+    print(f"\n{overall['requests']} requests in {report['meta']['duration_s']}s "
+          f"({overall['throughput_rps']} req/s), errors={overall['errors']}, "
+          f"p50={overall['p50_ms']}ms p95={overall['p95_ms']}ms p99={overall['p99_ms']}ms")
+    print(f"✓ Report written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare_reports(baseline, report, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+startup_benchmark.py — Measure import-time cost of the two server entry points.
+
+Each target is imported in a fresh interpreter (like a new gunicorn worker or a Lambda
+cold start) several times. The script reports the median/min wall time of the import
+and, from one `python -X importtime` run, the heaviest modules by cumulative time.
+
+Targets:
+    server   `import app` in server/ (what each gunicorn worker does at boot)
+    lambda   `import lambda_handler` in server_lambda/src/ (Lambda cold start init)
+
+Usage (from server/):
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 20 --target server --output startup.json
+
+No AWS credentials are needed: boto3 clients are not created at import time.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LAMBDA_SRC_DIR = os.path.abspath(os.path.join(SERVER_DIR, '..', 'server_lambda', 'src'))
+
+TARGETS = {
+    'server': {'cwd': SERVER_DIR, 'module': 'app'},
+    'lambda': {'cwd': LAMBDA_SRC_DIR, 'module': 'lambda_handler'},
+}
+
+
+def _env(data_dir):
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'startup-benchmark')
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    env['DATA_DIR'] = data_dir
+    return env
+
+
+def _time_import(target, env):
+    """Wall time (ms) of importing the target module in a fresh interpreter."""
+    code = (f"import time; t = time.perf_counter(); import {target['module']}; "
+            f"print((time.perf_counter() - t) * 1000)")
+    out = subprocess.run([sys.executable, '-c', code], cwd=target['cwd'], env=env,
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _heaviest_imports(target, env, top):
+    """Parse `-X importtime` output into the `top` modules by cumulative microseconds."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {target['module']}"],
+                         cwd=target['cwd'], env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        # Only top-level packages, so "boto3" is reported once rather than for every submodule
+        if '.' in name:
+            continue
+        rows.append({'module': name, 'cumulative_ms': round(int(cumulative_us) / 1000, 1),
+                     'self_ms': round(int(self_us) / 1000, 1)})
+    rows.sort(key=lambda r: r['cumulative_ms'], reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure server/Lambda import (startup) time.')
+    parser.add_argument('--target', choices=['server', 'lambda', 'all'], default='all')
+    parser.add_argument('--runs', type=int, default=10, help='Fresh-interpreter imports per target (default: 10)')
+    parser.add_argument('--top', type=int, default=10, help='Heaviest imports to list (default: 10)')
+    parser.add_argument('--output', help='Write the results as JSON to this path')
+    args = parser.parse_args()
+
+    names = list(TARGETS) if args.target == 'all' else [args.target]
+    results = {'timestamp': int(time.time()), 'python': sys.version.split()[0], 'targets': {}}
+
+    with tempfile.TemporaryDirectory(prefix='sa_startup_') as data_dir:
+        env = _env(data_dir)
+        for name in names:
+            target = TARGETS[name]
+            timings = [_time_import(target, env) for _ in range(args.runs)]
+            heaviest = _heaviest_imports(target, env, args.top)
+            results['targets'][name] = {
+                'module': target['module'],
+                'runs': args.runs,
+                'median_ms': round(statistics.median(timings), 1),
+                'min_ms': round(min(timings), 1),
+                'max_ms': round(max(timings), 1),
+                'heaviest_imports': heaviest,
+            }
+
+            print(f"\n{name}: import {target['module']} — median {statistics.median(timings):.1f}ms, "
+                  f"min {min(timings):.1f}ms over {args.runs} runs")
+            for row in heaviest:
+                print(f"    {row['module']:<28}{row['cumulative_ms']:>8.1f}ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
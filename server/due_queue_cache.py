@@ -0,0 +1,172 @@
+"""
+due_queue_cache.py — Per-worker in-memory due queues for GET /review.
+
+A student in a session calls /review and /answer back to back, and only one card
+changes each time. With the cache on, a worker keeps three min-heaps for each
+active user's current deck:
+- learning (queues 1 and 3), keyed by due timestamp;
+- review (queue 2), keyed by due day;
+- new (queue 0), keyed by a random number, so picks stay random like ORDER BY RANDOM().
+
+The heaps are built on first use. /answer, /add_card and DELETE /cards/<id> then
+update them in place, and /review picks the next card in O(log n) without scanning
+the cards table. Each entry records the col.mod it matches. Every writer bumps
+col.mod, so a change made anywhere else (another worker, bulk edits, sync, deck
+changes) shows up as a different col.mod and the entry is rebuilt. The number of
+users kept is bounded by an LRU.
+
+Removed cards are deleted lazily: a heap item counts only if it matches the card's
+latest push, and the heaps are compacted once stale items outnumber live ones.
+
+The cache holds no Flask or request state: app.py keeps one instance per worker
+and builds queues from a DB cursor, so the heaps can be unit tested against a
+plain sqlite3 database.
+"""
+
+import heapq
+import random
+import threading
+from collections import OrderedDict
+
+LEARN, REVIEW, NEW = 'learn', 'review', 'new'
+
+_HEAP_FOR_QUEUE = {0: NEW, 1: LEARN, 2: REVIEW, 3: LEARN}
+
+
+class DueQueues:
+    """The due queues of one user's deck, as of collection mod `mod` and scheduling day `day`."""
+
+    def __init__(self, deck_id, mod, day, new_seen_today):
+        self.deck_id = deck_id
+        self.mod = mod
+        self.day = day
+        self.new_seen_today = new_seen_today
+        self._heaps = {LEARN: [], REVIEW: [], NEW: []}
+        self._entries = {}  # card id -> (heap name, push sequence) of its live heap item
+        self._sequence = 0
+        self._stale = 0
+        self._lock = threading.RLock()  # /review may pop stale items while /answer pushes
+
+    @classmethod
+    def build(cls, cursor, deck_id, mod, day, new_seen_today):
+        """Loads the deck's schedulable cards (queues 0-3) with a single scan."""
+        queues = cls(deck_id, mod, day, new_seen_today)
+        cursor.execute("SELECT id, queue, due FROM cards WHERE did = ? AND queue BETWEEN 0 AND 3", (deck_id,))
+        for card_id, queue, due in cursor.fetchall():
+            queues.push(card_id, queue, due)
+        return queues
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, card_id):
+        return card_id in self._entries
+
+    def push(self, card_id, queue, due):
+        """Adds or moves a card. Cards outside queues 0-3 (suspended, buried) are just removed."""
+        with self._lock:
+            self.remove(card_id)
+            name = _HEAP_FOR_QUEUE.get(queue)
+            if name is None:
+                return
+            key = random.random() if name == NEW else due
+            self._sequence += 1
+            self._entries[card_id] = (name, self._sequence)
+            heapq.heappush(self._heaps[name], (key, self._sequence, card_id))
+
+    def update_card(self, card_id, deck_id, queue, due):
+        """Applies a card's new deck/queue/due after a write. Cards now in another deck are dropped."""
+        if deck_id == self.deck_id:
+            self.push(card_id, queue, due)
+        else:
+            self.remove(card_id)
+
+    def remove(self, card_id):
+        with self._lock:
+            if self._entries.pop(card_id, None) is not None:
+                self._stale += 1
+                if self._stale > len(self._entries):
+                    self._compact()
+
+    def next_card(self, now, day, allow_new):
+        """
+        (card id, queue name) of the next card to study, or None. Same priorities as
+        the SQL path: learning due by `now`, then reviews due by `day`, then new cards.
+        """
+        with self._lock:
+            for name, limit in ((LEARN, now), (REVIEW, day)):
+                top = self._top(name)
+                if top is not None and top[0] <= limit:
+                    return top[2], name
+            if allow_new:
+                top = self._top(NEW)
+                if top is not None:
+                    return top[2], NEW
+            return None
+
+    def _top(self, name):
+        heap = self._heaps[name]
+        while heap:
+            _, sequence, card_id = heap[0]
+            if self._entries.get(card_id) == (name, sequence):
+                return heap[0]
+            heapq.heappop(heap)
+            self._stale -= 1
+        return None
+
+    def _compact(self):
+        for name, heap in self._heaps.items():
+            heap[:] = [item for item in heap if self._entries.get(item[2]) == (name, item[1])]
+            heapq.heapify(heap)
+        self._stale = 0
+
+
+class DueQueueCache:
+    """LRU of DueQueues by user id, shared by the threads of one worker process."""
+
+    def __init__(self, max_users):
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def get(self, user_id, deck_id, mod, day):
+        """The user's queues if they still match the deck, col.mod and day. Otherwise drops them and returns None."""
+        with self._lock:
+            queues = self._users.get(user_id)
+            if queues is None:
+                return None
+            if (queues.deck_id, queues.mod, queues.day) != (deck_id, mod, day):
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return queues
+
+    def put(self, user_id, queues):
+        with self._lock:
+            self._users[user_id] = queues
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def apply(self, user_id, old_mod, new_mod, update):
+        """
+        Runs update(queues) after a write that moved col.mod from old_mod to new_mod.
+        The update is applied only if the cached queues were current before the write.
+        Otherwise they missed another change and are dropped.
+        """
+        with self._lock:
+            queues = self._users.get(user_id)
+            if queues is None:
+                return
+            if queues.mod != old_mod:
+                del self._users[user_id]
+                return
+            update(queues)
+            queues.mod = new_mod
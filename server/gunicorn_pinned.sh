@@ -0,0 +1,28 @@
+#!/bin/bash
+# Starts PINNED_WORKERS single-worker gunicorn processes on consecutive ports
+# (8000, 8001, ...) instead of one gunicorn with PINNED_WORKERS workers behind a
+# shared socket. nginx lists every port as its own upstream server and hashes the
+# route cookie over them, so each student always reaches the same worker process
+# and its in-memory caches. See docs/AFFINITY_ROUTING.md.
+#
+# If any worker exits the script stops the others and exits too, so Docker's
+# restart policy brings the whole container back.
+
+set -u
+
+WORKERS="${PINNED_WORKERS:-3}"
+BASE_PORT="${PINNED_BASE_PORT:-8000}"
+THREADS="${GUNICORN_THREADS:-1}"
+
+pids=()
+for ((i = 0; i < WORKERS; i++)); do
+    gunicorn --bind "0.0.0.0:$((BASE_PORT + i))" --workers 1 --threads "$THREADS" app:app &
+    pids+=($!)
+done
+
+trap 'kill "${pids[@]}" 2>/dev/null' TERM INT
+wait -n
+status=$?
+kill "${pids[@]}" 2>/dev/null
+wait
+exit "$status"
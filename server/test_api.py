@@ -116,6 +116,21 @@ class AuthTestCase(unittest.TestCase):
         })
         self.assertEqual(r.status_code, 400)
 
+    def test_login_sets_route_cookie_that_outlives_logout(self):
+        """nginx pins a user to one worker by hashing the sa_route cookie; keeping it after
+        logout sends the next login (and its warm-up) to the same worker."""
+        r = self.client.post('/login', json={
+            'email': 'test@example.com', 'password': 'senha12345'
+        })
+        route_key = r.headers['X-Route-Key']
+        self.assertIn(f'{server_app.ROUTE_COOKIE}={route_key}', r.headers['Set-Cookie'])
+        self.assertEqual(r.headers['X-Served-By'], f'{server_app.INSTANCE_ID}:{os.getpid()}')
+        self.assertEqual(self.client.get_cookie(server_app.ROUTE_COOKIE).value, route_key)
+
+        r = self.client.post('/logout')
+        self.assertNotIn('X-Route-Key', r.headers)
+        self.assertEqual(self.client.get_cookie(server_app.ROUTE_COOKIE).value, route_key)
+
     # ------------------------------------------------------------------
     # POST /change-password
     # ------------------------------------------------------------------
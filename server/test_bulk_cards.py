@@ -0,0 +1,98 @@
+"""
+test_bulk_cards.py — Unit tests for POST /cards/bulk.
+
+Run from /server:
+    python -m unittest test_bulk_cards.py -v
+"""
+import os
+import sqlite3
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+from user_db_test_case import UserDbTestCase  # noqa: E402
+
+
+class BulkCardsTestCase(UserDbTestCase):
+
+    user_name = 'Bulk Test'
+    username = 'bulk_test'
+
+    def setUp(self):
+        super().setUp()
+        self.card_ids = [row[0] for row in self._query("SELECT id FROM cards ORDER BY id")]
+
+    def _bulk(self, **body):
+        return self.client.post('/cards/bulk', json=body)
+
+    def test_move_by_card_ids(self):
+        response = self._bulk(selection={'cardIds': self.card_ids[:5]}, operation='move', targetDeckId=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {'operation': 'move', 'matched': 5, 'changed': 5})
+        self.assertEqual(self._query("SELECT COUNT(*) FROM cards WHERE did = 1")[0][0], 5)
+
+    def test_move_to_unknown_deck_is_404(self):
+        response = self._bulk(selection={'deckId': 2}, operation='move', targetDeckId=999)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self._query("SELECT COUNT(*) FROM cards WHERE did = 2")[0][0], len(self.card_ids))
+
+    def test_suspend_and_unsuspend_deck(self):
+        self.assertEqual(self._bulk(selection={'deckId': 2}, operation='suspend').get_json()['changed'],
+                         len(self.card_ids))
+        self.assertEqual(self._query("SELECT DISTINCT queue FROM cards"), [(-1,)])
+        # Already suspended cards are not counted again
+        self.assertEqual(self._bulk(selection={'deckId': 2}, operation='suspend').get_json()['changed'], 0)
+
+        self._bulk(selection={'deckId': 2}, operation='unsuspend')
+        self.assertEqual(self._query("SELECT DISTINCT queue FROM cards"), [(0,)])
+
+    def test_reset_by_query(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE cards SET type = 2, queue = 2, ivl = 10, reps = 4, due = 5")
+        conn.commit()
+        conn.close()
+        front = self._query("SELECT sfld FROM notes ORDER BY id LIMIT 1")[0][0]
+
+        response = self._bulk(selection={'deckId': 2, 'query': front}, operation='reset')
+        self.assertEqual(response.status_code, 200)
+        matched = response.get_json()['matched']
+        self.assertGreaterEqual(matched, 1)
+        self.assertEqual(self._query("SELECT COUNT(*) FROM cards WHERE type = 0 AND queue = 0 "
+                                     "AND ivl = 0 AND reps = 0 AND due = nid")[0][0], matched)
+
+    def test_query_wildcards_are_literal(self):
+        response = self._bulk(selection={'query': '%'}, operation='suspend')
+        self.assertEqual(response.get_json()['matched'], 0)
+
+    def test_delete_writes_graves(self):
+        response = self._bulk(selection={'cardIds': self.card_ids[:3] + [123]}, operation='delete')
+        self.assertEqual(response.get_json(), {'operation': 'delete', 'matched': 3, 'changed': 3, 'notesDeleted': 3})
+        self.assertEqual(self._query("SELECT COUNT(*) FROM cards")[0][0], len(self.card_ids) - 3)
+        self.assertEqual(self._query("SELECT type, COUNT(*) FROM graves GROUP BY type"), [(0, 3), (1, 3)])
+
+    def test_retag(self):
+        selection = {'cardIds': self.card_ids[:2]}
+        response = self._bulk(selection=selection, operation='retag',
+                              addTags=['semester1 review'], removeTags=['VERBAL_TENSES'])
+        self.assertEqual(response.get_json()['changed'], 2)
+        tags = self._query("SELECT n.tags FROM notes n JOIN cards c ON c.nid = n.id WHERE c.id IN (?, ?)",
+                           tuple(self.card_ids[:2]))
+        self.assertEqual({row[0] for row in tags}, {'semester1 review'})
+
+    def test_invalid_requests(self):
+        self.assertEqual(self._bulk(selection={'deckId': 2}, operation='explode').status_code, 400)
+        self.assertEqual(self._bulk(selection={}, operation='suspend').status_code, 400)
+        self.assertEqual(self._bulk(selection={'cardIds': ['x']}, operation='suspend').status_code, 400)
+        self.assertEqual(self._bulk(selection={'deckId': 2}, operation='move').status_code, 400)
+        self.assertEqual(self._bulk(selection={'deckId': 2}, operation='retag').status_code, 400)
+        # Selections without a usable filter
+        self.assertEqual(self._bulk(selection={'query': ''}, operation='suspend').status_code, 400)
+        self.assertEqual(self._bulk(selection={'cardIds': None}, operation='suspend').status_code, 400)
+        # true/false are not ids
+        self.assertEqual(self._bulk(selection={'cardIds': [True]}, operation='suspend').status_code, 400)
+        self.assertEqual(self._bulk(selection={'deckId': True}, operation='suspend').status_code, 400)
+        self.assertEqual(self._bulk(selection={'deckId': 2}, operation='move', targetDeckId=True).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+"""
+test_conditional_get.py — Unit tests for ETag / 304 Not Modified on read routes.
+
+Run from /server:
+    python -m unittest test_conditional_get.py -v
+"""
+import os
+import sqlite3
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+from user_db_test_case import UserDbTestCase  # noqa: E402
+
+
+class ConditionalGetTestCase(UserDbTestCase):
+
+    user_name = 'ETag Test'
+    username = 'etag_test'
+
+    def setUp(self):
+        super().setUp()
+
+    def _revalidate(self, url, etag):
+        return self.client.get(url, headers={'If-None-Match': etag})
+
+    def test_read_routes_return_304_when_unchanged(self):
+        card_id = sqlite3.connect(self.db_path).execute("SELECT id FROM cards LIMIT 1").fetchone()[0]
+        for url in ('/decks', '/decks/2/stats', '/decks/2/cards?page=1', f'/cards/{card_id}'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200, url)
+            self.assertEqual(first.headers['Cache-Control'], 'private, no-cache')
+            etag = first.headers['ETag']
+            self.assertTrue(etag.startswith('W/'), url)
+
+            second = self._revalidate(url, etag)
+            self.assertEqual(second.status_code, 304, url)
+            self.assertEqual(second.data, b'')
+            self.assertEqual(second.headers['ETag'], etag)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get('/decks').headers['ETag']
+        self.assertEqual(self.client.post('/decks', json={'name': 'Semester 2'}).status_code, 201)
+        response = self._revalidate('/decks', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Semester 2', [deck['name'] for deck in response.get_json()])
+
+    def test_revlog_change_without_col_mod_changes_etag(self):
+        etag = self.client.get('/decks/2/stats').headers['ETag']
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO revlog (id, cid, usn, ease, ivl, lastIvl, factor, time, type) "
+                     "VALUES (1, 1, -1, 3, 1, 0, 2500, 5000, 0)")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self._revalidate('/decks/2/stats', etag).status_code, 200)
+
+    def test_errors_are_not_tagged(self):
+        response = self.client.get('/decks/999/stats')
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response.headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
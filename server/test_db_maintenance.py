@@ -0,0 +1,170 @@
+"""
+test_db_maintenance.py — Unit tests for the off-peak maintenance worker (tools/db_maintenance.py).
+
+Run from /server:
+    python -m unittest test_db_maintenance.py -v
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+import app as server_app  # noqa: E402
+import db_maintenance  # noqa: E402
+
+DAY = 86400
+START, END = timedelta(hours=5, minutes=5), timedelta(hours=5, minutes=55)
+
+
+def _args(**overrides):
+    values = dict(archive_revlog_days=0, archive_min_rows=1000, min_free_ratio=0.10, min_free_bytes=64 * 1024,
+                  growth=0.25, stats_max_age_days=7, dry_run=False, session_dir=None, active_minutes=30,
+                  max_dbs=500, pause_ms=0, lock_timeout=1.0)
+    values.update(overrides)
+    return argparse.Namespace(**values)
+
+
+def _info(**overrides):
+    info = dict(page_size=4096, page_count=1000, freelist_count=0, free_ratio=0.0, size_bytes=4096 * 1000,
+                auto_vacuum=db_maintenance.AUTO_VACUUM_INCREMENTAL, has_stats=True, archivable_revlog=0)
+    info.update(overrides)
+    if 'free_ratio' not in overrides:
+        info['free_ratio'] = info['freelist_count'] / info['page_count']
+    return info
+
+
+class NextWindowTestCase(unittest.TestCase):
+
+    def _at(self, hour, minute):
+        return datetime(2026, 3, 10, hour, minute, tzinfo=timezone.utc)
+
+    def test_before_window_is_today(self):
+        start, end = db_maintenance.next_window(self._at(1, 0), START, END)
+        self.assertEqual((start, end), (self._at(5, 5), self._at(5, 55)))
+
+    def test_inside_window_is_the_current_one(self):
+        start, end = db_maintenance.next_window(self._at(5, 30), START, END)
+        self.assertEqual((start, end), (self._at(5, 5), self._at(5, 55)))
+
+    def test_after_window_is_tomorrow(self):
+        for now in (self._at(5, 55), self._at(23, 59)):
+            start, end = db_maintenance.next_window(now, START, END)
+            self.assertEqual((start, end), (self._at(5, 5) + timedelta(days=1), self._at(5, 55) + timedelta(days=1)))
+
+
+class PlanDbTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = time.time()
+        self.fresh = {'analyzed_size': 4096 * 1000, 'analyzed_at': self.now - DAY}
+
+    def test_nothing_to_do(self):
+        self.assertEqual(db_maintenance.plan_db(_info(), self.fresh, _args(), self.now)[:3], (False, False, False))
+
+    def test_vacuum_needs_both_ratio_and_bytes(self):
+        args = _args()
+        # 10% free, 400 KiB
+        self.assertTrue(db_maintenance.plan_db(_info(freelist_count=100), self.fresh, args, self.now)[1])
+        # Just under the ratio
+        self.assertFalse(db_maintenance.plan_db(_info(freelist_count=99), self.fresh, args, self.now)[1])
+        # A high ratio on a tiny DB frees too few bytes to bother
+        tiny = _info(page_count=20, freelist_count=10, size_bytes=4096 * 20)
+        self.assertFalse(db_maintenance.plan_db(tiny, self.fresh, args, self.now)[1])
+
+    def test_analyze_thresholds(self):
+        args = _args()
+        self.assertTrue(db_maintenance.plan_db(_info(has_stats=False), None, args, self.now)[2])
+        # Grown by --growth since the last ANALYZE
+        grown = _info(page_count=1250, size_bytes=4096 * 1250)
+        self.assertTrue(db_maintenance.plan_db(grown, self.fresh, args, self.now)[2])
+        barely = _info(page_count=1249, size_bytes=4096 * 1249)
+        self.assertFalse(db_maintenance.plan_db(barely, self.fresh, args, self.now)[2])
+        # Statistics older than --stats-max-age-days
+        stale = dict(self.fresh, analyzed_at=self.now - 7 * DAY)
+        self.assertTrue(db_maintenance.plan_db(_info(), stale, args, self.now)[2])
+        # Statistics present but no state (e.g. analyzed by someone else): left alone
+        self.assertFalse(db_maintenance.plan_db(_info(), None, args, self.now)[2])
+
+    def test_archive_threshold_implies_vacuum(self):
+        args = _args(archive_revlog_days=120)
+        archive, vacuum, _, _ = db_maintenance.plan_db(_info(archivable_revlog=1000), self.fresh, args, self.now)
+        self.assertEqual((archive, vacuum), (True, True))
+        archive, vacuum, _, _ = db_maintenance.plan_db(_info(archivable_revlog=999), self.fresh, args, self.now)
+        self.assertEqual((archive, vacuum), (False, False))
+        # Archiving disabled: due rows don't matter
+        self.assertFalse(db_maintenance.plan_db(_info(archivable_revlog=5000), self.fresh, _args(), self.now)[0])
+
+
+class MaintainDbTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.user_db_dir = os.path.join(self.test_dir, 'user_dbs')
+        os.makedirs(self.user_db_dir)
+        self.db_path = os.path.join(self.user_db_dir, 'user_1.db')
+        server_app.init_anki_db(self.db_path, user_name='Maintenance Test')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        self.addCleanup(conn.close)
+        return conn
+
+    def _fill_and_delete(self, conn, rows=2000):
+        conn.execute("CREATE TABLE IF NOT EXISTS filler (data BLOB)")
+        conn.executemany("INSERT INTO filler VALUES (?)", [(os.urandom(1024),) for _ in range(rows)])
+        conn.execute("DELETE FROM filler")
+
+    def test_first_vacuum_converts_to_incremental(self):
+        conn = self._connect()
+        conn.execute("PRAGMA auto_vacuum = NONE")
+        conn.execute("VACUUM")
+        self._fill_and_delete(conn)
+        info = db_maintenance.inspect_db(conn)
+        self.assertNotEqual(info['auto_vacuum'], db_maintenance.AUTO_VACUUM_INCREMENTAL)
+        _, vacuum, analyze, _ = db_maintenance.plan_db(info, None, _args(), time.time())
+        self.assertTrue(vacuum)
+        self.assertTrue(analyze)  # no sqlite_stat1 yet
+
+        result = db_maintenance.maintain_db(conn, info, vacuum, analyze)
+        self.assertEqual(result['actions'], ['vacuum(convert-incremental)', 'analyze', 'optimize'])
+        self.assertGreater(result['reclaimed_bytes'], 1024 * 1024)
+        after = db_maintenance.inspect_db(conn)
+        self.assertEqual(after['auto_vacuum'], db_maintenance.AUTO_VACUUM_INCREMENTAL)
+        self.assertEqual(after['freelist_count'], 0)
+        self.assertTrue(after['has_stats'])
+
+        # Later runs only free pages incrementally
+        self._fill_and_delete(conn)
+        info = db_maintenance.inspect_db(conn)
+        result = db_maintenance.maintain_db(conn, info, vacuum=True, analyze=False)
+        self.assertEqual(result['actions'], ['incremental_vacuum', 'optimize'])
+        self.assertEqual(db_maintenance.inspect_db(conn)['freelist_count'], 0)
+
+    def test_run_once_optimizes_dbs_with_nothing_else_to_do(self):
+        conn = self._connect()
+        conn.execute("ANALYZE")
+        old = time.time() - DAY
+        os.utime(self.db_path, (old, old))
+        state_file = os.path.join(self.test_dir, 'maintenance_state.json')
+        db_maintenance._save_state(state_file, {'user_1.db': {'analyzed_size': os.path.getsize(self.db_path),
+                                                              'analyzed_at': int(time.time())}})
+        args = _args(user_db_dir=self.user_db_dir, state_file=state_file,
+                     report_file=os.path.join(self.test_dir, 'maintenance_report.jsonl'))
+
+        summary = db_maintenance.run_once(args)
+        self.assertEqual((summary['scanned'], summary['maintained'], summary['optimized']), (1, 0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -468,15 +468,18 @@ def verify_deck_in_database(db_path: str, deck_id: int) -> Dict[str, Any]:
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
 
-        # Get deck info from col table
-        cursor.execute("SELECT decks FROM col")
-        decks_json = cursor.fetchone()[0]
-        decks = json.loads(decks_json)
+        # Get deck info from the deck registry (schema v3+), else from the col table JSON
+        try:
+            row = cursor.execute("SELECT id, name, conf FROM decks WHERE id = ?", (deck_id,)).fetchone()
+            deck_info = {"id": row[0], "name": row[1], "conf": row[2]} if row else None
+        except sqlite3.OperationalError:
+            cursor.execute("SELECT decks FROM col")
+            decks_json = cursor.fetchone()[0]
+            decks = json.loads(decks_json)
+            deck_info = decks.get(str(deck_id))
 
         conn.close()
 
-        deck_info = decks.get(str(deck_id))
-
         return {
             "success": True,
             "exists": deck_info is not None,
@@ -0,0 +1,80 @@
+"""
+test_delete_deck.py — Unit tests for DELETE /decks/<id> (chunked, set-based deletion).
+
+Run from /server:
+    python -m unittest test_delete_deck.py -v
+"""
+import os
+import sqlite3
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import app as server_app  # noqa: E402
+from user_db_test_case import UserDbTestCase  # noqa: E402
+
+
+class DeleteDeckTestCase(UserDbTestCase):
+
+    user_name = 'Delete Test'
+    username = 'delete_test'
+
+    def setUp(self):
+        super().setUp()
+
+    def test_deletes_cards_notes_and_writes_graves(self):
+        card_ids = {row[0] for row in self._query("SELECT id FROM cards WHERE did = 2")}
+        note_ids = {row[0] for row in self._query("SELECT nid FROM cards WHERE did = 2")}
+
+        response = self.client.delete('/decks/2')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f"{len(card_ids)} cards", response.get_json()['message'])
+
+        self.assertEqual(self._query("SELECT COUNT(*) FROM cards WHERE did = 2")[0][0], 0)
+        self.assertEqual(self._query("SELECT COUNT(*) FROM notes")[0][0], 0)
+        graves = self._query("SELECT oid, type FROM graves")
+        self.assertEqual({oid for oid, t in graves if t == 0}, card_ids)
+        self.assertEqual({oid for oid, t in graves if t == 1}, note_ids)
+        self.assertEqual([oid for oid, t in graves if t == 2], [2])
+        self.assertEqual(self._query("SELECT id FROM decks WHERE id = 2"), [])
+
+    def test_small_chunks_and_shared_notes(self):
+        # Give one note a second card in deck 1: the note must survive the deck 2 deletion
+        nid = self._query("SELECT nid FROM cards WHERE did = 2 LIMIT 1")[0][0]
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            INSERT INTO cards (id, nid, did, ord, mod, usn, type, queue, due, ivl, factor, reps, lapses, left, odue, odid, flags, data)
+            VALUES (1, ?, 1, 1, 0, -1, 0, 0, 0, 0, 2500, 0, 0, 0, 0, 0, 0, '')
+        """, (nid,))
+        conn.commit()
+        conn.close()
+
+        cards, notes = None, None
+        conn = sqlite3.connect(self.db_path)
+        try:
+            cards, notes = server_app._deleteDeckCards(conn, 2, chunkSize=7)
+        finally:
+            conn.close()
+
+        self.assertEqual(cards, 108)
+        self.assertEqual(notes, 107)
+        self.assertEqual(self._query("SELECT id FROM notes"), [(nid,)])
+        self.assertEqual(self._query("SELECT COUNT(*) FROM cards")[0][0], 1)
+
+    def test_revlog_is_kept_by_default(self):
+        cid = self._query("SELECT id FROM cards WHERE did = 2 LIMIT 1")[0][0]
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO revlog (id, cid, usn, ease, ivl, lastIvl, factor, time, type) "
+                     "VALUES (1, ?, -1, 3, 1, 0, 2500, 5000, 0)", (cid,))
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self.client.delete('/decks/2').status_code, 200)
+        self.assertEqual(self._query("SELECT COUNT(*) FROM revlog")[0][0], 1)
+
+    def test_unknown_deck_is_404(self):
+        self.assertEqual(self.client.delete('/decks/999').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+test_due_queue_cache.py — Unit tests for the in-memory due queues used by GET /review.
+
+Run from /server:
+    python -m unittest test_due_queue_cache.py -v
+"""
+import os
+import time
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import app as server_app  # noqa: E402
+import due_queue_cache  # noqa: E402
+from due_queue_cache import DueQueueCache, DueQueues, LEARN, NEW, REVIEW  # noqa: E402
+from user_db_test_case import UserDbTestCase  # noqa: E402
+
+
+class DueQueuesTestCase(unittest.TestCase):
+
+    def test_priorities_and_due_limits(self):
+        queues = DueQueues(deck_id=2, mod=1, day=10, new_seen_today=0)
+        queues.push(1, 0, 1)
+        queues.push(2, 2, 9)
+        queues.push(3, 2, 4)
+        queues.push(4, 1, 5000)
+        self.assertEqual(queues.next_card(now=4000, day=10, allow_new=True), (3, REVIEW))
+        self.assertEqual(queues.next_card(now=5000, day=10, allow_new=True), (4, LEARN))
+        self.assertEqual(queues.next_card(now=0, day=0, allow_new=True), (1, NEW))
+        self.assertIsNone(queues.next_card(now=0, day=0, allow_new=False))
+
+    def test_moves_and_removals_are_lazy_but_exact(self):
+        queues = DueQueues(deck_id=2, mod=1, day=10, new_seen_today=0)
+        for card_id in range(100):
+            queues.push(card_id, 2, card_id)
+        queues.push(0, 2, 50)  # answered: pushed back to day 50
+        queues.remove(1)
+        queues.push(2, -1, 0)  # suspended
+        self.assertEqual(queues.next_card(now=0, day=100, allow_new=False), (3, REVIEW))
+        self.assertEqual(len(queues), 98)
+
+        for card_id in range(3, 90):
+            queues.remove(card_id)
+        self.assertLessEqual(sum(len(heap) for heap in queues._heaps.values()), 2 * len(queues) + 1)
+        self.assertEqual(queues.next_card(now=0, day=100, allow_new=False), (0, REVIEW))
+
+    def test_update_card_drops_cards_moved_to_other_decks(self):
+        queues = DueQueues(deck_id=2, mod=1, day=10, new_seen_today=0)
+        queues.update_card(7, 2, 0, 7)
+        self.assertIn(7, queues)
+        queues.update_card(7, 3, 0, 7)
+        self.assertNotIn(7, queues)
+
+
+class DueQueueCacheTestCase(unittest.TestCase):
+
+    def test_lru_bound(self):
+        cache = DueQueueCache(max_users=2)
+        for user_id in (1, 2):
+            cache.put(user_id, DueQueues(1, 0, 0, 0))
+        self.assertIsNotNone(cache.get(1, 1, 0, 0))  # 1 is now most recent
+        cache.put(3, DueQueues(1, 0, 0, 0))
+        self.assertIsNone(cache.get(2, 1, 0, 0))
+        self.assertIsNotNone(cache.get(1, 1, 0, 0))
+        self.assertEqual(len(cache), 2)
+
+    def test_get_drops_entries_for_another_mod_deck_or_day(self):
+        cache = DueQueueCache(max_users=5)
+        for key in ((2, 5, 0), (1, 6, 0), (1, 5, 1)):
+            cache.put(1, DueQueues(1, 5, 0, 0))
+            self.assertIsNone(cache.get(1, *key))
+            self.assertEqual(len(cache), 0)
+
+    def test_apply_only_on_current_queues(self):
+        cache = DueQueueCache(max_users=5)
+        cache.put(1, DueQueues(1, 5, 0, 0))
+        cache.apply(1, 5, 6, lambda queues: queues.push(10, 0, 10))
+        queues = cache.get(1, 1, 6, 0)
+        self.assertIn(10, queues)
+
+        # Queues that missed a write are dropped instead of patched
+        cache.apply(1, 7, 8, lambda queues: queues.push(11, 0, 11))
+        self.assertIsNone(cache.get(1, 1, 8, 0))
+
+
+class ReviewWithDueQueuesTestCase(UserDbTestCase):
+
+    user_name = 'Queue Test'
+    username = 'queue_test'
+
+    def setUp(self):
+        super().setUp()
+        self._execute("UPDATE col_config SET value = '2' WHERE key = 'curDeck'")
+
+        self.original_cache = server_app._due_queue_cache
+        server_app._due_queue_cache = DueQueueCache(max_users=10)
+
+    def tearDown(self):
+        server_app._due_queue_cache = self.original_cache
+
+    def _cached_queues(self):
+        return server_app._due_queue_cache._users.get(1)
+
+    def test_answers_update_the_cached_queues_in_place(self):
+        card = self.client.get('/review').get_json()
+        queues = self._cached_queues()
+        self.assertEqual(len(queues), 108)
+
+        self.assertEqual(self.client.post('/answer', json={'ease': 3}).status_code, 200)
+        self.assertIs(self._cached_queues(), queues)
+        self.assertEqual(queues.new_seen_today, 1)
+        (mod,) = self._execute("SELECT mod FROM col")[0]
+        self.assertEqual(queues.mod, mod)
+        self.assertEqual(queues._entries[card['cardId']][0], due_queue_cache.LEARN)
+
+        next_card = self.client.get('/review').get_json()
+        self.assertNotEqual(next_card['cardId'], card['cardId'])
+        self.assertIs(self._cached_queues(), queues)
+
+    def test_add_and_delete_card_update_the_queues(self):
+        self.client.get('/review')
+        queues = self._cached_queues()
+        time.sleep(1.2)  # /add_card ids are whole-second timestamps; step past the seeded notes' ids
+        card_id = self.client.post('/add_card', json={'front': 'f', 'back': 'b'}).get_json()['card_id']
+        self.assertIn(card_id, queues)
+        self.assertEqual(self.client.delete(f'/cards/{card_id}').status_code, 200)
+        self.assertNotIn(card_id, queues)
+        self.assertIs(self._cached_queues(), queues)
+
+    def test_external_change_rebuilds_the_queues(self):
+        self.client.get('/review')
+        queues = self._cached_queues()
+        card_id = self._execute("SELECT id FROM cards LIMIT 1")[0][0]
+        self._execute("UPDATE cards SET type = 2, queue = 2, due = 0, ivl = 1 WHERE id = ?", (card_id,))
+        self._execute("UPDATE col SET mod = mod + 1")
+
+        card = self.client.get('/review').get_json()
+        self.assertEqual(card['cardId'], card_id)
+        self.assertIsNot(self._cached_queues(), queues)
+
+    def test_out_of_date_queues_fall_back_to_sql(self):
+        self.client.get('/review')
+        # A write that (wrongly) leaves col.mod alone
+        self._execute("UPDATE cards SET queue = -1")
+        response = self.client.get('/review').get_json()
+        self.assertNotIn('cardId', response)
+        self.assertIsNone(self._cached_queues())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+test_revlog_archive.py — Unit tests for the revlog archive tier (user_db_revlog_archive.py).
+
+Run from /server:
+    python -m unittest test_revlog_archive.py -v
+"""
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import unittest
+import zipfile
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import user_db_revlog_archive as archive  # noqa: E402
+from user_db_test_case import UserDbTestCase  # noqa: E402
+
+DAY_MS = 86400 * 1000
+NOW_MS = int(time.time() * 1000)
+
+
+class RevlogArchiveTestCase(UserDbTestCase):
+
+    user_name = 'Archive Test'
+    username = 'archive_test'
+
+    def setUp(self):
+        super().setUp()
+
+        # 60 days of history on 10 cards, two answers per card per day, one of them a lapse
+        conn = sqlite3.connect(self.db_path)
+        card_ids = [row[0] for row in conn.execute("SELECT id FROM cards ORDER BY id LIMIT 10")]
+        rows = []
+        for day in range(60):
+            for n, card_id in enumerate(card_ids):
+                base = NOW_MS - (60 - day) * DAY_MS + n * 1000
+                rows.append((base, card_id, 1, 1, 0, 2500, 4000, 1))
+                rows.append((base + 500, card_id, 3, day + 1, 1, 2500, 6000, 1))
+        conn.executemany("""
+            INSERT INTO revlog (id, cid, ease, ivl, lastIvl, factor, time, type, usn) VALUES (?,?,?,?,?,?,?,?,0)
+        """, rows)
+        conn.commit()
+        conn.close()
+        self.card_ids = card_ids
+        self.horizon = NOW_MS - 30 * DAY_MS
+
+    def _full_history(self, conn):
+        return [tuple(row) for row in conn.execute(
+            f"SELECT {', '.join(archive.REVLOG_ROW_COLUMNS)} FROM revlog ORDER BY id")]
+
+    def test_archive_keeps_history_and_summaries(self):
+        conn = sqlite3.connect(self.db_path)
+        history = self._full_history(conn)
+        summary = archive.card_summary(conn, self.card_ids[0])
+        days = archive.day_summaries(conn, 0, 10 ** 6)
+
+        report = archive.archive_revlog(conn, self.horizon)
+        self.assertEqual(report['archived_rows'], sum(1 for row in history if row[0] < self.horizon))
+        self.assertEqual(report['cards'], 10)
+        self.assertEqual(report['hot_rows_after'], conn.execute("SELECT COUNT(*) FROM revlog").fetchone()[0])
+        self.assertLess(report['hot_rows_after'], report['hot_rows_before'])
+        if report['revlog_bytes_before'] is not None:
+            self.assertLess(report['revlog_bytes_after'], report['revlog_bytes_before'])
+
+        self.assertEqual(list(archive.iter_revlog(conn)), history)
+        self.assertEqual(list(archive.iter_revlog(conn, self.horizon - DAY_MS, self.horizon + DAY_MS)),
+                         [row for row in history if self.horizon - DAY_MS <= row[0] < self.horizon + DAY_MS])
+        self.assertEqual(archive.card_summary(conn, self.card_ids[0]), summary)
+        self.assertEqual(summary['reviews'], 120)
+        self.assertEqual(summary['lapses'], 60)
+        self.assertEqual(archive.day_summaries(conn, 0, 10 ** 6), days)
+
+        # A second run later on adds to the summaries instead of replacing them
+        archive.archive_revlog(conn, NOW_MS)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM revlog").fetchone()[0], 0)
+        self.assertEqual(archive.card_summary(conn, self.card_ids[0]), summary)
+        self.assertEqual(archive.day_summaries(conn, 0, 10 ** 6), days)
+        self.assertEqual(list(archive.iter_revlog(conn)), history)
+        conn.close()
+
+    def test_export_and_sync_include_archived_rows(self):
+        conn = sqlite3.connect(self.db_path)
+        history = self._full_history(conn)
+        archive.archive_revlog(conn, self.horizon)
+        conn.close()
+
+        pulled = self.client.get('/sync').get_json()['revlog']['rows']
+        self.assertEqual(len(pulled), len(history))
+
+        response = self.client.get('/export')
+        self.assertEqual(response.status_code, 200)
+        export_path = os.path.join(self.test_dir, 'collection.anki2')
+        with zipfile.ZipFile(io.BytesIO(response.data)) as package:
+            with open(export_path, 'wb') as f:
+                f.write(package.read('collection.anki2'))
+        conn = sqlite3.connect(export_path)
+        self.assertEqual(self._full_history(conn), history)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        self.assertFalse(tables & set(archive.ARCHIVE_TABLES))
+
+    def test_maintenance_tool_archives_and_reports(self):
+        report_file = os.path.join(self.test_dir, 'report.jsonl')
+        os.utime(self.db_path, (time.time() - 3600, time.time() - 3600))
+        subprocess.run([
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools', 'db_maintenance.py'),
+            '--once', '--user-db-dir', self.test_dir, '--session-dir', '',
+            '--state-file', os.path.join(self.test_dir, 'state.json'), '--report-file', report_file,
+            '--archive-revlog-days', '30', '--archive-min-rows', '1', '--active-minutes', '5', '--pause-ms', '0',
+        ], check=True, capture_output=True)
+
+        with open(report_file) as f:
+            summary = json.loads(f.readline())
+        self.assertEqual(summary['archived_dbs'], 1)
+        self.assertEqual(summary['revlog_rows_before'], 1200)
+        self.assertEqual(summary['revlog_rows_after'], 1200 - summary['archived_rows'])
+        self.assertGreater(summary['archived_rows'], 500)
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(conn.execute("SELECT SUM(n) FROM revlog_archive").fetchone()[0], summary['archived_rows'])
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
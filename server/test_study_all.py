@@ -0,0 +1,94 @@
+"""
+test_study_all.py — Unit tests for the cross-deck review mode (GET /review?decks=...).
+
+Run from /server:
+    python -m unittest test_study_all.py -v
+"""
+import os
+import sqlite3
+import time
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import app as server_app  # noqa: E402
+import user_db_decks  # noqa: E402
+from user_db_test_case import UserDbTestCase  # noqa: E402
+
+SMALL_DECK_ID = 3
+SMALL_DECK_CARDS = [900001, 900002, 900003]
+
+
+class StudyAllTestCase(UserDbTestCase):
+
+    user_name = 'Study All Test'
+    username = 'study_all_test'
+
+    def setUp(self):
+        super().setUp()
+        self._add_small_deck()
+
+    def _add_small_deck(self):
+        """Deck 3 with three new cards and its own dconf allowing one new card per day."""
+        conn = sqlite3.connect(self.db_path)
+        user_db_decks.add_deck(conn, SMALL_DECK_ID, 'Small', conf=2)
+        options = user_db_decks.load_deck_configs(conn)['1']
+        options.update(id=2)
+        options['new']['perDay'] = 1
+        user_db_decks.put_deck_config(conn, options)
+        for card_id in SMALL_DECK_CARDS:
+            conn.execute("INSERT INTO notes (id, guid, mid, mod, usn, tags, flds, sfld, csum, flags, data) "
+                         "VALUES (?, ?, 1, 0, -1, '', ?, ?, 0, 0, '')",
+                         (card_id, f"g{card_id}", f"small {card_id}\x1fback", f"small {card_id}"))
+            conn.execute("INSERT INTO cards (id, nid, did, ord, mod, usn, type, queue, due, ivl, factor, reps, "
+                         "lapses, left, odue, odid, flags, data) "
+                         "VALUES (?, ?, ?, 0, 0, -1, 0, 0, ?, 0, 2500, 0, 0, 0, 0, 0, 0, '')",
+                         (card_id, card_id, SMALL_DECK_ID, card_id))
+        conn.commit()
+        conn.close()
+
+    def _log_today(self, card_id, log_type, offset=0):
+        review_id = int(time.time() * 1000) + offset
+        self._execute("INSERT INTO revlog (id, cid, usn, ease, ivl, lastIvl, factor, time, type) "
+                      "VALUES (?, ?, -1, 3, 0, 0, 2500, 1000, ?)", (review_id, card_id, log_type))
+
+    def test_due_review_card_from_any_deck_comes_before_new(self):
+        self._execute("UPDATE cards SET type = 2, queue = 2, due = 0, ivl = 3 WHERE id = ?", (SMALL_DECK_CARDS[0],))
+        card = self.client.get('/review?decks=all').get_json()
+        self.assertEqual((card['cardId'], card['deckId'], card['deckName']), (SMALL_DECK_CARDS[0], 3, 'Small'))
+
+        # The current deck is untouched
+        conn = sqlite3.connect(self.db_path)
+        self.assertEqual(user_db_decks.current_deck_id(conn), 1)
+        conn.close()
+
+    def test_deck_new_limit_from_dconf(self):
+        # Deck 3 already introduced its one new card today
+        self._log_today(SMALL_DECK_CARDS[0], 0)
+        for _ in range(10):
+            card = self.client.get(f'/review?decks=2,{SMALL_DECK_ID}').get_json()
+            self.assertEqual(card['deckId'], 2)
+
+        # Only deck 3 selected: nothing left for today
+        response = self.client.get(f'/review?decks={SMALL_DECK_ID}').get_json()
+        self.assertIn('No cards due', response['message'])
+
+    def test_global_daily_new_limit_still_applies(self):
+        card_id = self._execute("SELECT id FROM cards WHERE did = 2 LIMIT 1")[0][0]
+        for offset in range(server_app.DAILY_NEW_LIMIT):
+            self._log_today(card_id, 0, offset)
+        response = self.client.get('/review?decks=all').get_json()
+        self.assertNotIn('cardId', response)
+
+    def test_learning_cards_ignore_allowances(self):
+        self._log_today(SMALL_DECK_CARDS[0], 0)
+        self._execute("UPDATE cards SET type = 1, queue = 1, due = 0 WHERE id = ?", (SMALL_DECK_CARDS[1],))
+        card = self.client.get(f'/review?decks={SMALL_DECK_ID}').get_json()
+        self.assertEqual(card['cardId'], SMALL_DECK_CARDS[1])
+
+    def test_invalid_selection_is_400(self):
+        self.assertEqual(self.client.get('/review?decks=999,abc').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
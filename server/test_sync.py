@@ -0,0 +1,93 @@
+"""
+test_sync.py — Unit tests for USN change tracking and GET/POST /sync.
+
+Run from /server:
+    python -m unittest test_sync.py -v
+"""
+import os
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import user_db_sync  # noqa: E402
+from user_db_test_case import UserDbTestCase  # noqa: E402
+
+
+class SyncTestCase(UserDbTestCase):
+
+    user_name = 'Sync Test'
+    username = 'sync_test'
+
+    def setUp(self):
+        super().setUp()
+
+    def _pull(self, since=None):
+        url = '/sync' if since is None else f'/sync?since={since}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.get_json()
+
+    def test_full_then_incremental_pull(self):
+        total_cards = self._execute("SELECT COUNT(*) FROM cards")[0][0]
+        full = self._pull()
+        self.assertEqual(len(full['cards']['rows']), total_cards)
+        self.assertEqual(full['cards']['columns'], list(user_db_sync.CARD_COLUMNS))
+        self.assertIn('models', full['col'])
+
+        # Nothing changed: no rows, same high-water mark
+        idle = self._pull(full['usn'])
+        self.assertEqual((idle['usn'], idle['cards']['rows']), (full['usn'], []))
+
+        card_id = self._execute("SELECT id FROM cards LIMIT 1")[0][0]
+        self._execute("UPDATE cards SET queue = -1, usn = -1 WHERE id = ?", (card_id,))
+        (usn,) = self._execute("SELECT usn FROM cards WHERE id = ?", (card_id,))[0]
+        self.assertGreater(usn, full['usn'])
+
+        delta = self._pull(full['usn'])
+        self.assertEqual([row[0] for row in delta['cards']['rows']], [card_id])
+        self.assertEqual(delta['notes']['rows'], [])
+        self.assertNotIn('models', delta['col'])
+        self.assertEqual(self._pull(delta['usn'])['cards']['rows'], [])
+
+    def test_deleted_card_is_pulled_as_grave(self):
+        since = self._pull()['usn']
+        card_id, note_id = self._execute("SELECT id, nid FROM cards LIMIT 1")[0]
+        self.assertEqual(self.client.delete(f'/cards/{card_id}').status_code, 200)
+        graves = self._pull(since)['graves']['rows']
+        self.assertEqual(sorted(graves), sorted([[card_id, 0], [note_id, 1]]))
+
+    def test_push_is_last_writer_wins(self):
+        columns = list(user_db_sync.NOTE_COLUMNS)
+        note = list(self._execute(f"SELECT {', '.join(columns)} FROM notes LIMIT 1")[0])
+        newer, older = list(note), list(note)
+        newer[columns.index('flds')] = 'edited offline\x1fback'
+        newer[columns.index('mod')] = note[columns.index('mod')] + 10
+        older[columns.index('flds')] = 'stale edit\x1fback'
+        older[columns.index('mod')] = note[columns.index('mod')] - 10
+
+        response = self.client.post('/sync', json={'notes': {'columns': columns, 'rows': [older]}})
+        self.assertEqual(response.get_json()['notes'], {'applied': 0, 'skipped': 1})
+        response = self.client.post('/sync', json={'notes': {'columns': columns, 'rows': [newer]}})
+        self.assertEqual(response.get_json()['notes'], {'applied': 1, 'skipped': 0})
+        self.assertEqual(self._execute("SELECT flds FROM notes WHERE id = ?", (note[0],))[0][0],
+                         'edited offline\x1fback')
+
+    def test_push_revlog_and_graves(self):
+        card_id, note_id = self._execute("SELECT id, nid FROM cards LIMIT 1")[0]
+        review = [1700000000123, card_id, 3, 1, 0, 2500, 4000, 0]
+        body = {
+            'revlog': {'columns': list(user_db_sync.REVLOG_COLUMNS), 'rows': [review, review]},
+            'graves': {'columns': ['oid', 'type'], 'rows': [[note_id, 1]]},
+        }
+        summary = self.client.post('/sync', json=body).get_json()
+        self.assertEqual(summary['revlog'], {'applied': 1, 'skipped': 1})
+        self.assertEqual(summary['graves'], {'applied': 1, 'skipped': 0})
+        self.assertEqual(self._execute("SELECT COUNT(*) FROM cards WHERE nid = ?", (note_id,))[0][0], 0)
+
+    def test_malformed_push_is_400(self):
+        self.assertEqual(self.client.post('/sync', json={'cards': {'columns': ['id'], 'rows': [[1]]}}).status_code, 400)
+        self.assertEqual(self.client.post('/sync', json=[1, 2]).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
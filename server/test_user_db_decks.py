@@ -0,0 +1,79 @@
+"""
+test_user_db_decks.py — Unit tests for the deck registry tables (user_db_decks.py).
+
+Run from /server:
+    python -m unittest test_user_db_decks.py -v
+"""
+import io
+import json
+import os
+import sqlite3
+import unittest
+import zipfile
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import user_db_decks  # noqa: E402
+import user_db_migrations  # noqa: E402
+from user_db_test_case import UserDbTestCase  # noqa: E402
+
+
+class DeckRegistryTestCase(UserDbTestCase):
+
+    user_name = 'Registry Test'
+    username = 'registry_test'
+    initial_cards = False
+
+    def setUp(self):
+        super().setUp()
+
+    def test_migration_imports_the_col_json(self):
+        conn = sqlite3.connect(self.db_path)
+        user_db_decks.drop_tables(conn)
+        decks = json.loads(conn.execute("SELECT decks FROM col").fetchone()[0])
+        decks['7'] = dict(decks['1'], id=7, name='Legacy')
+        conn.execute("UPDATE col SET decks = ?, conf = json_set(conf, '$.curDeck', 7)", (json.dumps(decks),))
+        conn.execute("PRAGMA user_version = 2")
+        conn.commit()
+
+        user_db_migrations.migrate(conn)
+        self.assertEqual(user_db_decks.get_deck(conn, 7)['name'], 'Legacy')
+        self.assertEqual(user_db_decks.current_deck_id(conn), 7)
+        self.assertEqual(user_db_decks.get_deck_options(conn, 7)['rev']['perDay'], 100)
+        conn.close()
+
+    def test_deck_routes_write_rows_not_the_col_json(self):
+        col_json = self._query("SELECT decks, conf FROM col")
+        deck_id = self.client.post('/decks', json={'name': 'Ação'}).get_json()['id']
+        self.assertEqual(self.client.post('/decks', json={'name': 'AÇÃO'}).status_code, 409)
+        self.assertEqual(self.client.put(f'/decks/{deck_id}/rename', json={'name': 'Revisão'}).status_code, 200)
+        self.assertEqual(self.client.put('/decks/current', json={'deckId': deck_id}).status_code, 200)
+        self.assertEqual(self.client.put('/decks/current', json={'deckId': 999}).status_code, 404)
+
+        self.assertIn({'id': deck_id, 'name': 'Revisão'}, self.client.get('/decks').get_json())
+        self.assertEqual(self._query("SELECT value FROM col_config WHERE key = 'curDeck'"), [(deck_id,)])
+        self.assertEqual(self._query("SELECT decks, conf FROM col"), col_json)
+
+    def test_export_and_sync_see_the_registry(self):
+        self.client.put('/decks/2/rename', json={'name': 'Tenses'})
+
+        pulled = json.loads(self.client.get('/sync').get_json()['col']['decks'])
+        self.assertEqual(pulled['2']['name'], 'Tenses')
+
+        response = self.client.get('/export')
+        self.assertEqual(response.status_code, 200)
+        export_path = os.path.join(self.test_dir, 'collection.anki2')
+        with zipfile.ZipFile(io.BytesIO(response.data)) as package:
+            with open(export_path, 'wb') as f:
+                f.write(package.read('collection.anki2'))
+        conn = sqlite3.connect(export_path)
+        decks = json.loads(conn.execute("SELECT decks FROM col").fetchone()[0])
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        self.assertEqual(decks['2']['name'], 'Tenses')
+        self.assertEqual(decks['2']['desc'], 'English verb tenses sample deck for Registry Test')
+        self.assertFalse(tables & set(user_db_decks.REGISTRY_TABLES))
+
+
+if __name__ == '__main__':
+    unittest.main()
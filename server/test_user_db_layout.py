@@ -0,0 +1,75 @@
+"""
+test_user_db_layout.py — Unit tests for the sharded user_dbs/ layout.
+
+Run from /server:
+    python -m unittest test_user_db_layout.py -v
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import app as server_app  # noqa: E402
+import user_db_layout  # noqa: E402
+
+
+class UserDbLayoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.user_dbs_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.user_dbs_dir, ignore_errors=True)
+
+    def _touch(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+
+    def test_shard_is_id_mod_256_in_hex(self):
+        self.assertEqual(user_db_layout.shard_for(1), '01')
+        self.assertEqual(user_db_layout.shard_for(255), 'ff')
+        self.assertEqual(user_db_layout.shard_for(256), '00')
+        self.assertEqual(user_db_layout.shard_for('257'), '01')
+
+    def test_new_user_resolves_to_shard_and_creates_directory(self):
+        path = user_db_layout.resolve_user_db_path(self.user_dbs_dir, 300, create_dirs=True)
+        self.assertEqual(path, os.path.join(self.user_dbs_dir, '2c', 'user_300.db'))
+        self.assertTrue(os.path.isdir(os.path.dirname(path)))
+
+    def test_legacy_flat_db_is_still_found(self):
+        legacy = os.path.join(self.user_dbs_dir, 'user_7.db')
+        self._touch(legacy)
+        self.assertEqual(user_db_layout.resolve_user_db_path(self.user_dbs_dir, 7), legacy)
+
+    def test_sharded_db_wins_over_legacy(self):
+        self._touch(os.path.join(self.user_dbs_dir, 'user_7.db'))
+        sharded = os.path.join(self.user_dbs_dir, '07', 'user_7.db')
+        self._touch(sharded)
+        self.assertEqual(user_db_layout.resolve_user_db_path(self.user_dbs_dir, 7), sharded)
+
+    def test_iter_user_db_files_covers_both_layouts(self):
+        self._touch(os.path.join(self.user_dbs_dir, 'user_1.db'))
+        self._touch(os.path.join(self.user_dbs_dir, '02', 'user_2.db'))
+        names = sorted(os.path.basename(p) for p in user_db_layout.iter_user_db_files(self.user_dbs_dir))
+        self.assertEqual(names, ['user_1.db', 'user_2.db'])
+
+    def test_get_user_db_path_caches_resolution(self):
+        original_dir = server_app.USER_DBS_DIR
+        server_app.USER_DBS_DIR = self.user_dbs_dir
+        server_app._user_db_path_cache.clear()
+        try:
+            legacy = os.path.join(self.user_dbs_dir, 'user_42.db')
+            server_app.init_anki_db(legacy, user_name='Layout Test')  # a real DB, so its migration check succeeds
+            self.assertEqual(server_app.get_user_db_path(42), legacy)
+            # Once resolved, the path comes from the per-process cache
+            os.remove(legacy)
+            self.assertEqual(server_app.get_user_db_path(42), legacy)
+        finally:
+            server_app.USER_DBS_DIR = original_dir
+            server_app._user_db_path_cache.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+test_user_db_migrations.py — Unit tests for versioned user DB schema migrations.
+
+Run from /server:
+    python -m unittest test_user_db_migrations.py -v
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import app as server_app  # noqa: E402
+import user_db_migrations  # noqa: E402
+import user_db_sync  # noqa: E402
+
+
+def _indexes(db_path):
+    conn = sqlite3.connect(db_path)
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+    return names
+
+
+def _version(db_path):
+    conn = sqlite3.connect(db_path)
+    version = user_db_migrations.get_schema_version(conn)
+    conn.close()
+    return version
+
+
+class UserDbMigrationsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmp_dir, 'user_1.db')
+        server_app.init_anki_db(self.db_path, user_name='Migration Test')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        user_db_migrations._migrated_paths.discard(self.db_path)
+
+    def _downgrade_to_v0(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DROP INDEX ix_revlog_type_id")
+        conn.execute("DROP INDEX ix_revlog_cid_id")
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+        conn.close()
+
+    def test_new_db_is_created_at_latest_version(self):
+        self.assertEqual(_version(self.db_path), user_db_migrations.latest_version())
+        self.assertTrue({'ix_revlog_type_id', 'ix_revlog_cid_id'} <= _indexes(self.db_path))
+
+    def test_old_db_is_migrated_once(self):
+        self._downgrade_to_v0()
+        applied = user_db_migrations.ensure_migrated(self.db_path)
+        self.assertEqual([version for version, _, _ in applied],
+                         list(range(1, user_db_migrations.latest_version() + 1)))
+        self.assertEqual(_version(self.db_path), user_db_migrations.latest_version())
+        self.assertIn('ix_revlog_cid_id', _indexes(self.db_path))
+        # Second call in the same process is a no-op
+        self.assertEqual(user_db_migrations.ensure_migrated(self.db_path), [])
+
+    def test_migrate_is_idempotent_when_version_was_not_recorded(self):
+        # Indexes exist but user_version was lost (e.g. crash between DDL and PRAGMA)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+        applied = user_db_migrations.migrate(conn)
+        conn.close()
+        self.assertEqual(len(applied), user_db_migrations.latest_version())
+        self.assertEqual(_version(self.db_path), user_db_migrations.latest_version())
+
+    def test_usn_triggers_match_the_sync_module(self):
+        # Migration v2 freezes its trigger SQL; user_db_sync must still name what it installs
+        conn = sqlite3.connect(self.db_path)
+        triggers = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+        conn.close()
+        self.assertEqual(triggers, set(user_db_sync.USN_TRIGGERS))
+
+    def test_get_user_db_path_migrates_lazily(self):
+        user_dbs_dir = os.path.join(self.tmp_dir, 'user_dbs')
+        db_path = os.path.join(user_dbs_dir, '05', 'user_5.db')
+        os.makedirs(os.path.dirname(db_path))
+        shutil.move(self.db_path, db_path)
+        self.db_path = db_path
+        self._downgrade_to_v0()
+
+        original_dir = server_app.USER_DBS_DIR
+        server_app.USER_DBS_DIR = user_dbs_dir
+        server_app._user_db_path_cache.clear()
+        try:
+            self.assertEqual(server_app.get_user_db_path(5), db_path)
+            self.assertEqual(_version(db_path), user_db_migrations.latest_version())
+        finally:
+            server_app.USER_DBS_DIR = original_dir
+            server_app._user_db_path_cache.clear()
+
+    def test_failed_migration_is_retried_on_next_request(self):
+        user_dbs_dir = os.path.join(self.tmp_dir, 'user_dbs')
+        db_path = os.path.join(user_dbs_dir, '06', 'user_6.db')
+        os.makedirs(os.path.dirname(db_path))
+        shutil.move(self.db_path, db_path)
+        self.db_path = db_path
+        self._downgrade_to_v0()
+
+        def locked(path, logger=None):
+            raise sqlite3.OperationalError('database is locked')
+
+        original = (server_app.USER_DBS_DIR, user_db_migrations.ensure_migrated)
+        server_app.USER_DBS_DIR = user_dbs_dir
+        server_app._user_db_path_cache.clear()
+        try:
+            user_db_migrations.ensure_migrated = locked
+            self.assertEqual(server_app.get_user_db_path(6), db_path)
+            self.assertNotIn(6, server_app._user_db_path_cache)
+            self.assertEqual(_version(db_path), 0)
+
+            user_db_migrations.ensure_migrated = original[1]
+            self.assertEqual(server_app.get_user_db_path(6), db_path)
+            self.assertEqual(_version(db_path), user_db_migrations.latest_version())
+            self.assertIn(6, server_app._user_db_path_cache)
+        finally:
+            server_app.USER_DBS_DIR, user_db_migrations.ensure_migrated = original
+            server_app._user_db_path_cache.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+test_user_warmup.py — Unit tests for the background warm-up scheduled by /login (user_warmup.py).
+
+Run from /server:
+    python -m unittest test_user_warmup.py -v
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import bcrypt
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import app as server_app  # noqa: E402
+import user_db_layout  # noqa: E402
+from due_queue_cache import DueQueueCache  # noqa: E402
+from user_warmup import WarmupTracker  # noqa: E402
+
+
+class WarmupTrackerTestCase(unittest.TestCase):
+
+    def test_outcomes(self):
+        tracker = WarmupTracker(max_workers=2, wait_s=0.05)
+        release = threading.Event()
+        self.assertTrue(tracker.schedule(1, lambda user_id: None))
+        self.assertTrue(tracker.schedule(2, lambda user_id: release.wait(5)))
+        self.assertFalse(tracker.schedule(2, lambda user_id: None))  # one pending per user
+        self.assertTrue(tracker.schedule(3, lambda user_id: 1 / 0))
+
+        tracker._pending[1].done.wait(5)
+        tracker._pending[3].done.wait(5)
+        self.assertEqual(tracker.claim(1), 'hit')
+        self.assertEqual(tracker.claim(2), 'missed')
+        self.assertEqual(tracker.claim(3), 'failed')
+        self.assertIsNone(tracker.claim(1))
+        release.set()
+
+        stats = tracker.stats()
+        self.assertEqual((stats['scheduled'], stats['skipped'], stats['hit'], stats['missed'], stats['failed']),
+                         (3, 1, 1, 1, 1))
+        self.assertEqual(stats['payoff_rate'], round(1 / 3, 3))
+
+    def test_unclaimed_warmups_expire_as_unused(self):
+        tracker = WarmupTracker(ttl=0)
+        tracker.schedule(1, lambda user_id: None)
+        tracker._pending[1].done.wait(5)
+        stats = tracker.stats()
+        self.assertEqual((stats['unused'], stats['pending']), (1, 0))
+        self.assertIsNone(tracker.claim(1))
+
+
+class LoginWarmupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original = (server_app.ADMIN_DB_PATH, server_app.USER_DBS_DIR, server_app._due_queue_cache,
+                         server_app._login_warmups)
+        server_app.ADMIN_DB_PATH = os.path.join(self.test_dir, 'admin.db')
+        server_app.USER_DBS_DIR = os.path.join(self.test_dir, 'user_dbs')
+        server_app._due_queue_cache = DueQueueCache(max_users=10)
+        server_app._login_warmups = WarmupTracker(wait_s=5)
+        server_app.init_admin_db()
+        conn = sqlite3.connect(server_app.ADMIN_DB_PATH)
+        cursor = conn.execute(
+            "INSERT INTO users (username, name, password_hash, email) VALUES (?, ?, ?, ?)",
+            ('warm', 'Warm Up', bcrypt.hashpw(b'senha12345', bcrypt.gensalt(4)).decode(), 'warm@example.com'))
+        self.user_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+
+        self.db_path = user_db_layout.resolve_user_db_path(server_app.USER_DBS_DIR, self.user_id, create_dirs=True)
+        server_app.init_anki_db(self.db_path, user_name='Warm Up')
+        server_app.add_initial_flashcards(self.db_path, '1700000000001', deck_id=2)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE col_config SET value = '2' WHERE key = 'curDeck'")
+        conn.commit()
+        conn.close()
+        server_app._user_db_path_cache.pop(self.user_id, None)
+
+        server_app.app.config['TESTING'] = True
+        self.client = server_app.app.test_client()
+
+    def tearDown(self):
+        (server_app.ADMIN_DB_PATH, server_app.USER_DBS_DIR, server_app._due_queue_cache,
+         server_app._login_warmups) = self.original
+        server_app._user_db_path_cache.pop(self.user_id, None)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_login_warms_the_first_review(self):
+        r = self.client.post('/login', json={'email': 'warm@example.com', 'password': 'senha12345'})
+        self.assertEqual(r.status_code, 200)
+        server_app._login_warmups._pending[self.user_id].done.wait(5)
+
+        # The warm-up resolved the path and built the due queues the first /review uses
+        self.assertEqual(server_app._user_db_path_cache[self.user_id], self.db_path)
+        queues = server_app._due_queue_cache._users[self.user_id]
+        self.assertEqual(len(queues), 108)
+
+        self.assertIn('cardId', self.client.get('/review').get_json())
+        self.assertIs(server_app._due_queue_cache._users[self.user_id], queues)
+        stats = server_app._login_warmups.stats()
+        self.assertEqual((stats['scheduled'], stats['hit'], stats['pending']), (1, 1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -420,7 +420,7 @@ def fetch_from_s3(
         ]
         tar.extractall(path=str(dest_dir), members=safe_members)
 
-    db_files = list(user_dbs_dir.glob("*.db")) + list(user_dbs_dir.glob("*.anki2"))
+    db_files = glob_user_dbs(user_dbs_dir, "*.db") + glob_user_dbs(user_dbs_dir, "*.anki2")
     print(f"  {len(db_files)} banco(s) de dados de usuários extraídos.")
     return admin_db, user_dbs_dir
 
@@ -521,7 +521,7 @@ def fetch_databases(
             f"Expected {user_dbs_dir} after scp but it does not exist. "
             f"Contents of temp dir: {list(dest_dir.iterdir())}"
         )
-    db_files = list(user_dbs_dir.glob("*.db"))
+    db_files = glob_user_dbs(user_dbs_dir, "*.db")
     print(f"  {len(db_files)} banco(s) de dados de usuários baixados.")
     return dest_dir / "admin.db", user_dbs_dir
 
@@ -555,12 +555,19 @@ def find_user_db(user_dbs_dir: Path, username: str) -> Optional[Path]:
 
 
 def find_user_db_by_id(user_dbs_dir: Path, user_id: int) -> Optional[Path]:
-    p = user_dbs_dir / f"user_{user_id}.db"
-    if p.exists():
-        return p
+    # Sharded layout first (user_dbs/<id % 256 as 2 hex digits>/user_<id>.db), then the flat one
+    for p in (user_dbs_dir / f"{user_id % 256:02x}" / f"user_{user_id}.db",
+              user_dbs_dir / f"user_{user_id}.db"):
+        if p.exists():
+            return p
     return None
 
 
+def glob_user_dbs(user_dbs_dir: Path, pattern: str) -> List[Path]:
+    """Matches pattern in user_dbs/ and in its shard subdirectories (user_dbs/ab/)."""
+    return list(user_dbs_dir.glob(pattern)) + list(user_dbs_dir.glob(f"[0-9a-f][0-9a-f]/{pattern}"))
+
+
 def analyse_user_db(
     db_path: Path,
     start_dt: datetime,
@@ -1120,11 +1127,11 @@ def main():
         already_cached  = (
             cached_admin.exists()
             and cached_user_dbs.is_dir()
-            and any(cached_user_dbs.glob("*.db"))
+            and any(glob_user_dbs(cached_user_dbs, "*.db"))
         )
 
         if already_cached and not args.refresh:
-            db_count = len(list(cached_user_dbs.glob("*.db")))
+            db_count = len(glob_user_dbs(cached_user_dbs, "*.db"))
             print(f"  Usando cache em {fetch_dir}  ({db_count} BDs de usuários)")
             print("  (use --refresh para forçar novo download)")
         else:
@@ -1193,15 +1200,15 @@ def main():
             cached_admin.exists()
             and cached_user_dbs.is_dir()
             and (
-                any(cached_user_dbs.glob("*.db"))
-                or any(cached_user_dbs.glob("*.anki2"))
+                any(glob_user_dbs(cached_user_dbs, "*.db"))
+                or any(glob_user_dbs(cached_user_dbs, "*.anki2"))
             )
         )
 
         if already_cached and not args.refresh and not args.list_slots:
             db_count = (
-                len(list(cached_user_dbs.glob("*.db")))
-                + len(list(cached_user_dbs.glob("*.anki2")))
+                len(glob_user_dbs(cached_user_dbs, "*.db"))
+                + len(glob_user_dbs(cached_user_dbs, "*.anki2"))
             )
             print(f"  Usando cache em {fetch_dir}  ({db_count} BDs de usuários)")
             print("  (use --refresh para forçar novo download)")
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+db_maintenance.py — Off-peak VACUUM/ANALYZE maintenance for per-user databases.
+
+Deleting decks and cards leaves free pages inside user DBs, and nothing ever
+collects planner statistics. This worker walks user_dbs/ once a day and, for
+each DB:
+
+  - reclaims free pages when freelist_count / page_count is high
+    (PRAGMA incremental_vacuum; a DB still in auto_vacuum=NONE mode gets one
+    full VACUUM that switches it to INCREMENTAL, so later runs are cheap);
+  - runs ANALYZE when the DB has no statistics yet, has grown by --growth since
+    the last ANALYZE, or its statistics are older than --stats-max-age-days;
+  - runs PRAGMA optimize on every DB it opens, including those needing nothing else;
+  - with --archive-revlog-days N, moves revlog rows older than N days into the
+    compressed archive tables (user_db_revlog_archive.py) once at least
+    --archive-min-rows are due, then vacuums the pages that frees.
+
+Schedule: between --window-start and --window-end UTC (default 05:05–05:55),
+i.e. right after the 05:00 UTC day rollover (02:00 BRT) and before the 06:00 UTC
+backup, so the backup never tars a DB mid-VACUUM.
+
+Safety / rate limiting:
+  - DBs whose owner has a recent Flask session file, or that were written in the
+    last --active-minutes, are skipped (the student may be studying).
+  - Locks are taken with a short timeout; a busy DB is skipped, not waited on.
+  - At most --max-dbs DBs are maintained per run, with --pause-ms between them,
+    and the run stops when the window closes.
+
+Per-DB state (size and time of the last ANALYZE) is kept in
+maintenance_state.json next to user_dbs/. Each run appends a JSON line with the
+bytes reclaimed and the revlog rows/bytes before and after archiving to
+maintenance_report.jsonl.
+
+Usage (from server/):
+    python tools/db_maintenance.py --once --dry-run          # list candidates now
+    python tools/db_maintenance.py --once                    # one run now, ignoring the window
+    python tools/db_maintenance.py                           # daemon: run every day in the window
+    python tools/db_maintenance.py --once --archive-revlog-days 120
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import user_db_layout  # noqa: E402
+import user_db_revlog_archive  # noqa: E402
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+AUTO_VACUUM_INCREMENTAL = 2
+DAY_ROLLOVER_UTC = user_db_revlog_archive.DAY_ROLLOVER_UTC
+
+
+def log(msg):
+    print(f"[maintenance] {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')}Z {msg}", flush=True)
+
+
+# ---------------------------------------------------------------------------
+# Activity detection
+# ---------------------------------------------------------------------------
+
+def _read_session_user_id(path):
+    """user_id stored in a Flask-Session (cachelib) file, or None. Same format as manage_users.py."""
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        idx = raw.find(b'\x80')  # cachelib header precedes the pickle PROTO opcode
+        if idx == -1:
+            return None
+        data = pickle.loads(raw[idx:])
+        return data.get('user_id') if isinstance(data, dict) else None
+    except Exception:
+        return None
+
+
+def recently_active_user_ids(session_dir, active_seconds, now):
+    """User ids with a session file touched in the last active_seconds."""
+    active = set()
+    if not session_dir or not os.path.isdir(session_dir):
+        return active
+    for entry in os.scandir(session_dir):
+        if entry.is_file() and now - entry.stat().st_mtime <= active_seconds:
+            user_id = _read_session_user_id(entry.path)
+            if user_id is not None:
+                active.add(int(user_id))
+    return active
+
+
+def _db_written_recently(db_path, active_seconds, now):
+    for suffix in ('', '-wal', '-journal'):
+        try:
+            if now - os.stat(db_path + suffix).st_mtime <= active_seconds:
+                return True
+        except FileNotFoundError:
+            pass
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Inspection and maintenance of one DB
+# ---------------------------------------------------------------------------
+
+def archive_horizon_ms(now, days):
+    """revlog id (ms) of the start of the study day `days` days before the current one."""
+    today = int(now - DAY_ROLLOVER_UTC) // 86400
+    return ((today - days) * 86400 + DAY_ROLLOVER_UTC) * 1000
+
+
+def inspect_db(conn, archive_before_ms=None):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    auto_vacuum = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    has_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone() is not None
+    return {
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist,
+        'free_ratio': freelist / page_count if page_count else 0.0,
+        'size_bytes': page_size * page_count,
+        'auto_vacuum': auto_vacuum,
+        'has_stats': has_stats,
+        # revlog.id is the primary key, so this is a range count
+        'archivable_revlog': conn.execute(
+            "SELECT COUNT(*) FROM revlog WHERE id < ?", (archive_before_ms,)).fetchone()[0]
+        if archive_before_ms else 0,
+    }
+
+
+def plan_db(info, state, args, now):
+    """Decide what to do with one DB. Returns (archive, vacuum, analyze, reasons)."""
+    reasons = []
+    # Small batches would leave many tiny per-card blobs; wait until enough rows are due
+    archive = bool(args.archive_revlog_days) and info['archivable_revlog'] >= args.archive_min_rows
+    if archive:
+        reasons.append(f"{info['archivable_revlog']} revlog rows older than {args.archive_revlog_days} day(s)")
+    free_bytes = info['freelist_count'] * info['page_size']
+    vacuum = info['free_ratio'] >= args.min_free_ratio and free_bytes >= args.min_free_bytes
+    if vacuum:
+        reasons.append(f"{info['free_ratio']:.0%} free ({free_bytes // 1024} KiB)")
+    vacuum = vacuum or archive  # archiving frees the revlog pages it moved out
+
+    analyze = False
+    if not info['has_stats']:
+        analyze = True
+        reasons.append('no statistics')
+    elif state:
+        if state.get('analyzed_size') and info['size_bytes'] >= state['analyzed_size'] * (1 + args.growth):
+            analyze = True
+            reasons.append(f"grew {info['size_bytes'] / state['analyzed_size'] - 1:.0%} since ANALYZE")
+        elif now - state.get('analyzed_at', 0) >= args.stats_max_age_days * 86400:
+            analyze = True
+            reasons.append('statistics older than '
+                           f"{args.stats_max_age_days} day(s)")
+    return archive, vacuum, analyze, reasons
+
+
+def maintain_db(conn, info, vacuum, analyze, archive_before_ms=None):
+    """
+    Run the planned work (archiving first when archive_before_ms is given).
+    Returns a dict with what was done, bytes reclaimed and the archive report.
+    """
+    done = []
+    reclaimed = 0
+    archive = None
+    if archive_before_ms:
+        archive = user_db_revlog_archive.archive_revlog(conn, archive_before_ms)
+        done.append(f"archive_revlog({archive['archived_rows']} rows)")
+    if vacuum:
+        if info['auto_vacuum'] != AUTO_VACUUM_INCREMENTAL:
+            # One-time conversion: auto_vacuum can only change with a full VACUUM
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            done.append('vacuum(convert-incremental)')
+        else:
+            # Frees one page per sqlite3_step(); execute() steps only once, executescript() runs it to the end
+            conn.executescript("PRAGMA incremental_vacuum;")
+            done.append('incremental_vacuum')
+        # Measured before ANALYZE, whose sqlite_stat1 table adds a page or two
+        reclaimed = info['size_bytes'] - inspect_db(conn)['size_bytes']
+    if analyze:
+        conn.execute("ANALYZE")
+        done.append('analyze')
+    conn.execute("PRAGMA optimize")
+    done.append('optimize')
+
+    return {'actions': done, 'size_after': inspect_db(conn)['size_bytes'], 'reclaimed_bytes': reclaimed,
+            'archive': archive}
+
+
+# ---------------------------------------------------------------------------
+# Runs
+# ---------------------------------------------------------------------------
+
+def _load_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_state(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def run_once(args, deadline=None):
+    now = time.time()
+    state = _load_state(args.state_file)
+    active_users = recently_active_user_ids(args.session_dir, args.active_minutes * 60, now)
+
+    summary = {
+        'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'dry_run': args.dry_run,
+        'scanned': 0, 'maintained': 0, 'optimized': 0, 'skipped_active': 0, 'skipped_busy': 0,
+        'vacuumed': 0, 'analyzed': 0, 'bytes_before': 0, 'bytes_after': 0, 'reclaimed_bytes': 0,
+        'archived_dbs': 0, 'archived_rows': 0, 'revlog_rows_before': 0, 'revlog_rows_after': 0,
+        'revlog_bytes_before': 0, 'revlog_bytes_after': 0,
+    }
+    archive_before_ms = archive_horizon_ms(now, args.archive_revlog_days) if args.archive_revlog_days else None
+    started = time.perf_counter()
+
+    for db_path in user_db_layout.iter_user_db_files(args.user_db_dir, 'user_*.db'):
+        if summary['maintained'] >= args.max_dbs:
+            log(f"Reached --max-dbs={args.max_dbs}, stopping")
+            break
+        if deadline and time.time() >= deadline:
+            log("Off-peak window closed, stopping")
+            break
+
+        match = user_db_layout.USER_DB_FILENAME_RE.match(os.path.basename(db_path))
+        user_id = int(match.group(1)) if match else None
+        summary['scanned'] += 1
+        if user_id in active_users or _db_written_recently(db_path, args.active_minutes * 60, time.time()):
+            summary['skipped_active'] += 1
+            continue
+
+        key = os.path.relpath(db_path, args.user_db_dir)
+        try:
+            conn = sqlite3.connect(db_path, timeout=args.lock_timeout, isolation_level=None)
+        except sqlite3.Error as e:
+            log(f"Cannot open {key}: {e}")
+            continue
+        try:
+            info = inspect_db(conn, archive_before_ms)
+            archive, vacuum, analyze, reasons = plan_db(info, state.get(key), args, now)
+            if not (archive or vacuum or analyze):
+                if not args.dry_run:
+                    conn.execute("PRAGMA optimize")
+                    summary['optimized'] += 1
+                continue
+            if args.dry_run:
+                log(f"Would maintain {key} ({info['size_bytes'] // 1024} KiB): {', '.join(reasons)}")
+                summary['maintained'] += 1
+                continue
+
+            result = maintain_db(conn, info, vacuum, analyze, archive_before_ms if archive else None)
+        except sqlite3.OperationalError as e:
+            # "database is locked": somebody is using it after all, try again tomorrow
+            summary['skipped_busy'] += 1
+            log(f"Skipped {key}: {e}")
+            continue
+        finally:
+            conn.close()
+
+        summary['maintained'] += 1
+        summary['vacuumed'] += int(vacuum)
+        summary['analyzed'] += int(analyze)
+        summary['bytes_before'] += info['size_bytes']
+        summary['bytes_after'] += result['size_after']
+        summary['reclaimed_bytes'] += result['reclaimed_bytes']
+        archived = result['archive']
+        if archived:
+            summary['archived_dbs'] += 1
+            summary['archived_rows'] += archived['archived_rows']
+            summary['revlog_rows_before'] += archived['hot_rows_before']
+            summary['revlog_rows_after'] += archived['hot_rows_after']
+            summary['revlog_bytes_before'] += archived['revlog_bytes_before'] or 0
+            summary['revlog_bytes_after'] += archived['revlog_bytes_after'] or 0
+            log(f"{key}: archived {archived['archived_rows']} of {archived['hot_rows_before']} revlog rows "
+                f"({archived['cards']} cards, {archived['compressed_bytes'] // 1024} KiB compressed)")
+        if analyze:
+            state[key] = {'analyzed_size': result['size_after'], 'analyzed_at': int(time.time())}
+        log(f"{key}: {', '.join(result['actions'])} — reclaimed "
+            f"{result['reclaimed_bytes'] // 1024} KiB ({', '.join(reasons)})")
+        if args.pause_ms:
+            time.sleep(args.pause_ms / 1000.0)
+
+    summary['duration_s'] = round(time.perf_counter() - started, 2)
+    if not args.dry_run:
+        _save_state(args.state_file, state)
+        with open(args.report_file, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+
+    log(f"Run finished in {summary['duration_s']}s: {summary['scanned']} scanned, "
+        f"{summary['maintained']} maintained ({summary['vacuumed']} vacuumed, {summary['analyzed']} analyzed), "
+        f"{summary['optimized']} only optimized, "
+        f"{summary['skipped_active']} skipped (active), {summary['skipped_busy']} skipped (busy), "
+        f"{summary['reclaimed_bytes'] / 1024 / 1024:.2f} MiB reclaimed")
+    if summary['archived_dbs']:
+        log(f"Revlog archive: {summary['archived_rows']} rows moved from {summary['archived_dbs']} DB(s); "
+            f"hot revlog {summary['revlog_rows_before']} -> {summary['revlog_rows_after']} rows, "
+            f"{summary['revlog_bytes_before'] / 1024 / 1024:.2f} -> "
+            f"{summary['revlog_bytes_after'] / 1024 / 1024:.2f} MiB")
+    return summary
+
+
+def _parse_hhmm(value):
+    hours, minutes = value.split(':')
+    return timedelta(hours=int(hours), minutes=int(minutes))
+
+
+def next_window(now, start, end):
+    """(window_start, window_end) datetimes for the current or next off-peak window."""
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    window_start, window_end = midnight + start, midnight + end
+    if now >= window_end:
+        window_start += timedelta(days=1)
+        window_end += timedelta(days=1)
+    return window_start, window_end
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Off-peak VACUUM/ANALYZE maintenance for user DBs.')
+    parser.add_argument('--user-db-dir', default=os.path.join(SERVER_DIR, 'user_dbs'))
+    parser.add_argument('--session-dir', default=os.path.join(SERVER_DIR, 'flask_session'),
+                        help='Flask-Session directory used to detect active students')
+    parser.add_argument('--state-file', default=None, help='Default: <user-db-dir>/../maintenance_state.json')
+    parser.add_argument('--report-file', default=None, help='Default: <user-db-dir>/../maintenance_report.jsonl')
+    parser.add_argument('--once', action='store_true', help='Run once now, ignoring the off-peak window')
+    parser.add_argument('--dry-run', action='store_true', help='Only list DBs that would be maintained')
+    parser.add_argument('--window-start', default='05:05', help='Off-peak window start, UTC HH:MM (default: 05:05)')
+    parser.add_argument('--window-end', default='05:55', help='Off-peak window end, UTC HH:MM (default: 05:55)')
+    parser.add_argument('--min-free-ratio', type=float, default=0.10,
+                        help='Vacuum when free pages are at least this share of the file (default: 0.10)')
+    parser.add_argument('--min-free-bytes', type=int, default=64 * 1024,
+                        help='...and at least this many bytes are free (default: 65536)')
+    parser.add_argument('--growth', type=float, default=0.25,
+                        help='Re-ANALYZE after the DB grew by this fraction (default: 0.25)')
+    parser.add_argument('--stats-max-age-days', type=int, default=7, help='Re-ANALYZE after N days (default: 7)')
+    parser.add_argument('--archive-revlog-days', type=int, default=0,
+                        help='Archive revlog rows older than N days; 0 disables archiving (default: 0)')
+    parser.add_argument('--archive-min-rows', type=int, default=1000,
+                        help='Only archive a DB once this many revlog rows are due (default: 1000)')
+    parser.add_argument('--active-minutes', type=int, default=30,
+                        help='Skip DBs used or with a session touched in the last N minutes (default: 30)')
+    parser.add_argument('--max-dbs', type=int, default=500, help='Max DBs maintained per run (default: 500)')
+    parser.add_argument('--pause-ms', type=int, default=200, help='Pause between maintained DBs (default: 200)')
+    parser.add_argument('--lock-timeout', type=float, default=1.0, help='SQLite busy timeout in seconds')
+    args = parser.parse_args()
+
+    data_dir = os.path.dirname(os.path.abspath(args.user_db_dir))
+    args.state_file = args.state_file or os.path.join(data_dir, 'maintenance_state.json')
+    args.report_file = args.report_file or os.path.join(data_dir, 'maintenance_report.jsonl')
+
+    if args.archive_revlog_days < 0:
+        parser.error('--archive-revlog-days must be 0 (off) or a positive number of days')
+
+    if not os.path.isdir(args.user_db_dir):
+        log(f"user_dbs directory not found: {args.user_db_dir}")
+        sys.exit(1)
+
+    if args.once:
+        run_once(args)
+        return
+
+    start, end = _parse_hhmm(args.window_start), _parse_hhmm(args.window_end)
+    while True:
+        now = datetime.now(timezone.utc)
+        window_start, window_end = next_window(now, start, end)
+        if now < window_start:
+            log(f"Next run at {window_start.isoformat(timespec='minutes')} "
+                f"(sleeping {int((window_start - now).total_seconds())} s)")
+            time.sleep((window_start - now).total_seconds())
+        run_once(args, deadline=window_end.timestamp())
+        # Don't run twice in the same window
+        time.sleep(max(0, window_end.timestamp() - time.time()) + 60)
+
+
+if __name__ == '__main__':
+    main()
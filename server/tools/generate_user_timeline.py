@@ -337,6 +337,14 @@ class UserTimelineGenerator:
         conn = sqlite3.connect(user_db_path)
         cursor = conn.cursor()
 
+        # Deck registry table (schema v3+); the col.decks JSON is only current in older DBs
+        try:
+            rows = cursor.execute("SELECT id, name FROM decks").fetchall()
+            conn.close()
+            return {deck_id: {"id": deck_id, "name": name} for deck_id, name in rows}
+        except sqlite3.OperationalError:
+            pass
+
         # Get collection with decks
         cursor.execute("SELECT decks FROM col")
         row = cursor.fetchone()
@@ -177,8 +177,14 @@ def open_db(path):
     return conn
 
 
+def user_db_file(userdb_dir, user_id):
+    """Caminho do banco individual: layout particionado (user_dbs/<id % 256 em hex>/) ou plano (legado)."""
+    sharded = os.path.join(userdb_dir, f"{int(user_id) % 256:02x}", f"user_{user_id}.db")
+    return sharded if os.path.isfile(sharded) else os.path.join(userdb_dir, f"user_{user_id}.db")
+
+
 def get_revlog_count(userdb_dir, user_id):
-    path = os.path.join(userdb_dir, f"user_{user_id}.db")
+    path = user_db_file(userdb_dir, user_id)
     if not os.path.isfile(path):
         return None
     try:
@@ -191,7 +197,7 @@ def get_revlog_count(userdb_dir, user_id):
 
 
 def get_notes_count(userdb_dir, user_id):
-    path = os.path.join(userdb_dir, f"user_{user_id}.db")
+    path = user_db_file(userdb_dir, user_id)
     if not os.path.isfile(path):
         return None
     try:
@@ -297,7 +303,9 @@ def cmd_list_dupes_production(args):
         f"ids = {all_ids!r}\n"
         f"result = {{}}\n"
         f"for uid in ids:\n"
-        f"    path = os.path.join(userdb_dir, f'user_{{uid}}.db')\n"
+        f"    path = os.path.join(userdb_dir, f'{{uid % 256:02x}}', f'user_{{uid}}.db')\n"
+        f"    if not os.path.isfile(path):\n"
+        f"        path = os.path.join(userdb_dir, f'user_{{uid}}.db')\n"
         f"    notes, revs = None, None\n"
         f"    if os.path.isfile(path):\n"
         f"        try:\n"
@@ -570,7 +578,11 @@ def cmd_apply_local(args):
 
     # Remover arquivos user_dbs
     for rel_path in arquivos_remover:
-        full_path = os.path.join(args.userdb_dir, os.path.basename(rel_path))
+        m = re.match(r"user_(\d+)\.db$", os.path.basename(rel_path))
+        if m:
+            full_path = user_db_file(args.userdb_dir, int(m.group(1)))
+        else:
+            full_path = os.path.join(args.userdb_dir, os.path.basename(rel_path))
         if os.path.isfile(full_path):
             os.remove(full_path)
             print(f"Removido: {full_path}")
@@ -682,10 +694,16 @@ def cmd_apply_production(args):
 
     # Remover arquivos user_dbs dentro do container
     for rel_path in arquivos_remover:
-        container_file = container_userdb.rstrip("/") + "/" + os.path.basename(rel_path)
-        print(f"Removendo {container}:{container_file} ...")
-        py_rm = f"import os; os.remove('{container_file}') if os.path.isfile('{container_file}') else None"
-        _docker_exec_python(ssh_args, container, py_rm)
+        fname = os.path.basename(rel_path)
+        candidates = [container_userdb.rstrip("/") + "/" + fname]
+        m = re.match(r"user_(\d+)\.db$", fname)
+        if m:
+            # Layout particionado: user_dbs/<id % 256 em hex>/user_<id>.db
+            candidates.insert(0, f"{container_userdb.rstrip('/')}/{int(m.group(1)) % 256:02x}/{fname}")
+        for container_file in candidates:
+            print(f"Removendo {container}:{container_file} ...")
+            py_rm = f"import os; os.remove('{container_file}') if os.path.isfile('{container_file}') else None"
+            _docker_exec_python(ssh_args, container, py_rm)
 
     print("\nConcluído.")
 
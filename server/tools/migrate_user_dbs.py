@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+migrate_user_dbs.py — Apply pending schema migrations to every user DB in parallel.
+
+The server migrates a DB lazily the first time a worker opens it after a deploy
+(see server/user_db_migrations.py). Run this tool to migrate everybody up front
+instead, e.g. right after deploying a migration that builds a large index, so no
+student pays for it on their first request.
+
+Migrations are idempotent and take SQLite's write lock, so this is safe to run
+while the server is up.
+
+Usage (from server/):
+    python tools/migrate_user_dbs.py --dry-run                 # show schema versions only
+    python tools/migrate_user_dbs.py --workers 8
+    python tools/migrate_user_dbs.py --user-db-dir /opt/study-amigo/server/user_dbs --report migrate.json
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import user_db_layout  # noqa: E402
+import user_db_migrations  # noqa: E402
+
+DEFAULT_USER_DB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'user_dbs'))
+
+
+def _schema_version(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return user_db_migrations.get_schema_version(conn)
+    finally:
+        conn.close()
+
+
+def _migrate_one(db_path):
+    """Worker: migrate one DB. Returns (db_path, from_version, applied, error)."""
+    try:
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            from_version = user_db_migrations.get_schema_version(conn)
+            applied = user_db_migrations.migrate(conn)
+        finally:
+            conn.close()
+        return db_path, from_version, applied, None
+    except sqlite3.Error as e:
+        return db_path, None, [], str(e)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate all user DBs to the latest schema version.')
+    parser.add_argument('--user-db-dir', default=DEFAULT_USER_DB_DIR,
+                        help=f'user_dbs directory (default: {DEFAULT_USER_DB_DIR})')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help='Parallel worker processes (default: CPU count)')
+    parser.add_argument('--dry-run', action='store_true', help='Only report current schema versions')
+    parser.add_argument('--report', help='Write a JSON timing report to this path')
+    args = parser.parse_args()
+
+    db_paths = list(user_db_layout.iter_user_db_files(args.user_db_dir, 'user_*.db'))
+    latest = user_db_migrations.latest_version()
+    print(f"{len(db_paths)} user DB(s) in {args.user_db_dir}; latest schema version is v{latest}")
+
+    if args.dry_run:
+        versions = Counter(_schema_version(path) for path in db_paths)
+        for version, count in sorted(versions.items()):
+            print(f"  v{version}: {count} DB(s){'' if version >= latest else '  (pending)'}")
+        return
+
+    started = time.perf_counter()
+    per_migration = defaultdict(list)   # version -> [seconds, ...]
+    per_db = []                         # total seconds per migrated DB
+    descriptions = {}
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(_migrate_one, path) for path in db_paths]
+        for done, future in enumerate(as_completed(futures), 1):
+            db_path, from_version, applied, error = future.result()
+            if error:
+                failures.append({'db': db_path, 'error': error})
+                print(f"  ❌ {db_path}: {error}")
+            elif applied:
+                for version, description, seconds in applied:
+                    per_migration[version].append(seconds)
+                    descriptions[version] = description
+                per_db.append(sum(seconds for _, _, seconds in applied))
+            if done % 100 == 0:
+                print(f"  {done}/{len(db_paths)} done")
+    elapsed = time.perf_counter() - started
+
+    report = {
+        'user_db_dir': args.user_db_dir,
+        'databases': len(db_paths),
+        'migrated': len(per_db),
+        'already_current': len(db_paths) - len(per_db) - len(failures),
+        'failed': failures,
+        'latest_version': latest,
+        'workers': args.workers,
+        'wall_time_s': round(elapsed, 2),
+        'per_db_ms': {
+            'p50': _ms(statistics.median(per_db)) if per_db else 0,
+            'max': _ms(max(per_db)) if per_db else 0,
+        },
+        'migrations': {
+            f"v{version}": {
+                'description': descriptions[version],
+                'count': len(times),
+                'total_ms': _ms(sum(times)),
+                'p50_ms': _ms(statistics.median(times)),
+                'max_ms': _ms(max(times)),
+            } for version, times in sorted(per_migration.items())
+        },
+    }
+
+    print(f"\n✓ {report['migrated']} migrated, {report['already_current']} already at v{latest}, "
+          f"{len(failures)} failed in {report['wall_time_s']}s with {args.workers} worker(s)")
+    for name, stats in report['migrations'].items():
+        print(f"  {name} {stats['description']}: {stats['count']} DB(s), "
+              f"p50 {stats['p50_ms']}ms, max {stats['max_ms']}ms")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
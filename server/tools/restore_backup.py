@@ -261,7 +261,7 @@ def restore_local(s3, bucket: str, week: int, day: str, args: argparse.Namespace
             if pre_udb.exists():
                 shutil.rmtree(pre_udb)
             shutil.copytree(user_dbs, pre_udb)
-            count = len(list(user_dbs.glob("*.db")))
+            count = len(list(user_dbs.rglob("*.db")))
             info(f"  Saved user_dbs/ ({count} databases)")
 
         step("Restoring admin.db")
@@ -283,7 +283,7 @@ def restore_local(s3, bucket: str, week: int, day: str, args: argparse.Namespace
                 if m.name.startswith("user_dbs/") and ".." not in m.name
             ]
             tf.extractall(path=server_dir, members=safe_members)
-        count = len(list(user_dbs.glob("*.db")))
+        count = len(list(user_dbs.rglob("*.db")))
         info(f"  {count} user databases restored")
 
         step("Fixing file ownership (ubuntu:ubuntu = 1000:1000)")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+shard_user_dbs.py — Move per-user databases between the flat and the sharded layout.
+
+    flat:     user_dbs/user_257.db
+    sharded:  user_dbs/01/user_257.db      (shard = user_id % 256, two hex digits)
+
+The server finds a database in either place (see server/user_db_layout.py), so the
+move can be done at any time, but each gunicorn worker caches the path it resolved.
+Stop the server (or restart it right after) when migrating a live deployment:
+
+    docker compose stop server
+    python tools/shard_user_dbs.py --user-db-dir /opt/study-amigo/server/user_dbs --dry-run
+    python tools/shard_user_dbs.py --user-db-dir /opt/study-amigo/server/user_dbs
+    docker compose start server
+
+SQLite sidecar files (-wal, -shm, -journal) are moved together with their database.
+Files are renamed within the same filesystem, so each move is atomic.
+
+Usage:
+    python tools/shard_user_dbs.py [--user-db-dir DIR] [--dry-run] [--reverse]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import user_db_layout  # noqa: E402
+
+DEFAULT_USER_DB_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'user_dbs'))
+SIDECAR_SUFFIXES = ('', '-wal', '-shm', '-journal')
+
+
+def plan_moves(user_db_dir, reverse=False):
+    """Return a list of (user_id, src_db_path, dst_db_path) for databases that need moving."""
+    moves = []
+    for path in user_db_layout.iter_user_db_files(user_db_dir, 'user_*.db'):
+        match = user_db_layout.USER_DB_FILENAME_RE.match(os.path.basename(path))
+        if not match:
+            continue
+        user_id = int(match.group(1))
+        is_flat = os.path.normpath(os.path.dirname(path)) == os.path.normpath(user_db_dir)
+        if reverse and not is_flat:
+            moves.append((user_id, path, user_db_layout.legacy_user_db_path(user_db_dir, user_id)))
+        elif not reverse and is_flat:
+            moves.append((user_id, path, user_db_layout.sharded_user_db_path(user_db_dir, user_id)))
+    return moves
+
+
+def apply_moves(moves, dry_run=False):
+    """Move each DB and its sidecars. Returns (moved, skipped)."""
+    moved = skipped = 0
+    for user_id, src, dst in moves:
+        if os.path.exists(dst):
+            print(f"  ⚠️  user {user_id}: {dst} already exists, leaving {src} in place")
+            skipped += 1
+            continue
+        print(f"  {src} -> {dst}")
+        if dry_run:
+            moved += 1
+            continue
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        # Sidecars first, the main file last: a reader that finds the DB at dst also finds its WAL.
+        for suffix in reversed(SIDECAR_SUFFIXES):
+            if os.path.exists(src + suffix):
+                os.rename(src + suffix, dst + suffix)
+        moved += 1
+    return moved, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move user DBs between flat and sharded layout.')
+    parser.add_argument('--user-db-dir', default=DEFAULT_USER_DB_DIR,
+                        help=f'user_dbs directory (default: {DEFAULT_USER_DB_DIR})')
+    parser.add_argument('--dry-run', action='store_true', help='Only print the moves')
+    parser.add_argument('--reverse', action='store_true', help='Move sharded DBs back to the flat layout')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.user_db_dir):
+        print(f"❌ Not a directory: {args.user_db_dir}")
+        sys.exit(1)
+
+    moves = plan_moves(args.user_db_dir, reverse=args.reverse)
+    target = 'flat' if args.reverse else 'sharded'
+    if not moves:
+        print(f"✓ Nothing to do: all databases in {args.user_db_dir} already use the {target} layout")
+        return
+
+    print(f"{'[dry-run] ' if args.dry_run else ''}Moving {len(moves)} database(s) to the {target} layout:")
+    moved, skipped = apply_moves(moves, dry_run=args.dry_run)
+    print(f"\n✓ {moved} moved, {skipped} skipped{' (dry run, nothing changed)' if args.dry_run else ''}")
+    if skipped:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
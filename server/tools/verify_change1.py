@@ -2,7 +2,6 @@
 """Verification script for Change 1: Empty Default Deck"""
 
 import sqlite3
-import json
 import os
 import sys
 
@@ -10,6 +9,7 @@ import sys
 sys.path.insert(0, os.path.dirname(__file__))
 
 from app import init_anki_db, add_initial_flashcards, get_user_db_path
+import user_db_decks
 
 def verify_new_user_decks():
     """Verify that a new user gets MyFirstDeck (empty) and Verbal Tenses (108 cards)"""
@@ -29,10 +29,8 @@ def verify_new_user_decks():
     conn = sqlite3.connect(test_db)
     cursor = conn.cursor()
 
-    # Get collection
-    cursor.execute("SELECT decks FROM col")
-    decks_json = cursor.execute("SELECT decks FROM col").fetchone()[0]
-    decks = json.loads(decks_json)
+    # Get decks from the deck registry
+    decks = user_db_decks.load_decks(conn)
 
     print("\n" + "="*70)
     print("DECK STRUCTURE VERIFICATION")
@@ -0,0 +1,215 @@
+"""
+user_db_decks.py — Relational deck registry for per-user Anki databases.
+
+Anki's 2.0 schema stores every deck (col.decks), every deck option group
+(col.dconf) and the collection settings (col.conf) as JSON blobs in the one
+`col` row. Renaming a deck or switching the current deck meant parsing and
+rewriting all of them, and looking up a single deck name meant parsing
+them too. Migration v3 (see user_db_migrations.py) moves them into side tables,
+and the server reads and writes those rows directly:
+  decks        one row per deck: id, name, option group, mod, other Anki fields as JSON
+  deck_config  one row per option group, its Anki JSON
+  col_config   the col.conf keys the server changes (curDeck), JSON values
+
+The tables are the source of truth from then on. col.decks / col.dconf /
+col.conf are not updated on each change. materialize_col_json() regenerates
+them when an Anki-compatible file is needed; export does this on the copy it
+packages. Code that used to parse the blobs should call load_decks() and
+friends instead.
+
+This module only uses the standard library so tools can import it without the
+Flask app.
+"""
+
+import json
+import time
+
+TABLES_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS decks (
+        id              integer primary key,
+        name            text not null,
+        name_key        text not null, /* name.lower(), for case-insensitive duplicate checks */
+        conf            integer not null, /* deck_config id */
+        mod             integer not null, /* modification time (seconds) */
+        data            text not null /* remaining Anki deck fields (json) */
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_decks_name_key ON decks (name_key)",
+    """
+    CREATE TABLE IF NOT EXISTS deck_config (
+        id              integer primary key,
+        data            text not null /* Anki deck options (json) */
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS col_config (
+        key             text primary key,
+        value           text not null /* json, overrides the same key in col.conf */
+    ) WITHOUT ROWID
+    """,
+)
+
+REGISTRY_TABLES = ('decks', 'deck_config', 'col_config')
+SERVER_CONF_KEYS = ('curDeck',)  # col.conf keys owned by col_config
+DEFAULT_DECK_FIELDS = {
+    "usn": -1, "lrnToday": [0, 0], "revToday": [0, 0], "newToday": [0, 0], "timeToday": [0, 0],
+    "desc": "", "dyn": 0, "collapsed": False, "extendNew": 10, "extendRev": 50,
+}
+
+_DECK_COLUMNS = ('id', 'name', 'conf', 'mod')
+
+
+def create_tables(db):
+    # One statement at a time: executescript() would commit the caller's transaction
+    for sql in TABLES_SQL:
+        db.execute(sql)
+
+
+def import_col_json(db):
+    """Copies col.decks / col.dconf and the server-owned col.conf keys into the registry tables."""
+    decks, dconf, conf = db.execute("SELECT decks, dconf, conf FROM col LIMIT 1").fetchone()
+    for deck in json.loads(decks).values():
+        put_deck(db, deck)
+    for options in json.loads(dconf).values():
+        put_deck_config(db, options)
+    conf = json.loads(conf)
+    for key in SERVER_CONF_KEYS:
+        if key in conf:
+            set_conf_value(db, key, conf[key])
+
+
+def drop_tables(db):
+    """Removes the registry, e.g. from an exported copy after materialize_col_json()."""
+    for table in REGISTRY_TABLES:
+        db.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+# --- Decks ---
+
+def put_deck(db, deck):
+    """Inserts or replaces a deck given as an Anki deck dict."""
+    data = {key: value for key, value in deck.items() if key not in _DECK_COLUMNS}
+    db.execute("""
+        INSERT OR REPLACE INTO decks (id, name, name_key, conf, mod, data) VALUES (?, ?, ?, ?, ?, ?)
+    """, (int(deck['id']), deck['name'], deck['name'].lower(), int(deck.get('conf', 1)),
+          int(deck.get('mod', 0)), json.dumps(data)))
+
+
+def add_deck(db, deck_id, name, conf=1):
+    """Creates a deck with Anki's default fields. Returns its dict."""
+    deck = dict(DEFAULT_DECK_FIELDS, id=int(deck_id), name=name, conf=conf, mod=int(time.time()))
+    put_deck(db, deck)
+    return deck
+
+
+def _deck_from_row(row):
+    deck = json.loads(row[4])
+    deck.update(id=row[0], name=row[1], conf=row[2], mod=row[3])
+    return deck
+
+
+def load_decks(db, deck_ids=None):
+    """{str(deck id): Anki deck dict}, for all decks or just deck_ids."""
+    sql = "SELECT id, name, conf, mod, data FROM decks"
+    params = ()
+    if deck_ids is not None:
+        deck_ids = [int(deck_id) for deck_id in deck_ids]
+        sql += f" WHERE id IN ({', '.join('?' * len(deck_ids))})"
+        params = deck_ids
+    return {str(row[0]): _deck_from_row(row) for row in db.execute(sql, params).fetchall()}
+
+
+def get_deck(db, deck_id):
+    return load_decks(db, [deck_id]).get(str(int(deck_id)))
+
+
+def deck_exists(db, deck_id):
+    return db.execute("SELECT 1 FROM decks WHERE id = ?", (deck_id,)).fetchone() is not None
+
+
+def get_deck_name(db, deck_id, default=None):
+    row = db.execute("SELECT name FROM decks WHERE id = ?", (deck_id,)).fetchone()
+    return row[0] if row else default
+
+
+def list_decks(db):
+    """[(id, name)] sorted by name."""
+    return [(row[0], row[1]) for row in db.execute("SELECT id, name FROM decks ORDER BY name").fetchall()]
+
+
+def name_taken(db, name, exclude_id=None):
+    """True if another deck already has this name, ignoring case."""
+    row = db.execute("SELECT 1 FROM decks WHERE name_key = ? AND id IS NOT ? LIMIT 1",
+                     (name.lower(), exclude_id)).fetchone()
+    return row is not None
+
+
+def rename_deck(db, deck_id, name):
+    db.execute("UPDATE decks SET name = ?, name_key = ?, mod = ? WHERE id = ?",
+               (name, name.lower(), int(time.time()), deck_id))
+
+
+def delete_deck(db, deck_id):
+    db.execute("DELETE FROM decks WHERE id = ?", (deck_id,))
+
+
+# --- Deck options ---
+
+def put_deck_config(db, options):
+    """Inserts or replaces an option group given as an Anki dconf dict."""
+    db.execute("INSERT OR REPLACE INTO deck_config (id, data) VALUES (?, ?)", (int(options['id']), json.dumps(options)))
+
+
+def load_deck_configs(db, conf_ids=None):
+    """{str(option group id): Anki options dict}, for all groups or just conf_ids."""
+    sql = "SELECT id, data FROM deck_config"
+    params = ()
+    if conf_ids is not None:
+        conf_ids = [int(conf_id) for conf_id in conf_ids]
+        sql += f" WHERE id IN ({', '.join('?' * len(conf_ids))})"
+        params = conf_ids
+    return {str(row[0]): json.loads(row[1]) for row in db.execute(sql, params).fetchall()}
+
+
+def get_deck_options(db, deck_id):
+    """The option group of a deck (falling back to group 1), or None if neither exists."""
+    row = db.execute("""
+        SELECT c.data FROM deck_config c
+        WHERE c.id = IFNULL((SELECT conf FROM decks WHERE id = ?), 1)
+    """, (deck_id,)).fetchone()
+    if row is None:
+        row = db.execute("SELECT data FROM deck_config WHERE id = 1").fetchone()
+    return json.loads(row[0]) if row else None
+
+
+# --- Collection config ---
+
+def get_conf_value(db, key, default=None):
+    row = db.execute("SELECT value FROM col_config WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+def set_conf_value(db, key, value):
+    db.execute("INSERT OR REPLACE INTO col_config (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+
+def current_deck_id(db):
+    return get_conf_value(db, 'curDeck', 1)
+
+
+# --- Anki JSON ---
+
+def col_json(db):
+    """(decks, dconf, conf) dicts in col's Anki format, built from the registry tables."""
+    conf = json.loads(db.execute("SELECT conf FROM col LIMIT 1").fetchone()[0])
+    for key, value in db.execute("SELECT key, value FROM col_config").fetchall():
+        conf[key] = json.loads(value)
+    return load_decks(db), load_deck_configs(db), conf
+
+
+def materialize_col_json(db):
+    """Rewrites col.decks / col.dconf / col.conf from the registry tables."""
+    decks, dconf, conf = col_json(db)
+    db.execute("UPDATE col SET decks = ?, dconf = ?, conf = ?",
+               (json.dumps(decks), json.dumps(dconf), json.dumps(conf)))
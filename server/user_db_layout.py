@@ -0,0 +1,69 @@
+"""
+user_db_layout.py — Where per-user Anki databases live inside user_dbs/.
+
+Layout (sharded):
+
+    user_dbs/
+      00/user_256.db
+      01/user_1.db  user_257.db
+      ...
+      ff/user_255.db
+
+The shard is the user id modulo 256 in two hex digits, so each directory holds
+1/256th of the users and backups/rsync can work shard by shard. Databases from
+the old flat layout (user_dbs/user_{id}.db) are still found until they are moved
+with tools/shard_user_dbs.py.
+
+This module only uses the standard library so tools and the admin server can
+import it without pulling in the Flask app.
+"""
+
+import glob
+import os
+import re
+
+SHARD_COUNT = 256
+USER_DB_FILENAME_RE = re.compile(r'^user_(\d+)\.db$')
+
+
+def shard_for(user_id):
+    """Returns the shard directory name ('00'..'ff') for a user id."""
+    return f"{int(user_id) % SHARD_COUNT:02x}"
+
+
+def user_db_filename(user_id):
+    return f"user_{user_id}.db"
+
+
+def sharded_user_db_path(user_dbs_dir, user_id):
+    """Path of the user's DB in the sharded layout (may not exist yet)."""
+    return os.path.join(user_dbs_dir, shard_for(user_id), user_db_filename(user_id))
+
+
+def legacy_user_db_path(user_dbs_dir, user_id):
+    """Path of the user's DB in the old flat layout (may not exist)."""
+    return os.path.join(user_dbs_dir, user_db_filename(user_id))
+
+
+def resolve_user_db_path(user_dbs_dir, user_id, create_dirs=False):
+    """
+    Returns the path of an existing user DB, preferring the sharded layout and
+    falling back to the flat one. If neither exists, returns the sharded path
+    (where a new DB should be created), creating its shard directory when
+    create_dirs is True.
+    """
+    sharded = sharded_user_db_path(user_dbs_dir, user_id)
+    if os.path.exists(sharded):
+        return sharded
+    legacy = legacy_user_db_path(user_dbs_dir, user_id)
+    if os.path.exists(legacy):
+        return legacy
+    if create_dirs:
+        os.makedirs(os.path.dirname(sharded), exist_ok=True)
+    return sharded
+
+
+def iter_user_db_files(user_dbs_dir, pattern='*.db'):
+    """Yields every DB file matching pattern in both the flat and the sharded layout."""
+    yield from sorted(glob.glob(os.path.join(user_dbs_dir, pattern)))
+    yield from sorted(glob.glob(os.path.join(user_dbs_dir, '[0-9a-f][0-9a-f]', pattern)))
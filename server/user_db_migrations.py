@@ -0,0 +1,163 @@
+"""
+user_db_migrations.py — Versioned schema migrations for per-user Anki databases.
+
+Each user DB records the last migration applied to it in `PRAGMA user_version`
+(0 for databases created before this module existed; Anki itself versions the
+collection with col.ver, so user_version is free for us). Migrations are
+registered in order with @migration(version, description) and must be
+idempotent (CREATE ... IF NOT EXISTS etc.), so re-running one after a crash is
+harmless.
+
+They are applied:
+  - lazily, the first time a worker resolves a user's DB path
+    (app.get_user_db_path -> ensure_migrated), and by init_anki_db for new DBs;
+  - eagerly, with tools/migrate_user_dbs.py, which walks user_dbs/ in parallel
+    and reports timings.
+
+To add a migration, append a function below with the next version number and
+never change a migration that has already shipped.
+
+This module only uses the standard library so tools can import it without the
+Flask app.
+"""
+
+import sqlite3
+import threading
+import time
+
+import user_db_decks
+import user_db_revlog_archive
+
+_MIGRATIONS = []  # [(version, description, fn)], kept sorted by version
+_migrated_paths = set()  # DB paths already checked by this process
+_migrated_lock = threading.Lock()
+
+
+def migration(version, description):
+    """Registers fn(conn) as the migration that brings a DB to `version`."""
+    def decorator(fn):
+        if _MIGRATIONS and version <= _MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} registered out of order (last is {_MIGRATIONS[-1][0]})")
+        _MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+def latest_version():
+    return _MIGRATIONS[-1][0] if _MIGRATIONS else 0
+
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Applies every pending migration to an open connection, each in its own
+    transaction. Returns a list of (version, description, seconds) for the
+    migrations that ran (empty if the DB was already current).
+
+    BEGIN IMMEDIATE takes the write lock before the version is re-read, so two
+    workers opening the same DB at once don't both run a migration.
+    """
+    applied = []
+    if get_schema_version(conn) >= latest_version():
+        return applied
+
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None  # manage transactions explicitly
+    try:
+        for version, description, fn in _MIGRATIONS:
+            started = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(conn) >= version:
+                    conn.execute("COMMIT")
+                    continue
+                fn(conn)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append((version, description, time.perf_counter() - started))
+    finally:
+        conn.isolation_level = previous_isolation
+    return applied
+
+
+def ensure_migrated(db_path, logger=None):
+    """
+    Migrates the DB at db_path once per process. Later calls for the same path
+    return immediately without touching the file. Returns the list from migrate().
+    """
+    if db_path in _migrated_paths:
+        return []
+    with _migrated_lock:
+        if db_path in _migrated_paths:
+            return []
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            applied = migrate(conn)
+        finally:
+            conn.close()
+        _migrated_paths.add(db_path)
+    if applied and logger:
+        for version, description, seconds in applied:
+            logger.info(f"Migrated {db_path} to schema v{version} ({description}) in {seconds * 1000:.1f}ms")
+    return applied
+
+
+# --- Migrations ---
+
+@migration(1, "revlog covering indexes (type, id) and (cid, id)")
+def _revlog_covering_indexes(conn):
+    # (type, id): daily new-card counts and stats filter revlog by type and a time range.
+    # (cid, id): per-card history in id order without a sort step.
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_revlog_type_id ON revlog (type, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_revlog_cid_id ON revlog (cid, id)")
+
+
+@migration(2, "USN stamping triggers and graves usn index for incremental sync")
+def _usn_change_tracking(conn):
+    # Frozen as shipped: syncing another table, or changing the trigger, is a new migration
+    # (user_db_sync.USN_TRIGGERS must keep naming what the migrations install).
+    tables = ('notes', 'cards', 'revlog', 'graves')
+    trigger = """
+        CREATE TRIGGER IF NOT EXISTS usn_{table}_{event_name} AFTER {event} ON {table}
+        WHEN NEW.usn <> (SELECT usn FROM col)
+        BEGIN
+            UPDATE {table} SET usn = (SELECT usn FROM col) WHERE rowid = NEW.rowid;
+        END
+    """
+
+    # Rows written before change tracking carry usn -1 ("local"); give them the
+    # starting USN so a full sync (since = -1) returns them and later ones don't.
+    conn.execute("UPDATE col SET usn = 0 WHERE usn < 0")
+    for table in tables:
+        conn.execute(f"UPDATE {table} SET usn = 0 WHERE usn < 0")
+    conn.execute("""
+        UPDATE col SET usn = MAX(usn, (SELECT IFNULL(MAX(usn), 0) FROM notes),
+                                      (SELECT IFNULL(MAX(usn), 0) FROM cards),
+                                      (SELECT IFNULL(MAX(usn), 0) FROM revlog),
+                                      (SELECT IFNULL(MAX(usn), 0) FROM graves))
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_graves_usn ON graves (usn)")
+    for table in tables:
+        for event in ('INSERT', 'UPDATE'):
+            conn.execute(trigger.format(table=table, event=event, event_name=event.lower()))
+
+
+@migration(3, "deck registry side tables (decks, deck_config, col_config)")
+def _deck_registry(conn):
+    # From here on the tables are authoritative and col.decks/dconf/conf are
+    # only regenerated on demand (export), see user_db_decks.py.
+    user_db_decks.create_tables(conn)
+    user_db_decks.import_col_json(conn)
+
+
+@migration(4, "revlog archive tier (revlog_archive, revlog_card_stats, revlog_day_stats)")
+def _revlog_archive_tables(conn):
+    # Empty until tools/db_maintenance.py --archive-revlog-days moves old rows in,
+    # see user_db_revlog_archive.py.
+    user_db_revlog_archive.create_tables(conn)
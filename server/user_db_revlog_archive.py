@@ -0,0 +1,237 @@
+"""
+user_db_revlog_archive.py — Archive tier for old review log rows in per-user Anki databases.
+
+revlog only ever grows. After a few semesters most of it is history that nothing
+on the request path reads: the scheduler and the daily limits only look at
+today's rows. archive_revlog() moves rows older than a horizon out of revlog and
+into compact side tables (created by migration v4, see user_db_migrations.py):
+  revlog_archive     one row per card per archiving run: id range, row count,
+                     highest usn and the rows as zlib-compressed JSON
+  revlog_card_stats  per card: reviews, lapses, total time, first/last review id
+  revlog_day_stats   per day (05:00 UTC rollover, as in app.py) and revlog type:
+                     reviews and total time
+
+The two stats tables only summarize archived rows. card_summary() and
+day_summaries() add the rows still in revlog, so callers get full totals.
+iter_revlog() yields the complete history, archived and hot, in id order.
+restore_revlog() puts archived rows back into revlog, which /export runs on the
+copy it packages so Anki receives the whole review history.
+
+tools/db_maintenance.py --archive-revlog-days N runs archive_revlog() off-peak.
+
+This module only uses the standard library so tools can import it without the
+Flask app.
+"""
+
+import json
+import zlib
+
+DAY_ROLLOVER_UTC = 5 * 3600  # same day boundary as app.DAY_ROLLOVER_UTC
+
+# Column order of a revlog row, in archived blobs and everything this module yields
+REVLOG_ROW_COLUMNS = ('id', 'cid', 'usn', 'ease', 'ivl', 'lastIvl', 'factor', 'time', 'type')
+
+TABLES_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS revlog_archive (
+        cid             integer not null,
+        first_id        integer not null,
+        last_id         integer not null,
+        n               integer not null,
+        max_usn         integer not null,
+        data            blob not null /* zlib(json([[id, usn, ease, ivl, lastIvl, factor, time, type], ...])) */
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_revlog_archive_cid ON revlog_archive (cid)",
+    "CREATE INDEX IF NOT EXISTS ix_revlog_archive_max_usn ON revlog_archive (max_usn)",
+    """
+    CREATE TABLE IF NOT EXISTS revlog_card_stats (
+        cid             integer primary key,
+        reviews         integer not null,
+        lapses          integer not null, /* answers with ease 1 */
+        total_time      integer not null, /* ms */
+        first_id        integer not null,
+        last_id         integer not null
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS revlog_day_stats (
+        day             integer not null, /* (id / 1000 - DAY_ROLLOVER_UTC) / 86400 */
+        type            integer not null,
+        reviews         integer not null,
+        total_time      integer not null,
+        PRIMARY KEY (day, type)
+    ) WITHOUT ROWID
+    """,
+)
+
+ARCHIVE_TABLES = ('revlog_archive', 'revlog_card_stats', 'revlog_day_stats')
+
+
+def create_tables(db):
+    # One statement at a time: executescript() would commit the caller's transaction
+    for sql in TABLES_SQL:
+        db.execute(sql)
+
+
+def drop_tables(db):
+    for table in ARCHIVE_TABLES:
+        db.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def _day_sql(column='id'):
+    return f"(({column} / 1000 - {DAY_ROLLOVER_UTC}) / 86400)"
+
+
+def _revlog_bytes(conn):
+    """Bytes used by revlog and its indexes, or None when SQLite lacks the dbstat table."""
+    try:
+        return conn.execute("""
+            SELECT SUM(pgsize) FROM dbstat
+            WHERE name = 'revlog' OR name IN (SELECT name FROM sqlite_master WHERE tbl_name = 'revlog')
+        """).fetchone()[0] or 0
+    except Exception:
+        return None
+
+
+def archive_revlog(conn, before_ms):
+    """
+    Moves revlog rows with id < before_ms into the archive in one transaction.
+    Returns a report: rows archived, cards, hot rows before/after, compressed
+    bytes written and revlog bytes before/after (None without dbstat).
+    """
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None  # manage the transaction explicitly
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            create_tables(conn)
+            report = {
+                'hot_rows_before': conn.execute("SELECT COUNT(*) FROM revlog").fetchone()[0],
+                'revlog_bytes_before': _revlog_bytes(conn),
+            }
+            conn.execute("""
+                INSERT INTO revlog_day_stats (day, type, reviews, total_time)
+                SELECT {day}, type, COUNT(*), SUM(time) FROM revlog WHERE id < ? GROUP BY 1, 2
+                ON CONFLICT (day, type) DO UPDATE SET
+                    reviews = reviews + excluded.reviews, total_time = total_time + excluded.total_time
+            """.format(day=_day_sql()), (before_ms,))
+            conn.execute("""
+                INSERT INTO revlog_card_stats (cid, reviews, lapses, total_time, first_id, last_id)
+                SELECT cid, COUNT(*), SUM(ease = 1), SUM(time), MIN(id), MAX(id)
+                FROM revlog WHERE id < ? GROUP BY cid
+                ON CONFLICT (cid) DO UPDATE SET
+                    reviews = reviews + excluded.reviews, lapses = lapses + excluded.lapses,
+                    total_time = total_time + excluded.total_time,
+                    first_id = MIN(first_id, excluded.first_id), last_id = MAX(last_id, excluded.last_id)
+            """, (before_ms,))
+
+            archived, cards, compressed = 0, 0, 0
+            batch, cid = [], None
+            rows = conn.execute(f"""
+                SELECT {', '.join(REVLOG_ROW_COLUMNS)} FROM revlog WHERE id < ? ORDER BY cid, id
+            """, (before_ms,)).fetchall()
+            for row in rows + [None]:
+                if batch and (row is None or row[1] != cid):
+                    data = zlib.compress(json.dumps(batch, separators=(',', ':')).encode('utf-8'), 9)
+                    conn.execute("""
+                        INSERT INTO revlog_archive (cid, first_id, last_id, n, max_usn, data)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, (cid, batch[0][0], batch[-1][0], len(batch), max(r[1] for r in batch), data))
+                    archived += len(batch)
+                    cards += 1
+                    compressed += len(data)
+                    batch = []
+                if row is not None:
+                    cid = row[1]
+                    batch.append([row[0]] + list(row[2:]))
+            conn.execute("DELETE FROM revlog WHERE id < ?", (before_ms,))
+
+            report.update({
+                'archived_rows': archived,
+                'cards': cards,
+                'compressed_bytes': compressed,
+                'hot_rows_after': report['hot_rows_before'] - archived,
+                'revlog_bytes_after': _revlog_bytes(conn),
+            })
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = previous_isolation
+    return report
+
+
+def _unpack(cid, data):
+    for packed in json.loads(zlib.decompress(data)):
+        yield (packed[0], cid, *packed[1:])
+
+
+def archived_rows(db, min_usn=None, max_usn=None):
+    """Archived revlog rows (REVLOG_ROW_COLUMNS order), optionally only those with min_usn < usn <= max_usn."""
+    sql, params = "SELECT cid, data FROM revlog_archive", ()
+    if min_usn is not None:
+        sql, params = sql + " WHERE max_usn > ?", (min_usn,)
+    for cid, data in db.execute(sql, params).fetchall():
+        for row in _unpack(cid, data):
+            if (min_usn is None or row[2] > min_usn) and (max_usn is None or row[2] <= max_usn):
+                yield row
+
+
+def iter_revlog(db, start_ms=None, end_ms=None):
+    """The full review history, archived and hot, in id order, optionally limited to start_ms <= id < end_ms."""
+    low = start_ms if start_ms is not None else -1
+    high = end_ms if end_ms is not None else 2 ** 63 - 1
+    rows = []
+    for cid, data in db.execute(
+            "SELECT cid, data FROM revlog_archive WHERE last_id >= ? AND first_id < ?", (low, high)).fetchall():
+        rows.extend(row for row in _unpack(cid, data) if low <= row[0] < high)
+    rows.extend(tuple(row) for row in db.execute(
+        f"SELECT {', '.join(REVLOG_ROW_COLUMNS)} FROM revlog WHERE id >= ? AND id < ?", (low, high)).fetchall())
+    rows.sort()
+    return iter(rows)
+
+
+def restore_revlog(db):
+    """Copies every archived row back into revlog (existing ids are kept), e.g. for an export."""
+    db.executemany(f"""
+        INSERT OR IGNORE INTO revlog ({', '.join(REVLOG_ROW_COLUMNS)})
+        VALUES ({', '.join('?' * len(REVLOG_ROW_COLUMNS))})
+    """, archived_rows(db))
+
+
+def card_summary(db, cid):
+    """{'reviews', 'lapses', 'totalTime', 'firstReview', 'lastReview'} for a card over its whole history."""
+    archived = db.execute("""
+        SELECT reviews, lapses, total_time, first_id, last_id FROM revlog_card_stats WHERE cid = ?
+    """, (cid,)).fetchone() or (0, 0, 0, None, None)
+    hot = db.execute("""
+        SELECT COUNT(*), IFNULL(SUM(ease = 1), 0), IFNULL(SUM(time), 0), MIN(id), MAX(id)
+        FROM revlog WHERE cid = ?
+    """, (cid,)).fetchone()
+    firsts = [value for value in (archived[3], hot[3]) if value is not None]
+    lasts = [value for value in (archived[4], hot[4]) if value is not None]
+    return {
+        'reviews': archived[0] + hot[0],
+        'lapses': archived[1] + hot[1],
+        'totalTime': archived[2] + hot[2],
+        'firstReview': min(firsts) if firsts else None,
+        'lastReview': max(lasts) if lasts else None,
+    }
+
+
+def day_summaries(db, start_day, end_day):
+    """{day: {revlog type: (reviews, total time ms)}} for start_day <= day < end_day, archived plus hot."""
+    start_ms = (start_day * 86400 + DAY_ROLLOVER_UTC) * 1000
+    end_ms = (end_day * 86400 + DAY_ROLLOVER_UTC) * 1000
+    summaries = {}
+    rows = db.execute("""
+        SELECT day, type, reviews, total_time FROM revlog_day_stats WHERE day >= ? AND day < ?
+    """, (start_day, end_day)).fetchall() + db.execute(f"""
+        SELECT {_day_sql()}, type, COUNT(*), SUM(time) FROM revlog WHERE id >= ? AND id < ? GROUP BY 1, 2
+    """, (start_ms, end_ms)).fetchall()
+    for day, log_type, reviews, total_time in rows:
+        previous = summaries.setdefault(day, {}).get(log_type, (0, 0))
+        summaries[day][log_type] = (previous[0] + reviews, previous[1] + total_time)
+    return summaries
@@ -0,0 +1,200 @@
+"""
+user_db_sync.py — USN-based incremental sync for per-user Anki databases.
+
+Change tracking follows Anki's scheme. col.usn is the collection's current
+update sequence number, and every row written to notes, cards, revlog or graves
+is stamped with it by the triggers installed by migration v2 (see
+user_db_migrations.py). Existing writers keep writing usn = -1, and any row a
+writer touches without setting the current USN is re-stamped.
+
+A pull (GET /sync?since=N) returns every row with N < usn <= col.usn and,
+if anything was written at col.usn, bumps col.usn so later writes get a higher
+number. The response's `usn` is what the client passes as `since` next time.
+since = -1 (the default) is a full sync.
+
+Rows travel in a compact form: per table, the column names once plus one JSON
+array per row. A push (POST /sync) uses the same form.
+- notes/cards: last writer wins by `mod`.
+- revlog: append-only.
+- graves: delete cards (type 0) or notes and their cards (type 1).
+
+This module only uses the standard library so tools can import it without the
+Flask app.
+"""
+
+import json
+import time
+
+import user_db_decks
+import user_db_revlog_archive
+
+NOTE_COLUMNS = ('id', 'guid', 'mid', 'mod', 'tags', 'flds', 'sfld', 'csum', 'flags', 'data')
+CARD_COLUMNS = ('id', 'nid', 'did', 'ord', 'mod', 'type', 'queue', 'due', 'ivl', 'factor',
+                'reps', 'lapses', 'left', 'odue', 'odid', 'flags', 'data')
+REVLOG_COLUMNS = ('id', 'cid', 'ease', 'ivl', 'lastIvl', 'factor', 'time', 'type')
+GRAVE_COLUMNS = ('oid', 'type')
+
+SYNC_TABLES = {
+    'notes': NOTE_COLUMNS,
+    'cards': CARD_COLUMNS,
+    'revlog': REVLOG_COLUMNS,
+    'graves': GRAVE_COLUMNS,
+}
+
+# The triggers migration v2 installs (its copy is frozen; drop_usn_triggers needs the
+# names). A row whose usn differs from col.usn after an INSERT/UPDATE gets the current
+# col.usn. recursive_triggers is off, so the trigger's own UPDATE doesn't fire it again.
+USN_TRIGGERS = {
+    f"usn_{table}_{event.lower()}": f"""
+        CREATE TRIGGER IF NOT EXISTS usn_{table}_{event.lower()} AFTER {event} ON {table}
+        WHEN NEW.usn <> (SELECT usn FROM col)
+        BEGIN
+            UPDATE {table} SET usn = (SELECT usn FROM col) WHERE rowid = NEW.rowid;
+        END
+    """
+    for table in SYNC_TABLES for event in ('INSERT', 'UPDATE')
+}
+
+
+def drop_usn_triggers(conn):
+    """Removes the USN triggers, e.g. from an exported copy handed to Anki desktop."""
+    for name in USN_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+class SyncError(ValueError):
+    """A pushed change set is malformed."""
+
+
+def pull_changes(conn, since=-1, include_models=None):
+    """
+    Returns the rows changed after `since` plus the collection's deck/config JSON,
+    and marks a sync point. include_models defaults to full syncs only.
+    """
+    if include_models is None:
+        include_models = since < 0
+
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None  # manage the transaction explicitly
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            usn, models = conn.execute("SELECT usn, models FROM col LIMIT 1").fetchone()
+            if _written_at(conn, usn):
+                conn.execute("UPDATE col SET usn = usn + 1, ls = ?", (int(time.time() * 1000),))
+            else:
+                usn -= 1  # Nothing stamped with the current USN yet: leave it for the next writes
+
+            result = {'usn': usn, 'since': since}
+            for table, columns in SYNC_TABLES.items():
+                rows = conn.execute(
+                    f"SELECT {', '.join(columns)} FROM {table} WHERE usn > ? AND usn <= ?",
+                    (since, usn)).fetchall()
+                result[table] = {'columns': list(columns), 'rows': [list(row) for row in rows]}
+            # Rows moved to the archive tier are still part of the history a client pulls
+            result['revlog']['rows'].extend(
+                [row[0], row[1], *row[3:]] for row in user_db_revlog_archive.archived_rows(conn, since, usn))
+            decks, dconf, conf = user_db_decks.col_json(conn)  # the registry, not the stale col blobs
+            result['col'] = {'decks': json.dumps(decks), 'dconf': json.dumps(dconf), 'conf': json.dumps(conf)}
+            if include_models:
+                result['col']['models'] = models
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = previous_isolation
+    return result
+
+
+def _written_at(conn, usn):
+    return any(conn.execute(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE usn = ?)", (usn,)).fetchone()[0]
+               for table in SYNC_TABLES)
+
+
+def _rows(changes, table):
+    """Pushed rows of one table as dicts, validating the compact form."""
+    block = changes.get(table)
+    if block is None:
+        return []
+    if not isinstance(block, dict) or not isinstance(block.get('rows'), list):
+        raise SyncError(f"{table} must be an object with columns and rows")
+    columns = block.get('columns')
+    if not isinstance(columns, list) or set(columns) != set(SYNC_TABLES[table]):
+        raise SyncError(f"{table}.columns must be exactly: {', '.join(SYNC_TABLES[table])}")
+    rows = []
+    for row in block['rows']:
+        if not isinstance(row, list) or len(row) != len(columns):
+            raise SyncError(f"Each {table} row must be an array of {len(columns)} values")
+        rows.append(dict(zip(columns, row)))
+    return rows
+
+
+def _upsert_newer(cursor, table, columns, rows):
+    """Inserts new rows and updates existing ones whose pushed mod is newer. Returns rows applied."""
+    placeholders = ', '.join(f":{column}" for column in columns)
+    updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != 'id')
+    applied = 0
+    for row in rows:
+        cursor.execute(f"""
+            INSERT INTO {table} ({', '.join(columns)}, usn) VALUES ({placeholders}, -1)
+            ON CONFLICT(id) DO UPDATE SET {updates}, usn = -1 WHERE excluded.mod > {table}.mod
+        """, row)
+        applied += cursor.rowcount
+    return applied
+
+
+def apply_changes(conn, changes):
+    """
+    Applies a pushed change set in one transaction. Returns per-table counts
+    {'applied': n, 'skipped': n}. Raises SyncError for a malformed change set.
+    """
+    if not isinstance(changes, dict):
+        raise SyncError("Change set must be an object")
+    notes, cards = _rows(changes, 'notes'), _rows(changes, 'cards')
+    revlog, graves = _rows(changes, 'revlog'), _rows(changes, 'graves')
+
+    summary = {}
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.cursor()
+            for table, columns, rows in (('notes', NOTE_COLUMNS, notes), ('cards', CARD_COLUMNS, cards)):
+                applied = _upsert_newer(cursor, table, columns, rows)
+                summary[table] = {'applied': applied, 'skipped': len(rows) - applied}
+
+            cursor.executemany(f"""
+                INSERT OR IGNORE INTO revlog ({', '.join(REVLOG_COLUMNS)}, usn)
+                VALUES ({', '.join(f":{column}" for column in REVLOG_COLUMNS)}, -1)
+            """, revlog)
+            summary['revlog'] = {'applied': cursor.rowcount if revlog else 0}
+            summary['revlog']['skipped'] = len(revlog) - summary['revlog']['applied']
+
+            deleted = 0
+            for grave in graves:
+                if grave['type'] == 0:
+                    cursor.execute("DELETE FROM cards WHERE id = ?", (grave['oid'],))
+                elif grave['type'] == 1:
+                    cursor.execute("INSERT INTO graves (usn, oid, type) SELECT -1, id, 0 FROM cards WHERE nid = ?",
+                                   (grave['oid'],))
+                    cursor.execute("DELETE FROM cards WHERE nid = ?", (grave['oid'],))
+                    cursor.execute("DELETE FROM notes WHERE id = ?", (grave['oid'],))
+                else:
+                    continue  # Deck graves: decks are managed through the deck routes
+                if cursor.rowcount:
+                    deleted += 1
+                    cursor.execute("INSERT INTO graves (usn, oid, type) VALUES (-1, ?, ?)",
+                                   (grave['oid'], grave['type']))
+            summary['graves'] = {'applied': deleted, 'skipped': len(graves) - deleted}
+
+            if any(counts['applied'] for counts in summary.values()):
+                cursor.execute("UPDATE col SET mod = ?", (int(time.time() * 1000),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.isolation_level = previous_isolation
+    return summary
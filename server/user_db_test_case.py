@@ -0,0 +1,54 @@
+"""
+user_db_test_case.py — Shared fixture for route tests against one user's DB.
+
+UserDbTestCase gives each test a fresh user DB (with the initial flashcards in
+deck 2 unless initial_cards is False), points app.get_user_db_path at it, and a
+test client logged in as user 1. Subclasses call super().setUp() first and add
+their own data; everything set up here is undone with addCleanup, so they don't
+need to call super().tearDown().
+"""
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-for-unit-tests')
+
+import app as server_app  # noqa: E402
+
+
+class UserDbTestCase(unittest.TestCase):
+
+    user_name = 'Test'  # name stored in the collection
+    username = 'test'  # session username
+    initial_cards = True
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.test_dir, ignore_errors=True)
+        self.db_path = os.path.join(self.test_dir, 'user_1.db')
+        server_app.init_anki_db(self.db_path, user_name=self.user_name)
+        if self.initial_cards:
+            server_app.add_initial_flashcards(self.db_path, '1700000000001', deck_id=2)
+
+        self.addCleanup(setattr, server_app, 'get_user_db_path', server_app.get_user_db_path)
+        server_app.get_user_db_path = lambda user_id: self.db_path
+        server_app.app.config['TESTING'] = True
+        self.client = server_app.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = self.username
+
+    def _query(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(sql, params).fetchall()
+        conn.close()
+        return rows
+
+    def _execute(self, sql, params=()):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute(sql, params).fetchall()
+        conn.commit()
+        conn.close()
+        return rows
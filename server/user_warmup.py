@@ -0,0 +1,121 @@
+"""
+user_warmup.py — Background warm-up of a user's per-process state after login.
+
+The first /review after /login pays every cold cost at once. It resolves the DB
+path and applies pending migrations, opens the DB and reads the collection
+config. With DUE_QUEUE_CACHE_USERS it also builds the due queues. /login
+schedules that work with a WarmupTracker so it runs while the client loads its
+first screen, and the first /review claims the result.
+
+Warm-ups run on a small thread pool, at most one pending per user. Each one is
+counted once, by how it paid off:
+  hit     the first /review found it finished
+  late    the first /review arrived while it was running and waited for it
+  missed  the first /review gave up waiting (wait_s) and did the work itself
+  unused  nothing claimed it within ttl seconds (e.g. the student's requests
+          went to another worker, or they never opened /review)
+  failed  it raised
+
+The tracker only schedules and counts callables; the warm-up work itself lives
+in app.py, so the outcome accounting can be unit tested with plain functions.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+OUTCOMES = ('hit', 'late', 'missed', 'unused', 'failed')
+
+
+class _Warmup:
+    __slots__ = ('scheduled_at', 'done', 'error', 'seconds')
+
+    def __init__(self, scheduled_at):
+        self.scheduled_at = scheduled_at
+        self.done = threading.Event()
+        self.error = None
+        self.seconds = None
+
+
+class WarmupTracker:
+    """Schedules per-user warm-ups and counts how often they pay off."""
+
+    def __init__(self, max_workers=1, ttl=600, wait_s=0.5):
+        self.ttl = ttl
+        self.wait_s = wait_s
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='warmup')
+        self._pending = {}  # user_id -> _Warmup not yet claimed
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(('scheduled', 'skipped') + OUTCOMES, 0)
+        self._warm_seconds = 0.0
+        self._finished = 0
+
+    def schedule(self, user_id, warm):
+        """Runs warm(user_id) in the background unless one is already pending for the user.
+        Returns True if it was scheduled."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if user_id in self._pending:
+                self._counts['skipped'] += 1
+                return False
+            entry = _Warmup(now)
+            self._pending[user_id] = entry
+            self._counts['scheduled'] += 1
+        self._executor.submit(self._run, user_id, entry, warm)
+        return True
+
+    def _run(self, user_id, entry, warm):
+        started = time.monotonic()
+        try:
+            warm(user_id)
+        except Exception as e:
+            entry.error = e
+        entry.seconds = time.monotonic() - started
+        with self._lock:
+            self._warm_seconds += entry.seconds
+            self._finished += 1
+        entry.done.set()
+
+    def claim(self, user_id):
+        """
+        Called by the first request that uses the warmed state. Waits up to wait_s
+        for a running warm-up. Returns 'hit', 'late', 'missed' or 'failed', or None
+        if no warm-up was pending for the user.
+        """
+        with self._lock:
+            entry = self._pending.pop(user_id, None)
+        if entry is None:
+            return None
+        if entry.done.is_set():
+            outcome = 'hit'
+        elif entry.done.wait(self.wait_s):
+            outcome = 'late'
+        else:
+            outcome = 'missed'
+        if outcome != 'missed' and entry.error is not None:
+            outcome = 'failed'
+        with self._lock:
+            self._counts[outcome] += 1
+        return outcome
+
+    def _expire(self, now):
+        for user_id, entry in list(self._pending.items()):
+            if now - entry.scheduled_at > self.ttl:
+                del self._pending[user_id]
+                self._counts['failed' if entry.error is not None else 'unused'] += 1
+
+    def stats(self):
+        """Counts per outcome, pending warm-ups, payoff rate ((hit + late) / resolved) and mean duration."""
+        with self._lock:
+            self._expire(time.monotonic())
+            stats = dict(self._counts)
+            stats['pending'] = len(self._pending)
+            resolved = sum(self._counts[outcome] for outcome in OUTCOMES)
+            stats['payoff_rate'] = round((stats['hit'] + stats['late']) / resolved, 3) if resolved else None
+            stats['mean_warmup_ms'] = round(self._warm_seconds / self._finished * 1000, 1) if self._finished else None
+        return stats
+
+    def resolved(self):
+        with self._lock:
+            return sum(self._counts[outcome] for outcome in OUTCOMES)
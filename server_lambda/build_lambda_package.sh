@@ -43,7 +43,7 @@ echo "✅ Dependencies packaged"
 # Add application code at root level
 echo "📝 Adding application code..."
 cd src
-zip -g ../lambda_deployment.zip *.py -q
+zip -g ../lambda_deployment.zip *.py *.json -q
 cd ..
 echo "✅ Application code added"
 echo ""
@@ -70,6 +70,14 @@ else
     exit 1
 fi
 
+# Check sample deck data (read by verbal_tenses_deck.py when a user registers)
+if unzip -l lambda_deployment.zip | grep -q "^\s*[0-9]*\s.*verbal_tenses\.json$"; then
+    echo "  ✅ verbal_tenses.json found"
+else
+    echo "  ❌ verbal_tenses.json NOT found at root level!"
+    exit 1
+fi
+
 # Check bcrypt binary (CRITICAL - must be Linux binary)
 if unzip -l lambda_deployment.zip | grep -q "bcrypt/_bcrypt\.abi3\.so"; then
     BCRYPT_SIZE=$(unzip -l lambda_deployment.zip | grep "bcrypt/_bcrypt\.abi3\.so" | awk '{print $1}')
@@ -18,14 +18,13 @@ import hashlib
 import sqlite3
 import uuid
 from functools import wraps
-from flask import Flask, request, jsonify, g, send_file, Response
+from flask import Flask, request, jsonify, g, send_file, Response, make_response
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-import bcrypt
-import boto3
 
 # Import our custom modules
-from s3_sqlite import SessionAwareS3SQLite
+from s3_sqlite import (SessionAwareS3SQLite, LoginPrefetch, ConflictError, get_s3_client, get_collection_version,
+                       read_collection_version, user_database_exists, upload_new_database)
 from session_manager import SessionConflictError
 from user_repository import UserRepository
 from anki_schema import init_anki_db
@@ -48,6 +47,15 @@ user_repo = UserRepository()
 
 # --- Constants ---
 DAILY_NEW_LIMIT = 20  # Maximum number of new cards to introduce per day per user
+# /api/login downloads the user's DB while bcrypt runs and opens their session, so the
+# first /api/review is a session hit. LOGIN_WARMUP=0 turns this off.
+LOGIN_WARMUP = os.environ.get('LOGIN_WARMUP', '1') == '1'
+LOGIN_PREFETCH_WAIT_S = float(os.environ.get('LOGIN_PREFETCH_WAIT_S', '3'))  # max wait after bcrypt
+LOGIN_WARMUP_CLAIM_TTL = 600  # a warm-up not used by a DB request within this many seconds is 'unused'
+
+# Login warm-up outcomes in this container (see _claimLoginWarmup)
+_warmup_stats = {'warmed': 0, 'skipped': 0, 'failed': 0, 'hit': 0, 'miss': 0, 'unused': 0}
+_warmed_users = {}  # username -> time of the login warm-up, until its first DB request
 
 
 # --- Helper Functions for Review Logic ---
@@ -182,6 +190,61 @@ def get_card_state(card_type, queue, interval):
     return "Unknown"
 
 
+# --- Login Warm-up ---
+
+def _warmUserSession(username, prefetch):
+    """
+    Opens the user's session at login, so this container holds the DB in /tmp and
+    owns the DynamoDB session before the client asks for its first card. The
+    session open adopts the prefetched download when its ETag is still current.
+
+    If the download hasn't finished within LOGIN_PREFETCH_WAIT_S (or failed, e.g.
+    a new user), nothing is opened: the session open would start a second full
+    download inside the login. The first request adopts the prefetch instead.
+    """
+    if not prefetch.wait(LOGIN_PREFETCH_WAIT_S):
+        _logWarmup('skipped', username)
+        return
+    try:
+        db_wrapper = SessionAwareS3SQLite(username)
+        conn = db_wrapper.__enter__()
+        try:
+            _getCollectionConfig(conn.cursor())
+        finally:
+            db_wrapper.__exit__(None, None, None)
+        _warmed_users[username] = time.time()
+        _logWarmup('warmed', username)
+    except Exception as e:
+        # Never fail a login over the warm-up; the first request does the work instead
+        app.logger.warning(f"Login warm-up failed for {username}: {e}")
+        _logWarmup('failed', username)
+
+
+def _claimLoginWarmup(username, session_reused):
+    """
+    Counts whether a login warm-up paid off: 'hit' if the user's first DB request
+    after it reused the warmed session in this container, 'miss' if it had to
+    download again. Warm-ups whose user never came back to this container (their
+    requests went to another one) are counted 'unused' once they are stale.
+    """
+    now = time.time()
+    for other, warmed_at in list(_warmed_users.items()):
+        if other != username and now - warmed_at > LOGIN_WARMUP_CLAIM_TTL:
+            del _warmed_users[other]
+            _logWarmup('unused', other)
+    if _warmed_users.pop(username, None) is not None:
+        _logWarmup('hit' if session_reused else 'miss', username)
+
+
+def _logWarmup(event, username):
+    """Counts the event and logs it with the container's totals (one JSON line, for CloudWatch metric filters)."""
+    _warmup_stats[event] += 1
+    resolved = _warmup_stats['hit'] + _warmup_stats['miss'] + _warmup_stats['unused']
+    payoff = round(_warmup_stats['hit'] / resolved, 3) if resolved else None
+    print(json.dumps({'login_warmup': event, 'username': username, 'container': _warmup_stats,
+                      'payoff_rate': payoff}))
+
+
 # --- Decorator for Session-Aware DB Access ---
 
 def with_user_db(f):
@@ -210,6 +273,7 @@ def with_user_db(f):
             # Create session-aware connection
             db_wrapper = SessionAwareS3SQLite(username, session_id)
             conn = db_wrapper.__enter__()
+            _claimLoginWarmup(username, db_wrapper.session_reused)
 
             # Store in Flask g context
             g.db = conn
@@ -240,6 +304,9 @@ def with_user_db(f):
 
         except SessionConflictError as e:
             return jsonify({'error': str(e), 'code': 'SESSION_CONFLICT'}), 409
+        except ConflictError as e:
+            # S3_JOURNAL: another process appended to the user's journal first
+            return jsonify({'error': str(e), 'code': 'CONFLICT'}), 409
         except Exception as e:
             app.logger.error(f"Error in with_user_db: {e}")
             return jsonify({'error': 'Internal server error'}), 500
@@ -247,6 +314,49 @@ def with_user_db(f):
     return decorated
 
 
+def conditional_get(f):
+    """
+    Decorator for read-only routes: answer 304 Not Modified when the client's
+    If-None-Match still matches the user's collection version.
+
+    The version is checked BEFORE with_user_db runs, from the local /tmp copy
+    when this container owns the user's session or from S3 object metadata
+    (a HEAD request) otherwise, so a 304 never downloads the database.
+    200 responses get a weak ETag and Cache-Control: private, no-cache.
+
+    Usage:
+        @app.route('/api/decks', methods=['GET'])
+        @jwt_required()
+        @conditional_get
+        @with_user_db
+        def get_decks():
+            ...
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        username = get_jwt_identity()
+        version = get_collection_version(username)
+        if version is not None and request.if_none_match.contains_weak(f"{username}-{version}"):
+            response = app.response_class(status=304)
+            session_id = request.headers.get('X-Session-ID')
+            if session_id:
+                response.headers['X-Session-ID'] = session_id
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            # with_user_db has just opened the authoritative copy in /tmp
+            version = read_collection_version(f'/tmp/{username}.anki2')
+            if version is None:
+                return response
+
+        response.set_etag(f"{username}-{version}", weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    return decorated
+
+
 # --- Authentication Routes ---
 
 @app.route('/api/register', methods=['POST'])
@@ -293,17 +403,7 @@ def register():
     from s3_sqlite import S3SQLiteConnection
 
     # Check if DB already has full schema by checking S3 first
-    import boto3
-    s3 = boto3.client('s3')
-    bucket = os.environ.get('S3_BUCKET', 'javumbo-user-dbs')
-    s3_key = f'user_dbs/{username}.anki2'
-
-    db_exists_in_s3 = False
-    try:
-        s3.head_object(Bucket=bucket, Key=s3_key)
-        db_exists_in_s3 = True
-    except:
-        pass
+    db_exists_in_s3 = user_database_exists(username)
 
     if db_exists_in_s3:
         # DB exists in S3, just download it
@@ -334,10 +434,9 @@ def register():
             print(f"✓ Set current deck to Verbal Tenses (deck_id=2)")
         conn.close()
 
-        # Upload to S3
-        with open(local_path, 'rb') as f:
-            s3.put_object(Bucket=bucket, Key=s3_key, Body=f)
-        print(f"✓ Uploaded new database to S3: {s3_key}")
+        # Upload to S3 (one object, or chunks + manifest with S3_STORAGE_FORMAT=chunked)
+        upload_new_database(username, local_path)
+        print(f"✓ Uploaded new database to S3 for {username}")
 
     return jsonify({"message": "User registered successfully"}), 200
 
@@ -366,13 +465,21 @@ def login():
     username = data['username']
     password = data['password']
 
+    # Start downloading the user's DB now, so the S3 fetch overlaps the bcrypt check
+    prefetch = LoginPrefetch(username) if LOGIN_WARMUP else None
+
     # Authenticate user (password check done in repository)
     if not user_repo.authenticate(username, password):
+        if prefetch:
+            prefetch.discard()
         return jsonify({"error": "Invalid credentials"}), 401
 
     # Get user details (without password_hash)
     user = user_repo.get_user(username)
 
+    if prefetch:
+        _warmUserSession(username, prefetch)
+
     # Create JWT token
     access_token = create_access_token(identity=username)
 
@@ -395,6 +502,7 @@ def health():
 
 @app.route('/api/decks', methods=['GET'])
 @jwt_required()
+@conditional_get
 @with_user_db
 def get_decks():
     """
@@ -751,6 +859,7 @@ def delete_deck(deck_id):
 
 @app.route('/api/decks/<int:deck_id>/stats', methods=['GET'])
 @jwt_required()
+@conditional_get
 @with_user_db
 def get_deck_stats(deck_id):
     """
@@ -965,6 +1074,7 @@ def add_card():
 
 @app.route('/api/cards/<int:card_id>', methods=['GET'])
 @jwt_required()
+@conditional_get
 @with_user_db
 def get_card(card_id):
     """
@@ -1193,6 +1303,7 @@ def delete_card(card_id):
 
 @app.route('/api/decks/<int:deck_id>/cards', methods=['GET'])
 @jwt_required()
+@conditional_get
 @with_user_db
 def get_deck_cards(deck_id):
     """
@@ -1730,8 +1841,9 @@ def flush_session():
         200: {"success": True}
         400: {"error": "Missing session_id"}
     """
-    from s3_sqlite import S3SQLiteConnection
     from session_manager import SessionManager
+    from tmp_cache import db_cache
+    from write_behind import scheduler
 
     username = get_jwt_identity()
     data = request.get_json()
@@ -1742,14 +1854,14 @@ def flush_session():
     session_id = data['session_id']
 
     try:
-        # Force upload by opening and closing S3 connection
-        with S3SQLiteConnection(username) as conn:
-            # Context manager handles upload on exit
-            pass
+        # Upload this container's unflushed writes, if any. Nothing is re-downloaded:
+        # a clean (or already flushed) database is in S3 as it is
+        scheduler.flush(username, 'session_flush', raise_errors=True)
 
         # Delete session from DynamoDB
         session_mgr = SessionManager()
         session_mgr.delete_session(session_id)
+        db_cache.release_session(username)
 
         return jsonify({"success": True}), 200
 
@@ -1854,8 +1966,8 @@ def serve_static(path):
     For SPA routing, we return index.html for all non-API routes
     so React Router can handle client-side navigation.
     """
-    # Initialize S3 client
-    s3 = boto3.client('s3')
+    # Reuse the container-wide S3 client instead of building one per request
+    s3 = get_s3_client()
     bucket_name = os.environ.get('S3_FRONTEND_BUCKET', 'javumbo-frontend-prod')
 
     # If no path or root, serve index.html
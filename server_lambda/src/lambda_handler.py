@@ -16,5 +16,9 @@ from app import app
 # Import apig-wsgi (proper WSGI adapter for API Gateway)
 from apig_wsgi import make_lambda_handler
 
+# Flush dirty session databases (write_behind) when Lambda shuts the container down
+from write_behind import install_shutdown_hook
+install_shutdown_hook()
+
 # Wrap Flask app for Lambda
 handler = make_lambda_handler(app)
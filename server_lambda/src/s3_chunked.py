@@ -0,0 +1,238 @@
+"""
+s3_chunked - Chunked, content-addressed storage of user databases in S3
+
+With S3_STORAGE_FORMAT=chunked, s3_sqlite stores a user's .anki2 file as
+fixed-size chunks plus a manifest instead of one object:
+
+    user_dbs/<username>.manifest.json     {"format": 1, "chunk_size": 16384, "size": <bytes>,
+                                           "chunks": [<sha256 of chunk 0>, <sha256 of chunk 1>, ...]}
+    user_chunks/<username>/<sha256>       one object per distinct chunk content
+
+A review rewrites a handful of 4 KB SQLite pages, so an upload only PUTs the
+chunks whose hash is not in the current manifest, then the new manifest.
+Downloads fetch chunks in parallel and reuse every chunk an older local copy
+already has. The manifest is the unit of optimistic concurrency: its ETag plays
+the role the whole-file ETag played before, and a writer whose expected ETag no
+longer matches gets ConflictError. Chunks only the previous manifest used are
+deleted after the new manifest is written; a reader that loses that race
+re-reads the manifest and retries.
+
+Users still stored as a single user_dbs/<username>.anki2 object are read from
+it until their first chunked upload (see s3_sqlite). That object is left in
+place as a pre-migration snapshot; materialize_file_object() rewrites it from
+the chunks, e.g. before switching S3_STORAGE_FORMAT back to file.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import s3_codec
+import s3_transfer
+
+# 4 SQLite pages. Smaller chunks make the manifest (64 bytes per chunk) the bulk of an
+# upload on big collections, larger ones re-send more unchanged pages: see
+# tests/test_s3_chunked_delta.py
+CHUNK_SIZE = int(os.environ.get('S3_CHUNK_SIZE', 16 * 1024))
+CHUNK_WORKERS = int(os.environ.get('S3_CHUNK_WORKERS', 8))  # parallel chunk GETs/PUTs
+MANIFEST_FORMAT = 1
+
+
+class ChunkMissingError(Exception):
+    """A chunk named by the manifest is gone (deleted after a newer manifest was written)."""
+
+
+def manifest_key(username):
+    return f'user_dbs/{username}.manifest.json'
+
+
+def chunk_key(username, digest):
+    return f'user_chunks/{username}/{digest}'
+
+
+def iter_chunks(path, chunk_size):
+    """Yields (sha256 hex, bytes) for each chunk of a file."""
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                return
+            yield hashlib.sha256(data).hexdigest(), data
+
+
+def build_manifest(path, chunk_size=None):
+    """Manifest of a local file, without uploading anything."""
+    chunk_size = chunk_size or CHUNK_SIZE
+    return {
+        'format': MANIFEST_FORMAT,
+        'chunk_size': chunk_size,
+        'size': os.path.getsize(path),
+        'chunks': [digest for digest, _ in iter_chunks(path, chunk_size)],
+    }
+
+
+def read_manifest(s3, bucket, username):
+    """(manifest dict, ETag) of the user's manifest, or (None, None) if there is none."""
+    try:
+        response = s3.get_object(Bucket=bucket, Key=manifest_key(username))
+    except s3.exceptions.NoSuchKey:
+        return None, None
+    return json.loads(response['Body'].read()), response['ETag']
+
+
+def head_manifest(s3, bucket, username):
+    """HEAD response of the user's manifest, or None if there is none."""
+    try:
+        return s3.head_object(Bucket=bucket, Key=manifest_key(username))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return None
+        raise
+
+
+def _fetch_chunk(s3, bucket, username, digest):
+    try:
+        response = s3.get_object(Bucket=bucket, Key=chunk_key(username, digest))
+    except s3.exceptions.NoSuchKey:
+        raise ChunkMissingError(digest)
+    data = s3_codec.decode_bytes(response['Body'].read(), response.get('ContentEncoding'))
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f"Chunk {chunk_key(username, digest)} does not match its hash")
+    return data
+
+
+def _assemble(s3, bucket, username, manifest, local_path, reuse_path=None):
+    """Writes the manifest's file to local_path. Returns (chunks fetched, bytes fetched)."""
+    chunk_size = manifest['chunk_size']
+    have = {}
+    if reuse_path and os.path.exists(reuse_path):
+        wanted = set(manifest['chunks'])
+        have = {digest: data for digest, data in iter_chunks(reuse_path, chunk_size) if digest in wanted}
+    missing = sorted(set(manifest['chunks']) - set(have))
+    with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as pool:
+        for digest, data in zip(missing, pool.map(lambda d: _fetch_chunk(s3, bucket, username, d), missing)):
+            have[digest] = data
+
+    tmp_path = f'{local_path}.assembling'
+    with open(tmp_path, 'wb') as f:
+        for digest in manifest['chunks']:
+            f.write(have[digest])
+        f.truncate(manifest['size'])
+    os.replace(tmp_path, local_path)
+    return len(missing), sum(len(have[digest]) for digest in missing)
+
+
+def download(s3, bucket, username, local_path, manifest=None, etag=None, reuse_path=None):
+    """
+    Downloads the user's database to local_path, reading the manifest unless it is
+    given. Chunks already in reuse_path (an older local copy) are not fetched.
+    Returns (manifest, ETag), or (None, None) if the user has no manifest.
+    """
+    for attempt in range(2):
+        if manifest is None:
+            manifest, etag = read_manifest(s3, bucket, username)
+            if manifest is None:
+                return None, None
+        try:
+            fetched, fetched_bytes = _assemble(s3, bucket, username, manifest, local_path, reuse_path)
+            print(f"✓ Assembled {username} from {len(manifest['chunks'])} chunks "
+                  f"({fetched} fetched, {fetched_bytes} bytes)")
+            return manifest, etag
+        except ChunkMissingError:
+            if attempt:
+                raise
+            manifest = None  # a newer manifest replaced it: read that one
+
+
+def upload(s3, bucket, username, local_path, expected_etag, metadata=None, chunk_size=None):
+    """
+    Uploads the chunks of local_path that the current manifest doesn't have, then
+    writes a new manifest. expected_etag is the manifest ETag the local copy was
+    based on (None: there must be no manifest yet). chunk_size defaults to CHUNK_SIZE.
+
+    Returns (new ETag, stats dict). Raises ConflictError if the manifest changed.
+    """
+    from s3_sqlite import ConflictError
+
+    current, current_etag = read_manifest(s3, bucket, username)
+    if current_etag != expected_etag:
+        raise ConflictError(
+            f"Concurrent modification detected for {username}. "
+            f"Expected manifest ETag {expected_etag}, but S3 has {current_etag}. "
+            f"Another process modified the file. Please retry the operation."
+        )
+    known = set(current['chunks']) if current else set()
+
+    chunk_size = chunk_size or CHUNK_SIZE
+    digests, pending = [], {}
+    for digest, data in iter_chunks(local_path, chunk_size):
+        digests.append(digest)
+        if digest not in known:
+            pending[digest] = data
+    size = os.path.getsize(local_path)
+    if current and current['chunks'] == digests and current['size'] == size and current['chunk_size'] == chunk_size:
+        # Nothing changed (e.g. a read-only session ending): keep the manifest and its ETag
+        return current_etag, {'chunks': len(digests), 'uploaded_chunks': 0, 'uploaded_bytes': 0,
+                              'manifest_bytes': 0, 'deleted_chunks': 0}
+    encoding = s3_codec.active_encoding()
+
+    def put_chunk(item):
+        body = s3_codec.encode_bytes(item[1], encoding)
+        s3.put_object(Bucket=bucket, Key=chunk_key(username, item[0]), Body=body, **s3_codec.put_kwargs(encoding))
+        return len(body)
+
+    with ThreadPoolExecutor(max_workers=CHUNK_WORKERS) as pool:
+        uploaded_bytes = sum(pool.map(put_chunk, pending.items()))
+
+    # The chunk PUTs took time: the manifest PUT is conditional on expected_etag
+    # (s3_transfer.write_conditions); without conditional writes, check again first
+    conflict = ConflictError(
+        f"Concurrent modification detected for {username} while uploading chunks. "
+        f"Please retry the operation."
+    )
+    if not s3_transfer.CONDITIONAL_WRITES:
+        head = head_manifest(s3, bucket, username)
+        if (head['ETag'] if head else None) != expected_etag:
+            raise conflict
+    manifest = {'format': MANIFEST_FORMAT, 'chunk_size': chunk_size,
+                'size': size, 'chunks': digests}
+    body = json.dumps(manifest, separators=(',', ':')).encode('utf-8')
+    try:
+        response = s3.put_object(Bucket=bucket, Key=manifest_key(username), Body=body,
+                                 ContentType='application/json', Metadata=metadata or {},
+                                 **s3_transfer.write_conditions(expected_etag))
+    except ClientError as e:
+        if s3_transfer.is_write_conflict(e) or e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            raise conflict
+        raise
+
+    stale = sorted(known - set(digests))
+    for start in range(0, len(stale), 1000):
+        try:
+            s3.delete_objects(Bucket=bucket, Delete={
+                'Objects': [{'Key': chunk_key(username, digest)} for digest in stale[start:start + 1000]],
+                'Quiet': True})
+        except Exception as e:
+            # Orphaned chunks only cost storage; cleanup_s3.py can remove them later
+            print(f"⚠ Could not delete {len(stale)} stale chunks of {username}: {e}")
+            break
+
+    stats = {'chunks': len(digests), 'uploaded_chunks': len(pending),
+             'uploaded_bytes': uploaded_bytes, 'manifest_bytes': len(body),
+             'deleted_chunks': len(stale)}
+    return response['ETag'], stats
+
+
+def materialize_file_object(s3, bucket, username, local_path, metadata=None):
+    """Rewrites user_dbs/<username>.anki2 as one object from the chunks (rollback/backup)."""
+    manifest, _ = download(s3, bucket, username, local_path)
+    if manifest is None:
+        return False
+    encoding = s3_codec.active_encoding()
+    with s3_codec.open_encoded(local_path, encoding) as f:
+        s3_transfer.upload(s3, bucket, f'user_dbs/{username}.anki2', f, Metadata=metadata or {},
+                           **s3_codec.put_kwargs(encoding))
+    return True
@@ -0,0 +1,125 @@
+"""
+s3_codec - Compressed at-rest storage of user database objects in S3
+
+S3_COMPRESSION=zstd (or gzip) stores user_dbs/<username>.anki2 objects and
+user_chunks/ chunk objects compressed, with the codec in the object's
+Content-Encoding header. Readers decode by that header, not by the setting, so
+compressed and uncompressed objects coexist during a migration: every object
+keeps its encoding until the next upload rewrites it with the current one.
+
+Both directions stream in STREAM_BLOCK pieces, so a Lambda never holds a whole
+database in memory:
+- download_to_file(): get_object Body -> decoder -> /tmp file
+- open_encoded(): /tmp file -> encoder -> temporary /tmp file -> put_object
+
+zstd needs the optional zstandard package. Without it, S3_COMPRESSION=zstd
+falls back to gzip for writes, and reading a zstd object raises.
+"""
+
+import contextlib
+import gzip
+import os
+import shutil
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip fallback
+    zstandard = None
+
+S3_COMPRESSION = os.environ.get('S3_COMPRESSION', 'none').lower()  # none | zstd | gzip
+ZSTD_LEVEL = int(os.environ.get('S3_ZSTD_LEVEL', 3))
+GZIP_LEVEL = int(os.environ.get('S3_GZIP_LEVEL', 6))
+STREAM_BLOCK = 1024 * 1024
+
+
+def active_encoding():
+    """Content-Encoding new uploads use: 'zstd', 'gzip' or None (uncompressed)."""
+    if S3_COMPRESSION == 'zstd':
+        return 'zstd' if zstandard is not None else 'gzip'
+    if S3_COMPRESSION == 'gzip':
+        return 'gzip'
+    return None
+
+
+def put_kwargs(encoding):
+    """Extra put_object arguments marking an object as encoded."""
+    return {'ContentEncoding': encoding} if encoding else {}
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise RuntimeError("Object is zstd-compressed but the zstandard package is not installed")
+
+
+def download_to_file(response, path):
+    """
+    Streams a get_object response into path, decoding its Content-Encoding.
+    Writes to a temporary file first, so path is never left half-written.
+    """
+    encoding = response.get('ContentEncoding')
+    body = response['Body']
+    tmp_path = f'{path}.download'
+    with open(tmp_path, 'wb') as f:
+        if encoding == 'zstd':
+            _require_zstandard()
+            zstandard.ZstdDecompressor().copy_stream(body, f, read_size=STREAM_BLOCK, write_size=STREAM_BLOCK)
+        elif encoding == 'gzip':
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            while block := body.read(STREAM_BLOCK):
+                # Bound each output piece too: a 1 MB compressed block inflates to ~4 MB
+                while block:
+                    f.write(decoder.decompress(block, STREAM_BLOCK))
+                    block = decoder.unconsumed_tail
+            f.write(decoder.flush())
+        else:
+            while block := body.read(STREAM_BLOCK):
+                f.write(block)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def open_encoded(path, encoding):
+    """
+    Yields a binary file with path's contents encoded for put_object. For a
+    codec, the file is a temporary compressed copy next to path, removed on exit.
+    """
+    if not encoding:
+        with open(path, 'rb') as f:
+            yield f
+        return
+
+    encoded_path = f'{path}.{encoding}'
+    try:
+        with open(path, 'rb') as src, open(encoded_path, 'wb') as dst:
+            if encoding == 'zstd':
+                _require_zstandard()
+                zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(src, dst, read_size=STREAM_BLOCK)
+            else:
+                with gzip.GzipFile(fileobj=dst, mode='wb', compresslevel=GZIP_LEVEL, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, STREAM_BLOCK)
+        with open(encoded_path, 'rb') as f:
+            yield f
+    finally:
+        if os.path.exists(encoded_path):
+            os.remove(encoded_path)
+
+
+def encode_bytes(data, encoding):
+    """Encodes a small object (a chunk) in memory."""
+    if encoding == 'zstd':
+        _require_zstandard()
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return data
+
+
+def decode_bytes(data, encoding):
+    """Decodes a small object (a chunk) read with get_object."""
+    if encoding == 'zstd':
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)  # frames from copy_stream carry no size
+    if encoding == 'gzip':
+        return gzip.decompress(data)
+    return data
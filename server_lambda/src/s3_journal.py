@@ -0,0 +1,299 @@
+"""
+s3_journal - Append-only change journal for user databases (S3_JOURNAL=true)
+
+A review changes one cards row and adds one revlog row, yet making it durable
+meant uploading the whole .anki2 file. With the journal, a session connection
+records which rows it changes (TEMP triggers, so nothing is added to the
+database file), and on each request the changed rows are appended to S3 as one
+small segment:
+
+    user_journal/<username>/<seq:012d>.json     {"format": 1, "seq": N, "tables":
+        {"cards": {"columns": [...], "rows": [[rowid, [values]], ...]}, ...}}
+
+A row is written whole when inserted, as its changed columns only when updated
+(so bumping col.mod doesn't ship the models/decks JSON), and as null when
+deleted. Replaying a record twice gives the same row, so replay is idempotent.
+
+Segment N is written with IfNoneMatch='*': two writers can't both append N, and
+the loser gets ConflictError (the journal's optimistic lock). Compaction
+deletes segments, so an append also checks the base afterwards: a seq at or
+below its journal-seq was folded already and is a conflict too. The base
+user_dbs/<username>.anki2 object carries the last segment folded into it in
+its 'journal-seq' metadata, and loading a database is base + replay of the
+segments after it. Compaction is a whole-file upload (write_behind, after
+S3_JOURNAL_COMPACT_SEGMENTS segments or at session end): it stores the new
+journal-seq and then deletes the folded segments.
+
+S3 rather than DynamoDB: the conditional PUT per sequence number already orders
+appends, the segments share the bucket's lifecycle, and items aren't limited
+to 400 KB. Only S3_STORAGE_FORMAT=file is journaled (chunked uploads are
+already proportional to the change). Appends are only race-free with
+S3_CONDITIONAL_WRITES on.
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+
+from botocore.exceptions import ClientError
+
+import s3_codec
+import s3_transfer
+
+JOURNAL_ENABLED = os.environ.get('S3_JOURNAL', 'false').lower() in ('1', 'true', 'yes')
+JOURNAL_COMPACT_SEGMENTS = int(os.environ.get('S3_JOURNAL_COMPACT_SEGMENTS', 50))
+JOURNAL_FORMAT = 1
+JOURNAL_SEQ_METADATA = 'journal-seq'
+_FULL_ROW = -1  # change mask for inserted rows (all columns)
+
+# Per user, as of this container's /tmp copy: the last segment applied or
+# appended, and the segment the base object had folded in when it was loaded
+_last_seq = {}
+_base_seq = {}
+_lock = threading.Lock()
+
+
+class JournalGapError(Exception):
+    """Segments after the base are missing (compacted meanwhile): load the base again."""
+    pass
+
+
+def journal_prefix(username):
+    return f'user_journal/{username}/'
+
+
+def segment_key(username, seq):
+    return f'{journal_prefix(username)}{seq:012d}.json'
+
+
+def _base_key(username):
+    """The base object (s3_sqlite's single-object user database)."""
+    return f'user_dbs/{username}.anki2'
+
+
+def base_seq(head):
+    """journal-seq of a base object, from its head_object/get_object response."""
+    return int(head.get('Metadata', {}).get(JOURNAL_SEQ_METADATA, 0))
+
+
+def last_seq(username):
+    with _lock:
+        return _last_seq.get(username, 0)
+
+
+def segments_since_base(username):
+    """Segments appended or replayed on top of the base this container loaded."""
+    with _lock:
+        return _last_seq.get(username, 0) - _base_seq.get(username, 0)
+
+
+def _set_seq(username, last, base=None):
+    with _lock:
+        _last_seq[username] = last
+        if base is not None:
+            _base_seq[username] = base
+
+
+# --- Capturing changes ---
+
+def _tables(conn):
+    return [name for (name,) in conn.execute(
+        "SELECT name FROM main.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f'PRAGMA main.table_info("{table}")')]
+
+
+def capture(conn):
+    """
+    Starts recording the rows conn changes (per connection, in its temp schema).
+    Returns the schema version, for collect().
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS _journal "
+                 "(tbl TEXT, id INTEGER, mask INTEGER, PRIMARY KEY (tbl, id))")
+    for table in _tables(conn):
+        columns = _columns(conn, table)
+        if len(columns) <= 62:
+            changed = ' | '.join(f'((OLD."{c}" IS NOT NEW."{c}") << {i})' for i, c in enumerate(columns))
+        else:
+            changed = str(_FULL_ROW)
+        upsert = "ON CONFLICT (tbl, id) DO UPDATE SET mask = mask | excluded.mask"
+        conn.executescript(f'''
+            CREATE TEMP TRIGGER IF NOT EXISTS "_journal_{table}_insert" AFTER INSERT ON main."{table}" BEGIN
+                INSERT INTO _journal SELECT '{table}', NEW.rowid, {_FULL_ROW} WHERE 1 {upsert};
+            END;
+            CREATE TEMP TRIGGER IF NOT EXISTS "_journal_{table}_update" AFTER UPDATE ON main."{table}" BEGIN
+                INSERT INTO _journal SELECT '{table}', OLD.rowid, {_FULL_ROW} WHERE OLD.rowid != NEW.rowid {upsert};
+                INSERT INTO _journal SELECT '{table}', NEW.rowid,
+                    CASE WHEN OLD.rowid != NEW.rowid THEN {_FULL_ROW} ELSE {changed} END WHERE 1 {upsert};
+            END;
+            CREATE TEMP TRIGGER IF NOT EXISTS "_journal_{table}_delete" AFTER DELETE ON main."{table}" BEGIN
+                INSERT INTO _journal SELECT '{table}', OLD.rowid, {_FULL_ROW} WHERE 1 {upsert};
+            END;
+        ''')
+    return conn.execute("PRAGMA main.schema_version").fetchone()[0]
+
+
+def collect(conn, schema_version):
+    """
+    The committed changes recorded since capture() (or the last collect()), as
+    segment tables, and forgets them. Returns None if the schema changed: DDL
+    isn't journaled, the whole file has to be uploaded.
+    """
+    if conn.execute("PRAGMA main.schema_version").fetchone()[0] != schema_version:
+        conn.execute("DELETE FROM _journal")
+        conn.commit()
+        return None
+    tables = {}
+    for table, rowid, mask in conn.execute("SELECT tbl, id, mask FROM _journal ORDER BY tbl, id").fetchall():
+        if table not in tables:
+            tables[table] = {'columns': _columns(conn, table), 'rows': []}
+        columns = tables[table]['columns']
+        row = conn.execute(f'SELECT * FROM main."{table}" WHERE rowid = ?', (rowid,)).fetchone()
+        if row is None:
+            tables[table]['rows'].append([rowid, None])
+        elif mask == _FULL_ROW:
+            tables[table]['rows'].append([rowid, [_encode(v) for v in row]])
+        else:
+            changed = {c: _encode(row[i]) for i, c in enumerate(columns) if mask & (1 << i)}
+            if changed:
+                tables[table]['rows'].append([rowid, changed])
+    conn.execute("DELETE FROM _journal")
+    conn.commit()
+    return {table: changes for table, changes in tables.items() if changes['rows']}
+
+
+def _encode(value):
+    return {'b64': base64.b64encode(value).decode()} if isinstance(value, bytes) else value
+
+
+def _decode(value):
+    return base64.b64decode(value['b64']) if isinstance(value, dict) else value
+
+
+def apply(conn, tables):
+    """Replays segment tables onto conn (no commit)."""
+    for table, changes in tables.items():
+        columns = changes['columns']
+        for rowid, values in changes['rows']:
+            if values is None:
+                conn.execute(f'DELETE FROM "{table}" WHERE rowid = ?', (rowid,))
+            elif isinstance(values, list):
+                names = ', '.join(['rowid'] + [f'"{c}"' for c in columns])
+                marks = ', '.join('?' * (len(columns) + 1))
+                conn.execute(f'INSERT OR REPLACE INTO "{table}" ({names}) VALUES ({marks})',
+                             [rowid] + [_decode(v) for v in values])
+            else:
+                assignments = ', '.join(f'"{c}" = ?' for c in values)
+                conn.execute(f'UPDATE "{table}" SET {assignments} WHERE rowid = ?',
+                             [_decode(v) for v in values.values()] + [rowid])
+
+
+# --- S3 ---
+
+def append(s3, bucket, username, tables):
+    """
+    Appends one segment after this container's last one. Returns its seq.
+    Raises ConflictError if another writer appended that seq first, or if a
+    compaction already folded it into the base (this container is behind).
+    """
+    from s3_sqlite import ConflictError
+
+    seq = last_seq(username) + 1
+    key = segment_key(username, seq)
+    encoding = s3_codec.active_encoding()
+    body = s3_codec.encode_bytes(json.dumps({'format': JOURNAL_FORMAT, 'seq': seq, 'tables': tables},
+                                            separators=(',', ':')).encode(), encoding)
+    try:
+        s3.put_object(Bucket=bucket, Key=key, Body=body, **s3_transfer.write_conditions(None),
+                      **s3_codec.put_kwargs(encoding))
+    except ClientError as e:
+        if s3_transfer.is_write_conflict(e):
+            raise ConflictError(
+                f"Concurrent modification detected for {username}. "
+                f"Journal segment {seq} was already written by another process. "
+                f"Please retry the operation."
+            )
+        raise
+
+    # IfNoneMatch can't protect seqs whose segments compaction deleted: a writer
+    # behind the base could append one, and replay (after the base's journal-seq)
+    # would never apply it. fold() deletes only after the base records the seq, so
+    # checking the base after the PUT catches every such append
+    try:
+        folded_seq = base_seq(s3.head_object(Bucket=bucket, Key=_base_key(username)))
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        folded_seq = 0
+    if seq <= folded_seq:
+        s3.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key}], 'Quiet': True})
+        raise ConflictError(
+            f"Concurrent modification detected for {username}. "
+            f"Journal segment {seq} was already compacted into the database (journal-seq {folded_seq}) "
+            f"by another process. Please retry the operation."
+        )
+    _set_seq(username, seq)
+    return seq
+
+
+def _list_segments(s3, bucket, username, after_seq=None, max_keys=1000):
+    """Yields (seq, key) of the journal's segments in order, after after_seq if given."""
+    kwargs = {'Bucket': bucket, 'Prefix': journal_prefix(username), 'MaxKeys': max_keys}
+    if after_seq is not None:
+        kwargs['StartAfter'] = segment_key(username, after_seq)
+    while True:
+        response = s3.list_objects_v2(**kwargs)
+        for obj in response.get('Contents', []):
+            yield int(obj['Key'].rsplit('/', 1)[1].split('.')[0]), obj['Key']
+        if not response.get('IsTruncated'):
+            return
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+
+def replay(s3, bucket, username, path, from_seq, base=None):
+    """
+    Applies the segments after from_seq to the database at path, in one
+    transaction. base is the loaded base object's journal-seq (None: path already
+    had segments applied on top of it). Returns the number of segments applied.
+    Raises JournalGapError if the first one isn't from_seq + 1.
+    """
+    segments = list(_list_segments(s3, bucket, username, after_seq=from_seq))
+    expected = from_seq + 1
+    for seq, _ in segments:
+        if seq != expected:
+            raise JournalGapError(f"Journal of {username} jumps from {expected - 1} to {seq}")
+        expected += 1
+
+    if segments:
+        conn = sqlite3.connect(path)
+        try:
+            for seq, key in segments:
+                response = s3.get_object(Bucket=bucket, Key=key)
+                data = s3_codec.decode_bytes(response['Body'].read(), response.get('ContentEncoding'))
+                apply(conn, json.loads(data)['tables'])
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"✓ Replayed {len(segments)} journal segment(s) for {username} ({from_seq + 1}..{expected - 1})")
+    _set_seq(username, expected - 1, base)
+    return len(segments)
+
+
+def has_newer(s3, bucket, username, seq):
+    """True if the journal has segments after seq (another writer appended)."""
+    return next(_list_segments(s3, bucket, username, after_seq=seq, max_keys=1), None) is not None
+
+
+def fold(s3, bucket, username, seq):
+    """After a base upload with journal-seq=seq: deletes the segments it contains."""
+    _set_seq(username, max(last_seq(username), seq), seq)
+    keys = [key for segment_seq, key in _list_segments(s3, bucket, username) if segment_seq <= seq]
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': key} for key in keys[i:i + 1000]],
+                                                 'Quiet': True})
+    if keys:
+        print(f"✓ Compacted {len(keys)} journal segment(s) of {username} into the base (journal-seq {seq})")
@@ -8,29 +8,423 @@ Day 2 Version: Basic implementation without caching
 Day 3 Version: Lambda container caching with ETag validation
 Day 4 Version: Optimistic locking with ETags (prevents concurrent write conflicts)
 Day 6 Version: Session-aware caching with DynamoDB coordination (90% reduction in S3 operations)
+S3_STORAGE_FORMAT=chunked: databases stored as content-addressed chunks + manifest (s3_chunked.py)
+S3_COMPRESSION=zstd|gzip: objects stored compressed, streamed to/from /tmp (s3_codec.py)
+Large objects: parallel ranged GETs and multipart uploads (s3_transfer.py)
+/tmp cache: size-bounded LRU that never evicts dirty or session-held databases (tmp_cache.py)
+Session writes: flushed to S3 write-behind, when idle or after N writes (write_behind.py)
+S3_JOURNAL=true: session writes appended as row-change segments, loads are base + replay (s3_journal.py)
 """
 
 import boto3
 import sqlite3
 import os
+import threading
 import time
+import uuid
 from botocore.exceptions import ClientError
 from typing import Optional
 
+import s3_chunked
+import s3_codec
+import s3_journal
+import s3_transfer
+import write_behind
+from tmp_cache import db_cache
 
-# S3 client (reused across invocations)
-s3 = boto3.client('s3')
+
+# S3 client (created on first use, then reused across invocations)
+_s3_client = None
+
+
+def get_s3_client():
+    """Return the container-wide S3 client, creating it on first call."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
 
 # Get bucket name from environment variable
 BUCKET = os.environ.get('S3_BUCKET', 'javumbo-user-dbs')
 
-# Lambda container cache (persists across warm invocations)
-# Cache structure: {username: {'etag': str, 'timestamp': float, 'path': str}}
-db_cache = {}
+# Lambda container cache (persists across warm invocations): db_cache, imported above
+# Cache structure: {username: {'etag': str, 'timestamp': float, 'path': str, 'size': int}}
+# Bounded by DB_CACHE_MAX_MB: least recently used databases are deleted from /tmp
 
 # Cache configuration
 CACHE_TTL = int(os.environ.get('DB_CACHE_TTL', 300))  # 5 minutes default
 
+# S3 object metadata key carrying the collection version, so conditional GETs
+# can be answered with a HEAD request instead of a download
+COLLECTION_VERSION_METADATA = 'collection-version'
+
+# How user databases are stored: 'file' (one user_dbs/<username>.anki2 object per
+# upload) or 'chunked' (only changed chunks + a manifest per upload, see s3_chunked.py).
+# In chunked mode the ETags kept in db_cache and sessions are manifest ETags, and
+# None means "no manifest yet" (new user, or one still stored as a single object).
+S3_STORAGE_FORMAT = os.environ.get('S3_STORAGE_FORMAT', 'file')
+
+
+# Login prefetch: /api/login downloads the user's database while the password is
+# being checked (LoginPrefetch), and the next session open in this container adopts
+# the file instead of downloading it again, if the S3 ETag still matches.
+# Structure: {username: {'etag': str, 'path': str, 'timestamp': float}}
+_prefetched = {}
+_prefetch_lock = threading.Lock()
+PREFETCH_TTL = CACHE_TTL
+
+
+class LoginPrefetch:
+    """
+    Background S3 download of a user's database to a private /tmp file.
+
+    Lambda freezes the container between invocations, so a download still running
+    when the login response is sent resumes on the container's next invocation and
+    is registered for adoption when it finishes.
+    """
+
+    def __init__(self, username):
+        self.username = username
+        self.path = f'/tmp/{username}.{uuid.uuid4().hex}.prefetch'
+        self.error = None
+        self._discarded = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            if S3_STORAGE_FORMAT == 'chunked':
+                _, etag = s3_chunked.download(get_s3_client(), BUCKET, self.username, self.path,
+                                              reuse_path=f'/tmp/{self.username}.anki2')
+                if etag is None:
+                    raise FileNotFoundError(s3_chunked.manifest_key(self.username))
+            else:
+                etag = s3_transfer.download(get_s3_client(), BUCKET, f'user_dbs/{self.username}.anki2', self.path)
+        except Exception as e:  # NoSuchKey for new users: nothing to prefetch
+            self.error = e
+            self._remove()
+            return
+        with self._lock:
+            if self._discarded:
+                self._remove()
+                return
+            with _prefetch_lock:
+                previous = _prefetched.pop(self.username, None)
+                _prefetched[self.username] = {'etag': etag, 'path': self.path, 'timestamp': time.time()}
+        if previous and os.path.exists(previous['path']):
+            os.remove(previous['path'])
+
+    def wait(self, timeout):
+        """Waits up to timeout seconds. Returns True if the download finished and was kept."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive() and self.error is None and not self._discarded
+
+    def discard(self):
+        """Drops the download (e.g. the password was wrong), now or when it finishes."""
+        with self._lock:
+            self._discarded = True
+            if self._thread.is_alive():
+                return
+        with _prefetch_lock:
+            entry = _prefetched.get(self.username)
+            if entry and entry['path'] == self.path:
+                del _prefetched[self.username]
+        self._remove()
+
+    def _remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def adopt_prefetched(username, etag, local_path) -> bool:
+    """Moves a prefetched download with this ETag into local_path. Returns True if it did."""
+    with _prefetch_lock:
+        entry = _prefetched.pop(username, None)
+    if entry is None:
+        return False
+    if entry['etag'] != etag or time.time() - entry['timestamp'] > PREFETCH_TTL or not os.path.exists(entry['path']):
+        if os.path.exists(entry['path']):
+            os.remove(entry['path'])
+        return False
+    os.replace(entry['path'], local_path)
+    return True
+
+
+def read_collection_version(db_path) -> Optional[str]:
+    """
+    Read the collection version of a local database: "<col.mod>-<MAX(revlog.id)>".
+
+    Every write route bumps col.mod; MAX(revlog.id) also catches reviews
+    written without it. Returns None if the file can't be read.
+    """
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            col_mod, revlog_max = conn.execute(
+                "SELECT (SELECT mod FROM col LIMIT 1), (SELECT MAX(id) FROM revlog)").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return f"{col_mod}-{revlog_max or 0}"
+
+
+def collection_version_metadata(db_path):
+    """S3 Metadata for put_object: the collection version of the file being uploaded."""
+    version = read_collection_version(db_path)
+    return {COLLECTION_VERSION_METADATA: version} if version else {}
+
+
+def get_collection_version(username) -> Optional[str]:
+    """
+    Get a user's current collection version without downloading the database.
+
+    - This container owns the user's session: read the local /tmp copy.
+    - Another container owns it: its copy may be ahead of S3, so the version
+      is unknown (None).
+    - No active session: S3 is authoritative; HEAD the object and read the
+      version from its metadata (None for objects uploaded before it existed).
+      With S3_JOURNAL, segments appended after the base aren't in that version:
+      None while the journal has any.
+    """
+    from session_manager import SessionManager
+
+    session_manager = SessionManager()
+    session = session_manager.get_user_session(username)
+    local_path = f'/tmp/{username}.anki2'
+    if session:
+        if session['lambda_instance_id'] == session_manager.lambda_instance_id:
+            return read_collection_version(local_path)
+        return None
+
+    try:
+        head_response = None
+        if S3_STORAGE_FORMAT == 'chunked':
+            head_response = s3_chunked.head_manifest(get_s3_client(), BUCKET, username)
+        if head_response is None:
+            head_response = get_s3_client().head_object(Bucket=BUCKET, Key=f'user_dbs/{username}.anki2')
+        if _journaling() and s3_journal.has_newer(get_s3_client(), BUCKET, username,
+                                                  s3_journal.base_seq(head_response)):
+            return None
+    except ClientError:
+        return None
+    return head_response.get('Metadata', {}).get(COLLECTION_VERSION_METADATA)
+
+
+def _download_chunked(username, local_path, known_etag=None):
+    """
+    Chunked-format download to local_path. Reuses the chunks of the file already
+    there, and skips the download if the manifest ETag is still known_etag.
+
+    Returns (found, manifest ETag). A user without a manifest is read from the
+    single-object user_dbs/<username>.anki2 (ETag None); found is False if that
+    doesn't exist either.
+    """
+    s3 = get_s3_client()
+    manifest, etag = s3_chunked.read_manifest(s3, BUCKET, username)
+    if manifest is not None:
+        if etag == known_etag and os.path.exists(local_path):
+            print(f"✓ Cache refreshed for {username} (manifest ETag match, no download needed)")
+        elif adopt_prefetched(username, etag, local_path):
+            print(f"✓ Using login prefetch of {username} (manifest ETag: {etag})")
+        else:
+            _, etag = s3_chunked.download(s3, BUCKET, username, local_path, manifest, etag, reuse_path=local_path)
+        return True, etag
+
+    try:
+        s3_transfer.download(s3, BUCKET, f'user_dbs/{username}.anki2', local_path)
+    except s3.exceptions.NoSuchKey:
+        return False, None
+    print(f"✓ Downloaded user_dbs/{username}.anki2 (not chunked yet; the next upload converts it)")
+    return True, None
+
+
+def _upload_chunked(username, local_path, expected_etag):
+    """Chunked-format upload. Returns the new manifest ETag; raises ConflictError."""
+    etag, stats = s3_chunked.upload(get_s3_client(), BUCKET, username, local_path, expected_etag,
+                                    metadata=collection_version_metadata(local_path))
+    print(f"✓ Uploaded {stats['uploaded_chunks']}/{stats['chunks']} chunks of {username} "
+          f"({stats['uploaded_bytes']} bytes + {stats['manifest_bytes']} manifest bytes, new ETag: {etag})")
+    return etag
+
+
+def _journaling():
+    """S3_JOURNAL is on and applies (single-object storage, see s3_journal.py)."""
+    return s3_journal.JOURNAL_ENABLED and S3_STORAGE_FORMAT == 'file'
+
+
+def _download_database(username, local_path, head_response):
+    """
+    Single-object download of user_dbs/<username>.anki2 to local_path (decoded, in
+    parallel if large), then with S3_JOURNAL replay of the journal segments after
+    it. Loads the base again once if those were compacted meanwhile.
+
+    Returns the base object's ETag.
+    """
+    s3 = get_s3_client()
+    s3_key = f'user_dbs/{username}.anki2'
+    for attempt in range(2):
+        etag = s3_transfer.download(s3, BUCKET, s3_key, local_path, head_response)
+        if not _journaling():
+            return etag
+        seq = s3_journal.base_seq(head_response)
+        try:
+            s3_journal.replay(s3, BUCKET, username, local_path, seq, base=seq)
+            return etag
+        except s3_journal.JournalGapError as e:
+            if attempt:
+                raise
+            print(f"⚠ {e}, loading the compacted base again")
+            head_response = s3.head_object(Bucket=BUCKET, Key=s3_key)
+
+
+def _catch_up_journal(username, local_path, head_response=None):
+    """
+    With S3_JOURNAL, applies the segments local_path doesn't have yet: those after
+    the base described by head_response (a copy of it, e.g. a login prefetch), or
+    by default those appended since this container loaded its copy. Returns False
+    if the copy can't be caught up (segments compacted meanwhile).
+    """
+    if not _journaling():
+        return True
+    base = s3_journal.base_seq(head_response) if head_response else None
+    from_seq = s3_journal.last_seq(username) if base is None else base
+    try:
+        s3_journal.replay(get_s3_client(), BUCKET, username, local_path, from_seq, base=base)
+        return True
+    except s3_journal.JournalGapError:
+        return False
+
+
+def _put_database(username, s3_key, local_path, expected_etag, journal_seq=None):
+    """
+    Single-object upload of a database. Unless S3_CONDITIONAL_WRITES is off, S3
+    only accepts it if the object is still at expected_etag (None: doesn't exist).
+
+    With S3_JOURNAL this is a compaction: the object records journal_seq (default:
+    the last segment this container applied), the last segment the file contains,
+    and those segments are deleted afterwards.
+
+    Returns the new ETag. Raises ConflictError if S3 rejects the condition; a
+    ClientError NoSuchKey means the object expected at expected_etag is gone.
+    """
+    s3 = get_s3_client()
+    metadata = collection_version_metadata(local_path)
+    if _journaling():
+        if journal_seq is None:
+            journal_seq = s3_journal.last_seq(username)
+        # Segments after ours were appended by another process on a copy we never saw
+        if s3_journal.has_newer(s3, BUCKET, username, s3_journal.last_seq(username)):
+            raise ConflictError(
+                f"Concurrent modification detected for {username}. "
+                f"The journal has changes this copy doesn't. Please retry the operation."
+            )
+        metadata[s3_journal.JOURNAL_SEQ_METADATA] = str(journal_seq)
+
+    encoding = s3_codec.active_encoding()
+    try:
+        with s3_codec.open_encoded(local_path, encoding) as f:
+            etag = s3_transfer.upload(s3, BUCKET, s3_key, f,
+                                      conditions=s3_transfer.write_conditions(expected_etag),
+                                      Metadata=metadata,
+                                      **s3_codec.put_kwargs(encoding))
+    except ClientError as e:
+        if s3_transfer.is_write_conflict(e):
+            expected = f"ETag {expected_etag}" if expected_etag else "no object"
+            raise ConflictError(
+                f"Concurrent modification detected for {username}. "
+                f"S3 rejected the write: expected {expected} at {s3_key}. "
+                f"Another process modified the file. Please retry the operation."
+            )
+        raise
+
+    if _journaling():
+        try:
+            s3_journal.fold(s3, BUCKET, username, journal_seq)
+        except ClientError as e:
+            # Left-over segments are harmless: replaying them again gives the same rows
+            print(f"⚠ Could not delete compacted journal segments of {username}: {e}")
+    return etag
+
+
+def user_database_exists(username) -> bool:
+    """True if the user has a database in S3 (in either storage format)."""
+    s3 = get_s3_client()
+    if S3_STORAGE_FORMAT == 'chunked' and s3_chunked.head_manifest(s3, BUCKET, username) is not None:
+        return True
+    try:
+        s3.head_object(Bucket=BUCKET, Key=f'user_dbs/{username}.anki2')
+    except ClientError:
+        return False
+    return True
+
+
+def upload_new_database(username, local_path):
+    """Uploads a freshly created database (registration) in the configured storage format."""
+    if S3_STORAGE_FORMAT == 'chunked':
+        return _upload_chunked(username, local_path, None)
+    return _put_database(username, f'user_dbs/{username}.anki2', local_path, None)
+
+
+def upload_session_database(username, local_path, current_etag, journal_seq=None):
+    """
+    Uploads a session's database file (or a snapshot of it) with optimistic locking
+    against current_etag, the session's ETag ('new' or None: not in S3 yet).
+    journal_seq: the last S3_JOURNAL segment the file contains (see _put_database).
+
+    Called by write_behind for SessionAwareS3SQLite: on flush, force_upload() and
+    end_session().
+
+    Returns:
+        str: The new ETag (manifest ETag in chunked mode)
+
+    Raises:
+        ConflictError: If another process modified the file since current_etag
+    """
+    expected_etag = None if current_etag == 'new' else current_etag
+    if S3_STORAGE_FORMAT == 'chunked':
+        return _upload_chunked(username, local_path, expected_etag)
+
+    s3 = get_s3_client()
+    s3_key = f'user_dbs/{username}.anki2'
+    # Optimistic locking check (only if file existed before) for backends without
+    # conditional writes; otherwise S3 checks the ETag as part of the PUT
+    if expected_etag is not None and not s3_transfer.CONDITIONAL_WRITES:
+        try:
+            head_response = s3.head_object(Bucket=BUCKET, Key=s3_key)
+            s3_etag = head_response['ETag']
+
+            if s3_etag != expected_etag:
+                raise ConflictError(
+                    f"Concurrent modification detected for {username}. "
+                    f"Expected ETag {expected_etag}, but S3 has {s3_etag}. "
+                    f"Another process modified the file. Please retry the operation."
+                )
+        except ConflictError:
+            raise
+        except ClientError as e:
+            if e.response['Error']['Code'] == '404':
+                # File was deleted - this is OK for first upload
+                print("  File doesn't exist in S3 yet, proceeding with first upload")
+            else:
+                raise
+
+    # Upload
+    try:
+        new_etag = _put_database(username, s3_key, local_path, expected_etag, journal_seq)
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+        # File was deleted - this is OK for first upload
+        print("  File doesn't exist in S3 yet, proceeding with first upload")
+        new_etag = _put_database(username, s3_key, local_path, None, journal_seq)
+
+    print(f"✓ Uploaded {s3_key} to S3 (new ETag: {new_etag})")
+    return new_etag
+
 
 class S3SQLiteConnection:
     """
@@ -154,9 +548,28 @@ class S3SQLiteConnection:
         """
         # Check if we have a valid cached version
         if self._check_cache():
+            db_cache.record_hit()
+            db_cache.touch(self.username)
             print(f"✓ Using cached version for {self.username} (cache hit)")
             return
 
+        db_cache.record_miss()
+        if S3_STORAGE_FORMAT == 'chunked':
+            cached = db_cache.get(self.username)
+            found, self.current_etag = _download_chunked(self.username, self.local_path,
+                                                         cached['etag'] if cached else None)
+            if not found:
+                print(f"Database not found in S3, creating new database for {self.username}")
+                self._create_new_database()
+                return
+            db_cache[self.username] = {
+                'etag': self.current_etag,
+                'timestamp': time.time(),
+                'path': self.local_path
+            }
+            return
+
+        s3 = get_s3_client()
         try:
             # Get S3 metadata to check ETag (no download yet)
             try:
@@ -175,22 +588,20 @@ class S3SQLiteConnection:
             # Check if cached file exists but ETag changed
             if self.username in db_cache and os.path.exists(self.local_path):
                 cached_etag = db_cache[self.username]['etag']
-                if cached_etag == s3_etag:
+                if cached_etag == s3_etag and _catch_up_journal(self.username, self.local_path):
                     # Cache is still valid, just update timestamp
                     db_cache[self.username]['timestamp'] = time.time()
+                    db_cache.record_hit()
+                    db_cache.touch(self.username)
                     self.current_etag = s3_etag
                     print(f"✓ Cache refreshed for {self.username} (ETag match, no download needed)")
                     return
                 else:
                     print(f"Cache invalidated for {self.username} (ETag mismatch: {cached_etag} != {s3_etag})")
 
-            # Download from S3 (cache miss or invalidated)
-            response = s3.get_object(Bucket=BUCKET, Key=self.s3_key)
-            self.current_etag = response['ETag']
-
-            # Write to /tmp
-            with open(self.local_path, 'wb') as f:
-                f.write(response['Body'].read())
+            # Download from S3 (cache miss or invalidated), decompressing if the object is
+            # encoded and in parallel ranged GETs if it is large
+            self.current_etag = _download_database(self.username, self.local_path, head_response)
 
             # Update cache
             db_cache[self.username] = {
@@ -333,9 +744,22 @@ class S3SQLiteConnection:
         Raises:
             ConflictError: If another process modified the file since we downloaded it
         """
+        if S3_STORAGE_FORMAT == 'chunked':
+            self.current_etag = _upload_chunked(self.username, self.local_path, self.current_etag)
+            db_cache[self.username] = {
+                'etag': self.current_etag,
+                'timestamp': time.time(),
+                'path': self.local_path
+            }
+            db_cache.mark_clean(self.username)
+            write_behind.scheduler.synced(self.username, self.current_etag)
+            return
+
+        s3 = get_s3_client()
         # Day 4: Optimistic locking check
-        # Verify the ETag hasn't changed before uploading (if we have a stored ETag)
-        if self.current_etag is not None:
+        # Backends without conditional writes (S3_CONDITIONAL_WRITES=false): verify the
+        # ETag hasn't changed before uploading (if we have a stored ETag)
+        if self.current_etag is not None and not s3_transfer.CONDITIONAL_WRITES:
             try:
                 # Check current S3 ETag
                 head_response = s3.head_object(Bucket=BUCKET, Key=self.s3_key)
@@ -364,21 +788,28 @@ class S3SQLiteConnection:
                     # Unknown error, re-raise
                     raise
 
-        # ETag matches (or this is a new file) - safe to upload
-        with open(self.local_path, 'rb') as f:
-            response = s3.put_object(
-                Bucket=BUCKET,
-                Key=self.s3_key,
-                Body=f
-            )
+        # Upload. With conditional writes, S3 checks the ETag (or that a new file
+        # doesn't exist yet) as part of the PUT and raises ConflictError otherwise
+        try:
+            new_etag = _put_database(self.username, self.s3_key, self.local_path, self.current_etag)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                # File was deleted since we downloaded it - treat as conflict
+                raise ConflictError(
+                    f"Concurrent modification detected for {self.username}. "
+                    f"File was deleted from S3 since we downloaded it. "
+                    f"Please retry the operation."
+                )
+            raise
 
         # Update cache with new ETag
-        new_etag = response['ETag']
         db_cache[self.username] = {
             'etag': new_etag,
             'timestamp': time.time(),
             'path': self.local_path
         }
+        db_cache.mark_clean(self.username)
+        write_behind.scheduler.synced(self.username, new_etag)
         self.current_etag = new_etag
 
         print(f"✓ Uploaded {self.s3_key} to S3 (new ETag: {new_etag})")
@@ -389,12 +820,25 @@ def get_cache_stats():
     Get current cache statistics for debugging.
 
     Returns:
-        dict: Cache statistics including size, entries, and age info
+        dict: Cache statistics including size, entries, age info, bytes held in
+              /tmp against the budget, and hit/miss/eviction counters
     """
+    from session_manager import get_heartbeat_stats
+
+    lookups = db_cache.hits + db_cache.misses
     stats = {
         'cache_size': len(db_cache),
         'entries': [],
-        'total_age': 0
+        'total_age': 0,
+        'total_bytes': db_cache.total_bytes,
+        'max_bytes': db_cache.max_bytes,
+        'hits': db_cache.hits,
+        'misses': db_cache.misses,
+        'hit_rate': db_cache.hits / lookups if lookups else 0,
+        'evictions': db_cache.evictions,
+        'evicted_bytes': db_cache.evicted_bytes,
+        'write_behind': write_behind.scheduler.get_stats(),
+        'session_heartbeats': get_heartbeat_stats()
     }
 
     for username, entry in db_cache.items():
@@ -403,6 +847,8 @@ def get_cache_stats():
             'username': username,
             'age_seconds': age,
             'etag': entry['etag'],
+            'size_bytes': entry['size'],
+            'protected': db_cache.is_protected(username),
             'file_exists': os.path.exists(entry['path'])
         })
         stats['total_age'] += age
@@ -417,7 +863,7 @@ def get_cache_stats():
 
 def clear_cache():
     """
-    Clear all cache entries (for testing).
+    Clear all cache entries and counters (for testing).
     """
     db_cache.clear()
     print("✓ Cache cleared")
@@ -442,6 +888,9 @@ class SessionAwareS3SQLite:
     2. Subsequent accesses: Reuses in-memory database (no S3 download)
     3. Session end: Uploads to S3 once, deletes session
 
+    Committed writes are also flushed write-behind (write_behind.py): after
+    FLUSH_IDLE_SECONDS without writes or FLUSH_MAX_WRITES writes, and on shutdown.
+
     Expected performance improvements:
     - 90% reduction in S3 operations (1 download + 1 upload per session vs per-operation)
     - 80% reduction in latency for operations after first access
@@ -479,20 +928,25 @@ class SessionAwareS3SQLite:
         self.current_session = None
         self.current_etag = None
         self._is_session_owner = False
+        self.session_reused = False  # True when __enter__ reused this container's session and /tmp copy
+        self._entered_at = None  # time.monotonic() of __enter__: write-behind flushes after it have newer ETags
+        self._changes_flushed = 0  # conn.total_changes already uploaded by force_upload()
+        self._journal_schema = None  # S3_JOURNAL: schema version when change capture started
 
     def __enter__(self):
         """
         Open database connection with session coordination.
 
         Flow:
-        1. Check if user has active session (query DynamoDB)
+        1. Check if user has active session (lease cache, else DynamoDB)
         2. If no session:
            - Download from S3
            - Create new session
         3. If session exists and we own it:
+           - Extend it (fails if it was taken over meanwhile: go to 2)
            - Reuse in-memory database (NO S3 download!)
         4. If session exists but owned by another Lambda:
-           - Wait for session to expire, then take over
+           - Download from S3, then take the session over atomically
 
         Returns:
             sqlite3.Connection: Open SQLite connection
@@ -501,55 +955,65 @@ class SessionAwareS3SQLite:
         from session_manager import SessionManager
 
         self.session_manager = SessionManager()
+        self._entered_at = time.monotonic()
 
-        # Check for existing session
+        # Check for existing session (no DynamoDB read while we hold a cached lease)
         existing_session = self.session_manager.get_user_session(self.username)
+        replace_session_id = None
 
         if existing_session:
             # Check if WE own this session (same Lambda instance)
             if existing_session['lambda_instance_id'] == self.session_manager.lambda_instance_id:
-                # We own the session - reuse in-memory database
-                self._is_session_owner = True
-                self.current_session = existing_session
-                self.session_id = existing_session['session_id']  # Update session_id attribute
-                self.current_etag = existing_session['db_etag']
+                if not os.path.exists(self.local_path):
+                    # Session exists but file is gone - replace it after downloading
+                    print(f"⚠ Session exists but file missing, restarting session for {self.username}")
+                    replace_session_id = existing_session['session_id']
+                elif not self.session_manager.update_session(existing_session['session_id']):
+                    # Extend session TTL (throttled). Fails if another Lambda took the session over
+                    print(f"⚠ Session of {self.username} was taken over by another Lambda, reloading")
+                else:
+                    # We own the session - reuse in-memory database
+                    self._is_session_owner = True
+                    self.current_session = existing_session
+                    self.session_id = existing_session['session_id']  # Update session_id attribute
+                    self.current_etag = write_behind.scheduler.synced_etag(self.username, existing_session['db_etag'])
 
-                if os.path.exists(self.local_path):
                     # Open existing connection
                     self.conn = sqlite3.connect(self.local_path)
                     self.conn.row_factory = sqlite3.Row
+                    self._start_journal()
 
-                    # Extend session TTL
-                    self.session_manager.update_session(self.session_id)
+                    self.session_reused = True
+                    db_cache.record_hit()
+                    self._track_in_cache()
 
                     print(f"✓✓✓ SESSION HIT: Reusing in-memory DB for {self.username} (NO S3 download!)")
                     return self.conn
-                else:
-                    # Session exists but file is gone - invalidate and restart
-                    print(f"⚠ Session exists but file missing, invalidating session for {self.username}")
-                    self.session_manager.delete_session(self.current_session['session_id'])
-                    self._is_session_owner = False
             else:
-                # Another Lambda owns the session - invalidate and take over
+                # Another Lambda owns the session - take over (atomically, after downloading)
                 print(f"⚠ Concurrent access detected: {self.username} has active session on another Lambda")
                 print(f"  Current instance: {self.session_manager.lambda_instance_id}")
                 print(f"  Session owner: {existing_session['lambda_instance_id']}")
-                print(f"  Invalidating old session and taking over...")
-
-                self.session_manager.delete_session(existing_session['session_id'])
-                self._is_session_owner = False
+                print("  Taking over the session...")
+                replace_session_id = existing_session['session_id']
 
         # No valid session - download from S3 and create new session
+        # (first uploading writes of ours not flushed yet, the download replaces the file)
+        write_behind.scheduler.flush(self.username, 'reopen')
+        db_cache.record_miss()
         self._download_from_s3()
+        write_behind.scheduler.synced(self.username, self.current_etag)
 
         # Open SQLite connection
         self.conn = sqlite3.connect(self.local_path)
         self.conn.row_factory = sqlite3.Row
+        self._start_journal()
 
-        # Create new session
+        # Create new session (a conditional write: fails if another Lambda got there first)
         session = self.session_manager.create_session(
             username=self.username,
-            db_etag=self.current_etag or 'new'
+            db_etag=self.current_etag or 'new',
+            replace_session_id=replace_session_id
         )
 
         if session:
@@ -562,6 +1026,7 @@ class SessionAwareS3SQLite:
             self.session_id = None  # No session created
             print(f"⚠ Failed to create session for {self.username}, operating without session")
 
+        self._track_in_cache()
         return self.conn
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -581,6 +1046,22 @@ class SessionAwareS3SQLite:
         if self.conn:
             if exc_type is None:
                 self.conn.commit()
+                self.current_etag = write_behind.scheduler.synced_etag(self.username, self.current_etag,
+                                                                       since=self._entered_at)
+                journaled = False
+                try:
+                    if self._journal_schema is not None:
+                        journaled = self._append_journal()
+                except ConflictError:
+                    self.conn.close()
+                    raise
+                if not journaled and self.auto_upload and (self.conn.total_changes > self._changes_flushed
+                                                           or self.current_etag in (None, 'new')):
+                    # Not in S3 yet: write-behind uploads it once idle or after enough writes
+                    self._record_write()
+                elif journaled and s3_journal.segments_since_base(self.username) >= s3_journal.JOURNAL_COMPACT_SEGMENTS:
+                    # Durable in the journal; write-behind folds the segments into the base once idle
+                    self._record_write()
 
                 # Update session with latest state (if we own it)
                 if self._is_session_owner and self.current_session:
@@ -594,8 +1075,11 @@ class SessionAwareS3SQLite:
                 # On error, invalidate session to force fresh download next time
                 if self._is_session_owner and self.current_session:
                     self.session_manager.delete_session(self.current_session['session_id'])
+                    db_cache.release_session(self.username)
 
             self.conn.close()
+            if exc_type is None:
+                self._track_in_cache()  # re-measures: the writes may have grown the file
 
         # NOTE: Do NOT upload to S3 here - that defeats the purpose of session caching!
         # Upload happens only when session ends via end_session()
@@ -618,18 +1102,100 @@ class SessionAwareS3SQLite:
             return
 
         try:
-            self._upload_to_s3()
+            if self._journal_schema is not None and self._append_journal():
+                print(f"✓ Journaled write operation for {self.username} (no full upload needed)")
+                return
+            self._record_write()
+            new_etag = write_behind.scheduler.flush(self.username, 'force_upload', raise_errors=True)
+            if new_etag:
+                self.current_etag = new_etag
+            if self.conn:
+                self._changes_flushed = self.conn.total_changes
+            self._track_in_cache()
             print(f"✓ Forced upload to S3 after write operation for {self.username}")
-
-            # Update session with new ETag
-            if self._is_session_owner and self.current_session:
-                self.session_manager.update_session(
-                    self.current_session['session_id'],
-                    db_etag=self.current_etag
-                )
+        except ConflictError:
+            raise
         except Exception as e:
             print(f"⚠ Force upload failed: {e}")
 
+    def _start_journal(self):
+        """With S3_JOURNAL, records this connection's row changes (once the base is in S3)."""
+        self._journal_schema = None
+        if _journaling() and self.auto_upload and self.current_etag not in (None, 'new'):
+            self._journal_schema = s3_journal.capture(self.conn)
+
+    def _append_journal(self):
+        """
+        Appends the row changes committed on this connection to the S3 journal.
+
+        Returns:
+            bool: False if they can't be journaled (the schema changed) and the
+                  whole file has to be uploaded instead
+
+        Raises:
+            ConflictError: If another process appended first, or took the session
+                           over. The local copy and the session are dropped, so
+                           the next request reloads.
+        """
+        tables = s3_journal.collect(self.conn, self._journal_schema)
+        if tables is None:
+            return False
+        if not tables:
+            return True
+        self._confirm_session()
+        try:
+            seq = s3_journal.append(get_s3_client(), BUCKET, self.username, tables)
+        except ConflictError:
+            self._drop_local_copy()
+            raise
+        rows = sum(len(changes['rows']) for changes in tables.values())
+        print(f"✓ Journaled {rows} row change(s) for {self.username} (segment {seq})")
+        return True
+
+    def _confirm_session(self):
+        """
+        Before a journal segment goes to S3: extends the session with a written
+        heartbeat (never skipped), which fails if another Lambda took it over. A
+        skipped heartbeat would let this container append writes made on its stale
+        copy. Writes that only reach /tmp need no check here: write_behind confirms
+        the session before it uploads them.
+
+        Raises:
+            ConflictError: If the session was taken over. The local copy is dropped.
+        """
+        if not (self._is_session_owner and self.current_session):
+            return
+        try:
+            if self.session_manager.update_session(self.current_session['session_id'], force=True):
+                return
+        except ClientError as e:
+            print(f"⚠ Could not confirm session of {self.username}, writing on: {e}")
+            return
+        self._drop_local_copy()
+        raise ConflictError(
+            f"Concurrent modification detected for {self.username}. "
+            f"The session was taken over by another process. "
+            f"Please retry the operation."
+        )
+
+    def _drop_local_copy(self):
+        """Releases the session and deletes the /tmp copy, so the next request reloads from S3."""
+        if self._is_session_owner and self.current_session:
+            self.session_manager.delete_session(self.current_session['session_id'])
+            db_cache.release_session(self.username)
+            self._is_session_owner = False
+        if self.username in db_cache:
+            del db_cache[self.username]
+        if os.path.exists(self.local_path):
+            os.remove(self.local_path)
+
+    def _record_write(self):
+        """Hands the /tmp database to write_behind as dirty (flushed with the session's ETag)."""
+        self.current_etag = write_behind.scheduler.synced_etag(self.username, self.current_etag,
+                                                               since=self._entered_at)
+        write_behind.scheduler.record_write(self.username, self.local_path, self.current_etag,
+                                            self.session_id if self._is_session_owner else None)
+
     def end_session(self):
         """
         Explicitly end session and upload to S3.
@@ -647,7 +1213,10 @@ class SessionAwareS3SQLite:
         try:
             # Upload to S3 one final time
             if self.auto_upload and os.path.exists(self.local_path):
-                self._upload_to_s3()
+                self._record_write()
+                new_etag = write_behind.scheduler.flush(self.username, 'end_session', raise_errors=True)
+                if new_etag:
+                    self.current_etag = new_etag
                 print(f"✓ Session ended: Uploaded {self.username} to S3")
 
             # Delete session from DynamoDB
@@ -662,6 +1231,7 @@ class SessionAwareS3SQLite:
             # Clear state
             self.current_session = None
             self._is_session_owner = False
+            db_cache.release_session(self.username)
 
     def _download_from_s3(self):
         """
@@ -672,6 +1242,14 @@ class SessionAwareS3SQLite:
         2. Session exists but file is missing
         3. Concurrent access was detected
         """
+        if S3_STORAGE_FORMAT == 'chunked':
+            found, self.current_etag = _download_chunked(self.username, self.local_path)
+            if not found:
+                print(f"Database not found in S3, creating new database for {self.username}")
+                self._create_new_database()
+            return
+
+        s3 = get_s3_client()
         try:
             # Check if file exists in S3
             try:
@@ -687,13 +1265,15 @@ class SessionAwareS3SQLite:
                 else:
                     raise
 
-            # Download from S3
-            response = s3.get_object(Bucket=BUCKET, Key=self.s3_key)
-            self.current_etag = response['ETag']
+            # Downloaded during /api/login and still current: no GET needed
+            if (adopt_prefetched(self.username, s3_etag, self.local_path)
+                    and _catch_up_journal(self.username, self.local_path, head_response)):
+                self.current_etag = s3_etag
+                print(f"✓ Using login prefetch of {self.s3_key} (ETag: {s3_etag})")
+                return
 
-            # Write to /tmp
-            with open(self.local_path, 'wb') as f:
-                f.write(response['Body'].read())
+            # Download from S3 (decompressing, and in parallel ranged GETs if large)
+            self.current_etag = _download_database(self.username, self.local_path, head_response)
 
             print(f"✓ Downloaded {self.s3_key} from S3 (ETag: {self.current_etag})")
 
@@ -717,41 +1297,17 @@ class SessionAwareS3SQLite:
         temp_conn = S3SQLiteConnection(self.username)
         temp_conn._create_new_database()
 
-    def _upload_to_s3(self):
+    def _track_in_cache(self):
         """
-        Upload modified database back to S3 with optimistic locking.
-
-        This is called ONLY when session ends (via end_session()).
+        Records the /tmp copy in db_cache (its bytes count against DB_CACHE_MAX_MB and
+        it becomes most recently used), held from eviction while we own the session.
         """
-        # Optimistic locking check (only if file existed before)
-        if self.current_etag is not None and self.current_etag != 'new':
-            try:
-                head_response = s3.head_object(Bucket=BUCKET, Key=self.s3_key)
-                s3_etag = head_response['ETag']
-
-                if s3_etag != self.current_etag:
-                    raise ConflictError(
-                        f"Concurrent modification detected for {self.username}. "
-                        f"Expected ETag {self.current_etag}, but S3 has {s3_etag}. "
-                        f"Another process modified the file. Please retry the operation."
-                    )
-            except ConflictError:
-                raise
-            except ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    # File was deleted - this is OK for first upload
-                    print(f"  File doesn't exist in S3 yet, proceeding with first upload")
-                else:
-                    raise
-
-        # Upload
-        with open(self.local_path, 'rb') as f:
-            response = s3.put_object(
-                Bucket=BUCKET,
-                Key=self.s3_key,
-                Body=f
-            )
-
-        # Update ETag
-        self.current_etag = response['ETag']
-        print(f"✓ Uploaded {self.s3_key} to S3 (new ETag: {self.current_etag})")
+        if not os.path.exists(self.local_path):
+            return
+        db_cache[self.username] = {
+            'etag': None if self.current_etag == 'new' else self.current_etag,
+            'timestamp': time.time(),
+            'path': self.local_path
+        }
+        if self._is_session_owner:
+            db_cache.hold_session(self.username, time.time() + self.session_manager.session_ttl)
@@ -0,0 +1,141 @@
+"""
+s3_transfer - Transfers of user database objects: parallel, multipart and conditional
+
+A single get_object/put_object moves a user_dbs/<username>.anki2 object over one
+TCP stream, which bounds cold-start latency for big collections. Objects larger
+than S3_PARALLEL_THRESHOLD are instead:
+- downloaded as concurrent ranged GETs of S3_PART_SIZE bytes, each written at its
+  offset (os.pwrite) into a preallocated file
+- uploaded as a multipart upload whose parts are sent concurrently
+
+S3_TRANSFER_CONCURRENCY sets the number of parallel requests. Every ranged GET
+carries IfMatch=<ETag>, so parts of two different versions are never combined;
+if the object is replaced mid-download, the download starts over once.
+Objects with a Content-Encoding (s3_codec) are fetched the same way, then decoded
+from the assembled file.
+
+Writes are conditional (S3_CONDITIONAL_WRITES, default on): the optimistic-lock
+check rides on the PUT (or CompleteMultipartUpload) itself, IfMatch=<expected
+ETag>, or IfNoneMatch='*' when the object must not exist yet. S3 then rejects
+a stale write atomically, with no HEAD round trip and no window between check
+and write. For backends without conditional writes, set S3_CONDITIONAL_WRITES=
+false: write_conditions() returns nothing and callers HEAD and compare first.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import s3_codec
+
+PARALLEL_THRESHOLD = int(os.environ.get('S3_PARALLEL_THRESHOLD', 16 * 1024 * 1024))
+PART_SIZE = max(int(os.environ.get('S3_PART_SIZE', 8 * 1024 * 1024)), 5 * 1024 * 1024)  # S3 minimum: 5 MB
+TRANSFER_CONCURRENCY = int(os.environ.get('S3_TRANSFER_CONCURRENCY', 8))
+CONDITIONAL_WRITES = os.environ.get('S3_CONDITIONAL_WRITES', 'true').lower() in ('1', 'true', 'yes')
+
+
+def write_conditions(expected_etag):
+    """upload() conditions for a write based on expected_etag (None: the object must not exist)."""
+    if not CONDITIONAL_WRITES:
+        return {}
+    return {'IfMatch': expected_etag} if expected_etag else {'IfNoneMatch': '*'}
+
+
+def is_write_conflict(e):
+    """True if a ClientError is S3 rejecting a conditional write (the object changed)."""
+    return e.response['Error']['Code'] in ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409')
+
+
+def _is_precondition_failed(e):
+    return e.response['Error']['Code'] in ('PreconditionFailed', '412')
+
+
+def _download_ranges(s3, bucket, key, etag, size, path):
+    """Ranged GETs of the stored bytes into a preallocated file at path."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.ftruncate(fd, size)
+
+        def fetch(offset):
+            end = min(offset + PART_SIZE, size) - 1
+            body = s3.get_object(Bucket=bucket, Key=key, IfMatch=etag, Range=f'bytes={offset}-{end}')['Body']
+            while block := body.read(s3_codec.STREAM_BLOCK):
+                os.pwrite(fd, block, offset)
+                offset += len(block)
+
+        with ThreadPoolExecutor(max_workers=TRANSFER_CONCURRENCY) as pool:
+            list(pool.map(fetch, range(0, size, PART_SIZE)))
+    finally:
+        os.close(fd)
+
+
+def download(s3, bucket, key, path, head=None):
+    """
+    Downloads an object to path (decoded), in parallel above PARALLEL_THRESHOLD.
+    head is the object's head_object response if the caller already has one.
+    Returns the ETag of the version written. Raises the client's NoSuchKey if
+    the object doesn't exist.
+    """
+    for attempt in range(2):
+        if head is None:
+            try:
+                head = s3.head_object(Bucket=bucket, Key=key)
+            except ClientError as e:
+                if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                    raise s3.exceptions.NoSuchKey(e.response, 'HeadObject')
+                raise
+        etag, size = head['ETag'], head['ContentLength']
+        try:
+            if size <= PARALLEL_THRESHOLD:
+                s3_codec.download_to_file(s3.get_object(Bucket=bucket, Key=key, IfMatch=etag), path)
+                return etag
+
+            encoding = head.get('ContentEncoding')
+            raw_path = f'{path}.parts' if encoding else f'{path}.download'
+            _download_ranges(s3, bucket, key, etag, size, raw_path)
+            if encoding:
+                with open(raw_path, 'rb') as raw:
+                    s3_codec.download_to_file({'Body': raw, 'ContentEncoding': encoding}, path)
+                os.remove(raw_path)
+            else:
+                os.replace(raw_path, path)
+            return etag
+        except ClientError as e:
+            if attempt or not _is_precondition_failed(e):
+                raise
+            head = None  # replaced since the HEAD: start over with the new version
+
+
+def upload(s3, bucket, key, f, conditions=None, **put_kwargs):
+    """
+    Uploads the open binary file f (e.g. from s3_codec.open_encoded) to key:
+    put_object up to PARALLEL_THRESHOLD, a parallel multipart upload above it.
+    put_kwargs (Metadata, ContentEncoding, ...) apply to the object either way;
+    conditions (write_conditions()) apply to the request that makes it visible.
+    Returns the new ETag. A rejected condition raises a ClientError for which
+    is_write_conflict() is True (or NoSuchKey for IfMatch on a deleted object).
+    """
+    conditions = conditions or {}
+    size = os.fstat(f.fileno()).st_size
+    if size <= PARALLEL_THRESHOLD:
+        return s3.put_object(Bucket=bucket, Key=key, Body=f, **conditions, **put_kwargs)['ETag']
+
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, **put_kwargs)['UploadId']
+    fd = f.fileno()
+
+    def send(part):
+        number, offset = part
+        data = os.pread(fd, PART_SIZE, offset)
+        response = s3.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=data)
+        return {'PartNumber': number, 'ETag': response['ETag']}
+
+    try:
+        with ThreadPoolExecutor(max_workers=TRANSFER_CONCURRENCY) as pool:
+            parts = list(pool.map(send, enumerate(range(0, size, PART_SIZE), start=1)))
+        response = s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id,
+                                                MultipartUpload={'Parts': parts}, **conditions)
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+    return response['ETag']
@@ -8,20 +8,29 @@ concurrent access conflicts while enabling efficient session-based caching.
 Key Concepts:
 - Session ID: Unique identifier for each Lambda container session
 - Session TTL: Time window (default 5 min) for keeping DB in memory
-- Atomic Operations: DynamoDB conditional writes prevent race conditions
-- GSI Lookup: Fast username-based queries to find active sessions
+- Lease: The sessions table is keyed by username, so a user's session is a
+  single item. Acquiring it, taking it over and extending it are conditional
+  writes on that item, which makes them atomic
+- Lease Cache: This container remembers the sessions it holds, so requests
+  inside a valid lease read nothing from DynamoDB
+- GSI Lookup: session-index maps a session ID back to its username
 
 Architecture:
 - Each user can have at most ONE active session at a time
-- Sessions extend automatically on each database operation
-- Expired sessions are cleaned up by DynamoDB TTL
-- If concurrent access is detected, existing session is invalidated
+- Sessions extend automatically on database operations (heartbeats, written
+  only when the lease runs low or the ETag changed)
+- Expired sessions are cleaned up by DynamoDB TTL (and may be acquired before)
+- If concurrent access is detected, the existing session is taken over; the
+  old owner's next extension fails its condition and it drops its cached lease
 
 Usage:
     manager = SessionManager()
 
     # Create new session (returns None if user already has active session)
-    session = manager.create_session(username, lambda_id, db_etag)
+    session = manager.create_session(username, db_etag)
+
+    # Take over another container's session (None if it changed meanwhile)
+    session = manager.create_session(username, db_etag, replace_session_id=old_id)
 
     # Extend existing session
     manager.update_session(session_id, new_etag)
@@ -30,12 +39,110 @@ Usage:
     existing = manager.get_user_session(username)
 """
 
+import json
 import os
+import threading
 import time
 import uuid
 import boto3
 from botocore.exceptions import ClientError
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+
+
+# DynamoDB client shared by every SessionManager in the container. SessionManager is
+# constructed per request, and building a boto3 client each time costs tens of ms.
+_dynamodb_client = None
+
+
+def get_dynamodb_client():
+    """Return the container-wide DynamoDB client, creating it on first call."""
+    global _dynamodb_client
+    if _dynamodb_client is None:
+        _dynamodb_client = boto3.client('dynamodb')
+    return _dynamodb_client
+
+
+# Sessions this container holds, by username. While one is unexpired no other
+# container can acquire it, except by an explicit takeover, which our next
+# (conditional) update_session detects. The margin absorbs clock skew.
+LEASE_SAFETY_MARGIN = int(os.environ.get('SESSION_LEASE_MARGIN', '5'))
+_leases = {}
+_leases_lock = threading.Lock()
+
+# Heartbeats (update_session of a cached lease) are only written once less than
+# SESSION_HEARTBEAT_THRESHOLD seconds of the lease remain, or to record a new
+# ETag; the rest are skipped. Before changes go to S3 (a request that wrote,
+# a write-behind flush) the heartbeat is forced, so a taken-over container can
+# serve a stale read until its next written heartbeat, but never writes.
+# A threshold >= SESSION_TTL writes every heartbeat.
+HEARTBEAT_THRESHOLD = int(os.environ.get('SESSION_HEARTBEAT_THRESHOLD', '240'))
+_heartbeats = {'written': 0, 'skipped': 0}
+
+# Table scans (cleanup_expired_sessions, get_session_stats) run SESSION_SCAN_SEGMENTS
+# parallel segments, each following LastEvaluatedKey. SESSION_SCAN_PAGE_SIZE > 0
+# caps the items read per scan call (spreads the read capacity of a big table).
+SCAN_SEGMENTS = int(os.environ.get('SESSION_SCAN_SEGMENTS', '4'))
+SCAN_PAGE_SIZE = int(os.environ.get('SESSION_SCAN_PAGE_SIZE', '0'))
+BATCH_WRITE_SIZE = 25  # batch_write_item limit
+BATCH_WRITE_RETRIES = 5
+
+
+def _cache_lease(session: Dict[str, Any]):
+    with _leases_lock:
+        _leases[session['username']] = session
+
+
+def _forget_lease(username: str, session_id: Optional[str] = None):
+    """Drops the cached lease of username (only if it is session_id, when given)."""
+    with _leases_lock:
+        cached = _leases.get(username)
+        if cached is not None and (session_id is None or cached['session_id'] == session_id):
+            del _leases[username]
+
+
+def _cached_lease(session_id: str) -> Optional[Dict[str, Any]]:
+    with _leases_lock:
+        for session in _leases.values():
+            if session['session_id'] == session_id:
+                return session
+    return None
+
+
+def _count_heartbeat(outcome: str):
+    with _leases_lock:
+        _heartbeats[outcome] += 1
+
+
+def get_heartbeat_stats() -> Dict[str, int]:
+    """Session heartbeats written to DynamoDB and skipped by this container."""
+    with _leases_lock:
+        return dict(_heartbeats, threshold_seconds=HEARTBEAT_THRESHOLD)
+
+
+def clear_lease_cache():
+    """Forgets every cached lease and resets the heartbeat counters (tests, or to force DynamoDB reads)."""
+    with _leases_lock:
+        _leases.clear()
+        _heartbeats.update(written=0, skipped=0)
+
+
+def _is_condition_failure(error: ClientError) -> bool:
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+def _to_session(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Session dict from a DynamoDB item."""
+    return {
+        'session_id': item['session_id']['S'],
+        'username': item['username']['S'],
+        'lambda_instance_id': item['lambda_instance_id']['S'],
+        'db_etag': item['db_etag']['S'],
+        'created_at': int(item['created_at']['N']),
+        'last_access': int(item['last_access']['N']),
+        'expires_at': int(item['expires_at']['N']),
+        'status': item['status']['S']
+    }
 
 
 class SessionManager:
@@ -43,7 +150,7 @@ class SessionManager:
 
     def __init__(self):
         """Initialize SessionManager with DynamoDB client and configuration."""
-        self.dynamodb = boto3.client('dynamodb')
+        self.dynamodb = get_dynamodb_client()
         self.table_name = os.environ.get('DYNAMODB_SESSIONS_TABLE', 'javumbo-sessions')
         self.session_ttl = int(os.environ.get('SESSION_TTL', '300'))  # 5 minutes default
         self.lambda_instance_id = os.environ.get('AWS_LAMBDA_LOG_STREAM_NAME', 'local-dev')
@@ -52,22 +159,27 @@ class SessionManager:
         self,
         username: str,
         db_etag: str,
-        lambda_instance_id: Optional[str] = None
+        lambda_instance_id: Optional[str] = None,
+        replace_session_id: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Create a new session for a user with atomic check-and-set.
 
         This method ensures only one Lambda container can have an active session
-        for a given user at any time. It uses DynamoDB conditional writes to
-        atomically check if a session exists and create one if not.
+        for a given user at any time. The session is written with a conditional
+        put on the user's item: it succeeds only if the user has no session, the
+        session has expired, or it is replace_session_id (takeover). Two
+        containers racing for the same user can't both win.
 
         Args:
             username: User identifier
             db_etag: Current S3 database ETag for conflict detection
             lambda_instance_id: Optional Lambda instance ID (defaults to current)
+            replace_session_id: Active session to take over (from get_user_session)
 
         Returns:
             Session dict if created successfully, None if user already has active session
+            (or, on takeover, a session other than replace_session_id)
 
         Session Structure:
             {
@@ -97,15 +209,13 @@ class SessionManager:
             'status': 'active'
         }
 
-        try:
-            # Check if user already has an active session using GSI
-            existing_session = self.get_user_session(username)
-
-            if existing_session:
-                # User already has active session, don't create new one
-                return None
+        condition = 'attribute_not_exists(username) OR expires_at < :now'
+        expression_values = {':now': {'N': str(current_time)}}
+        if replace_session_id:
+            condition += ' OR session_id = :replace'
+            expression_values[':replace'] = {'S': replace_session_id}
 
-            # No existing session, create new one
+        try:
             self.dynamodb.put_item(
                 TableName=self.table_name,
                 Item={
@@ -117,15 +227,23 @@ class SessionManager:
                     'last_access': {'N': str(current_time)},
                     'expires_at': {'N': str(expires_at)},
                     'status': {'S': 'active'}
-                }
+                },
+                ConditionExpression=condition,
+                ExpressionAttributeValues=expression_values
             )
 
-            return session
-
         except ClientError as e:
-            print(f"Error creating session: {e}")
+            if not _is_condition_failure(e):
+                print(f"Error creating session: {e}")
+            # User already has active session (or another container took it over first)
             return None
 
+        if instance_id == self.lambda_instance_id:
+            _cache_lease(session)
+        else:
+            _forget_lease(username)
+        return session
+
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve session by session ID.
@@ -136,26 +254,22 @@ class SessionManager:
         Returns:
             Session dict if found, None otherwise
         """
+        username = self._username_of(session_id)
+        if username is None:
+            return None
+
         try:
             response = self.dynamodb.get_item(
                 TableName=self.table_name,
-                Key={'session_id': {'S': session_id}}
+                Key={'username': {'S': username}},
+                ConsistentRead=True
             )
 
-            if 'Item' not in response:
+            # The index may lag: the user's item is the truth
+            if 'Item' not in response or response['Item']['session_id']['S'] != session_id:
                 return None
 
-            item = response['Item']
-            return {
-                'session_id': item['session_id']['S'],
-                'username': item['username']['S'],
-                'lambda_instance_id': item['lambda_instance_id']['S'],
-                'db_etag': item['db_etag']['S'],
-                'created_at': int(item['created_at']['N']),
-                'last_access': int(item['last_access']['N']),
-                'expires_at': int(item['expires_at']['N']),
-                'status': item['status']['S']
-            }
+            return _to_session(response['Item'])
 
         except ClientError as e:
             print(f"Error getting session {session_id}: {e}")
@@ -163,10 +277,12 @@ class SessionManager:
 
     def get_user_session(self, username: str) -> Optional[Dict[str, Any]]:
         """
-        Find active session for a user using GSI.
+        Find active session for a user.
 
-        This method queries the username-index GSI to efficiently find if a user
-        has an active session. This is critical for preventing concurrent access.
+        A session this container holds is returned from the lease cache while it
+        has more than LEASE_SAFETY_MARGIN seconds left, without reading DynamoDB.
+        Otherwise the user's item is read (strongly consistent, unlike the old
+        username-index query). This is critical for preventing concurrent access.
 
         Args:
             username: User identifier
@@ -174,58 +290,74 @@ class SessionManager:
         Returns:
             Active session dict if found, None otherwise
         """
+        current_time = time.time()
+        with _leases_lock:
+            cached = _leases.get(username)
+        if cached is not None:
+            if cached['expires_at'] - LEASE_SAFETY_MARGIN > current_time:
+                return dict(cached)
+            _forget_lease(username, cached['session_id'])
+
         try:
-            response = self.dynamodb.query(
+            response = self.dynamodb.get_item(
                 TableName=self.table_name,
-                IndexName='username-index',
-                KeyConditionExpression='username = :username',
-                ExpressionAttributeValues={
-                    ':username': {'S': username},
-                    ':active': {'S': 'active'}
-                },
-                FilterExpression='#status = :active',
-                ExpressionAttributeNames={
-                    '#status': 'status'
-                }
+                Key={'username': {'S': username}},
+                ConsistentRead=True
             )
 
-            if not response['Items']:
+            if 'Item' not in response:
                 return None
 
-            # Should only be one active session per user
-            if len(response['Items']) > 1:
-                print(f"WARNING: User {username} has multiple active sessions!")
+            session = _to_session(response['Item'])
+            if session['status'] != 'active' or session['expires_at'] <= current_time:
+                # Expired: DynamoDB TTL deletes the item eventually, create_session may replace it now
+                return None
 
-            item = response['Items'][0]
-            return {
-                'session_id': item['session_id']['S'],
-                'username': item['username']['S'],
-                'lambda_instance_id': item['lambda_instance_id']['S'],
-                'db_etag': item['db_etag']['S'],
-                'created_at': int(item['created_at']['N']),
-                'last_access': int(item['last_access']['N']),
-                'expires_at': int(item['expires_at']['N']),
-                'status': item['status']['S']
-            }
+            if session['lambda_instance_id'] == self.lambda_instance_id:
+                _cache_lease(session)
+            return session
 
         except ClientError as e:
             print(f"Error querying sessions for user {username}: {e}")
             return None
 
-    def update_session(self, session_id: str, db_etag: Optional[str] = None) -> bool:
+    def update_session(self, session_id: str, db_etag: Optional[str] = None, force: bool = False) -> bool:
         """
         Update session to extend TTL and optionally update ETag.
 
         This method is called on every database operation to keep the session alive
-        and track the latest S3 database version for conflict detection.
+        and track the latest S3 database version for conflict detection. The update
+        is conditional on the user's session still being session_id, so a container
+        whose session was taken over finds out here (and forgets its cached lease).
+
+        For a session this container holds, the write is skipped (and counted in
+        get_heartbeat_stats) while more than HEARTBEAT_THRESHOLD seconds of the
+        lease remain and db_etag is unchanged: a study burst extends it about
+        once a minute instead of on every request. force writes it anyway: a
+        request that changed the database must confirm the session is still
+        ours before the changes go to S3.
 
         Args:
             session_id: Session to update
             db_etag: New S3 database ETag (optional)
+            force: Write even if the heartbeat could be skipped (and raise
+                   ClientError on errors other than a failed condition)
 
         Returns:
-            True if updated successfully, False otherwise
+            True if updated successfully (or skipped), False otherwise (including
+            when the session no longer exists or was taken over)
         """
+        cached = _cached_lease(session_id)
+        if (not force and cached is not None and cached['expires_at'] - time.time() > HEARTBEAT_THRESHOLD
+                and db_etag in (None, cached['db_etag'])):
+            _count_heartbeat('skipped')
+            return True
+
+        username = cached['username'] if cached is not None else self._username_of(session_id)
+        if username is None:
+            return False
+
+        _count_heartbeat('written')
         current_time = int(time.time())
         expires_at = current_time + self.session_ttl
 
@@ -233,24 +365,42 @@ class SessionManager:
             update_expression = 'SET last_access = :last_access, expires_at = :expires_at'
             expression_values = {
                 ':last_access': {'N': str(current_time)},
-                ':expires_at': {'N': str(expires_at)}
+                ':expires_at': {'N': str(expires_at)},
+                ':session_id': {'S': session_id}
             }
 
             if db_etag:
                 update_expression += ', db_etag = :db_etag'
                 expression_values[':db_etag'] = {'S': db_etag}
 
-            self.dynamodb.update_item(
+            response = self.dynamodb.update_item(
                 TableName=self.table_name,
-                Key={'session_id': {'S': session_id}},
+                Key={'username': {'S': username}},
                 UpdateExpression=update_expression,
-                ExpressionAttributeValues=expression_values
+                ConditionExpression='session_id = :session_id',
+                ExpressionAttributeValues=expression_values,
+                ReturnValues='ALL_NEW'
             )
 
+            session = _to_session(response['Attributes'])
+            if session['lambda_instance_id'] == self.lambda_instance_id:
+                _cache_lease(session)
+            if cached is not None:
+                # One JSON line per written heartbeat of a cached lease (for CloudWatch metric filters)
+                print(json.dumps({'session_heartbeat': 'written', 'username': username,
+                                  'remaining_seconds': round(cached['expires_at'] - current_time),
+                                  'etag_changed': db_etag not in (None, cached['db_etag']),
+                                  'container': get_heartbeat_stats()}))
             return True
 
         except ClientError as e:
-            print(f"Error updating session {session_id}: {e}")
+            if force and not _is_condition_failure(e):
+                raise  # the caller must not mistake a DynamoDB error for a takeover
+            _forget_lease(username, session_id)
+            if _is_condition_failure(e):
+                print(f"⚠ Session {session_id[:12]}... of {username} is gone (expired or taken over)")
+            else:
+                print(f"Error updating session {session_id}: {e}")
             return False
 
     def delete_session(self, session_id: str) -> bool:
@@ -263,20 +413,34 @@ class SessionManager:
         - When Lambda container is shutting down
         - When concurrent access is detected (invalidate old session)
 
+        The delete is conditional on the user's session still being session_id:
+        releasing a session that was already taken over leaves the new one alone.
+
         Args:
             session_id: Session to delete
 
         Returns:
-            True if deleted successfully, False otherwise
+            True if deleted successfully (or already gone), False otherwise
         """
+        username = self._username_of(session_id)
+        if username is None:
+            return True
+        return self._delete_user_session(username, session_id)
+
+    def _delete_user_session(self, username: str, session_id: str) -> bool:
+        _forget_lease(username, session_id)
         try:
             self.dynamodb.delete_item(
                 TableName=self.table_name,
-                Key={'session_id': {'S': session_id}}
+                Key={'username': {'S': username}},
+                ConditionExpression='session_id = :session_id',
+                ExpressionAttributeValues={':session_id': {'S': session_id}}
             )
             return True
 
         except ClientError as e:
+            if _is_condition_failure(e):
+                return True
             print(f"Error deleting session {session_id}: {e}")
             return False
 
@@ -296,24 +460,52 @@ class SessionManager:
         Returns:
             True if updated successfully, False otherwise
         """
+        username = self._username_of(session_id)
+        if username is None:
+            return False
+
         try:
             self.dynamodb.update_item(
                 TableName=self.table_name,
-                Key={'session_id': {'S': session_id}},
+                Key={'username': {'S': username}},
                 UpdateExpression='SET #status = :status',
+                ConditionExpression='session_id = :session_id',
                 ExpressionAttributeNames={
                     '#status': 'status'
                 },
                 ExpressionAttributeValues={
-                    ':status': {'S': status}
+                    ':status': {'S': status},
+                    ':session_id': {'S': session_id}
                 }
             )
+            _forget_lease(username, session_id)
             return True
 
         except ClientError as e:
             print(f"Error updating session status {session_id}: {e}")
             return False
 
+    def _username_of(self, session_id: str) -> Optional[str]:
+        """The user a session belongs to: from the lease cache, else the session-index GSI."""
+        cached = _cached_lease(session_id)
+        if cached is not None:
+            return cached['username']
+
+        try:
+            response = self.dynamodb.query(
+                TableName=self.table_name,
+                IndexName='session-index',
+                KeyConditionExpression='session_id = :session_id',
+                ExpressionAttributeValues={':session_id': {'S': session_id}}
+            )
+        except ClientError as e:
+            print(f"Error looking up session {session_id}: {e}")
+            return None
+
+        if not response['Items']:
+            return None
+        return response['Items'][0]['username']['S']
+
     def wait_for_session_flush(self, session_id: str, timeout: int = 10) -> bool:
         """
         Wait for a session to finish flushing to S3.
@@ -370,7 +562,7 @@ class SessionManager:
         if not existing_session:
             return False
 
-        return self.delete_session(existing_session['session_id'])
+        return self._delete_user_session(username, existing_session['session_id'])
 
     def cleanup_expired_sessions(self) -> int:
         """
@@ -379,32 +571,29 @@ class SessionManager:
         Note: DynamoDB TTL handles this automatically, but this method is useful
         for testing and immediate cleanup without waiting for TTL background process.
 
+        The deletes are batch_write_item calls of 25, which can't be conditional:
+        a session re-acquired between the scan and its delete is deleted too, and
+        its owner finds out at its next heartbeat (update_session returns False).
+
         Returns:
             Number of expired sessions deleted
         """
         current_time = int(time.time())
-        deleted_count = 0
 
         try:
-            # Scan for expired sessions
-            response = self.dynamodb.scan(
-                TableName=self.table_name,
-                FilterExpression='expires_at < :current_time',
-                ExpressionAttributeValues={
-                    ':current_time': {'N': str(current_time)}
-                }
+            items = self._scan(
+                'username',
+                filter_expression='expires_at < :current_time',
+                values={':current_time': {'N': str(current_time)}}
             )
-
-            for item in response.get('Items', []):
-                session_id = item['session_id']['S']
-                if self.delete_session(session_id):
-                    deleted_count += 1
-
-            return deleted_count
+            usernames = [item['username']['S'] for item in items]
+            for username in usernames:
+                _forget_lease(username)
+            return self._batch_delete(usernames)
 
         except ClientError as e:
             print(f"Error cleaning up expired sessions: {e}")
-            return deleted_count
+            return 0
 
     def get_session_stats(self) -> Dict[str, int]:
         """
@@ -416,14 +605,11 @@ class SessionManager:
         current_time = int(time.time())
 
         try:
-            response = self.dynamodb.scan(
-                TableName=self.table_name,
-                Select='ALL_ATTRIBUTES'
-            )
+            items = self._scan('expires_at, #status', names={'#status': 'status'})
 
-            total = len(response.get('Items', []))
+            total = len(items)
             active = sum(
-                1 for item in response.get('Items', [])
+                1 for item in items
                 if int(item['expires_at']['N']) > current_time
                 and item['status']['S'] == 'active'
             )
@@ -439,6 +625,65 @@ class SessionManager:
             print(f"Error getting session stats: {e}")
             return {'total': 0, 'active': 0, 'expired': 0}
 
+    def _scan(
+        self,
+        projection: str,
+        names: Optional[Dict[str, str]] = None,
+        filter_expression: Optional[str] = None,
+        values: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Every item of the sessions table (matching filter_expression), with only
+        the projected attributes: SCAN_SEGMENTS segments scanned in parallel,
+        each page by page until it has no LastEvaluatedKey.
+        """
+        kwargs = {
+            'TableName': self.table_name,
+            'ProjectionExpression': projection,
+            'TotalSegments': SCAN_SEGMENTS
+        }
+        if names:
+            kwargs['ExpressionAttributeNames'] = names
+        if filter_expression:
+            kwargs['FilterExpression'] = filter_expression
+            kwargs['ExpressionAttributeValues'] = values
+        if SCAN_PAGE_SIZE > 0:
+            kwargs['Limit'] = SCAN_PAGE_SIZE
+
+        def scan_segment(segment):
+            items = []
+            page_kwargs = dict(kwargs, Segment=segment)
+            while True:
+                response = self.dynamodb.scan(**page_kwargs)
+                items.extend(response.get('Items', []))
+                if 'LastEvaluatedKey' not in response:
+                    return items
+                page_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        with ThreadPoolExecutor(max_workers=SCAN_SEGMENTS) as pool:
+            return [item for items in pool.map(scan_segment, range(SCAN_SEGMENTS)) for item in items]
+
+    def _batch_delete(self, usernames: List[str]) -> int:
+        """
+        Deletes the sessions of usernames, 25 per batch_write_item, resending
+        unprocessed items with backoff. Returns the number deleted.
+        """
+        deleted = 0
+        for i in range(0, len(usernames), BATCH_WRITE_SIZE):
+            requests = [{'DeleteRequest': {'Key': {'username': {'S': username}}}}
+                        for username in usernames[i:i + BATCH_WRITE_SIZE]]
+            for attempt in range(BATCH_WRITE_RETRIES):
+                response = self.dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                deleted += len(requests) - len(unprocessed)
+                if not unprocessed:
+                    break
+                requests = unprocessed
+                time.sleep(0.05 * 2 ** attempt)  # throttled: back off before resending
+            else:
+                print(f"⚠ {len(requests)} expired session(s) not deleted (throttled)")
+        return deleted
+
 
 class SessionConflictError(Exception):
     """
@@ -0,0 +1,178 @@
+"""
+tmp_cache - Size-aware LRU of user databases kept in Lambda /tmp
+
+A warm container keeps /tmp/<username>.anki2 for every user it has served, and
+/tmp is 2GB. DatabaseCache (s3_sqlite.db_cache) tracks each cached database's
+bytes as it is stored or written (one os.stat per update, no walk of /tmp),
+in least-recently-used order. When the total exceeds DB_CACHE_MAX_MB, the least
+recently used databases are deleted from /tmp, except:
+- dirty ones: changes not uploaded to S3 yet (SessionAwareS3SQLite between writes
+  and end_session)
+- ones held by a session this container owns, until the session expires
+
+Hits, misses and evictions are counted for get_cache_stats(). tmp_cleanup skips
+the protected files too.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DB_CACHE_MAX_MB = int(os.environ.get('DB_CACHE_MAX_MB', 1536))  # of Lambda's 2048MB /tmp
+
+
+class DatabaseCache:
+    """
+    {username: {'etag': str, 'timestamp': float, 'path': str, 'size': int}} in LRU
+    order, bounded by max_bytes.
+
+    Reads and writes like the dict it replaces (db_cache[username] = entry,
+    db_cache.get(username), del db_cache[username]); storing an entry makes it
+    most recently used and evicts others if the budget is exceeded.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._dirty = set()
+        self._sessions = {}  # username -> session expiry (epoch seconds)
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def __contains__(self, username):
+        return username in self._entries
+
+    def __getitem__(self, username):
+        return self._entries[username]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, username, default=None):
+        return self._entries.get(username, default)
+
+    def items(self):
+        with self._lock:
+            return list(self._entries.items())
+
+    def __setitem__(self, username, entry):
+        with self._lock:
+            self._pop(username)
+            entry = dict(entry, size=_file_size(entry['path']))
+            self._entries[username] = entry
+            self.total_bytes += entry['size']
+            self._enforce_budget(keep=username)
+
+    def __delitem__(self, username):
+        with self._lock:
+            if self._pop(username) is None:
+                raise KeyError(username)
+
+    def _pop(self, username):
+        entry = self._entries.pop(username, None)
+        if entry is not None:
+            self.total_bytes -= entry['size']
+        return entry
+
+    def touch(self, username):
+        """Marks a database used and re-measures it (it may have grown). No-op if untracked."""
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                return
+            self._entries.move_to_end(username)
+            size = _file_size(entry['path'])
+            self.total_bytes += size - entry['size']
+            entry['size'] = size
+            self._enforce_budget(keep=username)
+
+    def discard_path(self, path):
+        """Forgets the entry for a file deleted outside the cache (tmp_cleanup)."""
+        with self._lock:
+            for username, entry in list(self._entries.items()):
+                if entry['path'] == path:
+                    self._pop(username)
+
+    def mark_dirty(self, username):
+        """The database has changes not in S3: never evict it."""
+        with self._lock:
+            self._dirty.add(username)
+
+    def mark_clean(self, username):
+        with self._lock:
+            self._dirty.discard(username)
+
+    def hold_session(self, username, expires_at):
+        """This container owns username's session until expires_at: keep the database."""
+        with self._lock:
+            self._sessions[username] = expires_at
+
+    def release_session(self, username):
+        with self._lock:
+            self._sessions.pop(username, None)
+
+    def is_protected(self, username):
+        with self._lock:
+            if username in self._dirty:
+                return True
+            expires_at = self._sessions.get(username)
+            if expires_at is not None and expires_at <= time.time():
+                del self._sessions[username]
+                return False
+            return expires_at is not None
+
+    def protected_paths(self):
+        """Paths of cached databases that must not be deleted."""
+        with self._lock:
+            return {entry['path'] for username, entry in self._entries.items() if self.is_protected(username)}
+
+    def record_hit(self):
+        self.hits += 1
+
+    def record_miss(self):
+        self.misses += 1
+
+    def _enforce_budget(self, keep=None):
+        """Deletes least recently used unprotected databases until total_bytes <= max_bytes."""
+        if self.total_bytes <= self.max_bytes:
+            return
+        for username in list(self._entries):
+            if self.total_bytes <= self.max_bytes:
+                return
+            if username == keep or self.is_protected(username):
+                continue
+            entry = self._pop(username)
+            try:
+                os.remove(entry['path'])
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+            self.evicted_bytes += entry['size']
+            print(f"✓ Evicted {username} from /tmp cache ({entry['size'] / (1024 * 1024):.1f}MB, LRU)")
+        if self.total_bytes > self.max_bytes:
+            print(f"⚠ /tmp cache over budget: {self.total_bytes / (1024 * 1024):.1f}MB "
+                  f"> {self.max_bytes / (1024 * 1024):.0f}MB, nothing else evictable (dirty, in session or in use)")
+
+    def clear(self):
+        """Forgets all entries and resets the counters (files are left in /tmp)."""
+        with self._lock:
+            self._entries.clear()
+            self._dirty.clear()
+            self._sessions.clear()
+            self.total_bytes = 0
+            self.hits = self.misses = self.evictions = self.evicted_bytes = 0
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+db_cache = DatabaseCache(DB_CACHE_MAX_MB * 1024 * 1024)
@@ -5,12 +5,17 @@ Lambda's /tmp directory is 2GB and persists across warm invocations.
 This utility provides functions to manage /tmp storage and prevent exhaustion.
 
 Day 5: Basic cleanup utilities for database files
+Cached user databases are bounded by tmp_cache (size-aware LRU, evicts as they are
+stored); these cleanups skip the databases it protects (dirty or session-held) and
+keep its byte count in step with what they delete.
 """
 
 import os
 import glob
 import time
 
+from tmp_cache import db_cache
+
 
 def get_tmp_size():
     """
@@ -75,17 +80,19 @@ def cleanup_old_files(max_age_seconds=3600, pattern='*.anki2', dry_run=False):
         dict: Statistics about cleanup operation
     """
     files = list_tmp_files(pattern)
+    protected = db_cache.protected_paths()
     deleted_count = 0
     deleted_size = 0
     kept_count = 0
     kept_size = 0
 
     for file in files:
-        if file['age'] > max_age_seconds:
+        if file['age'] > max_age_seconds and file['path'] not in protected:
             # File is too old, delete it
             if not dry_run:
                 try:
                     os.remove(file['path'])
+                    db_cache.discard_path(file['path'])
                     deleted_count += 1
                     deleted_size += file['size']
                 except (OSError, FileNotFoundError):
@@ -141,7 +148,8 @@ def cleanup_by_size(target_size_mb=1500, pattern='*.anki2', dry_run=False):
         }
 
     # Get all matching files, sorted by age (oldest first)
-    files = list_tmp_files(pattern)
+    protected = db_cache.protected_paths()
+    files = [f for f in list_tmp_files(pattern) if f['path'] not in protected]
     files.sort(key=lambda f: f['modified'])  # Oldest first
 
     deleted_count = 0
@@ -156,6 +164,7 @@ def cleanup_by_size(target_size_mb=1500, pattern='*.anki2', dry_run=False):
         if not dry_run:
             try:
                 os.remove(file['path'])
+                db_cache.discard_path(file['path'])
                 deleted_count += 1
                 deleted_size += file['size']
                 current_size -= file['size']
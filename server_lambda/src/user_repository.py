@@ -13,14 +13,20 @@ import bcrypt
 from botocore.exceptions import ClientError
 from datetime import datetime
 
-# DynamoDB client (reused across invocations)
-dynamodb = boto3.resource('dynamodb')
-
 # Get table name from environment variable
 USERS_TABLE = os.environ.get('DYNAMODB_USERS_TABLE', 'javumbo-users')
 
-# Get DynamoDB table
-users_table = dynamodb.Table(USERS_TABLE)
+# DynamoDB table (created on first use, then reused across invocations).
+# Building the boto3 resource is deferred so importing this module stays cheap on cold start.
+_users_table = None
+
+
+def get_users_table():
+    """Return the shared DynamoDB users Table, creating it on first call."""
+    global _users_table
+    if _users_table is None:
+        _users_table = boto3.resource('dynamodb').Table(USERS_TABLE)
+    return _users_table
 
 
 class UserRepository:
@@ -55,8 +61,15 @@ class UserRepository:
     """
 
     def __init__(self):
-        """Initialize UserRepository."""
-        self.table = users_table
+        """Initialize UserRepository (the DynamoDB table is resolved on first use)."""
+        self._table = None
+
+    @property
+    def table(self):
+        """DynamoDB users table."""
+        if self._table is None:
+            self._table = get_users_table()
+        return self._table
 
     def create_user(self, username, name, password):
         """
@@ -0,0 +1,269 @@
+"""
+write_behind - Write-behind flushing of dirty session databases to S3
+
+SessionAwareS3SQLite.__exit__ commits to /tmp and does not upload, so a session's
+writes were durable only once the client called /api/session/flush or a route
+called force_upload(). Now every committed write is recorded here, and a
+background thread uploads the user's database when either:
+- FLUSH_IDLE_SECONDS have passed since the last write (the session went quiet), or
+- FLUSH_MAX_WRITES writes have piled up since the last upload
+so a burst of reviews becomes one upload, and nothing stays unflushed for long.
+
+A flush uploads a consistent snapshot (sqlite3 backup API) of the /tmp file, so
+it can run while a request is writing; writes recorded after the snapshot keep
+the user dirty for the next flush. Uploads of one user are serialized, and the
+resulting ETag is kept here (synced_etag) as the container's view of what is in
+S3, so connections opened before a flush don't later write with a stale ETag.
+
+Lambda freezes the container between invocations; the thread resumes with it.
+On shutdown Lambda sends SIGTERM to the runtime (when an extension is
+registered, e.g. the Lambda Insights layer) and install_shutdown_hook() flushes
+everything still dirty then.
+
+Every flush logs one JSON line with the age of the data it made durable and of
+the oldest data still unflushed, for CloudWatch metric filters.
+"""
+
+import json
+import os
+import signal
+import sqlite3
+import sys
+import threading
+import time
+
+import s3_journal
+from tmp_cache import db_cache
+
+FLUSH_IDLE_SECONDS = float(os.environ.get('FLUSH_IDLE_SECONDS', 10))
+FLUSH_MAX_WRITES = int(os.environ.get('FLUSH_MAX_WRITES', 20))
+FLUSH_RETRY_SECONDS = 5
+
+
+class WriteBehindScheduler:
+    """
+    Dirty session databases and their flush timers.
+
+    Pending structure: {username: {'path': str, 'etag': str, 'session_id': str,
+    'writes': int, 'first_write': float, 'last_write': float, 'retry_at': float}}
+    """
+
+    def __init__(self, idle_seconds, max_writes):
+        self.idle_seconds = idle_seconds
+        self.max_writes = max_writes
+        self._pending = {}
+        self._synced = {}  # username -> (ETag in S3 as of our last download/upload, monotonic time)
+        self._lock = threading.Lock()
+        self._user_locks = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self.flushes = 0
+        self.conflicts = 0
+        self.failures = 0
+
+    def _user_lock(self, username):
+        with self._lock:
+            return self._user_locks.setdefault(username, threading.Lock())
+
+    def synced(self, username, etag):
+        """Records the ETag of the version just downloaded (or created: None) into /tmp."""
+        with self._lock:
+            self._synced[username] = (etag, time.monotonic())
+
+    def synced_etag(self, username, etag, since=None):
+        """The ETag this container last synced username at, if after since (monotonic); else etag."""
+        with self._lock:
+            synced = self._synced.get(username)
+        if synced is None or (since is not None and synced[1] <= since):
+            return etag
+        return synced[0]
+
+    def record_write(self, username, path, etag, session_id=None):
+        """Counts a committed write to username's /tmp database and schedules its flush."""
+        now = time.time()
+        with self._lock:
+            pending = self._pending.get(username)
+            if pending is None:
+                pending = self._pending[username] = {
+                    'path': path, 'etag': etag, 'writes': 0,
+                    'first_write': now, 'retry_at': 0
+                }
+            pending['writes'] += 1
+            pending['last_write'] = now
+            pending['session_id'] = session_id or pending.get('session_id')
+            self._ensure_thread()
+        db_cache.mark_dirty(username)
+        self._wake.set()
+
+    def is_dirty(self, username):
+        with self._lock:
+            return username in self._pending
+
+    def flush(self, username, reason, raise_errors=False):
+        """
+        Uploads username's database if it has unflushed writes. Returns the new ETag,
+        or None if there was nothing to flush (or the flush failed and raise_errors
+        is False; it is retried after FLUSH_RETRY_SECONDS, except on a conflict).
+        """
+        from s3_sqlite import ConflictError, upload_session_database
+
+        with self._user_lock(username):
+            with self._lock:
+                pending = self._pending.get(username)
+                if pending is None:
+                    return None
+                writes, etag, path = pending['writes'], pending['etag'], pending['path']
+                session_id = pending.get('session_id')
+            snapshot = f'{path}.flush'
+            # Read before the snapshot: every journal segment up to it is in the file (S3_JOURNAL)
+            journal_seq = s3_journal.last_seq(username)
+            try:
+                if session_id and not _session_still_ours(session_id):
+                    # Taken over: the new owner's copy doesn't have these writes, and
+                    # uploading them would make its flush conflict and drop its writes
+                    raise ConflictError(f"Session {session_id[:12]}... of {username} was taken over")
+                _snapshot(path, snapshot)
+                new_etag = upload_session_database(username, snapshot, etag, journal_seq)
+            except ConflictError as e:
+                # Another container wrote a newer version: these writes can't be applied on top
+                with self._lock:
+                    self._pending.pop(username, None)
+                    self._synced.pop(username, None)
+                    self.conflicts += 1
+                # Drop the stale copy like S3SQLiteConnection does: the next open downloads again
+                db_cache.mark_clean(username)
+                if username in db_cache:
+                    del db_cache[username]
+                if os.path.exists(path):
+                    os.remove(path)
+                self._log('conflict', username, pending, writes)
+                print(f"⚠ Write-behind flush of {username} conflicted, local changes dropped: {e}")
+                if raise_errors:
+                    raise
+                return None
+            except Exception as e:
+                with self._lock:
+                    pending['retry_at'] = time.time() + FLUSH_RETRY_SECONDS
+                    self.failures += 1
+                print(f"⚠ Write-behind flush of {username} failed ({reason}), retrying: {e}")
+                if raise_errors:
+                    raise
+                return None
+            finally:
+                if os.path.exists(snapshot):
+                    os.remove(snapshot)
+
+            with self._lock:
+                self._synced[username] = (new_etag, time.monotonic())
+                self.flushes += 1
+                pending['etag'] = new_etag
+                pending['writes'] -= writes
+                clean = pending['writes'] <= 0
+                if clean:
+                    del self._pending[username]
+                else:
+                    pending['first_write'] = pending['last_write']  # written during the upload
+            if clean:
+                db_cache.mark_clean(username)
+            self._log(reason, username, pending, writes)
+
+        if pending.get('session_id'):
+            from session_manager import SessionManager
+            SessionManager().update_session(pending['session_id'], db_etag=new_etag)
+        return new_etag
+
+    def flush_all(self, reason):
+        """Flushes every dirty database, oldest data first. Returns the number flushed."""
+        with self._lock:
+            usernames = sorted(self._pending, key=lambda u: self._pending[u]['first_write'])
+        return sum(1 for username in usernames if self.flush(username, reason) is not None)
+
+    def _due(self, now):
+        """[(username, reason)] ready to flush, and seconds until the next one is."""
+        due, wait = [], None
+        with self._lock:
+            for username, pending in self._pending.items():
+                if now < pending['retry_at']:
+                    ready_at = pending['retry_at']
+                elif pending['writes'] >= self.max_writes:
+                    due.append((username, 'writes'))
+                    continue
+                else:
+                    ready_at = pending['last_write'] + self.idle_seconds
+                    if ready_at <= now:
+                        due.append((username, 'idle'))
+                        continue
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+        return due, wait
+
+    def _run(self):
+        while True:
+            due, wait = self._due(time.time())
+            for username, reason in due:
+                self.flush(username, reason)
+            if not due:
+                self._wake.wait(wait)
+                self._wake.clear()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def oldest_unflushed_age(self):
+        """Seconds since the oldest write not yet in S3 (0 if everything is flushed)."""
+        now = time.time()
+        with self._lock:
+            return max((now - p['first_write'] for p in self._pending.values()), default=0)
+
+    def get_stats(self):
+        with self._lock:
+            dirty = len(self._pending)
+        return {
+            'dirty_databases': dirty,
+            'oldest_unflushed_age_seconds': round(self.oldest_unflushed_age(), 3),
+            'flushes': self.flushes,
+            'conflicts': self.conflicts,
+            'failures': self.failures
+        }
+
+    def _log(self, reason, username, pending, writes):
+        """One JSON line per flush (for CloudWatch metric filters)."""
+        print(json.dumps({'write_behind': reason, 'username': username, 'writes': writes,
+                          'unflushed_age_seconds': round(time.time() - pending['first_write'], 3),
+                          'container': self.get_stats()}))
+
+
+def _session_still_ours(session_id):
+    """Extends the session with a written heartbeat; False if another container took it over."""
+    from session_manager import SessionManager
+    return SessionManager().update_session(session_id, force=True)
+
+
+def _snapshot(path, snapshot_path):
+    """Consistent copy of a SQLite database that may be open (and written) elsewhere."""
+    src = sqlite3.connect(path)
+    dst = sqlite3.connect(snapshot_path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+def install_shutdown_hook():
+    """Flushes dirty databases on SIGTERM, then hands over to the previous handler. Main thread only."""
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        flushed = scheduler.flush_all('shutdown')
+        print(f"✓ Shutdown: flushed {flushed} dirty database(s)")
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            sys.exit(0)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+scheduler = WriteBehindScheduler(FLUSH_IDLE_SECONDS, FLUSH_MAX_WRITES)
@@ -56,18 +56,21 @@ resource "aws_dynamodb_table" "user_locks" {
 }
 
 # Sessions Table (for Lambda container session coordination)
+# Keyed by username: a user's session is one item, acquired and taken over with
+# conditional writes. (Changing the key from session_id replaces the table; its
+# items are 5-minute sessions, nothing durable is lost.)
 resource "aws_dynamodb_table" "sessions" {
   name         = var.dynamodb_sessions_table
   billing_mode = "PAY_PER_REQUEST"
-  hash_key     = "session_id"
+  hash_key     = "username"
 
   attribute {
-    name = "session_id"
+    name = "username"
     type = "S"
   }
 
   attribute {
-    name = "username"
+    name = "session_id"
     type = "S"
   }
 
@@ -77,12 +80,12 @@ resource "aws_dynamodb_table" "sessions" {
     enabled        = true
   }
 
-  # GSI for querying sessions by username
-  # Enables: "Does user X have an active session?"
+  # GSI for finding a session's user by session ID
+  # Enables: "Which user is session X?" (then a consistent read of that user's item)
   global_secondary_index {
-    name            = "username-index"
-    hash_key        = "username"
-    projection_type = "ALL"
+    name            = "session-index"
+    hash_key        = "session_id"
+    projection_type = "KEYS_ONLY"
   }
 
   # Enable encryption at rest
@@ -41,7 +41,21 @@ resource "aws_lambda_function" "api" {
       DYNAMODB_LOCKS_TABLE    = aws_dynamodb_table.user_locks.name
       DYNAMODB_SESSIONS_TABLE = aws_dynamodb_table.sessions.name
       SESSION_TTL             = "300"  # 5 minutes in seconds
+      SESSION_LEASE_MARGIN    = "5"    # stop trusting this container's cached session 5s before it expires
+      SESSION_HEARTBEAT_THRESHOLD = "240" # extend a session only once < 240s remain (or its ETag changed); >= SESSION_TTL: every request
+      SESSION_SCAN_SEGMENTS   = "4"    # parallel scan segments for session cleanup/stats
       DB_CACHE_TTL            = "300"  # 5 minutes in seconds
+      DB_CACHE_MAX_MB         = "1536" # /tmp budget for cached user DBs, LRU-evicted (tmp_cache.py)
+      FLUSH_IDLE_SECONDS      = "10"   # write-behind: upload a dirty session DB after 10s without writes (write_behind.py)
+      FLUSH_MAX_WRITES        = "20"   # ... or after 20 writes
+      S3_STORAGE_FORMAT       = "file" # "chunked": upload only changed chunks + a manifest (s3_chunked.py)
+      S3_COMPRESSION          = "none" # "zstd" or "gzip": store user DB objects compressed (s3_codec.py)
+      S3_PARALLEL_THRESHOLD   = "16777216" # objects above 16 MB: parallel ranged GETs / multipart upload (s3_transfer.py)
+      S3_PART_SIZE            = "8388608"
+      S3_TRANSFER_CONCURRENCY = "8"
+      S3_CONDITIONAL_WRITES   = "true" # IfMatch/IfNoneMatch PUTs; "false" for backends without conditional writes
+      S3_JOURNAL              = "false" # "true": append changed rows as journal segments instead of uploading the DB (s3_journal.py)
+      S3_JOURNAL_COMPACT_SEGMENTS = "50" # ... fold them into the DB object after 50 segments
       SECRET_KEY              = "CHANGE_THIS_IN_PRODUCTION" # TODO: Use AWS Secrets Manager
       # Note: AWS_LAMBDA_FUNCTION_NAME is automatically set by AWS Lambda runtime
     }
@@ -0,0 +1,120 @@
+"""
+Test: Login Warm-up (prefetch + session open in /api/login)
+
+Runs the warm-up against moto's in-process S3 and DynamoDB, no AWS account needed:
+- A prefetch that finished in time is adopted by the session open (one download)
+- A prefetch still running after LOGIN_PREFETCH_WAIT_S skips the session open,
+  so the login doesn't start a second full download
+
+Run with:
+    python -m unittest test_login_warmup.py -v
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('SECRET_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+import anki_schema
+import app
+import s3_sqlite
+import session_manager
+import write_behind
+from s3_sqlite import LoginPrefetch
+from write_behind import WriteBehindScheduler
+
+
+class LoginWarmupTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.s3 = boto3.client('s3')
+        self.s3.create_bucket(Bucket=s3_sqlite.BUCKET)
+        boto3.client('dynamodb').create_table(
+            TableName=os.environ.get('DYNAMODB_SESSIONS_TABLE', 'javumbo-sessions'),
+            BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': 'username', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'username', 'AttributeType': 'S'},
+                                  {'AttributeName': 'session_id', 'AttributeType': 'S'}],
+            GlobalSecondaryIndexes=[{'IndexName': 'session-index',
+                                     'KeySchema': [{'AttributeName': 'session_id', 'KeyType': 'HASH'}],
+                                     'Projection': {'ProjectionType': 'KEYS_ONLY'}}])
+
+        self.original = (s3_sqlite._s3_client, session_manager._dynamodb_client, write_behind.scheduler,
+                         app.LOGIN_PREFETCH_WAIT_S)
+        s3_sqlite._s3_client = self.s3
+        session_manager._dynamodb_client = None
+        write_behind.scheduler = WriteBehindScheduler(idle_seconds=3600, max_writes=1000)
+        s3_sqlite.clear_cache()
+        session_manager.clear_lease_cache()
+
+        self.username = f'warmup_{self._testMethodName}'
+        self.path = f'/tmp/{self.username}.anki2'
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'new.anki2')
+            conn = sqlite3.connect(path)
+            anki_schema.init_anki_db(conn, self.username)
+            conn.commit()
+            conn.close()
+            s3_sqlite.upload_new_database(self.username, path)
+
+        self.gets = 0
+        self.get_delay = 0
+        self.s3.meta.events.register('before-call.s3.GetObject', self._on_get)
+
+    def tearDown(self):
+        (s3_sqlite._s3_client, session_manager._dynamodb_client, write_behind.scheduler,
+         app.LOGIN_PREFETCH_WAIT_S) = self.original
+        s3_sqlite.clear_cache()
+        session_manager.clear_lease_cache()
+        app._warmed_users.pop(self.username, None)
+        prefetched = s3_sqlite._prefetched.pop(self.username, None)
+        for path in (self.path, prefetched and prefetched['path']):
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def _on_get(self, **kwargs):
+        self.gets += 1
+        time.sleep(self.get_delay)
+
+    def test_finished_prefetch_is_adopted(self):
+        warmed = app._warmup_stats['warmed']
+        app._warmUserSession(self.username, LoginPrefetch(self.username))
+
+        self.assertEqual(app._warmup_stats['warmed'], warmed + 1)
+        self.assertEqual(self.gets, 1)
+        self.assertIn(self.username, app._warmed_users)
+        self.assertIsNotNone(session_manager.SessionManager().get_user_session(self.username))
+
+    def test_slow_prefetch_skips_session_open(self):
+        app.LOGIN_PREFETCH_WAIT_S = 0.05
+        self.get_delay = 0.5
+        skipped = app._warmup_stats['skipped']
+        prefetch = LoginPrefetch(self.username)
+        app._warmUserSession(self.username, prefetch)
+
+        self.assertEqual(app._warmup_stats['skipped'], skipped + 1)
+        self.assertNotIn(self.username, app._warmed_users)
+        self.assertIsNone(session_manager.SessionManager().get_user_session(self.username))
+
+        # The prefetch finishes in the background, and is the only download
+        self.assertTrue(prefetch.wait(5))
+        self.assertEqual(self.gets, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
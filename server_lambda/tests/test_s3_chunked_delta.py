@@ -0,0 +1,258 @@
+"""
+Test: Chunked S3 storage - Upload Bytes per Review
+
+Measures how many bytes one review uploads with S3_STORAGE_FORMAT=chunked
+(changed chunks + manifest) against the whole-file put_object of the default
+format, on ~5 MB and ~50 MB collections and a few chunk sizes.
+
+Each review does what /api/review does to the database: update the card,
+insert a revlog row and bump col.mod. Every review is uploaded on its own,
+like force_upload() after a write.
+
+Expected outcome:
+- Whole-file format: every review uploads the entire collection
+- Chunked format: a review uploads a few chunks + the manifest (KBs, not MBs)
+- Downloads reassemble a byte-identical file
+
+The unit tests (ChunkedStorageTestCase) run against moto's in-process S3:
+- Downloads reassemble a byte-identical file, fetching only the chunks an
+  older local copy (reuse_path) doesn't have
+- A download whose manifest lost its chunks to a newer upload re-reads it
+- An upload deletes the chunks only the previous manifest used
+
+Run with:
+    python -m pytest test_s3_chunked_delta.py  # unit tests
+    python test_s3_chunked_delta.py            # benchmark against $S3_BUCKET
+    python test_s3_chunked_delta.py --moto     # benchmark on in-process S3 (moto), no AWS account needed
+"""
+
+import sys
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+import s3_chunked
+from anki_schema import init_anki_db
+from s3_sqlite import ConflictError
+
+COLLECTION_SIZES_MB = [5, 50]
+CHUNK_SIZES = [4 * 1024, 16 * 1024, 64 * 1024]
+REVIEWS = 20
+
+
+def build_collection(path, target_mb):
+    """Anki collection of roughly target_mb: notes + cards + 10 revlog rows per card."""
+    conn = sqlite3.connect(path)
+    init_anki_db(conn, user_name='Bench')
+    rng = random.Random(42)
+    now_ms = int(time.time() * 1000)
+    next_id = now_ms - 10**9
+    while os.path.getsize(path) < target_mb * 1024 * 1024:
+        for _ in range(500):
+            next_id += 1
+            note_id, card_id = next_id, next_id
+            front = ' '.join(rng.choice(['ser', 'estar', 'haber', 'tener', 'ir', 'hacer']) for _ in range(12))
+            conn.execute("INSERT INTO notes VALUES (?, ?, 1700000000001, ?, -1, '', ?, ?, ?, 0, '')",
+                         (note_id, f'g{note_id}', now_ms // 1000, f'{front}\x1f{front[::-1]}', front, note_id % 2**31))
+            conn.execute("INSERT INTO cards VALUES (?, ?, 2, 0, ?, -1, 2, 2, ?, ?, 2500, 10, 0, 0, 0, 0, 0, '')",
+                         (card_id, note_id, now_ms // 1000, rng.randint(0, 400), rng.randint(1, 200)))
+            for r in range(10):
+                conn.execute("INSERT INTO revlog VALUES (?, ?, -1, ?, ?, ?, 2500, ?, 1)",
+                             (now_ms * 1000 + card_id * 10 + r, card_id, rng.randint(1, 4), r + 1, r, rng.randint(2000, 20000)))
+        conn.commit()
+    conn.close()
+
+
+def review_one_card(path, rng, review_no):
+    """One /api/review worth of writes."""
+    conn = sqlite3.connect(path)
+    card_id = conn.execute("SELECT id FROM cards ORDER BY id LIMIT 1 OFFSET ?",
+                           (rng.randint(0, conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0] - 1),)).fetchone()[0]
+    now_ms = int(time.time() * 1000) + review_no
+    conn.execute("UPDATE cards SET ivl = ivl + 1, due = due + 3, reps = reps + 1, mod = ?, usn = -1 WHERE id = ?",
+                 (now_ms // 1000, card_id))
+    conn.execute("INSERT INTO revlog VALUES (?, ?, -1, 3, 4, 3, 2500, 6000, 1)", (now_ms * 10**6 + review_no, card_id))
+    conn.execute("UPDATE col SET mod = ?", (now_ms,))
+    conn.commit()
+    conn.close()
+
+
+def measure(s3, bucket, path, size_mb, chunk_size):
+    username = f'test_chunked_{size_mb}mb_{chunk_size // 1024}k'
+    work = f'{path}.{chunk_size}'
+    with open(path, 'rb') as src, open(work, 'wb') as dst:
+        dst.write(src.read())
+
+    etag, first = s3_chunked.upload(s3, bucket, username, work, None, chunk_size=chunk_size)
+    rng = random.Random(7)
+    uploaded = []
+    for i in range(REVIEWS):
+        review_one_card(work, rng, i)
+        etag, stats = s3_chunked.upload(s3, bucket, username, work, etag, chunk_size=chunk_size)
+        uploaded.append(stats['uploaded_bytes'] + stats['manifest_bytes'])
+
+    # Round trip: a fresh download must be byte-identical
+    restored = f'{work}.restored'
+    s3_chunked.download(s3, bucket, username, restored)
+    with open(work, 'rb') as a, open(restored, 'rb') as b:
+        assert a.read() == b.read(), "Reassembled file differs from the uploaded one"
+
+    file_bytes = os.path.getsize(work)
+    avg = sum(uploaded) / len(uploaded)
+    print(f"  {size_mb:>3} MB  chunk {chunk_size // 1024:>2} KB  first upload {first['uploaded_bytes'] / 1024 / 1024:6.1f} MB"
+          f"  per review: avg {avg / 1024:7.1f} KB, max {max(uploaded) / 1024:7.1f} KB"
+          f"  (whole file: {file_bytes / 1024 / 1024:.1f} MB, {100 * avg / file_bytes:.2f}%)")
+
+    # Cleanup
+    prefix = f'user_chunks/{username}/'
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        keys = [{'Key': obj['Key']} for obj in page.get('Contents', [])]
+        if keys:
+            s3.delete_objects(Bucket=bucket, Delete={'Objects': keys, 'Quiet': True})
+    s3.delete_object(Bucket=bucket, Key=s3_chunked.manifest_key(username))
+    for p in (work, restored):
+        os.remove(p)
+
+
+class ChunkedStorageTestCase(unittest.TestCase):
+
+    CHUNK = 1024
+    BUCKET = 'chunked-test'
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.s3 = boto3.client('s3')
+        self.s3.create_bucket(Bucket=self.BUCKET)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'local.anki2')
+        self.restored = os.path.join(tmp.name, 'restored.anki2')
+        self.username = 'chunked_user'
+        self.chunk_gets = 0
+        self.s3.meta.events.register('provide-client-params.s3.GetObject', self._count_chunk_get)
+
+    def _count_chunk_get(self, params, **kwargs):
+        if params.get('Key', '').startswith('user_chunks/'):
+            self.chunk_gets += 1
+
+    def _write(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _upload(self, etag):
+        return s3_chunked.upload(self.s3, self.BUCKET, self.username, self.path, etag, chunk_size=self.CHUNK)
+
+    def _chunk_keys(self):
+        response = self.s3.list_objects_v2(Bucket=self.BUCKET, Prefix=f'user_chunks/{self.username}/')
+        return {obj['Key'] for obj in response.get('Contents', [])}
+
+    def test_round_trip_is_byte_identical(self):
+        data = os.urandom(10 * self.CHUNK + 123)  # a partial last chunk
+        self._write(data)
+        etag, stats = self._upload(None)
+        self.assertEqual((stats['chunks'], stats['uploaded_chunks']), (11, 11))
+
+        manifest, downloaded_etag = s3_chunked.download(self.s3, self.BUCKET, self.username, self.restored)
+        self.assertEqual(downloaded_etag, etag)
+        self.assertEqual(manifest['size'], len(data))
+        self.assertEqual(self._read(self.restored), data)
+        self.assertEqual(s3_chunked.download(self.s3, self.BUCKET, 'nobody', self.restored), (None, None))
+
+    def test_download_reuses_chunks_of_older_copy(self):
+        data = bytearray(os.urandom(8 * self.CHUNK))
+        self._write(data)
+        etag, _ = self._upload(None)
+        s3_chunked.download(self.s3, self.BUCKET, self.username, self.restored)
+
+        data[3 * self.CHUNK + 10] ^= 0xFF  # one changed page
+        self._write(data)
+        _, stats = self._upload(etag)
+        self.assertEqual(stats['uploaded_chunks'], 1)
+
+        self.chunk_gets = 0
+        s3_chunked.download(self.s3, self.BUCKET, self.username, self.restored, reuse_path=self.restored)
+        self.assertEqual(self.chunk_gets, 1)
+        self.assertEqual(self._read(self.restored), bytes(data))
+
+    def test_upload_deletes_stale_chunks(self):
+        data = bytearray(os.urandom(4 * self.CHUNK))
+        self._write(data)
+        etag, _ = self._upload(None)
+        before = self._chunk_keys()
+
+        data[0] ^= 0xFF
+        self._write(data)
+        _, stats = self._upload(etag)
+        self.assertEqual(stats['deleted_chunks'], 1)
+        after = self._chunk_keys()
+        self.assertEqual(len(after), 4)
+        self.assertEqual(len(before - after), 1)
+
+        with self.assertRaises(ConflictError):
+            self._upload(etag)  # based on the replaced manifest
+
+    def test_missing_chunk_rereads_manifest(self):
+        data = bytearray(os.urandom(4 * self.CHUNK))
+        self._write(data)
+        etag, _ = self._upload(None)
+        old_manifest, _ = s3_chunked.read_manifest(self.s3, self.BUCKET, self.username)
+
+        # Another writer replaces the manifest and deletes the chunk the old one named
+        data[0] ^= 0xFF
+        self._write(data)
+        new_etag, _ = self._upload(etag)
+        manifest, downloaded_etag = s3_chunked.download(self.s3, self.BUCKET, self.username, self.restored,
+                                                        manifest=old_manifest, etag=etag)
+        self.assertEqual(downloaded_etag, new_etag)
+        self.assertNotEqual(manifest['chunks'], old_manifest['chunks'])
+        self.assertEqual(self._read(self.restored), bytes(data))
+
+        # Only one retry: a chunk missing from the current manifest too is an error
+        self.s3.delete_object(Bucket=self.BUCKET, Key=s3_chunked.chunk_key(self.username, manifest['chunks'][1]))
+        with self.assertRaises(s3_chunked.ChunkMissingError):
+            s3_chunked.download(self.s3, self.BUCKET, self.username, self.restored)
+
+
+def run_benchmark(bucket):
+    """Upload bytes per review, chunked vs whole file"""
+    print(f"\n🧪 Chunked S3 storage: upload bytes per review ({REVIEWS} reviews each)")
+    print("=" * 60)
+    s3 = boto3.client('s3')
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in COLLECTION_SIZES_MB:
+            path = os.path.join(tmp, f'{size_mb}mb.anki2')
+            build_collection(path, size_mb)
+            for chunk_size in CHUNK_SIZES:
+                measure(s3, bucket, path, size_mb, chunk_size)
+    print("\n✅ Reassembled downloads matched every upload")
+
+
+if __name__ == '__main__':
+    if '--moto' in sys.argv:
+        with mock_aws():
+            boto3.client('s3').create_bucket(Bucket='chunked-bench')
+            run_benchmark('chunked-bench')
+    else:
+        bucket = os.environ.get('S3_BUCKET')
+        if not bucket:
+            print("ERROR: S3_BUCKET environment variable not set (or use --moto)")
+            sys.exit(1)
+        run_benchmark(bucket)
@@ -0,0 +1,184 @@
+"""
+Test: Compressed S3 storage - Size, Transfer Time and Memory Peak
+
+Uploads and downloads ~5 MB and ~50 MB collections as uncompressed, gzip and
+zstd user_dbs/ objects (S3_COMPRESSION), and measures:
+- stored object size (S3 storage and bytes on the wire)
+- upload / download time
+- Python memory peak of the download, streaming (s3_codec.download_to_file)
+  vs the old response['Body'].read() into memory
+
+Expected outcome:
+- zstd/gzip objects are a fraction of the file size
+- Streaming downloads peak at about STREAM_BLOCK, not the object size
+- Every codec round-trips to a byte-identical file, and objects of every
+  encoding can be read whatever S3_COMPRESSION is set to
+
+The unit tests (CodecTestCase) run against moto's in-process S3:
+- open_encoded -> put_object -> download_to_file and encode_bytes/decode_bytes
+  round-trip for no encoding, gzip and zstd
+- S3_COMPRESSION=zstd without the zstandard package writes gzip
+
+Run with:
+    python -m pytest test_s3_codec_compression.py  # unit tests
+    python test_s3_codec_compression.py            # benchmark against $S3_BUCKET
+    python test_s3_codec_compression.py --moto     # benchmark on in-process S3 (moto), no AWS account needed
+"""
+
+import sys
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+import s3_codec
+from test_s3_chunked_delta import COLLECTION_SIZES_MB, build_collection
+
+ENCODINGS = [None, 'gzip', 'zstd'] if s3_codec.zstandard is not None else [None, 'gzip']
+
+
+def peak_during(fn):
+    """Python memory peak (bytes) while fn runs."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(s3, bucket, path, size_mb, encoding):
+    key = f'user_dbs/test_codec_{size_mb}mb_{encoding or "none"}.anki2'
+    restored = f'{path}.restored'
+
+    start = time.time()
+    with s3_codec.open_encoded(path, encoding) as f:
+        s3.put_object(Bucket=bucket, Key=key, Body=f, **s3_codec.put_kwargs(encoding))
+    upload_s = time.time() - start
+    stored = s3.head_object(Bucket=bucket, Key=key)['ContentLength']
+
+    # Peaks cover reading the body only: get_object itself is outside the measurement
+    start = time.time()
+    response = s3.get_object(Bucket=bucket, Key=key)
+    streaming_peak = peak_during(lambda: s3_codec.download_to_file(response, restored))
+    download_s = time.time() - start
+    with open(path, 'rb') as a, open(restored, 'rb') as b:
+        assert a.read() == b.read(), f"{encoding or 'uncompressed'} round trip differs"
+
+    response = s3.get_object(Bucket=bucket, Key=key)
+
+    def read_whole():
+        with open(restored, 'wb') as f:
+            f.write(s3_codec.decode_bytes(response['Body'].read(), encoding))
+    buffered_peak = peak_during(read_whole)
+
+    file_bytes = os.path.getsize(path)
+    print(f"  {size_mb:>3} MB  {encoding or 'none':<5} stored {stored / 1024 / 1024:6.2f} MB ({100 * stored / file_bytes:5.1f}%)"
+          f"  up {upload_s:5.2f}s  down {download_s:5.2f}s"
+          f"  download peak: streaming {streaming_peak / 1024 / 1024:5.1f} MB, read() {buffered_peak / 1024 / 1024:5.1f} MB")
+
+    s3.delete_object(Bucket=bucket, Key=key)
+    os.remove(restored)
+
+
+class CodecTestCase(unittest.TestCase):
+
+    BUCKET = 'codec-test'
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.s3 = boto3.client('s3')
+        self.s3.create_bucket(Bucket=self.BUCKET)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+
+        original = (s3_codec.STREAM_BLOCK, s3_codec.S3_COMPRESSION, s3_codec.zstandard)
+        self.addCleanup(self._restore, original)
+        s3_codec.STREAM_BLOCK = 4096  # several blocks per object
+        # Compressible, like SQLite pages, with some noise
+        self.data = b''.join(b'page %06d ' % i * 40 + os.urandom(16) for i in range(300))
+
+    def _restore(self, original):
+        s3_codec.STREAM_BLOCK, s3_codec.S3_COMPRESSION, s3_codec.zstandard = original
+
+    def _round_trip(self, encoding):
+        path = os.path.join(self.tmp, 'db.anki2')
+        with open(path, 'wb') as f:
+            f.write(self.data)
+        with s3_codec.open_encoded(path, encoding) as f:
+            self.s3.put_object(Bucket=self.BUCKET, Key='db', Body=f, **s3_codec.put_kwargs(encoding))
+        self.assertEqual(os.listdir(self.tmp), ['db.anki2'])  # the encoded copy is gone
+
+        response = self.s3.get_object(Bucket=self.BUCKET, Key='db')
+        self.assertEqual(response.get('ContentEncoding'), encoding)
+        if encoding:
+            self.assertLess(response['ContentLength'], len(self.data) // 2)
+        restored = os.path.join(self.tmp, 'restored.anki2')
+        s3_codec.download_to_file(response, restored)
+        with open(restored, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+        os.remove(restored)
+
+        encoded = s3_codec.encode_bytes(self.data, encoding)
+        self.assertEqual(encoded == self.data, encoding is None)
+        self.assertEqual(s3_codec.decode_bytes(encoded, encoding), self.data)
+
+    def test_uncompressed_round_trip(self):
+        self._round_trip(None)
+
+    def test_gzip_round_trip(self):
+        self._round_trip('gzip')
+
+    @unittest.skipIf(s3_codec.zstandard is None, "zstandard not installed")
+    def test_zstd_round_trip(self):
+        self._round_trip('zstd')
+
+    def test_active_encoding_falls_back_to_gzip(self):
+        for setting, expected in (('none', None), ('gzip', 'gzip')):
+            s3_codec.S3_COMPRESSION = setting
+            self.assertEqual(s3_codec.active_encoding(), expected)
+        s3_codec.S3_COMPRESSION = 'zstd'
+        s3_codec.zstandard = None
+        self.assertEqual(s3_codec.active_encoding(), 'gzip')
+        with self.assertRaises(RuntimeError):
+            s3_codec.decode_bytes(b'', 'zstd')  # reading zstd needs the package
+
+
+def run_benchmark(bucket):
+    """Stored size, timings and memory peaks per codec"""
+    print(f"\n🧪 Compressed S3 storage (S3_COMPRESSION), block {s3_codec.STREAM_BLOCK // 1024} KB")
+    print("=" * 60)
+    s3 = boto3.client('s3')
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in COLLECTION_SIZES_MB:
+            path = os.path.join(tmp, f'{size_mb}mb.anki2')
+            build_collection(path, size_mb)
+            for encoding in ENCODINGS:
+                measure(s3, bucket, path, size_mb, encoding)
+    print("\n✅ Every codec round-tripped to an identical file")
+
+
+if __name__ == '__main__':
+    if '--moto' in sys.argv:
+        with mock_aws():
+            boto3.client('s3').create_bucket(Bucket='codec-bench')
+            run_benchmark('codec-bench')
+    else:
+        bucket = os.environ.get('S3_BUCKET')
+        if not bucket:
+            print("ERROR: S3_BUCKET environment variable not set (or use --moto)")
+            sys.exit(1)
+        run_benchmark(bucket)
@@ -0,0 +1,184 @@
+"""
+Test: Conditional Writes for S3 Optimistic Locking
+
+Runs against moto's in-process S3, no AWS account needed:
+- Conditional mode (default): uploads carry IfMatch / IfNoneMatch='*', send no
+  HEAD first, and a write that lost a race is rejected by S3 -> ConflictError
+- Fallback mode (S3_CONDITIONAL_WRITES=false) against a stand-in backend that
+  rejects conditional headers: uploads HEAD and compare, as before
+
+Run with:
+    python -m unittest test_s3_conditional_writes.py -v
+"""
+
+import sys
+import os
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+import s3_chunked
+import s3_sqlite
+import s3_transfer
+from s3_sqlite import ConflictError, S3SQLiteConnection
+
+EMPTY_MANIFEST = b'{"format": 1, "chunk_size": 16384, "size": 0, "chunks": []}'
+
+
+class S3WritesTestCase(unittest.TestCase):
+    """moto S3 with the s3_sqlite client swapped in and every S3 call recorded."""
+
+    conditional = True
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.s3 = boto3.client('s3')
+        self.s3.create_bucket(Bucket=s3_sqlite.BUCKET)
+        self.original = (s3_sqlite._s3_client, s3_transfer.CONDITIONAL_WRITES)
+        s3_sqlite._s3_client = self.s3
+        s3_transfer.CONDITIONAL_WRITES = self.conditional
+        self.calls = []
+        self.s3.meta.events.register('provide-client-params.s3.*', self._record)
+        self.username = f'cond_{type(self).__name__}_{self._testMethodName}'
+        s3_sqlite.clear_cache()
+
+    def tearDown(self):
+        s3_sqlite._s3_client, s3_transfer.CONDITIONAL_WRITES = self.original
+        s3_sqlite.clear_cache()
+        if os.path.exists(f'/tmp/{self.username}.anki2'):
+            os.remove(f'/tmp/{self.username}.anki2')
+        self.mock.stop()
+
+    def _record(self, params, model, **kwargs):
+        self.calls.append((model.name, dict(params)))
+
+    def _calls(self, name):
+        return [params for call, params in self.calls if call == name]
+
+    def _replace_object(self, key, body=b'written elsewhere'):
+        """Another writer replaces the object (a client without the recording hook)."""
+        boto3.client('s3').put_object(Bucket=s3_sqlite.BUCKET, Key=key, Body=body)
+
+    def _read_object(self, key):
+        return self.s3.get_object(Bucket=s3_sqlite.BUCKET, Key=key)['Body'].read()
+
+    def _local_db(self):
+        """A fresh user database outside /tmp/<username>.anki2, with nothing in S3."""
+        with S3SQLiteConnection(self.username):
+            pass
+        path = f'/tmp/{self.username}.local'
+        os.replace(f'/tmp/{self.username}.anki2', path)
+        self.addCleanup(os.remove, path)
+        for key in (f'user_dbs/{self.username}.anki2', s3_chunked.manifest_key(self.username)):
+            self.s3.delete_object(Bucket=s3_sqlite.BUCKET, Key=key)
+        return path
+
+
+class ConditionalWritesTestCase(S3WritesTestCase):
+
+    def test_upload_is_one_conditional_put(self):
+        with S3SQLiteConnection(self.username) as conn:
+            conn.execute("INSERT INTO revlog VALUES (1, 1, 0, 3, 1, 0, 2500, 1000, 0)")
+        self.assertEqual(self._calls('PutObject')[-1]['IfNoneMatch'], '*')
+
+        self.calls.clear()
+        etag = s3_sqlite.db_cache[self.username]['etag']
+        with S3SQLiteConnection(self.username) as conn:
+            conn.execute("INSERT INTO revlog VALUES (2, 1, 0, 3, 1, 0, 2500, 1000, 0)")
+        self.assertEqual(self._calls('PutObject')[-1]['IfMatch'], etag)
+        self.assertEqual(self._calls('HeadObject'), [])  # cache hit + conditional PUT: one request
+
+    def test_lost_race_raises_conflict(self):
+        with S3SQLiteConnection(self.username):
+            pass
+        conn = S3SQLiteConnection(self.username)
+        conn.__enter__().execute("INSERT INTO revlog VALUES (1, 1, 0, 3, 1, 0, 2500, 1000, 0)")
+        self._replace_object(conn.s3_key)  # after any check a HEAD could have made
+        with self.assertRaises(ConflictError):
+            conn.__exit__(None, None, None)
+        self.assertNotIn(self.username, s3_sqlite.db_cache)
+        self.assertEqual(self._read_object(conn.s3_key), b'written elsewhere')
+
+    def test_first_creation_does_not_overwrite(self):
+        path = self._local_db()
+        self._replace_object(f'user_dbs/{self.username}.anki2')
+        with self.assertRaises(ConflictError):
+            s3_sqlite.upload_new_database(self.username, path)
+        self.assertEqual(self._read_object(f'user_dbs/{self.username}.anki2'), b'written elsewhere')
+
+    def test_chunked_manifest_write_is_conditional(self):
+        path = self._local_db()
+        etag, _ = s3_chunked.upload(self.s3, s3_sqlite.BUCKET, self.username, path, None)
+        with open(path, 'ab') as f:
+            f.write(b'\0' * 4096)
+
+        # Another writer commits a manifest while this one is uploading chunks
+        def race(params, **kwargs):
+            if params.get('Key') == s3_chunked.manifest_key(self.username):
+                self._replace_object(params['Key'], EMPTY_MANIFEST)
+        self.s3.meta.events.register_first('provide-client-params.s3.PutObject', race)
+        self.calls.clear()
+        with self.assertRaises(ConflictError):
+            s3_chunked.upload(self.s3, s3_sqlite.BUCKET, self.username, path, etag)
+        self.assertEqual(self._calls('HeadObject'), [])
+        self.assertEqual(self._read_object(s3_chunked.manifest_key(self.username)), EMPTY_MANIFEST)
+
+
+class FallbackWritesTestCase(S3WritesTestCase):
+    """Backend without conditional writes: it rejects IfMatch/IfNoneMatch outright."""
+
+    conditional = False
+
+    def setUp(self):
+        super().setUp()
+        self.s3.meta.events.register('provide-client-params.s3.PutObject', self._reject_conditions)
+
+    @staticmethod
+    def _reject_conditions(params, **kwargs):
+        if 'IfMatch' in params or 'IfNoneMatch' in params:
+            raise ClientError({'Error': {'Code': 'NotImplemented', 'Message': 'Conditional writes'}}, 'PutObject')
+
+    def test_upload_heads_then_puts(self):
+        with S3SQLiteConnection(self.username):
+            pass
+        self.calls.clear()
+        with S3SQLiteConnection(self.username) as conn:
+            conn.execute("INSERT INTO revlog VALUES (1, 1, 0, 3, 1, 0, 2500, 1000, 0)")
+        self.assertEqual(len(self._calls('HeadObject')), 1)  # check-then-write
+        self.assertNotIn('IfMatch', self._calls('PutObject')[-1])
+
+    def test_changed_object_raises_conflict(self):
+        with S3SQLiteConnection(self.username):
+            pass
+        conn = S3SQLiteConnection(self.username)
+        conn.__enter__()
+        self._replace_object(conn.s3_key)
+        with self.assertRaises(ConflictError):
+            conn.__exit__(None, None, None)
+
+    def test_first_creation_is_unchecked(self):
+        # Without conditions, registration can't detect a concurrent creation
+        path = self._local_db()
+        self._replace_object(f'user_dbs/{self.username}.anki2')
+        s3_sqlite.upload_new_database(self.username, path)
+        self.assertNotEqual(self._read_object(f'user_dbs/{self.username}.anki2'), b'written elsewhere')
+
+    def test_chunked_manifest_change_raises_conflict(self):
+        path = self._local_db()
+        etag, _ = s3_chunked.upload(self.s3, s3_sqlite.BUCKET, self.username, path, None)
+        self._replace_object(s3_chunked.manifest_key(self.username), EMPTY_MANIFEST)
+        with self.assertRaises(ConflictError):
+            s3_chunked.upload(self.s3, s3_sqlite.BUCKET, self.username, path, etag)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+"""
+Test: Append-Only Change Journal (S3_JOURNAL)
+
+Runs SessionAwareS3SQLite against moto's in-process S3 and DynamoDB, no AWS
+account needed:
+- A review appends one small row-change segment instead of uploading the file
+- Loading a database is the base object + replay of the segments after it
+- Compaction (write-behind) folds the segments into the base and deletes them
+- Appending a segment another writer already wrote raises ConflictError, and
+  so does appending a segment number a compaction already folded into the base
+- The collection version of a user with uncompacted segments is unknown
+
+Run with:
+    python -m unittest test_s3_journal.py -v
+"""
+
+import sys
+import os
+import sqlite3
+import tempfile
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+import anki_schema
+import s3_journal
+import s3_sqlite
+import session_manager
+import write_behind
+from s3_sqlite import ConflictError, S3SQLiteConnection, SessionAwareS3SQLite
+from write_behind import WriteBehindScheduler
+
+REVIEW = "INSERT INTO revlog VALUES (?, 1, -1, 3, 1, 0, 2500, 1000, 0)"
+
+
+class JournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.s3 = boto3.client('s3')
+        self.s3.create_bucket(Bucket=s3_sqlite.BUCKET)
+        boto3.client('dynamodb').create_table(
+            TableName=os.environ.get('DYNAMODB_SESSIONS_TABLE', 'javumbo-sessions'),
+            BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': 'username', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'username', 'AttributeType': 'S'},
+                                  {'AttributeName': 'session_id', 'AttributeType': 'S'}],
+            GlobalSecondaryIndexes=[{'IndexName': 'session-index',
+                                     'KeySchema': [{'AttributeName': 'session_id', 'KeyType': 'HASH'}],
+                                     'Projection': {'ProjectionType': 'KEYS_ONLY'}}])
+
+        self.original = (s3_sqlite._s3_client, session_manager._dynamodb_client, s3_sqlite.S3_STORAGE_FORMAT,
+                         s3_journal.JOURNAL_ENABLED, s3_journal.JOURNAL_COMPACT_SEGMENTS, write_behind.scheduler)
+        s3_sqlite._s3_client = self.s3
+        session_manager._dynamodb_client = None
+        s3_sqlite.S3_STORAGE_FORMAT = 'file'
+        s3_journal.JOURNAL_ENABLED = True
+        s3_journal.JOURNAL_COMPACT_SEGMENTS = 1000
+        write_behind.scheduler = WriteBehindScheduler(idle_seconds=3600, max_writes=1000)
+        s3_sqlite.clear_cache()
+
+        self.username = f'journal_{self._testMethodName}'
+        self.path = f'/tmp/{self.username}.anki2'
+        self.base_key = f'user_dbs/{self.username}.anki2'
+        self.base_puts = 0
+        self.s3.meta.events.register('provide-client-params.s3.PutObject', self._count_base_put)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'new.anki2')
+            conn = sqlite3.connect(path)
+            anki_schema.init_anki_db(conn, self.username)
+            conn.commit()
+            conn.close()
+            s3_sqlite.upload_new_database(self.username, path)
+        self.base_puts = 0
+
+    def tearDown(self):
+        (s3_sqlite._s3_client, session_manager._dynamodb_client, s3_sqlite.S3_STORAGE_FORMAT,
+         s3_journal.JOURNAL_ENABLED, s3_journal.JOURNAL_COMPACT_SEGMENTS, write_behind.scheduler) = self.original
+        s3_sqlite.clear_cache()
+        self._new_container()
+
+    def _count_base_put(self, params, **kwargs):
+        if params.get('Key') == self.base_key:
+            self.base_puts += 1
+
+    def _new_container(self):
+        """Forgets everything this container knows about the user, as on another Lambda."""
+        s3_sqlite.clear_cache()
+        session_manager.clear_lease_cache()
+        s3_journal._last_seq.pop(self.username, None)
+        s3_journal._base_seq.pop(self.username, None)
+        write_behind.scheduler = WriteBehindScheduler(idle_seconds=3600, max_writes=1000)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _review(self, review_id):
+        wrapper = SessionAwareS3SQLite(self.username)
+        conn = wrapper.__enter__()
+        conn.execute(REVIEW, (review_id,))
+        conn.execute("UPDATE col SET mod = ?", (review_id,))
+        wrapper.__exit__(None, None, None)
+        return wrapper
+
+    def _segments(self):
+        response = self.s3.list_objects_v2(Bucket=s3_sqlite.BUCKET, Prefix=s3_journal.journal_prefix(self.username))
+        return [obj for obj in response.get('Contents', [])]
+
+    def _reviews_in_s3(self):
+        """Review ids of the user's database as a fresh container loads it."""
+        self._new_container()
+        with S3SQLiteConnection(self.username) as conn:
+            return [row[0] for row in conn.execute("SELECT id FROM revlog ORDER BY id")]
+
+    def test_review_appends_segment_not_database(self):
+        self._review(1)
+        self._review(2)
+        segments = self._segments()
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(self.base_puts, 0)
+        self.assertLess(max(obj['Size'] for obj in segments), 1024)  # not the models/decks JSON
+        self.assertFalse(write_behind.scheduler.is_dirty(self.username))
+
+    def test_load_replays_and_whole_upload_compacts(self):
+        self._review(1)
+        self._review(2)
+        self.assertEqual(self._reviews_in_s3(), [1, 2])
+
+        # S3SQLiteConnection's upload on exit was a compaction
+        head = self.s3.head_object(Bucket=s3_sqlite.BUCKET, Key=self.base_key)
+        self.assertEqual(s3_journal.base_seq(head), 2)
+        self.assertEqual(self._segments(), [])
+        self.assertEqual(self._reviews_in_s3(), [1, 2])
+
+    def test_write_behind_compacts_after_enough_segments(self):
+        s3_journal.JOURNAL_COMPACT_SEGMENTS = 2
+        self._review(1)
+        self.assertFalse(write_behind.scheduler.is_dirty(self.username))
+        self._review(2)
+        self.assertTrue(write_behind.scheduler.is_dirty(self.username))
+
+        self.assertIsNotNone(write_behind.scheduler.flush(self.username, 'test'))
+        self.assertEqual(self._segments(), [])
+        self._review(3)  # appended on top of the compacted base
+        self.assertEqual([obj['Key'] for obj in self._segments()],
+                         [s3_journal.segment_key(self.username, 3)])
+        self.assertEqual(self._reviews_in_s3(), [1, 2, 3])
+
+    def test_append_race_raises_conflict(self):
+        self._review(1)
+        # Another writer appends segment 2 first
+        self.s3.put_object(Bucket=s3_sqlite.BUCKET, Key=s3_journal.segment_key(self.username, 2),
+                           Body=b'{"format": 1, "seq": 2, "tables": {}}')
+        with self.assertRaises(ConflictError):
+            self._review(2)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self._reviews_in_s3(), [1])
+
+    def test_stale_append_after_compaction_conflicts(self):
+        self._review(1)
+        self._review(2)
+        self._review(3)
+        self.assertEqual(self._reviews_in_s3(), [1, 2, 3])  # another container compacted up to 3
+        self.assertEqual(self._segments(), [])
+
+        # A container that only knows the journal up to segment 1 appends "segment 2"
+        s3_journal._set_seq(self.username, 1)
+        review = {'revlog': {'columns': ['id'], 'rows': [[4, [4]]]}}
+        with self.assertRaises(ConflictError):
+            s3_journal.append(self.s3, s3_sqlite.BUCKET, self.username, review)
+        self.assertEqual(self._segments(), [])
+        self.assertEqual(s3_journal.last_seq(self.username), 1)
+
+    def test_collection_version_unknown_while_journal_has_segments(self):
+        self._review(1)
+        session_manager.SessionManager().invalidate_user_session(self.username)
+        self.assertIsNone(s3_sqlite.get_collection_version(self.username))
+
+        self._reviews_in_s3()  # compacts
+        self.assertIsNotNone(s3_sqlite.get_collection_version(self.username))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+"""
+Test: Parallel Ranged-GET Download and Multipart Upload
+
+Compares single-stream get_object/put_object with s3_transfer's parallel
+ranged GETs and multipart upload for a ~50 MB collection, across part sizes
+and concurrency levels, against a stand-in S3 over HTTP.
+
+Expected outcome:
+- Parallel transfers are byte-identical to the file
+- Against real S3 (per-stream bandwidth bound), download/upload time drops
+  roughly with concurrency until the Lambda's network share is saturated
+
+The unit tests (ParallelTransferTestCase) run against moto's in-process S3 with
+5 MB parts:
+- Multipart upload + ranged-GET download round-trip byte-identical, with and
+  without a Content-Encoding
+- A failed part aborts the multipart upload
+- A download whose object was replaced after the HEAD (412) starts over
+
+Run with:
+    python -m pytest test_s3_transfer_parallel.py                   # unit tests
+    python test_s3_transfer_parallel.py --moto                      # benchmark, moto server on localhost
+    python test_s3_transfer_parallel.py --endpoint-url http://localhost:9000   # MinIO ($S3_BUCKET)
+    python test_s3_transfer_parallel.py                             # real S3 ($S3_BUCKET)
+"""
+
+import sys
+import os
+import tempfile
+import time
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+import s3_codec
+import s3_transfer
+from test_s3_chunked_delta import build_collection
+
+SIZE_MB = 50
+PART_SIZES_MB = [5, 8, 16]
+CONCURRENCY = [1, 4, 8, 16]
+KEY = 'user_dbs/test_transfer_parallel.anki2'
+
+
+def timed(fn):
+    start = time.time()
+    fn()
+    return time.time() - start
+
+
+class ParallelTransferTestCase(unittest.TestCase):
+
+    BUCKET = 'transfer-test'
+    PART = 5 * 1024 * 1024  # the S3 minimum
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.s3 = boto3.client('s3')
+        self.s3.create_bucket(Bucket=self.BUCKET)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'collection.anki2')
+        self.restored = os.path.join(tmp.name, 'restored.anki2')
+
+        original = (s3_transfer.PARALLEL_THRESHOLD, s3_transfer.PART_SIZE)
+        self.addCleanup(self._restore, original)
+        s3_transfer.PARALLEL_THRESHOLD = s3_transfer.PART_SIZE = self.PART
+        self.data = os.urandom(2 * self.PART + 12345)  # incompressible: encoded copies stay multipart-sized
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+        self.calls = []
+        self.s3.meta.events.register('before-call.s3', self._count_call)
+
+    def _restore(self, original):
+        s3_transfer.PARALLEL_THRESHOLD, s3_transfer.PART_SIZE = original
+
+    def _count_call(self, model, **kwargs):
+        self.calls.append(model.name)
+
+    def _upload(self, encoding=None, **conditions):
+        with s3_codec.open_encoded(self.path, encoding) as f:
+            return s3_transfer.upload(self.s3, self.BUCKET, KEY, f, conditions, **s3_codec.put_kwargs(encoding))
+
+    def _restored(self):
+        with open(self.restored, 'rb') as f:
+            return f.read()
+
+    def _round_trip(self, encoding):
+        etag = self._upload(encoding)
+        self.assertEqual(self.calls.count('UploadPart'), 3)
+        self.assertEqual(self.s3.head_object(Bucket=self.BUCKET, Key=KEY).get('ContentEncoding'), encoding)
+
+        self.calls.clear()
+        self.assertEqual(s3_transfer.download(self.s3, self.BUCKET, KEY, self.restored), etag)
+        self.assertEqual(self.calls.count('GetObject'), 3)  # one ranged GET per part
+        self.assertEqual(self._restored(), self.data)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['collection.anki2', 'restored.anki2'])
+
+    def test_multipart_round_trip(self):
+        self._round_trip(None)
+
+    def test_multipart_round_trip_with_content_encoding(self):
+        self._round_trip('gzip')
+
+    def test_failed_part_aborts_upload(self):
+        def fail_second_part(params, **kwargs):
+            if params.get('PartNumber') == 2:
+                raise ClientError({'Error': {'Code': 'InternalError', 'Message': 'injected'}}, 'UploadPart')
+        self.s3.meta.events.register('provide-client-params.s3.UploadPart', fail_second_part)
+
+        with self.assertRaises(ClientError):
+            self._upload()
+        self.assertIn('AbortMultipartUpload', self.calls)
+        self.assertEqual(self.s3.list_multipart_uploads(Bucket=self.BUCKET).get('Uploads', []), [])
+        with self.assertRaises(ClientError):
+            self.s3.head_object(Bucket=self.BUCKET, Key=KEY)
+
+    def test_download_restarts_after_object_replaced(self):
+        for size in (1024, len(self.data)):  # single GET and ranged GETs
+            with self.subTest(size=size):
+                with open(self.path, 'wb') as f:
+                    f.write(self.data[:size])
+                self._upload()
+                stale_head = self.s3.head_object(Bucket=self.BUCKET, Key=KEY)
+
+                # Replaced between the caller's HEAD and its GETs
+                replacement = os.urandom(size)
+                with open(self.path, 'wb') as f:
+                    f.write(replacement)
+                etag = self._upload()
+
+                self.assertEqual(s3_transfer.download(self.s3, self.BUCKET, KEY, self.restored, head=stale_head),
+                                 etag)
+                self.assertEqual(self._restored(), replacement)
+
+
+def run_benchmark(s3, bucket):
+    """Single stream vs parallel ranged GET / multipart upload"""
+    print(f"\n🧪 Parallel transfer of a {SIZE_MB} MB collection")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'collection.anki2')
+        restored = os.path.join(tmp, 'restored.anki2')
+        build_collection(path, SIZE_MB)
+        with open(path, 'rb') as f:
+            original = f.read()
+
+        def single_put():
+            with open(path, 'rb') as f:
+                s3.put_object(Bucket=bucket, Key=KEY, Body=f)
+
+        def single_get():
+            with open(restored, 'wb') as f:
+                f.write(s3.get_object(Bucket=bucket, Key=KEY)['Body'].read())
+
+        up, down = timed(single_put), timed(single_get)
+        print(f"  single stream                 up {up:6.2f}s  down {down:6.2f}s")
+
+        s3_transfer.PARALLEL_THRESHOLD = 0
+        for part_mb in PART_SIZES_MB:
+            s3_transfer.PART_SIZE = part_mb * 1024 * 1024
+            for concurrency in CONCURRENCY:
+                s3_transfer.TRANSFER_CONCURRENCY = concurrency
+
+                def parallel_put():
+                    with open(path, 'rb') as f:
+                        s3_transfer.upload(s3, bucket, KEY, f)
+
+                up = timed(parallel_put)
+                down = timed(lambda: s3_transfer.download(s3, bucket, KEY, restored))
+                with open(restored, 'rb') as f:
+                    assert f.read() == original, "Parallel round trip differs"
+                print(f"  part {part_mb:>2} MB x {concurrency:>2} connections  up {up:6.2f}s  down {down:6.2f}s")
+
+        s3.delete_object(Bucket=bucket, Key=KEY)
+    print("\n✅ Every parallel round trip matched the file")
+
+
+if __name__ == '__main__':
+    endpoint_url = None
+    bucket = os.environ.get('S3_BUCKET')
+    if '--moto' in sys.argv:
+        import logging
+        from moto.server import ThreadedMotoServer
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = ThreadedMotoServer(port=0)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint_url, bucket = f'http://{host}:{port}', 'transfer-bench'
+    elif '--endpoint-url' in sys.argv:
+        endpoint_url = sys.argv[sys.argv.index('--endpoint-url') + 1]
+    if not bucket:
+        print("ERROR: S3_BUCKET environment variable not set (or use --moto)")
+        sys.exit(1)
+
+    s3 = boto3.client('s3', endpoint_url=endpoint_url)
+    if '--moto' in sys.argv:
+        s3.create_bucket(Bucket=bucket)
+    run_benchmark(s3, bucket)
@@ -0,0 +1,247 @@
+"""
+Test: Session Leases (atomic acquisition, per-container lease cache)
+
+Runs SessionManager against moto's in-process DynamoDB, no AWS account needed:
+- Only one container can acquire a user's session; an expired one can be re-acquired
+- A takeover succeeds only against the session it saw (conditional write)
+- A session this container holds is served from the lease cache: a warm
+  SessionAwareS3SQLite request reads nothing from DynamoDB
+- A container whose session was taken over finds out on its next update, and
+  releasing the old session leaves the new owner's alone
+- Heartbeats are only written when the lease runs low or the ETag changed, also
+  during a burst of writes; a journal append or a write-behind flush always
+  writes one, so a taken-over container's changes are refused
+
+Run with:
+    python -m unittest test_session_leases.py -v
+"""
+
+import sys
+import os
+import time
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+import s3_journal
+import s3_sqlite
+import session_manager
+import write_behind
+from s3_sqlite import ConflictError, SessionAwareS3SQLite
+from session_manager import SessionManager
+from write_behind import WriteBehindScheduler
+
+
+class SessionLeaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.dynamodb = boto3.client('dynamodb')
+        self.table = os.environ.get('DYNAMODB_SESSIONS_TABLE', 'javumbo-sessions')
+        self.dynamodb.create_table(
+            TableName=self.table,
+            BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': 'username', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'username', 'AttributeType': 'S'},
+                                  {'AttributeName': 'session_id', 'AttributeType': 'S'}],
+            GlobalSecondaryIndexes=[{'IndexName': 'session-index',
+                                     'KeySchema': [{'AttributeName': 'session_id', 'KeyType': 'HASH'}],
+                                     'Projection': {'ProjectionType': 'KEYS_ONLY'}}])
+        self.original_client = session_manager._dynamodb_client
+        session_manager._dynamodb_client = self.dynamodb
+        session_manager.clear_lease_cache()
+        self.calls = []
+        self.dynamodb.meta.events.register('before-call.dynamodb', self._count_call)
+
+        self.username = f'lease_{self._testMethodName}'
+        self.manager = SessionManager()
+
+    def tearDown(self):
+        session_manager._dynamodb_client = self.original_client
+        session_manager.clear_lease_cache()
+
+    def _count_call(self, model, **kwargs):
+        self.calls.append(model.name)
+
+    def _expire(self, username):
+        self.dynamodb.update_item(TableName=self.table, Key={'username': {'S': username}},
+                                  UpdateExpression='SET expires_at = :past',
+                                  ExpressionAttributeValues={':past': {'N': str(int(time.time()) - 1)}})
+
+    def test_acquire_is_exclusive(self):
+        first = self.manager.create_session(self.username, 'etag1', lambda_instance_id='lambda-a')
+        self.assertIsNotNone(first)
+        self.assertIsNone(self.manager.create_session(self.username, 'etag1', lambda_instance_id='lambda-b'))
+        self.assertEqual(self.manager.get_user_session(self.username)['session_id'], first['session_id'])
+
+        self._expire(self.username)
+        self.assertIsNone(self.manager.get_user_session(self.username))
+        second = self.manager.create_session(self.username, 'etag2', lambda_instance_id='lambda-b')
+        self.assertIsNotNone(second)
+        self.assertEqual(self.manager.get_session(second['session_id'])['lambda_instance_id'], 'lambda-b')
+        self.assertIsNone(self.manager.get_session(first['session_id']))
+
+    def test_takeover_only_of_the_session_seen(self):
+        first = self.manager.create_session(self.username, 'etag1', lambda_instance_id='lambda-a')
+        second = self.manager.create_session(self.username, 'etag1', lambda_instance_id='lambda-b',
+                                             replace_session_id=first['session_id'])
+        self.assertIsNotNone(second)
+
+        # lambda-c saw the first session too, but lambda-b took over first
+        self.assertIsNone(self.manager.create_session(self.username, 'etag1', lambda_instance_id='lambda-c',
+                                                      replace_session_id=first['session_id']))
+        self.assertEqual(self.manager.get_user_session(self.username)['session_id'], second['session_id'])
+
+    def test_cached_lease_reads_nothing(self):
+        session = self.manager.create_session(self.username, 'etag1')
+        self.calls.clear()
+        for _ in range(3):
+            self.assertEqual(SessionManager().get_user_session(self.username)['session_id'], session['session_id'])
+        self.assertEqual(self.calls, [])
+
+        self.assertTrue(self.manager.update_session(session['session_id'], db_etag='etag2'))
+        self.assertEqual(self.calls, ['UpdateItem'])
+        self.assertEqual(self.manager.get_user_session(self.username)['db_etag'], 'etag2')
+
+        # Near expiry the cache is no longer trusted
+        session_manager._leases[self.username]['expires_at'] = time.time() + session_manager.LEASE_SAFETY_MARGIN
+        self.manager.get_user_session(self.username)
+        self.assertEqual(self.calls, ['UpdateItem', 'GetItem'])
+
+    def test_taken_over_lease_is_detected(self):
+        mine = self.manager.create_session(self.username, 'etag1')
+        theirs = self.manager.create_session(self.username, 'etag1', lambda_instance_id='lambda-b',
+                                             replace_session_id=mine['session_id'])
+        # Our container still has its lease cached, and is due for a written heartbeat
+        session_manager._cache_lease(dict(mine, expires_at=time.time() + session_manager.HEARTBEAT_THRESHOLD - 1))
+
+        self.assertFalse(self.manager.update_session(mine['session_id']))
+        self.assertEqual(self.manager.get_user_session(self.username)['session_id'], theirs['session_id'])
+
+        # Releasing the old session doesn't delete the new owner's
+        self.assertTrue(self.manager.delete_session(mine['session_id']))
+        self.assertEqual(self.manager.get_session(theirs['session_id'])['lambda_instance_id'], 'lambda-b')
+
+    def test_heartbeats_are_throttled(self):
+        session = self.manager.create_session(self.username, 'etag1')
+        session_manager._leases[self.username]['expires_at'] = time.time() + 1000  # far from the threshold
+        self.calls.clear()
+        for _ in range(20):
+            self.assertTrue(self.manager.update_session(session['session_id'], db_etag='etag1'))
+        self.assertEqual(self.calls, [])
+
+        # A new ETag is always written
+        self.assertTrue(self.manager.update_session(session['session_id'], db_etag='etag2'))
+        self.assertEqual(self.calls, ['UpdateItem'])
+        self.assertEqual(self.manager.get_session(session['session_id'])['db_etag'], 'etag2')
+
+        # So is a heartbeat once the lease runs low
+        self.calls.clear()
+        session_manager._leases[self.username]['expires_at'] = time.time() + session_manager.HEARTBEAT_THRESHOLD - 1
+        self.assertTrue(self.manager.update_session(session['session_id']))
+        self.assertEqual(self.calls, ['UpdateItem'])
+        stats = session_manager.get_heartbeat_stats()
+        self.assertEqual((stats['skipped'], stats['written']), (20, 2))
+
+    def _use_s3(self):
+        """Moto S3 for SessionAwareS3SQLite, and a write-behind scheduler that only flushes when told to."""
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=s3_sqlite.BUCKET)
+        original = (s3_sqlite._s3_client, write_behind.scheduler)
+        s3_sqlite._s3_client = s3
+        write_behind.scheduler = WriteBehindScheduler(idle_seconds=3600, max_writes=1000)
+        path = f'/tmp/{self.username}.anki2'
+
+        def restore():
+            s3_sqlite._s3_client, write_behind.scheduler = original
+            s3_sqlite.clear_cache()
+            if os.path.exists(path):
+                os.remove(path)
+        self.addCleanup(restore)
+        return s3
+
+    def _taken_over(self, mine):
+        """Another Lambda takes the session over; this container still has its lease cached (far from expiry)."""
+        self.manager.create_session(self.username, 'etag-b', lambda_instance_id='lambda-b',
+                                    replace_session_id=mine['session_id'])
+        session_manager._cache_lease(dict(mine, expires_at=time.time() + 1000))
+
+    def test_warm_request_makes_no_dynamodb_read(self):
+        self._use_s3()
+        with SessionAwareS3SQLite(self.username) as conn:
+            conn.execute("SELECT COUNT(*) FROM cards").fetchone()
+        self.calls.clear()
+
+        wrapper = SessionAwareS3SQLite(self.username)
+        with wrapper as conn:
+            conn.execute("SELECT COUNT(*) FROM cards").fetchone()
+        self.assertTrue(wrapper.session_reused)
+        self.assertEqual(self.calls, [])  # no lookup, and the heartbeats were throttled
+
+    def test_writes_without_journal_keep_heartbeats_throttled(self):
+        self._use_s3()
+        with SessionAwareS3SQLite(self.username):
+            pass
+        write_behind.scheduler.flush(self.username, 'test')
+        self.calls.clear()
+
+        # A study burst: every request writes, but only to /tmp (write-behind confirms the session on upload)
+        for review_id in range(1, 21):
+            with SessionAwareS3SQLite(self.username) as conn:
+                conn.execute("INSERT INTO revlog VALUES (?, 1, -1, 3, 1, 0, 2500, 1000, 0)", (review_id,))
+        writes = [call for call in self.calls if call in ('PutItem', 'UpdateItem', 'DeleteItem')]
+        self.assertLessEqual(len(writes), 1)  # the heartbeat carrying the flushed ETag
+        self.assertTrue(write_behind.scheduler.is_dirty(self.username))
+
+    def test_journal_append_after_takeover_is_refused(self):
+        s3 = self._use_s3()
+        original = s3_journal.JOURNAL_ENABLED
+        s3_journal.JOURNAL_ENABLED = True
+        self.addCleanup(setattr, s3_journal, 'JOURNAL_ENABLED', original)
+        wrapper = SessionAwareS3SQLite(self.username)
+        with wrapper:
+            pass
+        write_behind.scheduler.flush(self.username, 'test')  # the new database is in S3
+        self._taken_over(wrapper.current_session)
+
+        # The skipped heartbeat lets the stale copy be reused, but appending to the journal confirms the session
+        stale = SessionAwareS3SQLite(self.username)
+        with self.assertRaises(ConflictError):
+            with stale as conn:
+                self.assertTrue(stale.session_reused)
+                conn.execute("INSERT INTO revlog VALUES (1, 1, -1, 3, 1, 0, 2500, 1000, 0)")
+        self.assertFalse(write_behind.scheduler.is_dirty(self.username))
+        self.assertFalse(os.path.exists(f'/tmp/{self.username}.anki2'))
+        self.assertEqual(s3.list_objects_v2(Bucket=s3_sqlite.BUCKET,
+                                            Prefix=s3_journal.journal_prefix(self.username)).get('KeyCount'), 0)
+        self.assertEqual(self.manager.get_user_session(self.username)['lambda_instance_id'], 'lambda-b')
+
+    def test_flush_after_takeover_drops_writes(self):
+        s3 = self._use_s3()
+        wrapper = SessionAwareS3SQLite(self.username)
+        with wrapper:
+            pass
+        write_behind.scheduler.flush(self.username, 'test')
+        etag = s3.head_object(Bucket=s3_sqlite.BUCKET, Key=f'user_dbs/{self.username}.anki2')['ETag']
+        with SessionAwareS3SQLite(self.username) as conn:
+            conn.execute("INSERT INTO revlog VALUES (1, 1, -1, 3, 1, 0, 2500, 1000, 0)")
+        self.assertTrue(write_behind.scheduler.is_dirty(self.username))
+        self._taken_over(wrapper.current_session)
+
+        self.assertIsNone(write_behind.scheduler.flush(self.username, 'test'))
+        self.assertEqual(write_behind.scheduler.conflicts, 1)
+        self.assertEqual(s3.head_object(Bucket=s3_sqlite.BUCKET, Key=f'user_dbs/{self.username}.anki2')['ETag'],
+                         etag)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Test: Paginated, Parallel Scans of the Sessions Table
+
+Runs SessionManager against moto's in-process DynamoDB, no AWS account needed,
+with a table spanning many scan pages (SCAN_PAGE_SIZE) in every segment:
+- get_session_stats counts every page of every segment
+- cleanup_expired_sessions deletes every expired session with batch_write_item,
+  and leaves the active ones
+
+Run with:
+    python -m unittest test_session_scans.py -v
+"""
+
+import sys
+import os
+import time
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+import session_manager
+from session_manager import SessionManager
+
+ACTIVE = 40
+EXPIRED = 70
+
+
+class SessionScanTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.dynamodb = boto3.client('dynamodb')
+        self.table = os.environ.get('DYNAMODB_SESSIONS_TABLE', 'javumbo-sessions')
+        self.dynamodb.create_table(
+            TableName=self.table,
+            BillingMode='PAY_PER_REQUEST',
+            KeySchema=[{'AttributeName': 'username', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'username', 'AttributeType': 'S'},
+                                  {'AttributeName': 'session_id', 'AttributeType': 'S'}],
+            GlobalSecondaryIndexes=[{'IndexName': 'session-index',
+                                     'KeySchema': [{'AttributeName': 'session_id', 'KeyType': 'HASH'}],
+                                     'Projection': {'ProjectionType': 'KEYS_ONLY'}}])
+        self.original = (session_manager._dynamodb_client, session_manager.SCAN_PAGE_SIZE)
+        session_manager._dynamodb_client = self.dynamodb
+        session_manager.SCAN_PAGE_SIZE = 5
+        session_manager.clear_lease_cache()
+        self.manager = SessionManager()
+
+        now = int(time.time())
+        for i in range(ACTIVE + EXPIRED):
+            expires_at = now + 300 if i < ACTIVE else now - 60
+            self.dynamodb.put_item(TableName=self.table, Item={
+                'session_id': {'S': f'sess_{i}'}, 'username': {'S': f'user{i}'},
+                'lambda_instance_id': {'S': 'lambda-a'}, 'db_etag': {'S': 'etag'},
+                'created_at': {'N': str(now)}, 'last_access': {'N': str(now)},
+                'expires_at': {'N': str(expires_at)}, 'status': {'S': 'active'}})
+
+        self.calls = []
+        self.dynamodb.meta.events.register('provide-client-params.dynamodb', self._record_call)
+
+    def tearDown(self):
+        session_manager._dynamodb_client, session_manager.SCAN_PAGE_SIZE = self.original
+        session_manager.clear_lease_cache()
+
+    def _record_call(self, params, model, **kwargs):
+        self.calls.append((model.name, params))
+
+    def _calls(self, operation):
+        return [params for name, params in self.calls if name == operation]
+
+    def test_stats_follow_every_page_of_every_segment(self):
+        self.assertEqual(self.manager.get_session_stats(),
+                         {'total': ACTIVE + EXPIRED, 'active': ACTIVE, 'expired': EXPIRED})
+
+        scans = self._calls('Scan')
+        self.assertEqual({params['Segment'] for params in scans}, set(range(session_manager.SCAN_SEGMENTS)))
+        self.assertGreater(len(scans), session_manager.SCAN_SEGMENTS)  # more than one page per segment
+        self.assertTrue(all(params['ProjectionExpression'] == 'expires_at, #status' for params in scans))
+
+    def test_cleanup_batch_deletes_every_expired_session(self):
+        self.assertEqual(self.manager.cleanup_expired_sessions(), EXPIRED)
+
+        batches = self._calls('BatchWriteItem')
+        self.assertEqual([len(params['RequestItems'][self.table]) for params in batches], [25, 25, 20])
+        self.assertEqual(self._calls('DeleteItem'), [])
+        self.assertEqual(self.manager.get_session_stats(), {'total': ACTIVE, 'active': ACTIVE, 'expired': 0})
+        self.assertIsNotNone(self.manager.get_user_session('user0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
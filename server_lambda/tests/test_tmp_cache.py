@@ -0,0 +1,140 @@
+"""
+Test: Size-Aware LRU for the /tmp Database Cache
+
+- DatabaseCache counts each database's bytes as it is stored or touched
+- Over DB_CACHE_MAX_MB, least recently used databases are deleted from /tmp,
+  never dirty or session-held ones
+- S3SQLiteConnection (against moto's in-process S3) counts hits, misses and
+  evictions, reported by get_cache_stats()
+
+Run with:
+    python -m unittest test_tmp_cache.py -v
+"""
+
+import sys
+import os
+import tempfile
+import time
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+import s3_sqlite
+from s3_sqlite import S3SQLiteConnection, get_cache_stats
+from tmp_cache import DatabaseCache
+
+KB = 1024
+
+
+class DatabaseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = DatabaseCache(max_bytes=100 * KB)
+
+    def _store(self, username, size):
+        path = os.path.join(self.tmp.name, f'{username}.anki2')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * size)
+        self.cache[username] = {'etag': f'"{username}"', 'timestamp': time.time(), 'path': path}
+        return path
+
+    def test_evicts_least_recently_used_over_budget(self):
+        a = self._store('a', 40 * KB)
+        self._store('b', 40 * KB)
+        self.cache.touch('a')  # b is now least recently used
+        b_path = self.cache['b']['path']
+        self._store('c', 40 * KB)
+
+        self.assertNotIn('b', self.cache)
+        self.assertFalse(os.path.exists(b_path))
+        self.assertTrue(os.path.exists(a))
+        self.assertEqual(self.cache.total_bytes, 80 * KB)
+        self.assertEqual((self.cache.evictions, self.cache.evicted_bytes), (1, 40 * KB))
+
+    def test_touch_tracks_growth(self):
+        a = self._store('a', 10 * KB)
+        with open(a, 'ab') as f:
+            f.write(b'\0' * 20 * KB)
+        self.cache.touch('a')
+        self.assertEqual(self.cache.total_bytes, 30 * KB)
+        del self.cache['a']
+        self.assertEqual(self.cache.total_bytes, 0)
+
+    def test_dirty_and_session_databases_are_kept(self):
+        self._store('dirty', 40 * KB)
+        self.cache.mark_dirty('dirty')
+        self._store('session', 40 * KB)
+        self.cache.hold_session('session', time.time() + 300)
+        self._store('c', 40 * KB)
+
+        self.assertIn('dirty', self.cache)
+        self.assertIn('session', self.cache)
+        self.assertEqual(self.cache.evictions, 0)  # over budget, nothing evictable
+
+        self.cache.mark_clean('dirty')
+        self._store('d', 10 * KB)
+        self.assertNotIn('dirty', self.cache)
+        self.assertIn('session', self.cache)
+
+    def test_expired_session_is_evictable(self):
+        self._store('session', 60 * KB)
+        self.cache.hold_session('session', time.time() - 1)
+        self._store('c', 60 * KB)
+        self.assertNotIn('session', self.cache)
+
+    def test_database_larger_than_budget_is_kept_once_stored(self):
+        self._store('big', 150 * KB)
+        self.assertIn('big', self.cache)
+
+
+class S3SQLiteCacheStatsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=s3_sqlite.BUCKET)
+        self.original = (s3_sqlite._s3_client, s3_sqlite.db_cache.max_bytes)
+        s3_sqlite._s3_client = s3
+        s3_sqlite.clear_cache()
+        self.users = ['lru_cache_a', 'lru_cache_b']
+
+    def tearDown(self):
+        s3_sqlite._s3_client, s3_sqlite.db_cache.max_bytes = self.original
+        s3_sqlite.clear_cache()
+        for username in self.users:
+            if os.path.exists(f'/tmp/{username}.anki2'):
+                os.remove(f'/tmp/{username}.anki2')
+
+    def test_hits_misses_and_evictions(self):
+        a, b = self.users
+        with S3SQLiteConnection(a):
+            pass
+        size = os.path.getsize(f'/tmp/{a}.anki2')
+        s3_sqlite.db_cache.max_bytes = int(size * 1.5)  # room for one database
+
+        with S3SQLiteConnection(a):
+            pass
+        with S3SQLiteConnection(b):
+            pass
+
+        stats = get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual([entry['username'] for entry in stats['entries']], [b])
+        self.assertEqual(stats['total_bytes'], os.path.getsize(f'/tmp/{b}.anki2'))
+        self.assertFalse(os.path.exists(f'/tmp/{a}.anki2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
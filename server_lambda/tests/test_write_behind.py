@@ -0,0 +1,154 @@
+"""
+Test: Write-Behind Flushing of Dirty Session Databases
+
+Runs against moto's in-process S3, no AWS account needed:
+- A dirty database is uploaded once FLUSH_IDLE_SECONDS pass without writes
+- Writes are coalesced: one upload per FLUSH_MAX_WRITES writes, not per write
+- A flush that lost a race drops the stale /tmp copy (ConflictError)
+- SIGTERM flushes everything still dirty
+
+Run with:
+    python -m unittest test_write_behind.py -v
+"""
+
+import sys
+import os
+import signal
+import sqlite3
+import time
+import unittest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+
+import boto3
+from moto import mock_aws
+
+import s3_sqlite
+import write_behind
+from write_behind import WriteBehindScheduler
+
+
+class WriteBehindTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.s3 = boto3.client('s3')
+        self.s3.create_bucket(Bucket=s3_sqlite.BUCKET)
+        self.original_client = s3_sqlite._s3_client
+        s3_sqlite._s3_client = self.s3
+        self.puts = 0
+        self.s3.meta.events.register('provide-client-params.s3.PutObject', self._count_put)
+
+        self.username = f'write_behind_{self._testMethodName}'
+        self.key = f'user_dbs/{self.username}.anki2'
+        self.path = f'/tmp/{self.username}.anki2'
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE revlog (id INTEGER PRIMARY KEY)")
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        s3_sqlite._s3_client = self.original_client
+        s3_sqlite.clear_cache()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _count_put(self, **kwargs):
+        self.puts += 1
+
+    def _write(self, scheduler, review_id, etag=None):
+        conn = sqlite3.connect(self.path)
+        conn.execute("INSERT INTO revlog VALUES (?)", (review_id,))
+        conn.commit()
+        conn.close()
+        scheduler.record_write(self.username, self.path, etag)
+
+    def _stored_reviews(self):
+        restored = f'{self.path}.restored'
+        with open(restored, 'wb') as f:
+            f.write(self.s3.get_object(Bucket=s3_sqlite.BUCKET, Key=self.key)['Body'].read())
+        try:
+            conn = sqlite3.connect(restored)
+            return conn.execute("SELECT COUNT(*) FROM revlog").fetchone()[0]
+        finally:
+            conn.close()
+            os.remove(restored)
+
+    def _wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.02)
+        return condition()
+
+    def test_flushes_when_idle(self):
+        scheduler = WriteBehindScheduler(idle_seconds=0.2, max_writes=100)
+        self._write(scheduler, 1)
+        self._write(scheduler, 2)
+        self.assertGreater(scheduler.oldest_unflushed_age(), 0)
+
+        self.assertTrue(self._wait_for(lambda: not scheduler.is_dirty(self.username)))
+        self.assertEqual(self.puts, 1)
+        self.assertEqual(self._stored_reviews(), 2)
+        etag = self.s3.head_object(Bucket=s3_sqlite.BUCKET, Key=self.key)['ETag']
+        self.assertEqual(scheduler.synced_etag(self.username, None), etag)
+        self.assertEqual(scheduler.get_stats()['oldest_unflushed_age_seconds'], 0)
+
+    def test_coalesces_writes_up_to_max(self):
+        scheduler = WriteBehindScheduler(idle_seconds=60, max_writes=3)
+        self._write(scheduler, 1)
+        self._write(scheduler, 2)
+        time.sleep(0.2)
+        self.assertEqual(self.puts, 0)
+
+        self._write(scheduler, 3)
+        self.assertTrue(self._wait_for(lambda: not scheduler.is_dirty(self.username)))
+        self.assertEqual(self.puts, 1)
+        self.assertEqual(self._stored_reviews(), 3)
+
+        # The next batch is checked against the ETag of the first flush
+        etag = scheduler.synced_etag(self.username, None)
+        for review_id in (4, 5, 6):
+            self._write(scheduler, review_id, etag)
+        self.assertTrue(self._wait_for(lambda: not scheduler.is_dirty(self.username)))
+        self.assertEqual(self.puts, 2)
+        self.assertEqual(self._stored_reviews(), 6)
+
+    def test_conflict_drops_stale_copy(self):
+        scheduler = WriteBehindScheduler(idle_seconds=60, max_writes=100)
+        self.s3.put_object(Bucket=s3_sqlite.BUCKET, Key=self.key, Body=b'written elsewhere')
+        self._write(scheduler, 1)  # based on "not in S3 yet"
+
+        self.assertIsNone(scheduler.flush(self.username, 'test'))
+        self.assertEqual(scheduler.conflicts, 1)
+        self.assertFalse(scheduler.is_dirty(self.username))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.s3.get_object(Bucket=s3_sqlite.BUCKET, Key=self.key)['Body'].read(),
+                         b'written elsewhere')
+
+    def test_sigterm_flushes_dirty_databases(self):
+        scheduler = WriteBehindScheduler(idle_seconds=60, max_writes=100)
+        original = (write_behind.scheduler, signal.getsignal(signal.SIGTERM))
+        handed_over = []
+        write_behind.scheduler = scheduler
+        signal.signal(signal.SIGTERM, lambda signum, frame: handed_over.append(signum))
+        try:
+            write_behind.install_shutdown_hook()
+            self._write(scheduler, 1)
+            os.kill(os.getpid(), signal.SIGTERM)
+        finally:
+            write_behind.scheduler = original[0]
+            signal.signal(signal.SIGTERM, original[1])
+
+        self.assertEqual(handed_over, [signal.SIGTERM])
+        self.assertFalse(scheduler.is_dirty(self.username))
+        self.assertEqual(self._stored_reviews(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()